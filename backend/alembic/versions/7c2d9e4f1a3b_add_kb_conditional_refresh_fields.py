@@ -0,0 +1,40 @@
+"""add_kb_conditional_refresh_fields
+
+Revision ID: 7c2d9e4f1a3b
+Revises: 6ae3fe5b3298
+Create Date: 2026-10-18 09:12:31.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2d9e4f1a3b'
+down_revision = '6ae3fe5b3298'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # HTTP validators and content hash used to skip unchanged pages on refresh
+    op.add_column('knowledge_base_documents', sa.Column('etag', sa.String(), nullable=True))
+    op.add_column('knowledge_base_documents', sa.Column('last_modified', sa.String(), nullable=True))
+    op.add_column('knowledge_base_documents', sa.Column('content_hash', sa.String(), nullable=True))
+    op.add_column('knowledge_base_documents', sa.Column('last_checked_at', sa.DateTime(), nullable=True))
+    op.add_column('knowledge_base_documents', sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # Scheduled refresh settings per collection
+    op.add_column('knowledge_base_collections', sa.Column('refresh_interval_hours', sa.Integer(), nullable=True))
+    op.add_column('knowledge_base_collections', sa.Column('last_refreshed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('knowledge_base_collections', 'last_refreshed_at')
+    op.drop_column('knowledge_base_collections', 'refresh_interval_hours')
+
+    op.drop_column('knowledge_base_documents', 'updated_at')
+    op.drop_column('knowledge_base_documents', 'last_checked_at')
+    op.drop_column('knowledge_base_documents', 'content_hash')
+    op.drop_column('knowledge_base_documents', 'last_modified')
+    op.drop_column('knowledge_base_documents', 'etag')
@@ -0,0 +1,59 @@
+"""add_integration_widget_lookup_columns
+
+Revision ID: 9e4b1c7d2f60
+Revises: 7c2d9e4f1a3b
+Create Date: 2026-10-18 14:05:47.902163
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b1c7d2f60'
+down_revision = '7c2d9e4f1a3b'
+branch_labels = None
+depends_on = None
+
+
+def _normalize_domain(domain):
+    # Same rules as app.core.database.normalize_widget_domain
+    if not domain:
+        return None
+    domain = domain.strip().lower()
+    if "://" in domain:
+        domain = domain.split("://", 1)[1]
+    return domain.split("/", 1)[0] or None
+
+
+def upgrade() -> None:
+    # Widget lookup keys extracted from the JSON config
+    op.add_column('integrations', sa.Column('widget_id', sa.String(), nullable=True))
+    op.add_column('integrations', sa.Column('domain', sa.String(), nullable=True))
+    op.create_index(op.f('ix_integrations_widget_id'), 'integrations', ['widget_id'], unique=False)
+    op.create_index(op.f('ix_integrations_domain'), 'integrations', ['domain'], unique=False)
+
+    # Backfill from existing configs
+    integrations = sa.table(
+        'integrations',
+        sa.column('id', sa.Integer),
+        sa.column('config', sa.JSON),
+        sa.column('widget_id', sa.String),
+        sa.column('domain', sa.String)
+    )
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(integrations.c.id, integrations.c.config)).fetchall()
+    for integration_id, config in rows:
+        config = config or {}
+        connection.execute(
+            integrations.update()
+            .where(integrations.c.id == integration_id)
+            .values(widget_id=config.get('widget_id') or None, domain=_normalize_domain(config.get('domain')))
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_integrations_domain'), table_name='integrations')
+    op.drop_index(op.f('ix_integrations_widget_id'), table_name='integrations')
+    op.drop_column('integrations', 'domain')
+    op.drop_column('integrations', 'widget_id')
@@ -0,0 +1,40 @@
+"""add_conversation_external_chat_fields
+
+Revision ID: a3f8d2e61b94
+Revises: 9e4b1c7d2f60
+Create Date: 2026-10-18 16:21:09.337514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f8d2e61b94'
+down_revision = '9e4b1c7d2f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # One conversation per (integration, external chat) for messaging channels
+    op.add_column('conversations', sa.Column('integration_id', sa.Integer(), nullable=True))
+    op.add_column('conversations', sa.Column('external_chat_id', sa.String(), nullable=True))
+    op.create_foreign_key(
+        'fk_conversations_integration_id', 'conversations', 'integrations',
+        ['integration_id'], ['id']
+    )
+    op.create_unique_constraint(
+        'unique_integration_chat', 'conversations', ['integration_id', 'external_chat_id']
+    )
+
+    # Conversation history is always read by conversation
+    op.create_index(op.f('ix_messages_conversation_id'), 'messages', ['conversation_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_messages_conversation_id'), table_name='messages')
+    op.drop_constraint('unique_integration_chat', 'conversations', type_='unique')
+    op.drop_constraint('fk_conversations_integration_id', 'conversations', type_='foreignkey')
+    op.drop_column('conversations', 'external_chat_id')
+    op.drop_column('conversations', 'integration_id')
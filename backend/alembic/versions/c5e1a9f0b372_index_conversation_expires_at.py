@@ -0,0 +1,24 @@
+"""index_conversation_expires_at
+
+Revision ID: c5e1a9f0b372
+Revises: a3f8d2e61b94
+Create Date: 2026-10-18 18:02:41.118204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e1a9f0b372'
+down_revision = 'a3f8d2e61b94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The anonymous session reaper looks up expired conversations by expiry
+    op.create_index(op.f('ix_conversations_expires_at'), 'conversations', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_conversations_expires_at'), table_name='conversations')
@@ -305,7 +305,16 @@ async def delete_user(
         await db.execute(delete(Agent).where(Agent.user_id == user_id))
         
         # Delete user's integrations
+        web_integration_ids = (await db.execute(
+            select(Integration.id).where(Integration.user_id == user_id, Integration.platform == "web")
+        )).scalars().all()
         await db.execute(delete(Integration).where(Integration.user_id == user_id))
+        # Bulk deletes skip ORM events, so drop cached widget lookups and assets explicitly
+        from app.services.widget_integration_cache import widget_integration_cache
+        from app.services.widget_asset_service import widget_asset_service
+        widget_integration_cache.clear()
+        for integration_id in web_integration_ids:
+            widget_asset_service.remove_config(integration_id)
         
         # Delete user's conversations
         await db.execute(delete(Conversation).where(Conversation.user_id == user_id))
@@ -11,6 +11,7 @@ from datetime import datetime
 
 from app.core.auth import get_current_user
 from app.core.database import get_db, User, Conversation, Agent
+from app.services.anonymous_session_service import anonymous_session_store
 
 router = APIRouter()
 
@@ -174,52 +175,18 @@ async def create_anonymous_conversation(
     
     logger.info(f"✅ Agent found: {agent.name} (ID: {agent.id})")
     
-    # Check if conversation already exists for this customer and agent
-    logger.info(f"🔍 Checking for existing conversation...")
-    existing_conversation = await db.execute(
-        select(Conversation).where(
-            Conversation.customer_identifier == conversation_data.customer_identifier,
-            Conversation.agent_id == conversation_data.agent_id,
-            Conversation.customer_type == "anonymous"
-        )
-    )
-    existing = existing_conversation.scalar_one_or_none()
-    
-    if existing:
-        logger.info(f"✅ Found existing conversation: ID={existing.id}")
-        return ConversationResponse(
-            id=existing.id,
-            user_id=existing.user_id,
-            agent_id=existing.agent_id,
-            session_id=existing.session_id,
-            title=existing.title,
-            context_summary=existing.context_summary,
-            memory_metadata=existing.memory_metadata,
-            retention_policy=existing.retention_policy,
-            created_at=existing.created_at.isoformat(),
-            updated_at=existing.updated_at.isoformat() if existing.updated_at else None
-        )
-    
-    # Create new anonymous conversation
-    logger.info(f"📝 Creating new anonymous conversation...")
-    new_conversation = Conversation(
-        user_id=None,  # No user for anonymous
-        agent_id=conversation_data.agent_id,
+    # Resume the customer's live conversation with this agent, or start one
+    conversation_id, _ = await anonymous_session_store.get_or_create(
+        db,
+        agent,
+        conversation_data.customer_identifier,
         session_id=conversation_data.session_id,
         title=conversation_data.title or f"Anonymous Chat - {agent.name}",
-        customer_type="anonymous",
-        customer_identifier=conversation_data.customer_identifier,
-        linked_email=conversation_data.linked_email,
-        expires_at=None  # Persistent conversation
+        linked_email=conversation_data.linked_email
     )
-    
-    logger.info(f"💾 Adding conversation to database...")
-    db.add(new_conversation)
-    await db.commit()
+    new_conversation = await db.get(Conversation, conversation_id)
     await db.refresh(new_conversation)
-    
-    logger.info(f"✅ Anonymous conversation created successfully!")
-    logger.info(f"📋 Conversation details: ID={new_conversation.id}, Customer={new_conversation.customer_identifier}")
+    logger.info(f"✅ Anonymous conversation ready: ID={new_conversation.id}, Customer={new_conversation.customer_identifier}")
     
     return ConversationResponse(
         id=new_conversation.id,
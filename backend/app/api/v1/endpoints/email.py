@@ -19,15 +19,16 @@ class EmailWebhookData(BaseModel):
     subject: str = None
     body: str = None
     html_body: str = None
+    message_id: str = None  # Message-ID header, used to drop redeliveries
 
 @router.post("/webhook")
 async def email_webhook(
-    email_data: EmailWebhookData,
-    db: AsyncSession = Depends(get_db)
+    email_data: EmailWebhookData
 ):
     """
     Handle incoming email webhook
     This endpoint receives emails from email services like SendGrid, Mailgun, etc.
+    The email is queued and answered by a background worker.
     """
     try:
         email_service = EmailIntegrationService()
@@ -37,13 +38,18 @@ async def email_webhook(
             'to': email_data.to,
             'from': email_data.from_email,
             'subject': email_data.subject,
-            'body': email_data.body or email_data.html_body
+            'body': email_data.body or email_data.html_body,
+            'message_id': email_data.message_id
         }
         
-        await email_service.process_incoming_email(email_dict, db)
+        if not email_service.enqueue_email(email_dict):
+            # Queue is full; the email provider redelivers on errors
+            raise HTTPException(status_code=503, detail="Busy, retry later")
         
-        return {"status": "success", "message": "Email processed"}
+        return {"status": "success", "message": "Email queued"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Email webhook error: {e}")
         raise HTTPException(status_code=500, detail="Failed to process email")
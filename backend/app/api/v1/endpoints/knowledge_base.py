@@ -9,8 +9,10 @@ from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 
 from app.core.auth import get_current_user
+from app.core.config import settings
 from app.core.database import get_db, User
 from app.services.knowledge_base_service import KnowledgeBaseService
+from app.services.retrieval_cache_service import retrieval_cache_service
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -27,6 +29,9 @@ class WebsiteCrawlRequest(BaseModel):
     max_pages: int = 50
     max_depth: int = 3
 
+class RefreshScheduleRequest(BaseModel):
+    refresh_interval_hours: Optional[int] = None  # None disables scheduled refresh
+
 class CollectionResponse(BaseModel):
     id: int
     name: str
@@ -111,6 +116,58 @@ async def crawl_website_to_collection(
             detail=f"Failed to crawl website: {str(e)}"
         )
 
+@router.post("/collections/{collection_id}/refresh")
+async def refresh_collection(
+    collection_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Re-check the website pages of a collection and re-embed only changed content."""
+    try:
+        kb_service = KnowledgeBaseService(db)
+        result = await kb_service.refresh_collection(collection_id, user_id=current_user.id)
+        
+        return {
+            "success": True,
+            "message": f"Refreshed {result['pages_checked']} pages: {result['documents_updated']} updated, {result['documents_unchanged']} unchanged",
+            "data": result
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to refresh collection: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to refresh collection: {str(e)}"
+        )
+
+@router.put("/collections/{collection_id}/refresh-schedule")
+async def set_refresh_schedule(
+    collection_id: int,
+    schedule: RefreshScheduleRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Enable or disable scheduled refresh for a collection."""
+    try:
+        kb_service = KnowledgeBaseService(db)
+        result = await kb_service.set_refresh_schedule(
+            collection_id=collection_id,
+            user_id=current_user.id,
+            refresh_interval_hours=schedule.refresh_interval_hours
+        )
+        
+        return {
+            "success": True,
+            "data": result
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to update refresh schedule: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to update refresh schedule: {str(e)}"
+        )
+
 @router.post("/collections/{collection_id}/upload-file")
 async def upload_file_to_collection(
     collection_id: int,
@@ -121,7 +178,7 @@ async def upload_file_to_collection(
     """Upload a file to a collection."""
     try:
         # Validate file type
-        allowed_extensions = ['.txt', '.md', '.pdf', '.doc', '.docx']
+        allowed_extensions = ['.txt', '.md', '.pdf', '.docx', '.csv', '.json']
         file_extension = file.filename.lower().split('.')[-1] if '.' in file.filename else ''
         
         if f'.{file_extension}' not in allowed_extensions:
@@ -130,11 +187,12 @@ async def upload_file_to_collection(
                 detail=f"File type not supported. Allowed types: {', '.join(allowed_extensions)}"
             )
         
-        # Validate file size (max 10MB)
-        if file.size and file.size > 10 * 1024 * 1024:
+        # Validate file size
+        max_size = settings.KNOWLEDGE_BASE_MAX_FILE_SIZE
+        if file.size and file.size > max_size:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="File size must be less than 10MB"
+                detail=f"File size must be less than {max_size // (1024 * 1024)}MB"
             )
         
         kb_service = KnowledgeBaseService(db)
@@ -185,6 +243,8 @@ async def query_collection(
     collection_id: int,
     query: str = Form(...),
     top_k: int = Form(5),
+    similarity_threshold: Optional[float] = Form(None),
+    max_tokens: Optional[int] = Form(None),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -194,7 +254,9 @@ async def query_collection(
         result = await kb_service.query_collection(
             collection_id=collection_id,
             query=query,
-            top_k=top_k
+            top_k=top_k,
+            similarity_threshold=similarity_threshold,
+            max_tokens=max_tokens
         )
         
         return {
@@ -209,6 +271,33 @@ async def query_collection(
             detail=f"Failed to query collection: {str(e)}"
         )
 
+@router.get("/cache-stats")
+async def get_retrieval_cache_stats(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Query-embedding and result cache hit rates for the current user's collections."""
+    try:
+        kb_service = KnowledgeBaseService(db)
+        collections = await kb_service.get_user_collections(current_user.id)
+        
+        stats = {}
+        for collection in collections:
+            name = collection['chroma_collection_name']
+            stats[collection['name']] = retrieval_cache_service.get_stats(name)[name]
+        
+        return {
+            "success": True,
+            "data": stats
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to get cache stats: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get cache stats: {str(e)}"
+        )
+
 @router.delete("/collections/{collection_id}")
 async def delete_collection(
     collection_id: int,
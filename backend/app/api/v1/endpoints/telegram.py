@@ -9,6 +9,7 @@ from typing import Dict, Any, Optional
 
 from app.core.auth import get_current_user
 from app.core.database import get_db, User
+from app.core.rate_limit import limit_telegram_webhook
 from app.services.telegram_integration import TelegramIntegrationService
 
 router = APIRouter()
@@ -19,25 +20,38 @@ class TelegramUpdate(BaseModel):
     edited_message: Optional[Dict[str, Any]] = None
     callback_query: Optional[Dict[str, Any]] = None
 
-@router.post("/webhook")
+@router.post("/webhook", dependencies=[Depends(limit_telegram_webhook)])
 async def telegram_webhook(
     update: TelegramUpdate,
-    db: AsyncSession = Depends(get_db)
+    request: Request
 ):
     """
     Handle incoming Telegram webhook updates
-    This endpoint receives updates from Telegram Bot API
+    Updates are queued and answered by background workers, so Telegram gets
+    its acknowledgement right away
     """
     try:
+        # Acknowledge but drop updates from chats over their rate limit
+        if request.state.rate_limited:
+            return {"status": "ok"}
+        
         telegram_service = TelegramIntegrationService()
         
         # Convert to dict for processing
         update_data = update.dict()
         
-        await telegram_service.process_telegram_update(update_data, db)
+        # Webhooks set by this service carry a secret token that names the bot
+        secret_token = request.headers.get("x-telegram-bot-api-secret-token")
+        bot_id = secret_token.split("_", 1)[0] if secret_token else None
+        
+        if not telegram_service.enqueue_update(update_data, bot_id=bot_id, secret_token=secret_token):
+            # Queue is full; Telegram redelivers on errors
+            raise HTTPException(status_code=503, detail="Busy, retry later")
         
         return {"status": "ok"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Telegram webhook error: {e}")
         raise HTTPException(status_code=500, detail="Failed to process update")
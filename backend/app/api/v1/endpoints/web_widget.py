@@ -3,7 +3,7 @@ Web Widget integration endpoints
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
@@ -11,8 +11,10 @@ import os
 import json
 
 from app.core.auth import get_current_user
+from app.core.rate_limit import limit_widget_requests
 from app.core.database import get_db, User, Integration
 from app.services.web_widget_integration import WebWidgetIntegrationService
+from app.services.widget_asset_service import WidgetAsset, widget_asset_service
 from sqlalchemy import select
 
 def get_base_url(request: Request) -> str:
@@ -65,7 +67,7 @@ async def handle_widget_message_options():
         }
     )
 
-@router.post("/message")
+@router.post("/message", dependencies=[Depends(limit_widget_requests)])
 async def handle_widget_message(
     message_data: WidgetMessage,
     db: AsyncSession = Depends(get_db)
@@ -112,7 +114,7 @@ async def handle_widget_message_stream_options():
         }
     )
 
-@router.post("/message/stream")
+@router.post("/message/stream", dependencies=[Depends(limit_widget_requests)])
 async def handle_widget_message_stream(
     message_data: WidgetMessage,
     db: AsyncSession = Depends(get_db)
@@ -171,6 +173,34 @@ async def handle_widget_message_stream(
         print(f"Widget streaming error: {e}")
         raise HTTPException(status_code=500, detail="Failed to process streaming message")
 
+def _asset_response(asset: WidgetAsset, request: Request, cache_control: Optional[str] = None) -> Response:
+    """Serve a widget asset with validators, answering revalidations with 304"""
+    headers = {
+        "ETag": asset.etag,
+        "Cache-Control": cache_control or asset.cache_control,
+        "Access-Control-Allow-Origin": "*"
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if asset.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=asset.body, media_type="application/javascript; charset=utf-8", headers=headers)
+
+@router.get("/runtime/{version}.js")
+async def get_widget_runtime(version: str, request: Request):
+    """Serve the static widget runtime; versioned URLs are cached forever"""
+    runtime = widget_asset_service.runtime
+    # Unknown versions get the current runtime, but must not be cached as if it were theirs
+    cache_control = None if version == widget_asset_service.runtime_version else "no-cache"
+    return _asset_response(runtime, request, cache_control)
+
+@router.get("/config/{integration_id}.js")
+async def get_widget_config_script(integration_id: int, request: Request):
+    """Serve the config script that embedded widgets load on every page view"""
+    asset = await widget_asset_service.load_config_script(integration_id)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Widget not found")
+    return _asset_response(asset, request)
+
 @router.get("/script/{integration_id}")
 async def get_widget_script(
     integration_id: int,
@@ -200,7 +230,7 @@ async def get_widget_script(
         base_url = get_base_url(request)
         config['api_url'] = f"{base_url}/api/v1/web-widget"
         
-        script = widget_service.generate_widget_script(config)
+        script = widget_service.generate_widget_script(config, integration_id)
         
         # Debug logging
         print(f"Generated script length: {len(script)}")
@@ -302,7 +332,7 @@ async def test_widget_page(
         base_url = get_base_url(request)
         config['api_url'] = f"{base_url}/api/v1/web-widget"
         
-        script = widget_service.generate_widget_script(config)
+        script = widget_service.generate_widget_script(config, integration_id)
         
         # Create test HTML page
         html_page = f"""
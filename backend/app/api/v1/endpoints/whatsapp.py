@@ -6,6 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any
 from app.core.database import get_db
+from app.core.rate_limit import limit_whatsapp_webhook
 from app.services.whatsapp_integration import WhatsAppIntegrationService
 
 router = APIRouter()
@@ -30,23 +31,28 @@ async def verify_webhook(
     
     raise HTTPException(status_code=403, detail="Forbidden")
 
-@router.post("/webhook")
-async def receive_webhook(
-    request: Request,
-    db: AsyncSession = Depends(get_db)
-):
+@router.post("/webhook", dependencies=[Depends(limit_whatsapp_webhook)])
+async def receive_webhook(request: Request):
     """
     Receive WhatsApp messages via webhook
-    This endpoint receives incoming WhatsApp messages and routes them to AI agents
+    Messages are queued and answered by background workers, so WhatsApp gets
+    its acknowledgement right away
     """
     try:
         webhook_data = await request.json()
+        if not isinstance(webhook_data, dict):
+            raise HTTPException(status_code=400, detail="Invalid webhook payload")
         
+        # Messages from senders over their rate limit are acknowledged but dropped
         whatsapp_service = WhatsAppIntegrationService()
-        await whatsapp_service.handle_webhook(webhook_data, db)
+        if not whatsapp_service.handle_webhook(webhook_data, skip_message_ids=request.state.rate_limited_messages):
+            # Queue is full; WhatsApp redelivers on errors
+            raise HTTPException(status_code=503, detail="Busy, retry later")
         
         return {"status": "ok"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Webhook error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
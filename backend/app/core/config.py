@@ -56,9 +56,68 @@ class Settings(BaseSettings):
     # Redis (for caching and queues)
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
     
+    # Rate limiting for public widget and webhook endpoints ("memory" or "redis")
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_IP_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "60"))
+    RATE_LIMIT_WIDGET_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_WIDGET_PER_MINUTE", "600"))
+    RATE_LIMIT_CUSTOMER_PER_HOUR: int = int(os.getenv("RATE_LIMIT_CUSTOMER_PER_HOUR", "50"))
+    # Reverse proxies in front of the app that append to X-Forwarded-For (0: use the socket address)
+    TRUSTED_PROXY_COUNT: int = int(os.getenv("TRUSTED_PROXY_COUNT", "0"))
+    
+    # Inbound WhatsApp/Telegram/email message queue
+    MESSAGE_INGESTION_WORKERS: int = int(os.getenv("MESSAGE_INGESTION_WORKERS", "8"))
+    MESSAGE_INGESTION_MAX_PENDING: int = int(os.getenv("MESSAGE_INGESTION_MAX_PENDING", "1000"))
+    
+    # Long-poll Telegram bots that have no webhook_url configured
+    TELEGRAM_POLLING_ENABLED: bool = os.getenv("TELEGRAM_POLLING_ENABLED", "false").lower() == "true"
+    
+    # Anonymous widget conversations are deleted after this many days without activity
+    ANONYMOUS_SESSION_TTL_DAYS: int = int(os.getenv("ANONYMOUS_SESSION_TTL_DAYS", "30"))
+    
+    # Rendered web widget config scripts, shared by all worker processes
+    WIDGET_ASSET_DIR: str = os.getenv("WIDGET_ASSET_DIR", os.path.join(os.getcwd(), "widget_assets"))
+    
+    # Token budget for the chat history sent with WhatsApp/Telegram messages
+    CONVERSATION_CONTEXT_MAX_TOKENS: int = int(os.getenv("CONVERSATION_CONTEXT_MAX_TOKENS", "3000"))
+    
+    # HTML content extraction worker pool (0 = min(4, CPU count))
+    CONTENT_EXTRACTION_WORKERS: int = int(os.getenv("CONTENT_EXTRACTION_WORKERS", "0"))
+    
+    # Share one model call between identical first turns that arrive at the same time
+    AGENT_TURN_COALESCING_ENABLED: bool = os.getenv("AGENT_TURN_COALESCING_ENABLED", "true").lower() == "true"
+    
+    # Tables stored by the data tools, deleted after a conversation is idle this long
+    DATASET_STORE_DIR: str = os.getenv("DATASET_STORE_DIR", "./cache/datasets")
+    DATASET_TTL_SECONDS: int = int(os.getenv("DATASET_TTL_SECONDS", "86400"))
+    
+    # Rendered charts of the data visualization tool, served from /temp/charts ("local") or Vercel Blob ("blob")
+    CHART_OUTPUT_DIR: str = os.getenv("CHART_OUTPUT_DIR", os.path.join(os.getcwd(), "temp", "charts"))
+    CHART_STORAGE: str = os.getenv("CHART_STORAGE", "local")
+    CHART_TTL_SECONDS: int = int(os.getenv("CHART_TTL_SECONDS", "86400"))
+    # Chart rendering worker pool (0 = min(2, CPU count))
+    CHART_RENDER_WORKERS: int = int(os.getenv("CHART_RENDER_WORKERS", "0"))
+    
+    # MongoDB Advanced tool: shared clients closed after this long unused, inferred schemas kept this long
+    MONGO_CLIENT_IDLE_SECONDS: int = int(os.getenv("MONGO_CLIENT_IDLE_SECONDS", "600"))
+    MONGO_SCHEMA_CACHE_SECONDS: int = int(os.getenv("MONGO_SCHEMA_CACHE_SECONDS", "300"))
+    
+    # Google Sheets tool: how long read ranges and spreadsheet versions are trusted without asking the API
+    GOOGLE_SHEETS_CACHE_TTL_SECONDS: int = int(os.getenv("GOOGLE_SHEETS_CACHE_TTL_SECONDS", "30"))
+    
+    # Image Processor batch worker pool (0 = CPU count)
+    IMAGE_PROCESSING_WORKERS: int = int(os.getenv("IMAGE_PROCESSING_WORKERS", "0"))
+    
+    # PDF Processor page worker pool (0 = min(4, CPU count)) and page text cache
+    PDF_PROCESSING_WORKERS: int = int(os.getenv("PDF_PROCESSING_WORKERS", "0"))
+    PDF_TEXT_CACHE_DIR: str = os.getenv("PDF_TEXT_CACHE_DIR", "./cache/pdf_text")
+    
+    # Knowledge base retrieval cache (query embeddings)
+    RETRIEVAL_CACHE_DIR: str = os.getenv("RETRIEVAL_CACHE_DIR", "./cache/retrieval")
+    
     # File Storage
     UPLOAD_DIR: str = "./uploads"
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    KNOWLEDGE_BASE_MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB, uploads are streamed to disk
     
     # Vercel Blob Storage
     BLOB_READ_WRITE_TOKEN: Optional[str] = None
@@ -5,8 +5,8 @@ Database configuration and models for the AI Agent Platform
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON, Float, func, UniqueConstraint, text
-from sqlalchemy.orm import relationship
-from typing import AsyncGenerator
+from sqlalchemy.orm import relationship, validates
+from typing import AsyncGenerator, Optional
 import uuid
 from datetime import datetime
 
@@ -391,12 +391,32 @@ class Integration(Base):
     config = Column(JSON, nullable=False)  # Platform-specific configuration
     webhook_url = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
+    # Lookup keys copied out of config so widget traffic can use an index
+    widget_id = Column(String, nullable=True, index=True)
+    domain = Column(String, nullable=True, index=True)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
     # Relationships
     user = relationship("User", back_populates="integrations")
     agent = relationship("Agent")
+    
+    @validates("config")
+    def _sync_lookup_keys(self, key, config):
+        """Keep widget_id/domain in step with the config they come from."""
+        config = config or {}
+        self.widget_id = config.get("widget_id") or None
+        self.domain = normalize_widget_domain(config.get("domain"))
+        return config
+
+def normalize_widget_domain(domain: Optional[str]) -> Optional[str]:
+    """Lowercase host of a domain or URL, e.g. ``https://Example.com/`` -> ``example.com``."""
+    if not domain:
+        return None
+    domain = domain.strip().lower()
+    if "://" in domain:
+        domain = domain.split("://", 1)[1]
+    return domain.split("/", 1)[0] or None
 
 class OrganizationIntegration(Base):
     __tablename__ = "organization_integrations"
@@ -644,14 +664,22 @@ class Conversation(Base):
     customer_type = Column(String, default="authenticated")  # 'authenticated' or 'anonymous'
     customer_identifier = Column(String, nullable=True, index=True)  # Cookie ID for anonymous users
     linked_email = Column(String, nullable=True, index=True)  # Optional email for persistence
-    expires_at = Column(DateTime, nullable=True)  # NULL for persistent conversations
+    expires_at = Column(DateTime, nullable=True, index=True)  # NULL for persistent conversations
     
     # Workspace support
     workspace_id = Column(Integer, ForeignKey("workspaces.id"), nullable=True)  # Optional workspace
     
+    # Messaging channel chats (WhatsApp number, Telegram chat id) keep one conversation each
+    integration_id = Column(Integer, ForeignKey("integrations.id"), nullable=True)
+    external_chat_id = Column(String, nullable=True)
+    
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
+    __table_args__ = (
+        UniqueConstraint('integration_id', 'external_chat_id', name='unique_integration_chat'),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="conversations")
     agent = relationship("Agent", back_populates="conversations")
@@ -679,7 +707,7 @@ class Message(Base):
     __tablename__ = "messages"
     
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, ForeignKey("conversations.id"))
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), index=True)
     role = Column(String)  # 'user', 'assistant', 'system'
     content = Column(Text)
     meta_data = Column(JSON, nullable=True)
@@ -859,6 +887,8 @@ class KnowledgeBaseCollection(Base):
     collection_type = Column(String, nullable=False)  # 'website', 'files', 'mixed'
     chroma_collection_name = Column(String, nullable=False, unique=True)
     pages_extracted = Column(Integer, default=0)  # Number of pages extracted from websites
+    refresh_interval_hours = Column(Integer, nullable=True)  # Scheduled website refresh, NULL disables it
+    last_refreshed_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -878,7 +908,12 @@ class KnowledgeBaseDocument(Base):
     file_path = Column(String, nullable=True)   # For uploaded files
     document_type = Column(String, nullable=False)  # 'website', 'file', 'text'
     document_metadata = Column(JSON, nullable=True)  # Additional metadata
+    etag = Column(String, nullable=True)  # ETag header from the last fetch
+    last_modified = Column(String, nullable=True)  # Last-Modified header from the last fetch
+    content_hash = Column(String, nullable=True)  # SHA-256 of the extracted content
+    last_checked_at = Column(DateTime, nullable=True)  # Last time the source was re-validated
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship
     collection = relationship("KnowledgeBaseCollection", back_populates="documents")
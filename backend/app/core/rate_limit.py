@@ -0,0 +1,303 @@
+"""
+Token-bucket rate limiting for public endpoints
+
+Buckets are keyed by scope and identity (``ip:1.2.3.4``, ``widget:abc``,
+``customer:xyz``) and refill continuously. State lives in a pluggable
+backend: an in-process store with expiring entries by default, or Redis when
+``RATE_LIMIT_BACKEND=redis`` so all workers share the same buckets.
+
+Routes use the FastAPI dependencies at the bottom of this module; outbound
+senders use ``RateLimiter.acquire`` to wait for provider limits instead.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """A bucket that holds ``capacity`` tokens and refills them over ``period`` seconds."""
+    name: str
+    capacity: int
+    period: float
+
+    @property
+    def refill_rate(self) -> float:
+        return self.capacity / self.period
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    remaining: int
+    retry_after: float
+    rule: Optional[RateLimitRule] = None
+
+
+class InMemoryRateLimitBackend:
+    """
+    Per-process bucket store.
+
+    A bucket that has been idle long enough to refill completely carries no
+    information, so it is dropped; the store is also capped at ``max_entries``
+    by evicting the least recently used buckets.
+    """
+
+    def __init__(self, max_entries: int = 100000, sweep_interval: float = 60.0):
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        # key -> (tokens, updated_at, seconds to refill completely)
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        self._last_sweep = time.monotonic()
+
+    async def consume(self, key: str, rule: RateLimitRule, cost: int = 1) -> RateLimitResult:
+        return await self.consume_all([(key, rule)], cost)
+
+    async def consume_all(self, buckets: List[Tuple[str, RateLimitRule]], cost: int = 1) -> RateLimitResult:
+        """
+        Take ``cost`` tokens from every ``(key, rule)`` bucket, or from none of
+        them if any is short. Returns the first short bucket's result, or the
+        last bucket's when all had enough.
+        """
+        now = time.monotonic()
+        levels = []
+        for key, rule in buckets:
+            tokens, updated_at, _ = self._buckets.get(key, (float(rule.capacity), now, rule.period))
+            tokens = min(float(rule.capacity), tokens + (now - updated_at) * rule.refill_rate)
+            if tokens < cost:
+                return RateLimitResult(False, int(tokens), (cost - tokens) / rule.refill_rate, rule)
+            levels.append(tokens)
+
+        result = RateLimitResult(True, 0, 0.0)
+        for (key, rule), tokens in zip(buckets, levels):
+            self._buckets[key] = (tokens - cost, now, rule.period)
+            self._buckets.move_to_end(key)
+            result = RateLimitResult(True, int(tokens - cost), 0.0, rule)
+
+        while len(self._buckets) > self.max_entries:
+            self._buckets.popitem(last=False)
+        if now - self._last_sweep > self.sweep_interval:
+            self._sweep(now)
+        return result
+
+    def _sweep(self, now: float):
+        self._last_sweep = now
+        expired = [key for key, (_, updated_at, period) in self._buckets.items() if now - updated_at >= period]
+        for key in expired:
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# Refill every bucket, then consume from all of them or none, atomically; keys
+# expire once the bucket would be full again. ARGV: now, cost, then capacity
+# and refill rate per key. Returns {allowed, deciding key index, its tokens}.
+_REDIS_TOKEN_BUCKETS = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local levels = {}
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[2 * i + 1])
+  local rate = tonumber(ARGV[2 * i + 2])
+  local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(bucket[1]) or capacity
+  local ts = tonumber(bucket[2]) or now
+  levels[i] = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+  if levels[i] < cost then
+    return {0, i, tostring(levels[i])}
+  end
+end
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[2 * i + 1])
+  local rate = tonumber(ARGV[2 * i + 2])
+  levels[i] = levels[i] - cost
+  redis.call('HSET', key, 'tokens', levels[i], 'ts', now)
+  redis.call('PEXPIRE', key, math.ceil((capacity - levels[i]) / rate * 1000) + 1000)
+end
+return {1, #KEYS, tostring(levels[#KEYS])}
+"""
+
+
+class RedisRateLimitBackend:
+    """Bucket store shared by all workers through Redis."""
+
+    def __init__(self, redis_url: str, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis_asyncio
+
+        self.prefix = prefix
+        self._client = redis_asyncio.from_url(redis_url)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKETS)
+
+    async def consume(self, key: str, rule: RateLimitRule, cost: int = 1) -> RateLimitResult:
+        return await self.consume_all([(key, rule)], cost)
+
+    async def consume_all(self, buckets: List[Tuple[str, RateLimitRule]], cost: int = 1) -> RateLimitResult:
+        """See ``InMemoryRateLimitBackend.consume_all``."""
+        args = [time.time(), cost]
+        for _, rule in buckets:
+            args += [rule.capacity, rule.refill_rate]
+        allowed, index, tokens = await self._script(
+            keys=[f"{self.prefix}{key}" for key, _ in buckets],
+            args=args
+        )
+        rule = buckets[int(index) - 1][1]
+        tokens = float(tokens)
+        retry_after = 0.0 if allowed else (cost - tokens) / rule.refill_rate
+        return RateLimitResult(bool(allowed), int(tokens), retry_after, rule)
+
+
+class RateLimiter:
+    """Checks a request against several buckets at once."""
+
+    def __init__(self, backend_name: str = "memory", redis_url: Optional[str] = None):
+        self.backend = self._create_backend(backend_name, redis_url)
+        self.rejected: Dict[str, int] = {}
+
+    @staticmethod
+    def _create_backend(backend_name: str, redis_url: Optional[str]):
+        if backend_name == "redis":
+            try:
+                return RedisRateLimitBackend(redis_url)
+            except ImportError:
+                logger.warning("RATE_LIMIT_BACKEND=redis but the redis package is not installed, using in-memory rate limits")
+        return InMemoryRateLimitBackend()
+
+    async def check(self, checks: List[Tuple[RateLimitRule, Optional[str]]]) -> RateLimitResult:
+        """
+        Consume one token from each ``(rule, identity)`` bucket.
+
+        Checks with an empty identity are skipped. Tokens are only taken when
+        every bucket has one; otherwise the first empty bucket's result is
+        returned and none is charged.
+        """
+        buckets = [(f"{rule.name}:{identity}", rule) for rule, identity in checks if identity]
+        if not buckets:
+            return RateLimitResult(True, 0, 0.0)
+        try:
+            result = await self.backend.consume_all(buckets)
+        except Exception as e:
+            # Never turn a limiter outage into an outage of the endpoint
+            logger.warning(f"Rate limit backend error, allowing request: {e}")
+            return RateLimitResult(True, 0, 0.0)
+        if not result.allowed:
+            self.rejected[result.rule.name] = self.rejected.get(result.rule.name, 0) + 1
+        return result
+
+    async def acquire(self, checks: List[Tuple[RateLimitRule, Optional[str]]]) -> float:
+        """
+        Wait until a token of each ``(rule, identity)`` bucket is consumed.
+
+        For callers that must slow down rather than drop work, such as
+        outbound provider messages. Returns the seconds spent waiting.
+        """
+        waited = 0.0
+        for rule, identity in checks:
+            if not identity:
+                continue
+            while True:
+                try:
+                    result = await self.backend.consume(f"{rule.name}:{identity}", rule)
+                except Exception as e:
+                    logger.warning(f"Rate limit backend error, not waiting: {e}")
+                    return waited
+                if result.allowed:
+                    break
+                await asyncio.sleep(result.retry_after)
+                waited += result.retry_after
+        return waited
+
+
+rate_limiter = RateLimiter(settings.RATE_LIMIT_BACKEND, settings.REDIS_URL)
+
+IP_RULE = RateLimitRule("ip", settings.RATE_LIMIT_IP_PER_MINUTE, 60)
+WIDGET_RULE = RateLimitRule("widget", settings.RATE_LIMIT_WIDGET_PER_MINUTE, 60)
+CUSTOMER_RULE = RateLimitRule("customer", settings.RATE_LIMIT_CUSTOMER_PER_HOUR, 3600)
+
+
+def get_client_ip(request: Request) -> Optional[str]:
+    """
+    Client address. Behind ``TRUSTED_PROXY_COUNT`` proxies, this is the
+    X-Forwarded-For hop the outermost proxy appended: hops further left are
+    whatever the client sent, so they are never trusted.
+    """
+    if settings.TRUSTED_PROXY_COUNT > 0:
+        hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(hops) >= settings.TRUSTED_PROXY_COUNT:
+            return hops[-settings.TRUSTED_PROXY_COUNT]
+    return request.client.host if request.client else None
+
+
+async def _json_body(request: Request) -> Dict[str, Any]:
+    # Starlette caches the body, so the route can still read it afterwards
+    try:
+        body = await request.json()
+    except Exception:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+async def limit_widget_requests(request: Request):
+    """Reject widget traffic over the per-IP, per-widget or per-visitor limits with a 429."""
+    body = await _json_body(request)
+    result = await rate_limiter.check([
+        (IP_RULE, get_client_ip(request)),
+        (WIDGET_RULE, body.get("widget_id") or body.get("domain")),
+        (CUSTOMER_RULE, body.get("customer_identifier") or body.get("session_id")),
+    ])
+    if not result.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="You've sent too many messages. Please wait a bit before sending another message.",
+            headers={"Retry-After": str(max(1, int(result.retry_after + 0.999)))}
+        )
+
+
+async def limit_whatsapp_webhook(request: Request):
+    """
+    Mark the messages of a WhatsApp webhook call whose senders are over their limit.
+
+    Webhooks must still be acknowledged or Meta retries them, so instead of
+    failing the request this sets ``request.state.rate_limited_messages`` to
+    the ids of those messages and the route skips only them. One call can
+    batch messages from many senders; each is checked on its own.
+    """
+    body = await _json_body(request)
+    rate_limited = set()
+    for entry in body.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            phone_number_id = (value.get("metadata") or {}).get("phone_number_id")
+            for message in value.get("messages") or []:
+                if not message.get("id") or not message.get("from"):
+                    continue
+                result = await rate_limiter.check([(CUSTOMER_RULE, f"whatsapp:{phone_number_id}:{message['from']}")])
+                if not result.allowed:
+                    rate_limited.add(message["id"])
+                    logger.warning(f"Dropping WhatsApp message {message['id']} from {message['from']} to {phone_number_id}: sender over its rate limit")
+    request.state.rate_limited_messages = rate_limited
+
+
+async def limit_telegram_webhook(request: Request):
+    """
+    Mark Telegram updates from chats over their limit by setting
+    ``request.state.rate_limited``; the route acknowledges and skips them
+    (see ``limit_whatsapp_webhook``).
+    """
+    body = await _json_body(request)
+    message = body.get("message") or body.get("edited_message") or (body.get("callback_query") or {}).get("message") or {}
+    chat_id = (message.get("chat") or {}).get("id")
+    request.state.rate_limited = False
+    if chat_id is not None:
+        result = await rate_limiter.check([(CUSTOMER_RULE, f"telegram:{chat_id}")])
+        request.state.rate_limited = not result.allowed
@@ -14,12 +14,17 @@ from loguru import logger
 import re
 
 from app.core.config import settings
-from app.core.database import Agent, Tool, Message, Conversation
+from app.core.database import Agent, AsyncSessionLocal, Tool, Message, Conversation
 from app.services.credit_service import CreditService
 from app.services.tool_registry import tool_registry
 from app.services.tool_usage_tracker import tool_usage_tracker
 from app.services.json_tool_loader import json_tool_loader
+from app.services.response_cache_service import ResponseCacheConfig, response_cache_service
 from app.services.tool_system_prompts import tool_system_prompts_service
+from app.services.turn_coalescing_service import turn_coalescing_service
+
+# Tools that keep per-conversation state (dataset handles, see dataset_store_service)
+SESSION_SCOPED_TOOLS = frozenset({"csv_processor", "statistical_analysis", "data_visualization"})
 
 class AgentService:
     def __init__(self, db: AsyncSession):
@@ -52,11 +57,100 @@ class AgentService:
         conversation_history: List[Dict[str, str]] = None,
         session_id: str = None,
         user_id: int = None,
-        integration_id: int = None
+        integration_id: int = None,
+        question: str = None,
+        cache_context: str = "",
+        use_response_cache: bool = True
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """
         Execute an agent with streaming response
+        
+        First turns of agents with a response cache (see response_cache_service)
+        are replayed from it when the question was answered before. ``question``
+        is the user's text without channel framing, which is what the cache
+        matches on; it defaults to ``user_message``. ``cache_context`` holds the
+        rest of the framing (e.g. the site a widget runs on): answers are only
+        replayed within the same context. Callers whose framing identifies the
+        user pass ``use_response_cache=False``.
+        """
+        cache_config = None if conversation_history or not use_response_cache else ResponseCacheConfig.for_agent(agent)
+        question = question or user_message
+        if cache_config:
+            cached = await response_cache_service.lookup(agent, question, cache_config, cache_context)
+            if cached:
+                logger.info(f"💾 Agent {agent.id} answered from the response cache")
+                async for event in response_cache_service.replay(cached):
+                    yield event
+                return
+        
+        # Turns without history see the same input whoever sends them, so they
+        # are shared across callers and sessions. The shared turn runs without
+        # a session_id; agents with tools that keep state for the session run
+        # their own turns so that state lands in the caller's session.
+        if conversation_history or not settings.AGENT_TURN_COALESCING_ENABLED or (session_id and not self._can_share_turn(agent)):
+            events = self._stream_agent_turn(
+                agent, user_message, conversation_history, session_id, user_id, integration_id
+            )
+        else:
+            events = self._coalesced_first_turn(agent, user_message, user_id, integration_id)
+        
+        async for event in events:
+            if cache_config and event["type"] == "complete" and response_cache_service.is_cacheable(event.get("tools_used", []), cache_config):
+                try:
+                    await response_cache_service.store(agent, question, event["content"], event["tools_used"], cache_context)
+                except Exception as e:
+                    logger.warning(f"Could not cache response of agent {agent.id}: {e}")
+            yield event
+
+    def _coalesced_first_turn(
+        self,
+        agent: Agent,
+        user_message: str,
+        user_id: int = None,
+        integration_id: int = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        A turn without history shared with identical concurrent ones (see
+        turn_coalescing_service), whatever their sessions. The shared turn
+        runs without a session_id and on its own database session, so it
+        outlives the request that started it; callers persist the reply
+        under their own sessions.
         """
+        key = (agent.id, response_cache_service.agent_version(agent), user_message, user_id, integration_id)
+        
+        async def upstream():
+            async with AsyncSessionLocal() as db:
+                async for event in AgentService(db)._stream_agent_turn(
+                    agent, user_message, None, None, user_id, integration_id
+                ):
+                    yield event
+        
+        return turn_coalescing_service.stream(key, upstream)
+
+    @staticmethod
+    def _can_share_turn(agent: Agent) -> bool:
+        """Whether a turn of this agent can run without its caller's session_id."""
+        for tool_config in agent.tools or []:
+            if not isinstance(tool_config, dict):
+                return False
+            tool_id = tool_config.get('tool_id') or tool_config.get('id')
+            tool_data = json_tool_loader.get_tool_by_id(tool_id) if tool_id else None
+            name = (tool_data or {}).get('name') or tool_config.get('name')
+            # Tools that cannot be identified may keep session state too
+            if not name or name in SESSION_SCOPED_TOOLS:
+                return False
+        return True
+
+    async def _stream_agent_turn(
+        self, 
+        agent: Agent, 
+        user_message: str, 
+        conversation_history: List[Dict[str, str]] = None,
+        session_id: str = None,
+        user_id: int = None,
+        integration_id: int = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Run one streaming model turn, with tool calls"""
         import time
         stream_start = time.time()
         print(f"🤖 AgentService.execute_agent_stream started at {time.strftime('%H:%M:%S')}.{int((stream_start % 1) * 1000):03d}")
@@ -183,7 +277,7 @@ class AgentService:
                 messages.append(assistant_message)
                 
                 tools_used = await self._handle_tool_calls_stream(
-                    agent, assistant_message["tool_calls"], messages, user_id, integration_id
+                    agent, assistant_message["tool_calls"], messages, user_id, integration_id, session_id
                 )
                 
                 # Make a follow-up streaming call to get the final response after tool execution
@@ -329,7 +423,7 @@ class AgentService:
                 })
                 
                 tools_used = await self._handle_tool_calls(
-                    agent, assistant_message.tool_calls, messages, user_id, integration_id
+                    agent, assistant_message.tool_calls, messages, user_id, integration_id, session_id
                 )
                 
                 # Make a follow-up call to get the final response after tool execution
@@ -730,7 +824,8 @@ class AgentService:
         tool_calls: List[Any], 
         messages: List[Dict[str, str]],
         user_id: int = None,
-        integration_id: int = None
+        integration_id: int = None,
+        session_id: str = None
     ) -> List[str]:
         """Handle tool calls from the AI model"""
         tools_used = []
@@ -748,7 +843,7 @@ class AgentService:
             start_time = time.time()
             try:
                 # Execute the tool using the registry
-                tool_result = await self._execute_tool(tool_name, tool_args, agent, user_id, integration_id)
+                tool_result = await self._execute_tool(tool_name, tool_args, agent, user_id, integration_id, session_id)
                 execution_time = time.time() - start_time
                 
                 # Log successful tool execution
@@ -817,7 +912,8 @@ class AgentService:
         tool_calls: List[Dict], 
         messages: List[Dict[str, str]],
         user_id: int = None,
-        integration_id: int = None
+        integration_id: int = None,
+        session_id: str = None
     ) -> List[str]:
         """Handle tool calls with streaming updates"""
         tools_used = []
@@ -832,7 +928,7 @@ class AgentService:
                 
                 # Execute tool
                 logger.info(f"🔄 Starting tool execution: {tool_name}")
-                tool_result = await self._execute_tool(tool_name, arguments, agent, user_id, integration_id)
+                tool_result = await self._execute_tool(tool_name, arguments, agent, user_id, integration_id, session_id)
                 logger.info(f"✅ Tool execution completed: {tool_name}")
                 
                 # Add tool result to messages
@@ -869,7 +965,7 @@ class AgentService:
         
         return tools_used
 
-    async def _execute_tool(self, tool_name: str, arguments: str, agent: Agent = None, user_id: int = None, integration_id: int = None) -> str:
+    async def _execute_tool(self, tool_name: str, arguments: str, agent: Agent = None, user_id: int = None, integration_id: int = None, session_id: str = None) -> str:
         """Execute a specific tool using the tool registry"""
         try:
             args = json.loads(arguments) if isinstance(arguments, str) else arguments
@@ -1013,6 +1109,10 @@ class AgentService:
                     except Exception as e:
                         logger.error(f"❌ Error finding project management integration: {e}")
             
+            # Lets tools keep per-conversation state (like dataset handles)
+            if session_id:
+                tool_params['session_id'] = session_id
+            
             result = await tool_registry.execute_tool(
                 tool_name=sanitized_tool_name,
                 config=merged_config,  # Use merged config from JSON
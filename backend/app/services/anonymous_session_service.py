@@ -0,0 +1,279 @@
+"""
+Anonymous Session Service
+
+Conversations of anonymous web widget visitors, keyed by the visitor's
+cookie id (``customer_identifier``) and agent.
+
+- ``AnonymousSessionStore`` resolves a visitor to their conversation from an
+  in-process cache, falling back to an indexed query. Conversations expire
+  after ``ANONYMOUS_SESSION_TTL_DAYS`` of inactivity; the expiry slides
+  forward at most once a day per conversation, so busy chats do not write on
+  every message. Conversations linked to an email stay persistent.
+- ``AnonymousSessionReaper`` deletes expired conversations and their messages
+  in small batches, and records table sizes so growth can be watched.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import Agent, AsyncSessionLocal, Conversation, CreditTransaction, Message
+
+logger = logging.getLogger(__name__)
+
+
+class _Session:
+    __slots__ = ("conversation_id", "session_id", "expires_at", "cached_at")
+
+    def __init__(self, conversation_id: int, session_id: Optional[str], expires_at: Optional[datetime]):
+        self.conversation_id = conversation_id
+        self.session_id = session_id
+        self.expires_at = expires_at
+        self.cached_at = time.monotonic()
+
+
+class AnonymousSessionStore:
+    """Cookie id -> conversation cache in front of the conversations table."""
+
+    def __init__(self, ttl_days: int = 30, cache_ttl_seconds: int = 600, max_entries: int = 50000):
+        self.ttl = timedelta(days=ttl_days)
+        self.refresh_interval = min(timedelta(days=1), self.ttl / 2)
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.max_entries = max_entries
+        self._sessions: "OrderedDict[Tuple[int, str], _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_create(
+        self,
+        db: AsyncSession,
+        agent: Agent,
+        customer_identifier: str,
+        session_id: Optional[str] = None,
+        title: Optional[str] = None,
+        linked_email: Optional[str] = None
+    ) -> Tuple[int, Optional[str]]:
+        """
+        Find the visitor's live conversation with an agent, or start one.
+
+        Returns:
+            (conversation id, session id)
+        """
+        key = (agent.id, customer_identifier)
+        now = datetime.utcnow()
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None and (
+                time.monotonic() - session.cached_at > self.cache_ttl_seconds
+                or (session.expires_at is not None and session.expires_at <= now)
+            ):
+                del self._sessions[key]
+                session = None
+            if session is not None:
+                self._sessions.move_to_end(key)
+                self.hits += 1
+
+        if session is None:
+            self.misses += 1
+            session = await self._load(db, agent, customer_identifier, now)
+            if session is None:
+                conversation = Conversation(
+                    user_id=None,
+                    agent_id=agent.id,
+                    session_id=session_id or f"widget_{customer_identifier}_{agent.id}",
+                    title=title or f"Widget Chat - {agent.name}",
+                    customer_type="anonymous",
+                    customer_identifier=customer_identifier,
+                    linked_email=linked_email,
+                    expires_at=None if linked_email else now + self.ttl
+                )
+                db.add(conversation)
+                await db.commit()
+                session = _Session(conversation.id, conversation.session_id, conversation.expires_at)
+            self._put(key, session)
+
+        await self._touch(db, session, now)
+        return session.conversation_id, session.session_id
+
+    async def _load(self, db: AsyncSession, agent: Agent, customer_identifier: str, now: datetime) -> Optional[_Session]:
+        result = await db.execute(
+            select(Conversation.id, Conversation.session_id, Conversation.expires_at, Conversation.linked_email)
+            .where(
+                Conversation.customer_identifier == customer_identifier,
+                Conversation.agent_id == agent.id,
+                Conversation.customer_type == "anonymous",
+                Conversation.integration_id.is_(None),
+                or_(Conversation.expires_at.is_(None), Conversation.expires_at > now)
+            )
+            .order_by(Conversation.id.desc())
+            .limit(1)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        conversation_id, session_id, expires_at, linked_email = row
+        if expires_at is None and not linked_email:
+            # Conversations from before expiry existed start expiring once they are used again
+            expires_at = now
+        return _Session(conversation_id, session_id, expires_at)
+
+    async def _touch(self, db: AsyncSession, session: _Session, now: datetime):
+        """Slide the expiry forward, at most once per refresh interval."""
+        if session.expires_at is None or session.expires_at - now > self.ttl - self.refresh_interval:
+            return
+        session.expires_at = now + self.ttl
+        await db.execute(
+            update(Conversation)
+            .where(Conversation.id == session.conversation_id)
+            .values(expires_at=session.expires_at)
+        )
+        await db.commit()
+
+    def _put(self, key: Tuple[int, str], session: _Session):
+        with self._lock:
+            self._sessions[key] = session
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+
+    def forget_conversations(self, conversation_ids):
+        """Drop cached sessions of deleted conversations."""
+        conversation_ids = set(conversation_ids)
+        with self._lock:
+            for key in [key for key, session in self._sessions.items() if session.conversation_id in conversation_ids]:
+                del self._sessions[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            size = len(self._sessions)
+        return {"entries": size, "hits": self.hits, "misses": self.misses}
+
+
+class AnonymousSessionReaper:
+    """Background loop that deletes expired anonymous conversations in batches."""
+
+    def __init__(self, store: AnonymousSessionStore, interval_seconds: int = 3600, batch_size: int = 500):
+        self.store = store
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._stats: Dict[str, Any] = {
+            "conversations_deleted": 0,
+            "messages_deleted": 0,
+            "last_run_at": None,
+            "tables": {}
+        }
+
+    def start(self):
+        """Start the reaper loop on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info("🧹 Anonymous session reaper started")
+
+    async def stop(self):
+        """Stop the reaper loop."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.reap()
+                await self.collect_table_metrics()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Anonymous session reaper error: {str(e)}")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def reap(self) -> int:
+        """Delete every expired anonymous conversation. Returns how many were deleted."""
+        total = 0
+        while True:
+            # One short transaction per batch keeps locks and WAL bursts small
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(Conversation.id)
+                    .where(
+                        Conversation.customer_type == "anonymous",
+                        Conversation.expires_at < datetime.utcnow()
+                    )
+                    .limit(self.batch_size)
+                )
+                conversation_ids = result.scalars().all()
+                if not conversation_ids:
+                    break
+
+                await db.execute(
+                    update(CreditTransaction)
+                    .where(CreditTransaction.conversation_id.in_(conversation_ids))
+                    .values(conversation_id=None)
+                )
+                messages = await db.execute(delete(Message).where(Message.conversation_id.in_(conversation_ids)))
+                await db.execute(delete(Conversation).where(Conversation.id.in_(conversation_ids)))
+                await db.commit()
+
+            self.store.forget_conversations(conversation_ids)
+            total += len(conversation_ids)
+            self._stats["conversations_deleted"] += len(conversation_ids)
+            self._stats["messages_deleted"] += max(messages.rowcount or 0, 0)
+            if len(conversation_ids) < self.batch_size:
+                break
+            # Let request traffic through between batches
+            await asyncio.sleep(0)
+
+        self._stats["last_run_at"] = datetime.utcnow().isoformat()
+        if total:
+            logger.info(f"🧹 Deleted {total} expired anonymous conversations")
+        return total
+
+    async def collect_table_metrics(self) -> Dict[str, int]:
+        """Row counts of the tables anonymous sessions grow."""
+        async with AsyncSessionLocal() as db:
+            conversations = (await db.execute(select(func.count(Conversation.id)))).scalar()
+            anonymous = (await db.execute(
+                select(func.count(Conversation.id)).where(Conversation.customer_type == "anonymous")
+            )).scalar()
+            persistent_anonymous = (await db.execute(
+                select(func.count(Conversation.id)).where(
+                    Conversation.customer_type == "anonymous",
+                    Conversation.expires_at.is_(None)
+                )
+            )).scalar()
+            messages = (await db.execute(select(func.count(Message.id)))).scalar()
+
+        previous = self._stats["tables"]
+        tables = {
+            "conversations": conversations,
+            "anonymous_conversations": anonymous,
+            "anonymous_without_expiry": persistent_anonymous,
+            "messages": messages
+        }
+        if previous:
+            tables["conversations_growth"] = conversations - previous["conversations"]
+            tables["messages_growth"] = messages - previous["messages"]
+        self._stats["tables"] = tables
+        logger.info(f"📊 Conversation tables: {tables}")
+        return tables
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "cache": self.store.get_stats()}
+
+
+anonymous_session_store = AnonymousSessionStore(settings.ANONYMOUS_SESSION_TTL_DAYS)
+anonymous_session_reaper = AnonymousSessionReaper(anonymous_session_store)
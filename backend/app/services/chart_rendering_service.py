@@ -0,0 +1,517 @@
+"""
+Chart Rendering Service
+
+Renders the Data Visualization tool's charts outside the event loop and
+returns links instead of image data, so images never end up in the model's
+context:
+
+- figures are drawn in a process pool whose workers import matplotlib and
+  seaborn (and draw a first figure) once at start-up;
+- each chart is a file named by a hash of its data source (dataset handle
+  or inline rows) and its spec, so asking for the same chart again returns
+  the existing file without rendering it, and identical requests in flight
+  share one render;
+- files are written under ``CHART_OUTPUT_DIR`` (served from ``/temp/charts``)
+  or uploaded to Vercel Blob when ``CHART_STORAGE=blob``, and deleted after
+  ``CHART_TTL_SECONDS``.
+
+Drawing uses matplotlib's object-oriented API (no pyplot state), so the
+thread pool fallback is safe too.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
+
+from app.core.config import settings
+from app.services.dataset_store_service import dataset_scope
+
+logger = logging.getLogger(__name__)
+
+CHART_URL_PATH = "/temp/charts"
+
+
+def chart_source_key(params: Dict[str, Any], data_key: str = 'data') -> str:
+    """What a chart is drawn from: a stored dataset handle, or a hash of inline rows."""
+    if params.get('dataset'):
+        return f"{dataset_scope(params)}:{params['dataset']}"
+    payload = json.dumps(params.get(data_key), sort_keys=True, default=str)
+    return "inline:" + hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Worker side: everything below runs in the pool and only takes and returns plain data
+
+def _warm_worker():
+    sns.set_palette("husl")
+    # Draw once so fonts and the Agg canvas are loaded before the first request
+    figure = Figure(figsize=(1, 1))
+    figure.subplots().plot([0, 1], [0, 1])
+    figure.savefig(io.BytesIO(), format="png")
+
+
+def _require(df: pd.DataFrame, chart: str, x_column: str, y_column: Optional[str] = None):
+    if y_column is None:
+        if not x_column:
+            raise ValueError(f"X column is required for {chart}")
+        if x_column not in df.columns:
+            raise ValueError("Specified column not found in data")
+        return
+    if not x_column or not y_column:
+        raise ValueError(f"X and Y columns are required for {chart}")
+    if x_column not in df.columns or y_column not in df.columns:
+        raise ValueError("Specified columns not found in data")
+
+
+def _bar_chart(df, x_column, y_column, color_column, options, ax: Axes) -> Dict[str, Any]:
+    _require(df, 'bar chart', x_column, y_column)
+    if color_column and color_column in df.columns:
+        grouped = df.groupby([x_column, color_column])[y_column].sum().reset_index()
+        pivot_data = grouped.pivot(index=x_column, columns=color_column, values=y_column)
+        pivot_data.plot(kind='bar', ax=ax, stacked=options.get('stacked', False))
+    else:
+        df.plot(x=x_column, y=y_column, kind='bar', ax=ax)
+
+    # Rotate x-axis labels if needed
+    if df[x_column].nunique() > 10:
+        ax.tick_params(axis='x', rotation=45)
+
+    return {'x_column': x_column, 'y_column': y_column, 'color_column': color_column, 'data_points': len(df)}
+
+
+def _line_chart(df, x_column, y_column, color_column, options, ax: Axes) -> Dict[str, Any]:
+    _require(df, 'line chart', x_column, y_column)
+    df_sorted = df.sort_values(x_column)
+    marker = options.get('marker', 'o')
+    if color_column and color_column in df.columns:
+        for color_value, subset in df_sorted.groupby(color_column, sort=False):
+            ax.plot(subset[x_column], subset[y_column], label=str(color_value), marker=marker)
+        ax.legend()
+    else:
+        ax.plot(df_sorted[x_column], df_sorted[y_column], marker=marker)
+
+    return {'x_column': x_column, 'y_column': y_column, 'color_column': color_column, 'data_points': len(df)}
+
+
+def _scatter_chart(df, x_column, y_column, color_column, size_column, options, ax: Axes) -> Dict[str, Any]:
+    _require(df, 'scatter chart', x_column, y_column)
+    scatter_kwargs = {'x': df[x_column], 'y': df[y_column], 'alpha': options.get('alpha', 0.6)}
+    has_color = bool(color_column) and color_column in df.columns
+    if has_color:
+        scatter_kwargs['c'] = df[color_column]
+        scatter_kwargs['cmap'] = options.get('colormap', 'viridis')
+    if size_column and size_column in df.columns:
+        scatter_kwargs['s'] = df[size_column] * options.get('size_scale', 100)
+
+    scatter = ax.scatter(**scatter_kwargs)
+    if has_color:
+        ax.figure.colorbar(scatter, ax=ax, label=color_column)
+
+    return {
+        'x_column': x_column,
+        'y_column': y_column,
+        'color_column': color_column,
+        'size_column': size_column,
+        'data_points': len(df)
+    }
+
+
+def _pie_chart(df, x_column, y_column, options, ax: Axes) -> Dict[str, Any]:
+    _require(df, 'pie chart', x_column, y_column)
+    pie_data = df.groupby(x_column)[y_column].sum()
+    ax.pie(
+        pie_data.values,
+        labels=pie_data.index,
+        autopct=options.get('autopct', '%1.1f%%'),
+        startangle=options.get('startangle', 90)
+    )
+    return {'x_column': x_column, 'y_column': y_column, 'categories': len(pie_data), 'total_value': float(pie_data.sum())}
+
+
+def _histogram(df, x_column, color_column, options, ax: Axes) -> Dict[str, Any]:
+    _require(df, 'histogram', x_column)
+    bins = options.get('bins', 30)
+    alpha = options.get('alpha', 0.7)
+    if color_column and color_column in df.columns:
+        for color_value, subset in df.groupby(color_column, sort=False):
+            ax.hist(subset[x_column], bins=bins, alpha=alpha, label=str(color_value))
+        ax.legend()
+    else:
+        ax.hist(df[x_column], bins=bins, alpha=alpha)
+
+    return {'x_column': x_column, 'color_column': color_column, 'bins': bins, 'data_points': len(df)}
+
+
+def _box_chart(df, x_column, y_column, color_column, options, ax: Axes) -> Dict[str, Any]:
+    _require(df, 'box chart', x_column, y_column)
+    if color_column and color_column in df.columns:
+        df.boxplot(column=y_column, by=[x_column, color_column], ax=ax)
+    else:
+        df.boxplot(column=y_column, by=x_column, ax=ax)
+
+    return {'x_column': x_column, 'y_column': y_column, 'color_column': color_column, 'data_points': len(df)}
+
+
+def _heatmap(df, x_column, y_column, options, ax: Axes) -> Dict[str, Any]:
+    _require(df, 'heatmap', x_column, y_column)
+    pivot_table = df.pivot_table(
+        values=y_column,
+        index=df[x_column],
+        columns=df[x_column] if x_column == y_column else None,
+        aggfunc='mean'
+    )
+    sns.heatmap(pivot_table, annot=options.get('annotate', True), cmap=options.get('colormap', 'viridis'), ax=ax)
+
+    return {'x_column': x_column, 'y_column': y_column, 'matrix_size': list(pivot_table.shape), 'data_points': len(df)}
+
+
+def _apply_theme(ax: Axes, theme: str):
+    if theme == 'dark':
+        ax.set_facecolor('#2E2E2E')
+        ax.figure.patch.set_facecolor('#2E2E2E')
+        ax.tick_params(colors='white')
+        ax.xaxis.label.set_color('white')
+        ax.yaxis.label.set_color('white')
+        ax.title.set_color('white')
+    elif theme == 'minimal':
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.grid(True, alpha=0.3)
+
+
+def _draw_chart(df: pd.DataFrame, spec: Dict[str, Any], ax: Axes) -> Dict[str, Any]:
+    """Draw one chart spec (as built by the Data Visualization tool) on an axes."""
+    chart_type = spec.get('chart_type', 'bar')
+    x_column = spec.get('x_column', '')
+    y_column = spec.get('y_column', '')
+    color_column = spec.get('color_column', '')
+    options = spec.get('chart_options') or {}
+
+    if chart_type == 'bar':
+        chart_data = _bar_chart(df, x_column, y_column, color_column, options, ax)
+    elif chart_type == 'line':
+        chart_data = _line_chart(df, x_column, y_column, color_column, options, ax)
+    elif chart_type == 'scatter':
+        chart_data = _scatter_chart(df, x_column, y_column, color_column, spec.get('size_column', ''), options, ax)
+    elif chart_type == 'pie':
+        chart_data = _pie_chart(df, x_column, y_column, options, ax)
+    elif chart_type == 'histogram':
+        chart_data = _histogram(df, x_column, color_column, options, ax)
+    elif chart_type == 'box':
+        chart_data = _box_chart(df, x_column, y_column, color_column, options, ax)
+    elif chart_type == 'heatmap':
+        chart_data = _heatmap(df, x_column, y_column, options, ax)
+    else:
+        raise ValueError(f"Unknown chart type: {chart_type}")
+
+    if spec.get('title'):
+        ax.set_title(spec['title'], fontsize=14, fontweight='bold')
+    if spec.get('x_label'):
+        ax.set_xlabel(spec['x_label'])
+    if spec.get('y_label'):
+        ax.set_ylabel(spec['y_label'])
+    _apply_theme(ax, options.get('theme', spec.get('theme', 'default')))
+    return chart_data
+
+
+def _chart_figure(frames: List[pd.DataFrame], spec: Dict[str, Any]) -> Tuple[Figure, Dict[str, Any]]:
+    figure = Figure(figsize=tuple(spec['figsize']))
+    return figure, _draw_chart(frames[0], spec, figure.subplots())
+
+
+def _statistical_figure(frames: List[pd.DataFrame], spec: Dict[str, Any]) -> Tuple[Figure, Dict[str, Any]]:
+    df = frames[0]
+    plot_type = spec.get('plot_type', 'correlation')
+
+    if plot_type == 'correlation':
+        numerical_cols = df.select_dtypes(include=[np.number]).columns
+        if len(numerical_cols) < 2:
+            raise ValueError("Need at least 2 numerical columns for correlation")
+        corr_matrix = df[numerical_cols].corr()
+        figure = Figure(figsize=tuple(spec['figsize']))
+        ax = figure.subplots()
+        sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', center=0, ax=ax)
+        ax.set_title('Correlation Matrix')
+        # Round-trip through JSON so NaN and numpy floats serialize cleanly
+        return figure, {'correlation_matrix': json.loads(corr_matrix.to_json())}
+
+    if plot_type == 'distribution':
+        columns = spec.get('columns') or df.select_dtypes(include=[np.number]).columns.tolist()
+        if not columns:
+            raise ValueError("No numerical columns found")
+        figure = Figure(figsize=(5 * len(columns), 5))
+        axes = np.atleast_1d(figure.subplots(1, len(columns)))
+        for ax, column in zip(axes, columns):
+            if column in df.columns:
+                sns.histplot(df[column], kde=True, ax=ax)
+                ax.set_title(f'Distribution of {column}')
+        return figure, {'columns_analyzed': columns}
+
+    raise ValueError(f"Unknown statistical plot type: {plot_type}")
+
+
+def _dashboard_figure(frames: List[pd.DataFrame], spec: Dict[str, Any]) -> Tuple[Figure, Dict[str, Any]]:
+    rows, cols = spec['rows'], spec['cols']
+    figure = Figure(figsize=(5 * cols, 4 * rows))
+    axes = figure.subplots(rows, cols, squeeze=False).ravel()
+
+    charts = []
+    for ax, df, chart_spec in zip(axes, frames, spec['charts']):
+        try:
+            charts.append({'chart_type': chart_spec.get('chart_type', 'bar'), 'title': chart_spec.get('title', ''),
+                           'chart_data': _draw_chart(df, chart_spec, ax)})
+        except (ValueError, KeyError, TypeError) as e:
+            # A broken panel is reported and left empty; the rest of the dashboard still renders
+            charts.append({'chart_type': chart_spec.get('chart_type', 'bar'), 'error': str(e)})
+            ax.set_axis_off()
+    for ax in axes[len(spec['charts']):]:
+        figure.delaxes(ax)
+    return figure, {'charts': charts}
+
+
+def _interactive_html(frames: List[pd.DataFrame], spec: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    import plotly.express as px
+
+    df = frames[0]
+    chart_type = spec.get('chart_type', 'scatter')
+    x_column = spec.get('x_column', '')
+    y_column = spec.get('y_column', '')
+    title = spec.get('title', '')
+    color_column = spec.get('color_column', '')
+    options = spec.get('chart_options') or {}
+    color = {'color': color_column} if color_column and color_column in df.columns else {}
+
+    if chart_type == 'scatter':
+        fig = px.scatter(df, x=x_column, y=y_column, title=title, **color, **options)
+    elif chart_type == 'line':
+        fig = px.line(df, x=x_column, y=y_column, title=title, **color, **options)
+    elif chart_type == 'bar':
+        fig = px.bar(df, x=x_column, y=y_column, title=title, **color, **options)
+    elif chart_type == 'pie':
+        fig = px.pie(df, values=y_column, names=x_column, title=title, **options)
+    elif chart_type == 'histogram':
+        fig = px.histogram(df, x=x_column, title=title, **options)
+    else:
+        raise ValueError(f"Unknown chart type: {chart_type}")
+
+    # A standalone page loading plotly.js from the CDN instead of inlining ~3 MB of it
+    return fig.to_html(include_plotlyjs='cdn', full_html=True), {}
+
+
+_FIGURES = {
+    'chart': _chart_figure,
+    'statistical': _statistical_figure,
+    'dashboard': _dashboard_figure
+}
+
+
+def _write_atomic(path: str, content: bytes):
+    partial = f"{path}.{os.getpid()}.part"
+    with open(partial, 'wb') as f:
+        f.write(content)
+    os.replace(partial, path)
+
+
+def render_chart_file(kind: str, spec: Dict[str, Any], frames: List[pd.DataFrame], path: str) -> Dict[str, Any]:
+    """Draw a chart and write it to ``path``. Returns its chart data and file size."""
+    if kind == 'interactive':
+        html, chart_data = _interactive_html(frames, spec)
+        content = html.encode('utf-8')
+    else:
+        figure, chart_data = _FIGURES[kind](frames, spec)
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format=spec['format'], dpi=spec['dpi'], bbox_inches='tight')
+        content = buffer.getvalue()
+    _write_atomic(path, content)
+    return {'chart_data': chart_data, 'size_bytes': len(content)}
+
+
+# Service side
+
+class ChartRenderingService:
+    """Renders charts to files in a warm worker pool and caches them by content."""
+
+    def __init__(
+        self,
+        output_dir: str,
+        max_workers: Optional[int] = None,
+        ttl_seconds: int = 86400,
+        storage: str = "local"
+    ):
+        self.output_dir = output_dir
+        self.max_workers = max_workers or min(2, os.cpu_count() or 1)
+        self.ttl_seconds = ttl_seconds
+        self.storage = storage
+        self.sweep_interval_seconds = 300
+        self._executor: Optional[Executor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._last_sweep = 0.0
+        self.stats = {'rendered': 0, 'cache_hits': 0, 'shared': 0}
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            try:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_warm_worker)
+            except (OSError, NotImplementedError, PermissionError) as e:
+                # Some sandboxes forbid subprocesses; threads still keep the loop free
+                logger.warning(f"Process pool unavailable ({e}), rendering charts in threads")
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, initializer=_warm_worker)
+            logger.info(f"📊 Chart rendering pool started ({self.max_workers} workers)")
+        return self._executor
+
+    @staticmethod
+    def cache_key(kind: str, source_key: str, spec: Dict[str, Any]) -> str:
+        payload = json.dumps([kind, source_key, spec], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def _paths(self, key: str, extension: str) -> Tuple[str, str]:
+        image_path = os.path.join(self.output_dir, f"{key}.{extension}")
+        return image_path, f"{image_path}.json"
+
+    async def render(
+        self,
+        kind: str,
+        spec: Dict[str, Any],
+        source_key: str,
+        load_frames: Callable[[], List[pd.DataFrame]]
+    ) -> Dict[str, Any]:
+        """
+        The chart for ``spec`` drawn from ``source_key``'s data, rendering it
+        only if it is not cached. ``load_frames`` is called on a miss only, in a
+        worker thread.
+
+        Returns the chart's url, file name, format, size and chart data.
+        """
+        extension = 'html' if kind == 'interactive' else spec['format']
+        key = self.cache_key(kind, source_key, spec)
+
+        cached = self._read_cached(key, extension)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return {**cached, 'cached': True}
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats['shared'] += 1
+            return {**await asyncio.shield(pending), 'cached': True}
+
+        pending = asyncio.get_running_loop().create_future()
+        self._inflight[key] = pending
+        try:
+            result = await self._render(kind, spec, key, extension, load_frames)
+            pending.set_result(result)
+            return {**result, 'cached': False}
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            # Nobody else may be waiting; don't leave the exception unretrieved
+            pending.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _render(self, kind, spec, key, extension, load_frames) -> Dict[str, Any]:
+        self.sweep()
+        os.makedirs(self.output_dir, exist_ok=True)
+        image_path, meta_path = self._paths(key, extension)
+        # Loading stored datasets reads Parquet; keep it off the event loop
+        frames = await asyncio.to_thread(load_frames)
+
+        loop = asyncio.get_running_loop()
+        rendered = await loop.run_in_executor(self._get_executor(), render_chart_file, kind, spec, frames, image_path)
+        self.stats['rendered'] += 1
+
+        file_name = os.path.basename(image_path)
+        if self.storage == "blob":
+            url = await asyncio.to_thread(self._upload_blob, image_path, file_name)
+        else:
+            url = f"{settings.API_BASE_URL}{CHART_URL_PATH}/{file_name}"
+
+        result = {
+            'url': url,
+            'file_name': file_name,
+            'format': extension,
+            'size_bytes': rendered['size_bytes'],
+            'chart_data': rendered['chart_data']
+        }
+        _write_atomic(meta_path, json.dumps(result, default=str).encode())
+        return result
+
+    def _read_cached(self, key: str, extension: str) -> Optional[Dict[str, Any]]:
+        image_path, meta_path = self._paths(key, extension)
+        try:
+            with open(meta_path) as f:
+                result = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if self.storage != "blob" and not os.path.exists(image_path):
+            return None
+        # A hit counts as use, so popular charts outlive the TTL
+        for path in (image_path, meta_path):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+        return result
+
+    def _upload_blob(self, image_path: str, file_name: str) -> str:
+        from vercel_blob import put
+
+        with open(image_path, 'rb') as f:
+            blob = put(f"charts/{file_name}", f.read(), {
+                "token": settings.BLOB_READ_WRITE_TOKEN,
+                "addRandomSuffix": "false"
+            })
+        return blob['url']
+
+    def sweep(self, force: bool = False) -> int:
+        """Delete chart files unused for longer than the TTL. Returns how many were deleted."""
+        now = time.time()
+        if not force and now - self._last_sweep < self.sweep_interval_seconds:
+            return 0
+        self._last_sweep = now
+        if not os.path.isdir(self.output_dir):
+            return 0
+
+        deleted = 0
+        for entry in os.scandir(self.output_dir):
+            try:
+                if entry.is_file() and now - entry.stat().st_mtime > self.ttl_seconds:
+                    os.remove(entry.path)
+                    deleted += 1
+            except FileNotFoundError:
+                continue
+        if deleted:
+            logger.info(f"🧹 Deleted {deleted} expired chart files")
+        return deleted
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'in_flight': len(self._inflight), 'storage': self.storage}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+chart_rendering_service = ChartRenderingService(
+    settings.CHART_OUTPUT_DIR,
+    settings.CHART_RENDER_WORKERS or None,
+    settings.CHART_TTL_SECONDS,
+    settings.CHART_STORAGE
+)
@@ -0,0 +1,257 @@
+"""
+Content Extraction Service
+
+Shared HTML main-content extraction for the knowledge base crawler and the
+multi-link scraper. Pages are parsed once with the fastest available
+BeautifulSoup backend (lxml when installed) and scored with a
+readability-style heuristic that keeps the densest block of prose and drops
+navigation, sidebars and other boilerplate. Parsing runs in a process pool
+so it never blocks the event loop.
+"""
+
+import asyncio
+import html as html_lib
+import logging
+import os
+import re
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+_TITLE_PATTERN = re.compile(r"<title[^>]*>(.*?)</title\s*>", re.IGNORECASE | re.DOTALL)
+
+_BOILERPLATE_TAGS = ["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "iframe", "svg", "template"]
+
+_UNLIKELY = re.compile(
+    r"banner|breadcrumb|combx|comment|community|cookie|disqus|extra|foot|header|legends|menu|modal|"
+    r"related|remark|replies|rss|share|shoutbox|sidebar|skyscraper|social|sponsor|ad-break|agegate|"
+    r"pagination|pager|popup|newsletter|subscribe",
+    re.IGNORECASE
+)
+_LIKELY = re.compile(r"and|article|body|column|content|main|shadow|policy|terms|privacy", re.IGNORECASE)
+_POSITIVE = re.compile(r"article|body|content|entry|hentry|h-entry|main|page|pagination|post|text|blog|story|policy|terms", re.IGNORECASE)
+_NEGATIVE = re.compile(
+    r"hidden|banner|combx|comment|com-|contact|foot|footer|footnote|masthead|media|meta|outbrain|promo|"
+    r"related|scroll|share|shoutbox|sidebar|skyscraper|sponsor|shopping|tags|tool|widget|nav|menu",
+    re.IGNORECASE
+)
+
+_TAG_WEIGHTS = {
+    "div": 5, "article": 10, "main": 10, "section": 3,
+    "pre": 3, "td": 3, "blockquote": 3,
+    "address": -3, "ol": -3, "ul": -3, "dl": -3, "dd": -3, "dt": -3, "li": -3, "form": -3,
+    "h1": -5, "h2": -5, "h3": -5, "h4": -5, "h5": -5, "h6": -5, "th": -5,
+}
+
+_BLOCK_TAGS = {"p", "pre", "td", "blockquote", "li", "h1", "h2", "h3", "h4", "h5", "h6", "dd", "dt", "figcaption"}
+
+
+def extract_title(html: str) -> str:
+    """Read ``<title>`` without parsing the document."""
+    match = _TITLE_PATTERN.search(html[:200000])
+    if not match:
+        return ""
+    return " ".join(html_lib.unescape(match.group(1)).split())
+
+
+def _class_weight(element) -> int:
+    weight = 0
+    for value in (" ".join(element.get("class") or []), element.get("id") or ""):
+        if not value:
+            continue
+        if _NEGATIVE.search(value):
+            weight -= 25
+        if _POSITIVE.search(value):
+            weight += 25
+    return weight
+
+
+def _text_of(element) -> str:
+    return " ".join(element.get_text(" ", strip=True).split())
+
+
+def _link_density(element, text_length: int) -> float:
+    if not text_length:
+        return 0.0
+    link_length = sum(len(_text_of(link)) for link in element.find_all("a"))
+    return link_length / text_length
+
+
+def _iter_blocks(element):
+    """Outermost block-level descendants of an element, in document order."""
+    for child in element.children:
+        name = getattr(child, "name", None)
+        if name is None:
+            continue
+        if name in _BLOCK_TAGS:
+            yield child
+        else:
+            yield from _iter_blocks(child)
+
+
+def _block_text(element) -> str:
+    """Text of an element with one paragraph per block-level descendant."""
+    if element.name in _BLOCK_TAGS:
+        return _text_of(element)
+    blocks = [text for text in (_text_of(block) for block in _iter_blocks(element)) if text]
+    if not blocks:
+        return _text_of(element)
+    return "\n\n".join(blocks)
+
+
+def extract_main_content_from_soup(soup: BeautifulSoup, min_length: int = 100) -> Dict[str, Any]:
+    """
+    Readability-style main content extraction on an already parsed document.
+
+    The soup is modified in place (boilerplate is removed).
+
+    Returns:
+        Dict with ``content``, ``method`` and ``confidence``
+    """
+    for element in soup(_BOILERPLATE_TAGS):
+        element.decompose()
+
+    # Drop elements whose class/id marks them as page chrome
+    for element in soup.find_all(True):
+        # Descendants of an element removed earlier in this loop are already gone
+        if element.decomposed or element.name in ("html", "body", "main", "article"):
+            continue
+        if not element.attrs:
+            continue
+        match_string = " ".join(element.get("class") or []) + " " + (element.get("id") or "")
+        if match_string.strip() and _UNLIKELY.search(match_string) and not _LIKELY.search(match_string):
+            element.decompose()
+
+    # Score paragraphs and propagate to their ancestors
+    scores: Dict[int, float] = {}
+    nodes: Dict[int, Any] = {}
+    for paragraph in soup.find_all(["p", "pre", "td", "blockquote"]):
+        text = _text_of(paragraph)
+        if len(text) < 25:
+            continue
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        parent = paragraph.parent
+        grandparent = parent.parent if parent is not None else None
+        for ancestor, share in ((parent, 1.0), (grandparent, 0.5)):
+            if ancestor is None or ancestor.name in (None, "[document]"):
+                continue
+            key = id(ancestor)
+            if key not in scores:
+                scores[key] = _TAG_WEIGHTS.get(ancestor.name, 0) + _class_weight(ancestor)
+                nodes[key] = ancestor
+            scores[key] += score * share
+
+    best = None
+    best_score = 0.0
+    for key, score in scores.items():
+        node = nodes[key]
+        text_length = len(_text_of(node))
+        adjusted = score * (1 - _link_density(node, text_length))
+        scores[key] = adjusted
+        if best is None or adjusted > best_score:
+            best, best_score = node, adjusted
+
+    if best is not None:
+        # Pull in sibling blocks that score well or read like prose
+        threshold = max(10.0, best_score * 0.2)
+        parts = []
+        parent = best.parent
+        siblings = parent.find_all(recursive=False) if parent is not None else [best]
+        for sibling in siblings:
+            include = sibling is best or scores.get(id(sibling), 0) >= threshold
+            if not include and sibling.name == "p":
+                text = _text_of(sibling)
+                density = _link_density(sibling, len(text))
+                include = (len(text) > 80 and density < 0.25) or (0 < len(text) <= 80 and density == 0 and re.search(r"\.( |$)", text))
+            if include:
+                text = _block_text(sibling)
+                if text:
+                    parts.append(text)
+        content = "\n\n".join(parts)
+        if len(content) >= min_length:
+            confidence = min(0.95, 0.4 + best_score / 100)
+            return {"content": content, "method": "readability", "confidence": round(confidence, 2)}
+
+    # Fallback: all prose-like blocks in the body
+    body = soup.body or soup
+    blocks = [block for block in _block_text(body).split("\n\n") if len(block) > 50]
+    content = "\n\n".join(blocks)
+    if len(content) >= min_length:
+        return {"content": content, "method": "fallback", "confidence": 0.3}
+
+    return {"content": "", "method": "none", "confidence": 0.0}
+
+
+def _is_crawlable_href(href: str) -> bool:
+    return not href.lower().startswith(("javascript:", "mailto:", "tel:", "#"))
+
+
+def analyze_html(html: str, url: str = "", min_length: int = 100, include_links: bool = False) -> Dict[str, Any]:
+    """
+    Parse a page once and return its title, main content and optionally links.
+
+    Runs in worker processes, so it only takes and returns plain data.
+    """
+    soup = BeautifulSoup(html, HTML_PARSER)
+    title_tag = soup.find("title")
+    title = _text_of(title_tag) if title_tag else ""
+
+    links: List[str] = []
+    if include_links:
+        for anchor in soup.find_all("a", href=True):
+            href = anchor["href"].strip()
+            if href and _is_crawlable_href(href):
+                links.append(urljoin(url, href))
+
+    result = extract_main_content_from_soup(soup, min_length=min_length)
+    result.update({"title": title, "links": links, "url": url})
+    return result
+
+
+class ContentExtractionService:
+    """Runs HTML analysis in a worker pool."""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.parser = HTML_PARSER
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            try:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            except (OSError, NotImplementedError, PermissionError) as e:
+                # Some sandboxes forbid subprocesses; threads still keep the loop free
+                logger.warning(f"Process pool unavailable ({e}), using threads for HTML parsing")
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            logger.info(f"🧩 Content extraction pool started ({self.max_workers} workers, parser={self.parser})")
+        return self._executor
+
+    async def analyze(self, html: str, url: str = "", min_length: int = 100, include_links: bool = False) -> Dict[str, Any]:
+        """Parse a page off the event loop; see ``analyze_html``."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), analyze_html, html, url, min_length, include_links)
+
+    async def extract_content(self, html: str, url: str = "", min_length: int = 100) -> Dict[str, Any]:
+        """Main content of a page, parsed off the event loop."""
+        return await self.analyze(html, url, min_length=min_length)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+content_extraction_service = ContentExtractionService(settings.CONTENT_EXTRACTION_WORKERS or None)
@@ -0,0 +1,277 @@
+"""
+Conversation Memory Service
+
+Conversation memory for messaging channels (WhatsApp, Telegram). Each
+(integration, external chat id) pair maps to one ``Conversation``; messages
+are persisted as they are exchanged and the agent receives the most recent
+ones that fit in a token budget.
+
+Recent messages of active chats are kept in an in-process window cache. A
+cached window is only trusted while its newest message id matches the
+database, so chats served by several workers never see stale context.
+Conversation ids are cached too; when a cached conversation turns out to be
+deleted (from the dashboard, or by the anonymous session reaper), appending
+to it fails on the foreign key, and the chat is resolved again.
+"""
+
+import logging
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import Agent, Conversation, Integration, Message
+from app.services.knowledge_retrieval_service import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_MESSAGES = 50
+
+
+class _Window:
+    """Newest messages of a conversation, oldest first."""
+
+    def __init__(self, max_messages: int):
+        self.messages: Deque[Tuple[str, str, int]] = deque(maxlen=max_messages)
+        self.last_message_id: Optional[int] = None
+
+
+@dataclass
+class _Chat:
+    """What it takes to find or create the conversation of an external chat."""
+    integration_id: int
+    external_chat_id: str
+    user_id: Optional[int]
+    agent_id: int
+    platform: str
+    title: str
+
+    @property
+    def key(self) -> Tuple[int, str]:
+        return (self.integration_id, self.external_chat_id)
+
+
+class ConversationMemoryService:
+    """Maps channel chats to conversations and serves token-bounded history."""
+
+    def __init__(self, max_context_tokens: int = 3000, max_cached_conversations: int = 5000):
+        self.max_context_tokens = max_context_tokens
+        self.max_cached_conversations = max_cached_conversations
+        self._conversation_ids: "OrderedDict[Tuple[int, str], int]" = OrderedDict()
+        # conversation id -> its chat, for resolving it again once deleted
+        self._chats: Dict[int, _Chat] = {}
+        self._windows: "OrderedDict[int, _Window]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def max_messages_for(agent: Agent) -> int:
+        """History length from the agent's context config retention policy."""
+        try:
+            history_policy = agent.context_config["memory_strategy"]["retention_policy"]["conversation_history"]
+        except (TypeError, KeyError):
+            return DEFAULT_MAX_MESSAGES
+        if history_policy.get("enabled") is False:
+            return 0
+        return int(history_policy.get("max_messages") or DEFAULT_MAX_MESSAGES)
+
+    async def get_conversation_id(
+        self,
+        db: AsyncSession,
+        integration: Integration,
+        agent: Agent,
+        external_chat_id: str,
+        title: str
+    ) -> int:
+        """Find or create the conversation of an external chat."""
+        key = (integration.id, str(external_chat_id))
+        with self._lock:
+            conversation_id = self._conversation_ids.get(key)
+            if conversation_id is not None:
+                self._conversation_ids.move_to_end(key)
+                return conversation_id
+
+        return await self._resolve(db, _Chat(
+            integration_id=integration.id,
+            external_chat_id=key[1],
+            user_id=integration.user_id,
+            agent_id=agent.id,
+            platform=integration.platform,
+            title=title
+        ))
+
+    async def _resolve(self, db: AsyncSession, chat: _Chat) -> int:
+        conversation_id = await self._find_conversation_id(db, *chat.key)
+        if conversation_id is None:
+            conversation = Conversation(
+                user_id=chat.user_id,
+                agent_id=chat.agent_id,
+                integration_id=chat.integration_id,
+                external_chat_id=chat.external_chat_id,
+                session_id=f"{chat.platform}_{chat.external_chat_id}",
+                title=chat.title,
+                customer_type="anonymous",
+                customer_identifier=chat.external_chat_id
+            )
+            db.add(conversation)
+            try:
+                await db.commit()
+                conversation_id = conversation.id
+            except IntegrityError:
+                # Created concurrently by another worker
+                await db.rollback()
+                conversation_id = await self._find_conversation_id(db, *chat.key)
+
+        with self._lock:
+            self._conversation_ids[chat.key] = conversation_id
+            self._chats[conversation_id] = chat
+            while len(self._conversation_ids) > self.max_cached_conversations:
+                _, evicted_id = self._conversation_ids.popitem(last=False)
+                self._chats.pop(evicted_id, None)
+        return conversation_id
+
+    def _forget(self, conversation_id: int) -> Optional[_Chat]:
+        """Drop everything cached about a conversation. Returns its chat, if known."""
+        with self._lock:
+            self._windows.pop(conversation_id, None)
+            chat = self._chats.pop(conversation_id, None)
+            if chat is not None and self._conversation_ids.get(chat.key) == conversation_id:
+                del self._conversation_ids[chat.key]
+        return chat
+
+    @staticmethod
+    async def _find_conversation_id(db: AsyncSession, integration_id: int, external_chat_id: str) -> Optional[int]:
+        result = await db.execute(
+            select(Conversation.id).where(
+                Conversation.integration_id == integration_id,
+                Conversation.external_chat_id == external_chat_id
+            )
+        )
+        return result.scalar_one_or_none()
+
+    async def load_history(
+        self,
+        db: AsyncSession,
+        conversation_id: int,
+        max_messages: int = DEFAULT_MAX_MESSAGES,
+        max_tokens: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Most recent user/assistant messages that fit in ``max_tokens``, oldest first.
+        """
+        if max_messages <= 0:
+            return []
+        max_tokens = max_tokens or self.max_context_tokens
+
+        result = await db.execute(
+            select(func.max(Message.id)).where(Message.conversation_id == conversation_id)
+        )
+        last_message_id = result.scalar()
+
+        with self._lock:
+            window = self._windows.get(conversation_id)
+            if window is not None and window.last_message_id == last_message_id and window.messages.maxlen == max_messages:
+                self._windows.move_to_end(conversation_id)
+                messages = list(window.messages)
+            else:
+                window = None
+
+        if window is None:
+            messages = await self._load_window(db, conversation_id, max_messages, last_message_id)
+
+        # Newest messages win the budget
+        history: List[Dict[str, str]] = []
+        used_tokens = 0
+        for role, content, tokens in reversed(messages):
+            if used_tokens + tokens > max_tokens:
+                break
+            history.append({"role": role, "content": content})
+            used_tokens += tokens
+        history.reverse()
+        return history
+
+    async def _load_window(
+        self,
+        db: AsyncSession,
+        conversation_id: int,
+        max_messages: int,
+        last_message_id: Optional[int]
+    ) -> List[Tuple[str, str, int]]:
+        result = await db.execute(
+            select(Message.role, Message.content)
+            .where(
+                Message.conversation_id == conversation_id,
+                Message.role.in_(["user", "assistant"])
+            )
+            .order_by(Message.id.desc())
+            .limit(max_messages)
+        )
+        rows = list(reversed(result.all()))
+
+        window = _Window(max_messages)
+        for role, content in rows:
+            content = content or ""
+            window.messages.append((role, content, estimate_tokens(content)))
+        window.last_message_id = last_message_id
+
+        with self._lock:
+            self._windows[conversation_id] = window
+            while len(self._windows) > self.max_cached_conversations:
+                self._windows.popitem(last=False)
+        return list(window.messages)
+
+    async def append_messages(
+        self,
+        db: AsyncSession,
+        conversation_id: int,
+        messages: List[Dict[str, Any]]
+    ) -> int:
+        """
+        Persist messages (``role``, ``content``, optional ``meta_data``) and
+        extend the cached window. Returns the conversation id they went to,
+        which differs from ``conversation_id`` when that conversation was
+        deleted and its chat got a new one.
+        """
+        try:
+            rows = await self._insert_messages(db, conversation_id, messages)
+        except IntegrityError:
+            await db.rollback()
+            chat = self._forget(conversation_id)
+            if chat is None:
+                raise
+            logger.info(f"Conversation {conversation_id} no longer exists, resolving its chat again")
+            conversation_id = await self._resolve(db, chat)
+            rows = await self._insert_messages(db, conversation_id, messages)
+
+        with self._lock:
+            window = self._windows.get(conversation_id)
+            if window is None:
+                return conversation_id
+            for row in rows:
+                if row.role in ("user", "assistant"):
+                    content = row.content or ""
+                    window.messages.append((row.role, content, estimate_tokens(content)))
+            window.last_message_id = max(row.id for row in rows)
+        return conversation_id
+
+    @staticmethod
+    async def _insert_messages(db: AsyncSession, conversation_id: int, messages: List[Dict[str, Any]]) -> List[Message]:
+        rows = [
+            Message(
+                conversation_id=conversation_id,
+                role=message["role"],
+                content=message["content"],
+                meta_data=message.get("meta_data")
+            )
+            for message in messages
+        ]
+        db.add_all(rows)
+        await db.commit()
+        return rows
+
+
+conversation_memory_service = ConversationMemoryService(settings.CONVERSATION_CONTEXT_MAX_TOKENS)
@@ -0,0 +1,237 @@
+"""
+Dataset Store Service
+
+Server-side tables for the data tools (CSV Processor, Statistical Analysis,
+Data Visualization), so a table is not round-tripped through the model as
+JSON on every step. A tool stores its result and returns a short handle with
+the schema and a few preview rows; later tool calls pass the handle back as
+``dataset`` instead of the rows.
+
+Tables are written as Parquet (a pickle when pyarrow is not installed) under
+``DATASET_STORE_DIR``, one directory per conversation. A conversation's
+tables are deleted after ``DATASET_TTL_SECONDS`` without use. The most
+recently used tables are also kept in memory, up to a byte budget.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import secrets
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+HANDLE_PREFIX = "ds_"
+PREVIEW_ROWS = 5
+
+
+class DatasetNotFoundError(LookupError):
+    """The handle is unknown, expired or belongs to another conversation."""
+
+    def __init__(self, handle: str):
+        super().__init__(f"Unknown or expired dataset handle: {handle}")
+
+
+class DatasetScopeError(ValueError):
+    """The tool call has neither a conversation nor an owner to keep tables under."""
+
+    def __init__(self):
+        super().__init__("Stored datasets need a conversation: the tool call has no session_id or user_id")
+
+
+def dataset_scope(params: Dict[str, Any]) -> str:
+    """
+    The conversation a tool call belongs to, falling back to its owner.
+
+    Raises:
+        DatasetScopeError: the call has neither, and tables are never shared
+    """
+    if params.get('session_id'):
+        return f"session:{params['session_id']}"
+    if params.get('user_id'):
+        return f"user:{params['user_id']}"
+    raise DatasetScopeError()
+
+
+def frame_schema(df: pd.DataFrame) -> Dict[str, str]:
+    return {str(column): str(dtype) for column, dtype in df.dtypes.items()}
+
+
+def preview_records(df: pd.DataFrame, rows: int = PREVIEW_ROWS) -> List[Dict[str, Any]]:
+    # Round-trip through JSON so numpy scalars, NaN and timestamps serialize cleanly
+    return json.loads(df.head(rows).to_json(orient='records', date_format='iso'))
+
+
+class DatasetStore:
+    """Conversation-scoped table store addressed by handles."""
+
+    def __init__(self, root_dir: str, ttl_seconds: int = 86400, memory_budget_bytes: int = 256 * 1024 * 1024):
+        self.root_dir = root_dir
+        self.ttl_seconds = ttl_seconds
+        self.memory_budget_bytes = memory_budget_bytes
+        self.sweep_interval_seconds = 300
+        # (scope, handle) -> (frame, approximate size)
+        self._frames: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._memory_bytes = 0
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        self._extension = "parquet" if PARQUET_AVAILABLE else "pkl"
+
+    def _scope_dir(self, scope: str) -> str:
+        return os.path.join(self.root_dir, hashlib.sha256(scope.encode()).hexdigest()[:32])
+
+    def _path(self, scope: str, handle: str) -> str:
+        if not handle.startswith(HANDLE_PREFIX) or not handle[len(HANDLE_PREFIX):].isalnum():
+            raise DatasetNotFoundError(handle)
+        return os.path.join(self._scope_dir(scope), f"{handle}.{self._extension}")
+
+    def put(self, df: pd.DataFrame, scope: str) -> str:
+        """Store a table for a conversation and return its handle."""
+        self.sweep()
+        handle = f"{HANDLE_PREFIX}{secrets.token_hex(8)}"
+        path = self._path(scope, handle)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Parquet needs string column names
+        df = df.rename(columns=str).reset_index(drop=True)
+        if PARQUET_AVAILABLE:
+            df.to_parquet(path, index=False)
+        else:
+            df.to_pickle(path)
+        self._touch(scope)
+        self._remember(scope, handle, df)
+        return handle
+
+    def get(self, handle: str, scope: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Load a stored table. ``columns`` limits what is read from disk.
+
+        Raises:
+            DatasetNotFoundError: the handle is unknown or expired here
+        """
+        with self._lock:
+            cached = self._frames.get((scope, handle))
+            if cached is not None:
+                self._frames.move_to_end((scope, handle))
+        if cached is not None:
+            self._touch(scope)
+            # Tools modify the frames they get; the cached one must stay as stored
+            df = cached[0]
+            return df[columns].copy() if columns else df.copy()
+
+        path = self._path(scope, handle)
+        if not os.path.exists(path):
+            raise DatasetNotFoundError(handle)
+        if PARQUET_AVAILABLE:
+            df = pd.read_parquet(path, columns=columns or None)
+        else:
+            df = pd.read_pickle(path)
+            if columns:
+                df = df[columns]
+        self._touch(scope)
+        if not columns:
+            self._remember(scope, handle, df)
+            df = df.copy()
+        return df
+
+    def _remember(self, scope: str, handle: str, df: pd.DataFrame):
+        size = int(df.memory_usage(index=False).sum())
+        if size > self.memory_budget_bytes // 4:
+            return
+        with self._lock:
+            self._frames[(scope, handle)] = (df, size)
+            self._memory_bytes += size
+            while self._memory_bytes > self.memory_budget_bytes and self._frames:
+                _, (_, evicted_size) = self._frames.popitem(last=False)
+                self._memory_bytes -= evicted_size
+
+    def _touch(self, scope: str):
+        # The directory mtime is the conversation's last use, shared by all workers
+        scope_dir = self._scope_dir(scope)
+        try:
+            os.utime(scope_dir)
+        except FileNotFoundError:
+            pass
+
+    def drop_scope(self, scope: str):
+        """Delete every table of a conversation."""
+        with self._lock:
+            for key in [key for key in self._frames if key[0] == scope]:
+                self._memory_bytes -= self._frames.pop(key)[1]
+        shutil.rmtree(self._scope_dir(scope), ignore_errors=True)
+
+    def sweep(self, force: bool = False) -> int:
+        """Delete conversations idle for longer than the TTL. Returns how many were deleted."""
+        now = time.time()
+        if not force and now - self._last_sweep < self.sweep_interval_seconds:
+            return 0
+        self._last_sweep = now
+        if not os.path.isdir(self.root_dir):
+            return 0
+
+        expired = []
+        for entry in os.scandir(self.root_dir):
+            try:
+                if entry.is_dir() and now - entry.stat().st_mtime > self.ttl_seconds:
+                    expired.append(entry.path)
+            except FileNotFoundError:
+                continue
+        if expired:
+            expired_dirs = set(expired)
+            with self._lock:
+                for key in [key for key in self._frames if self._scope_dir(key[0]) in expired_dirs]:
+                    self._memory_bytes -= self._frames.pop(key)[1]
+            for path in expired:
+                shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"🧹 Deleted datasets of {len(expired)} idle conversations")
+        return len(expired)
+
+    # Helpers for the data tools
+
+    def load(self, params: Dict[str, Any], data_key: str = 'data', columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        The table a tool call refers to: the ``dataset`` handle if given,
+        otherwise the inline records under ``data_key``. None if neither is set.
+        """
+        handle = params.get('dataset')
+        if handle:
+            return self.get(handle, dataset_scope(params), columns)
+        data = params.get(data_key)
+        if not data:
+            return None
+        df = pd.DataFrame(data)
+        return df[columns] if columns else df
+
+    async def aload(self, params: Dict[str, Any], data_key: str = 'data', columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """``load`` for async callers; reading Parquet stays off the event loop."""
+        return await asyncio.to_thread(self.load, params, data_key, columns)
+
+    async def describe(self, df: pd.DataFrame, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a tool's result table and describe it compactly for the model."""
+        # Writing Parquet takes a while for large tables; keep it off the event loop
+        handle = await asyncio.to_thread(self.put, df, dataset_scope(params))
+        return {
+            'dataset': handle,
+            'columns': [str(column) for column in df.columns],
+            'shape': df.shape,
+            'schema': frame_schema(df),
+            'preview': preview_records(df)
+        }
+
+
+dataset_store = DatasetStore(settings.DATASET_STORE_DIR, settings.DATASET_TTL_SECONDS)
@@ -0,0 +1,277 @@
+"""
+Document Extraction Service
+
+Streaming text extraction shared by knowledge base uploads and the ChromaDB
+tool. Uploads are spooled to disk in fixed-size blocks, and every format is
+read incrementally (PDF page by page, DOCX paragraph by paragraph, CSV row
+by row, text in blocks), so memory stays bounded regardless of file size.
+"""
+
+import asyncio
+import codecs
+import csv
+import io
+import json
+import logging
+import os
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+from xml.etree import ElementTree
+
+logger = logging.getLogger(__name__)
+
+Source = Union[str, Path, BinaryIO]
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class DocumentExtractionService:
+    """Streams text out of uploaded documents."""
+
+    def __init__(
+        self,
+        read_block_size: int = 1024 * 1024,
+        text_block_size: int = 64 * 1024,
+        csv_rows_per_segment: int = 200,
+        json_pretty_print_limit: int = 5 * 1024 * 1024
+    ):
+        self.read_block_size = read_block_size
+        self.text_block_size = text_block_size
+        self.csv_rows_per_segment = csv_rows_per_segment
+        self.json_pretty_print_limit = json_pretty_print_limit
+
+    async def spool_upload(self, upload, destination: Union[str, Path], max_bytes: Optional[int] = None) -> int:
+        """
+        Stream a FastAPI ``UploadFile`` to disk without holding it in memory.
+
+        Args:
+            upload: The uploaded file
+            destination: Target path
+            max_bytes: Optional size limit; the partial file is removed if exceeded
+
+        Returns:
+            Number of bytes written
+        """
+        destination = Path(destination)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        written = 0
+        try:
+            with open(destination, "wb") as buffer:
+                while True:
+                    block = await upload.read(self.read_block_size)
+                    if not block:
+                        break
+                    written += len(block)
+                    if max_bytes is not None and written > max_bytes:
+                        raise ValueError(f"File exceeds the maximum size of {max_bytes} bytes")
+                    buffer.write(block)
+        except Exception:
+            destination.unlink(missing_ok=True)
+            raise
+        return written
+
+    def iter_segments(self, source: Source, file_name: str) -> Iterator[str]:
+        """
+        Yield text segments from a document.
+
+        Args:
+            source: File path or binary file object
+            file_name: Original file name, used to pick the format
+
+        Yields:
+            Text segments in document order (pages, paragraphs, row batches or blocks)
+        """
+        extension = os.path.splitext(file_name)[1].lower()
+
+        if extension == '.pdf':
+            yield from self._iter_pdf(source)
+        elif extension == '.docx':
+            yield from self._iter_docx(source)
+        elif extension == '.csv':
+            yield from self._iter_csv(source)
+        elif extension == '.json':
+            yield from self._iter_json(source)
+        else:
+            yield from self._iter_text(source)
+
+    def extract_text(self, source: Source, file_name: str) -> str:
+        """Extract the full text of a document."""
+        return "\n".join(segment for segment in self.iter_segments(source, file_name) if segment)
+
+    async def extract_text_async(self, source: Source, file_name: str) -> str:
+        """Extract the full text of a document in a worker thread."""
+        return await asyncio.to_thread(self.extract_text, source, file_name)
+
+    def iter_chunks(self, segments: Iterable[str], chunk_size: int, chunk_overlap: int) -> Iterator[str]:
+        """
+        Split a stream of text segments into overlapping chunks.
+
+        Only about one chunk of text is buffered at a time. Chunks end at a
+        sentence boundary within the last 100 characters when one exists.
+        """
+        chunk_overlap = min(chunk_overlap, chunk_size - 1)
+        buffer = ""
+
+        for segment in segments:
+            if not segment:
+                continue
+            buffer = f"{buffer}\n{segment}" if buffer else segment
+            while len(buffer) > chunk_size:
+                end = chunk_size
+                for i in range(end, max(end - 100, 0), -1):
+                    if buffer[i] in '.!?':
+                        end = i + 1
+                        break
+                chunk = buffer[:end].strip()
+                if chunk:
+                    yield chunk
+                buffer = buffer[max(end - chunk_overlap, 1):]
+
+        chunk = buffer.strip()
+        if chunk:
+            yield chunk
+
+    # Format readers
+
+    @staticmethod
+    def _open_binary(source: Source):
+        if isinstance(source, (str, Path)):
+            return open(source, "rb")
+        source.seek(0)
+        # Do not close a caller-owned stream when the reader finishes
+        return _Unclosable(source)
+
+    def _iter_text(self, source: Source) -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with self._open_binary(source) as stream:
+            while True:
+                block = stream.read(self.text_block_size)
+                if not block:
+                    break
+                yield decoder.decode(block)
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+
+    def _iter_pdf(self, source: Source) -> Iterator[str]:
+        if isinstance(source, (str, Path)):
+            try:
+                import fitz
+            except ImportError:
+                fitz = None
+
+            if fitz is not None:
+                # PyMuPDF loads pages on demand, so only one page is parsed at a time
+                with fitz.open(str(source)) as document:
+                    for page in document:
+                        yield page.get_text()
+                return
+
+        import PyPDF2
+        with self._open_binary(source) as stream:
+            reader = PyPDF2.PdfReader(stream)
+            for page in reader.pages:
+                yield page.extract_text() or ""
+
+    def _iter_docx(self, source: Source) -> Iterator[str]:
+        with self._open_binary(source) as stream, zipfile.ZipFile(stream) as archive:
+            with archive.open("word/document.xml") as xml_stream:
+                depth = 0
+                body = None
+                parts = []
+                for event, element in ElementTree.iterparse(xml_stream, events=("start", "end")):
+                    if event == "start":
+                        depth += 1
+                        if element.tag == f"{_WORD_NS}body":
+                            body = element
+                        continue
+
+                    depth -= 1
+                    tag = element.tag
+                    if tag == f"{_WORD_NS}t" and element.text:
+                        parts.append(element.text)
+                    elif tag == f"{_WORD_NS}tab":
+                        parts.append("\t")
+                    elif tag in (f"{_WORD_NS}br", f"{_WORD_NS}cr"):
+                        parts.append("\n")
+                    elif tag == f"{_WORD_NS}p":
+                        text = "".join(parts)
+                        parts = []
+                        if text.strip():
+                            yield text
+
+                    # Drop finished top-level blocks (paragraphs, tables) from the tree
+                    if depth == 2 and body is not None:
+                        body.clear()
+
+    def _iter_csv(self, source: Source) -> Iterator[str]:
+        with self._open_binary(source) as stream:
+            text_stream = io.TextIOWrapper(stream, encoding="utf-8", errors="replace", newline="")
+            try:
+                rows = []
+                for row in csv.reader(text_stream):
+                    rows.append(", ".join(row))
+                    if len(rows) >= self.csv_rows_per_segment:
+                        yield "\n".join(rows)
+                        rows = []
+                if rows:
+                    yield "\n".join(rows)
+            finally:
+                text_stream.detach()
+
+    def _iter_json(self, source: Source) -> Iterator[str]:
+        size = self._size_of(source)
+        if size is not None and size <= self.json_pretty_print_limit:
+            with self._open_binary(source) as stream:
+                try:
+                    yield json.dumps(json.loads(stream.read().decode("utf-8")), indent=2)
+                    return
+                except ValueError as e:
+                    logger.warning(f"Invalid JSON, extracting as text: {e}")
+        # Large or invalid JSON is indexed as raw text rather than parsed into memory
+        yield from self._iter_text(source)
+
+    @staticmethod
+    def _size_of(source: Source) -> Optional[int]:
+        if isinstance(source, (str, Path)):
+            return os.path.getsize(source)
+        try:
+            position = source.tell()
+            source.seek(0, os.SEEK_END)
+            size = source.tell()
+            source.seek(position)
+            return size
+        except (AttributeError, OSError):
+            return None
+
+
+class _Unclosable(io.RawIOBase):
+    """Wraps a binary stream so ``with`` blocks do not close it."""
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._stream.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._stream.tell()
+
+    def close(self):
+        # Leave the wrapped stream open for its owner
+        super().close()
+
+
+document_extraction_service = DocumentExtractionService()
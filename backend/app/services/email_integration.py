@@ -4,6 +4,7 @@ Handles email integration and message routing
 """
 
 import asyncio
+import hashlib
 import imaplib
 import email
 from email.mime.text import MIMEText
@@ -13,6 +14,8 @@ from sqlalchemy import select
 from app.core.config import settings
 from app.services.agent_service import AgentService
 from app.core.database import get_db, Integration, Agent
+from app.services.outbound_delivery_service import outbound_delivery_service
+from app.services.message_ingestion_service import InboundMessage, message_ingestion_service
 from sqlalchemy.ext.asyncio import AsyncSession
 
 class EmailIntegrationService:
@@ -21,8 +24,34 @@ class EmailIntegrationService:
     Handles incoming emails and routes them to agents
     """
     
-    def __init__(self):
-        self.agent_service = AgentService()
+    def enqueue_email(self, email_data: Dict[str, Any]) -> bool:
+        """
+        Queue an incoming email for processing.
+        
+        Emails are deduplicated by Message-ID, or by a hash of their content
+        when the provider does not pass one. Returns False when the queue is
+        full and the provider should redeliver.
+        """
+        to_email = (email_data.get('to') or '').strip().lower()
+        from_email = (email_data.get('from') or '').strip().lower()
+        message_id = email_data.get('message_id')
+        if not message_id:
+            digest = hashlib.sha256()
+            for part in (to_email, from_email, email_data.get('subject') or '', email_data.get('body') or ''):
+                digest.update(part.encode('utf-8', errors='ignore'))
+                digest.update(b'\0')
+            message_id = digest.hexdigest()
+        
+        return message_ingestion_service.enqueue(InboundMessage(
+            provider="email",
+            message_id=message_id,
+            chat_key=f"email:{to_email}:{from_email}",
+            payload=email_data
+        ))
+    
+    async def process_queued_message(self, inbound: InboundMessage, db: AsyncSession):
+        """Ingestion queue handler for emails"""
+        await self.process_incoming_email(inbound.payload, db)
     
     async def process_incoming_email(self, email_data: Dict[str, Any], db: AsyncSession):
         """Process incoming email and route to appropriate agent"""
@@ -50,11 +79,13 @@ class EmailIntegrationService:
                 return
             
             # Process email with agent
-            response = await self.agent_service.process_message(
-                agent_id=agent.id,
-                message=f"Email from {from_email}\nSubject: {subject}\n\n{body}",
+            agent_service = AgentService(db)
+            response, tools_used, cost = await agent_service.execute_agent(
+                agent=agent,
+                user_message=f"Email from {from_email}\nSubject: {subject}\n\n{body}",
+                session_id=f"email_{from_email}",
                 user_id=integration.user_id,
-                db=db
+                integration_id=integration.id
             )
             
             # Send response email
@@ -94,38 +125,21 @@ class EmailIntegrationService:
         body: str,
         integration_config: Dict[str, Any]
     ):
-        """Send response email using SMTP"""
-        try:
-            import smtplib
-            from email.mime.text import MIMEText
-            from email.mime.multipart import MIMEMultipart
-            
-            # Get SMTP configuration
-            smtp_server = integration_config.get('smtp_server', 'smtp.gmail.com')
-            smtp_port = integration_config.get('smtp_port', 587)
-            username = integration_config.get('username', from_email)
-            password = integration_config.get('password', '')
-            
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = from_email
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Add body
-            msg.attach(MIMEText(body, 'plain'))
-            
-            # Send email
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-            server.login(username, password)
-            server.send_message(msg)
-            server.quit()
-            
+        """Send response email over a pooled SMTP connection"""
+        delivered = await outbound_delivery_service.send_email(
+            smtp_server=integration_config.get('smtp_server', 'smtp.gmail.com'),
+            smtp_port=integration_config.get('smtp_port', 587),
+            username=integration_config.get('username', from_email),
+            password=integration_config.get('password', ''),
+            from_email=from_email,
+            to_email=to_email,
+            subject=subject,
+            body=body
+        )
+        if delivered:
             print(f"Response email sent to {to_email}")
-            
-        except Exception as e:
-            print(f"Error sending email: {e}")
+        else:
+            print(f"Error sending email to {to_email}")
     
     async def setup_email_monitoring(self, integration_config: Dict[str, Any]):
         """Set up email monitoring for incoming messages"""
@@ -161,4 +175,7 @@ class EmailIntegrationService:
         if '@' not in email_address:
             return False
         
-        return True
\ No newline at end of file
+        return True
+
+
+message_ingestion_service.register_handler("email", EmailIntegrationService().process_queued_message)
@@ -0,0 +1,293 @@
+"""
+Google Sheets Service
+
+Sheets API access for the Google Sheets Integration tool. Tool instances are
+created per call, so the authorized clients live here, one per set of
+credentials, instead of being rebuilt (discovery document, token refresh,
+gspread session) on every execution:
+
+- reads go through ``batch_get``, one ``values.batchGet`` request for every
+  range that is not cached, and writes through ``batch_update`` /
+  ``batch_clear``, one request for any number of ranges;
+- ranges read recently are cached per client, keyed by the spreadsheet's
+  Drive ``version``, which changes on every edit. The version is looked up
+  at most once per ``GOOGLE_SHEETS_CACHE_TTL_SECONDS``, so cached ranges are
+  at most that stale after an edit made elsewhere; writes made through the
+  client drop the spreadsheet's ranges at once. Without Drive access,
+  ranges simply expire after the TTL.
+
+``api_endpoint`` replaces the base URL of both APIs, e.g. with a local
+stand-in serving the Sheets (``/v4/spreadsheets/...``) and Drive
+(``/files/...``) paths.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+
+@dataclass
+class _CachedRange:
+    values: List[List[Any]]
+    revision: Optional[str]
+    fetched_at: float
+
+
+@dataclass
+class _Revision:
+    version: Optional[str]
+    checked_at: float
+
+
+@dataclass
+class SheetsStats:
+    api_calls: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {'api_calls': self.api_calls, 'cache_hits': self.cache_hits, 'cache_misses': self.cache_misses}
+
+
+class SheetsClient:
+    """Authorized Sheets and Drive clients for one set of credentials, with a range cache."""
+
+    def __init__(self, credentials, api_endpoint: Optional[str] = None, ttl_seconds: int = 30, max_spreadsheets: int = 64):
+        self.credentials = credentials
+        self.ttl_seconds = ttl_seconds
+        self.max_spreadsheets = max_spreadsheets
+        client_options = {'api_endpoint': api_endpoint} if api_endpoint else None
+        self.sheets = build('sheets', 'v4', credentials=credentials, client_options=client_options, cache_discovery=False)
+        self.drive = build('drive', 'v3', credentials=credentials, client_options=client_options, cache_discovery=False)
+        self._gspread = None
+        # httplib2 connections are not thread-safe, and tool calls run in worker threads
+        self._lock = threading.RLock()
+        self._ranges: "OrderedDict[str, Dict[str, _CachedRange]]" = OrderedDict()
+        self._revisions: Dict[str, _Revision] = {}
+        self.stats = SheetsStats()
+
+    @property
+    def gspread(self):
+        """gspread client, authorized on first use (only spreadsheet creation needs it)."""
+        with self._lock:
+            if self._gspread is None:
+                import gspread
+                self._gspread = gspread.authorize(self.credentials)
+            return self._gspread
+
+    def execute(self, request) -> Dict[str, Any]:
+        """Run one API request."""
+        with self._lock:
+            self.stats.api_calls += 1
+            return request.execute()
+
+    def revision(self, spreadsheet_id: str) -> Optional[str]:
+        """The spreadsheet's Drive version, looked up at most once per TTL. None without Drive access."""
+        now = time.monotonic()
+        with self._lock:
+            known = self._revisions.get(spreadsheet_id)
+            if known is not None and now - known.checked_at < self.ttl_seconds:
+                return known.version
+            try:
+                version = self.execute(self.drive.files().get(
+                    fileId=spreadsheet_id, fields='version', supportsAllDrives=True
+                )).get('version')
+            except HttpError as e:
+                logger.debug(f"Drive version of {spreadsheet_id} unavailable: {str(e)}")
+                version = None
+            self._revisions[spreadsheet_id] = _Revision(version, now)
+            return version
+
+    def batch_get(self, spreadsheet_id: str, ranges: List[str], use_cache: bool = True) -> List[List[List[Any]]]:
+        """Values of each range, in order. Ranges not cached are fetched in a single request."""
+        with self._lock:
+            revision = self.revision(spreadsheet_id) if use_cache else None
+            cached = self._ranges.get(spreadsheet_id, {})
+            now = time.monotonic()
+            found: Dict[str, List[List[Any]]] = {}
+            missing: List[str] = []
+            for range_spec in dict.fromkeys(ranges):
+                entry = cached.get(range_spec) if use_cache else None
+                if entry is not None and self._is_fresh(entry, revision, now):
+                    found[range_spec] = entry.values
+                    self.stats.cache_hits += 1
+                else:
+                    missing.append(range_spec)
+
+            if missing:
+                self.stats.cache_misses += len(missing)
+                response = self.execute(self.sheets.spreadsheets().values().batchGet(
+                    spreadsheetId=spreadsheet_id, ranges=missing
+                ))
+                # valueRanges come back in the order requested
+                for range_spec, value_range in zip(missing, response.get('valueRanges', [])):
+                    values = value_range.get('values', [])
+                    found[range_spec] = values
+                    self._store(spreadsheet_id, range_spec, _CachedRange(values, revision, now))
+            return [found[range_spec] for range_spec in ranges]
+
+    def _is_fresh(self, entry: _CachedRange, revision: Optional[str], now: float) -> bool:
+        if revision is not None:
+            return entry.revision == revision
+        return now - entry.fetched_at < self.ttl_seconds
+
+    def _store(self, spreadsheet_id: str, range_spec: str, entry: _CachedRange):
+        self._ranges.setdefault(spreadsheet_id, {})[range_spec] = entry
+        self._ranges.move_to_end(spreadsheet_id)
+        while len(self._ranges) > self.max_spreadsheets:
+            evicted, _ = self._ranges.popitem(last=False)
+            self._revisions.pop(evicted, None)
+
+    def invalidate(self, spreadsheet_id: str):
+        """Forget the cached ranges and version of a spreadsheet after it was changed."""
+        with self._lock:
+            self._ranges.pop(spreadsheet_id, None)
+            self._revisions.pop(spreadsheet_id, None)
+
+    def batch_update(self, spreadsheet_id: str, data: List[Dict[str, Any]], value_input_option: str = 'RAW') -> Dict[str, Any]:
+        """Write ``[{'range': ..., 'values': [[...]]}, ...]`` in a single request."""
+        try:
+            return self.execute(self.sheets.spreadsheets().values().batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={'valueInputOption': value_input_option, 'data': data}
+            ))
+        finally:
+            self.invalidate(spreadsheet_id)
+
+    def batch_clear(self, spreadsheet_id: str, ranges: List[str]) -> Dict[str, Any]:
+        """Clear any number of ranges in a single request."""
+        try:
+            return self.execute(self.sheets.spreadsheets().values().batchClear(
+                spreadsheetId=spreadsheet_id, body={'ranges': ranges}
+            ))
+        finally:
+            self.invalidate(spreadsheet_id)
+
+    def append(self, spreadsheet_id: str, range_spec: str, values: List[List[Any]], value_input_option: str = 'RAW') -> Dict[str, Any]:
+        """Append rows after the table found in ``range_spec``."""
+        try:
+            return self.execute(self.sheets.spreadsheets().values().append(
+                spreadsheetId=spreadsheet_id,
+                range=range_spec,
+                valueInputOption=value_input_option,
+                insertDataOption='INSERT_ROWS',
+                body={'values': values}
+            ))
+        finally:
+            self.invalidate(spreadsheet_id)
+
+    def update_spreadsheet(self, spreadsheet_id: str, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Apply ``spreadsheets.batchUpdate`` requests (formatting, sheets, dimensions)."""
+        try:
+            return self.execute(self.sheets.spreadsheets().batchUpdate(
+                spreadsheetId=spreadsheet_id, body={'requests': requests}
+            ))
+        finally:
+            self.invalidate(spreadsheet_id)
+
+    def metadata(self, spreadsheet_id: str) -> Dict[str, Any]:
+        """Title and sheet properties of a spreadsheet, without cell data."""
+        return self.execute(self.sheets.spreadsheets().get(
+            spreadsheetId=spreadsheet_id, fields='properties.title,sheets.properties'
+        ))
+
+    def close(self):
+        self.sheets.close()
+        self.drive.close()
+
+
+class GoogleSheetsService:
+    """Authorized Sheets clients, one per set of credentials, least recently used first out."""
+
+    def __init__(self, ttl_seconds: int = 30, max_clients: int = 32):
+        self.ttl_seconds = ttl_seconds
+        self.max_clients = max_clients
+        self._clients: "OrderedDict[str, SheetsClient]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_client(
+        self,
+        credentials: Optional[Dict[str, Any]] = None,
+        credentials_file: str = '',
+        scopes: Optional[List[str]] = None,
+        api_endpoint: Optional[str] = None
+    ) -> SheetsClient:
+        """
+        The shared client for a set of credentials: authorized user info,
+        service account info, or a service account key file.
+
+        Raises:
+            ValueError: no credentials were given
+        """
+        scopes = scopes or DEFAULT_SCOPES
+        key = hashlib.sha256(json.dumps(
+            [credentials or {}, credentials_file, sorted(scopes), api_endpoint], sort_keys=True, default=str
+        ).encode()).hexdigest()
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+
+        client = SheetsClient(self._credentials(credentials, credentials_file, scopes), api_endpoint, self.ttl_seconds)
+        with self._lock:
+            client = self._clients.setdefault(key, client)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_clients:
+                _, evicted = self._clients.popitem(last=False)
+                evicted.close()
+        return client
+
+    def _credentials(self, credentials: Optional[Dict[str, Any]], credentials_file: str, scopes: List[str]):
+        if credentials:
+            if credentials.get('type') == 'service_account':
+                return service_account.Credentials.from_service_account_info(credentials, scopes=scopes)
+            creds = Credentials.from_authorized_user_info(credentials, scopes)
+            # Refresh credentials if needed
+            if creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            return creds
+        if credentials_file:
+            return service_account.Credentials.from_service_account_file(credentials_file, scopes=scopes)
+        raise ValueError("No credentials provided")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            clients = list(self._clients.values())
+        totals = SheetsStats()
+        for client in clients:
+            totals.api_calls += client.stats.api_calls
+            totals.cache_hits += client.stats.cache_hits
+            totals.cache_misses += client.stats.cache_misses
+        return {'clients': len(clients), **totals.as_dict()}
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+google_sheets_service = GoogleSheetsService(settings.GOOGLE_SHEETS_CACHE_TTL_SECONDS)
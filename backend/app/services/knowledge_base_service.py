@@ -10,23 +10,26 @@ import logging
 import hashlib
 import os
 from typing import Any, Dict, List, Optional, Union
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 from urllib.parse import urlparse
 import aiohttp
-from bs4 import BeautifulSoup
 import chromadb
 from chromadb.config import Settings
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, delete
 from fastapi import UploadFile
 
-from app.core.database import KnowledgeBaseCollection, KnowledgeBaseDocument, User
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, KnowledgeBaseCollection, KnowledgeBaseDocument, User
+from app.services.content_extraction_service import content_extraction_service, extract_title
+from app.services.document_extraction_service import document_extraction_service
+from app.services.knowledge_retrieval_service import knowledge_retrieval_service
+from app.services.retrieval_cache_service import retrieval_cache_service
 # Import the crawler and extractor classes directly
 import aiohttp
-from bs4 import BeautifulSoup
 import re
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
@@ -41,8 +44,12 @@ class WebsiteCrawler:
         self.delay_between_requests = config.get('delay_between_requests', 1)
         self.respect_robots_txt = config.get('respect_robots_txt', True)
         
-    async def discover_pages(self, base_url: str, **kwargs) -> List[str]:
-        """Discover all pages on a website."""
+    async def discover_pages(self, base_url: str, page_store: Optional[Dict[str, Dict[str, Any]]] = None, **kwargs) -> List[str]:
+        """Discover all pages on a website.
+
+        When ``page_store`` is given, every fetched page is recorded in it keyed
+        by URL so callers can reuse the HTML instead of downloading it again.
+        """
         max_pages = kwargs.get('max_pages', self.max_pages)
         max_depth = kwargs.get('max_depth', self.max_depth)
         
@@ -71,9 +78,18 @@ class WebsiteCrawler:
                 discovered_urls.add(url)
                 logger.info(f"✅ Successfully discovered page: {url}")
                 
+                # One parse yields both the links and the main content
+                include_links = depth < max_depth
+                extracted = await content_extraction_service.analyze(
+                    page_data['html'], url, include_links=include_links
+                )
+                if page_store is not None:
+                    page_data['extracted'] = extracted
+                    page_store[url] = page_data
+                
                 # Extract links for further crawling
-                if depth < max_depth:
-                    links = self._extract_links(page_data['html'], url)
+                if include_links:
+                    links = self._filter_links(extracted['links'], url)
                     logger.info(f"🔗 Found {len(links)} links on {url}")
                     for link in links:
                         if link not in visited and len(discovered_urls) < max_pages:
@@ -89,8 +105,13 @@ class WebsiteCrawler:
                 
         return list(discovered_urls)
     
-    async def fetch_page(self, url: str) -> Optional[Dict[str, Any]]:
-        """Fetch a single page."""
+    async def fetch_page(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Fetch a single page.
+
+        Passing the ``etag``/``last_modified`` validators from a previous fetch
+        turns this into a conditional GET. A ``304 Not Modified`` answer is
+        returned as ``{'not_modified': True, ...}`` without any HTML.
+        """
         try:
             headers = {
                 'User-Agent': self.user_agent,
@@ -99,6 +120,10 @@ class WebsiteCrawler:
                 'Accept-Encoding': 'gzip, deflate',
                 'Connection': 'keep-alive',
             }
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
             
             async with aiohttp.ClientSession() as session:
                 async with session.get(
@@ -106,55 +131,48 @@ class WebsiteCrawler:
                     headers=headers, 
                     timeout=aiohttp.ClientTimeout(total=self.timeout)
                 ) as response:
+                    if response.status == 304:
+                        return {
+                            'url': url,
+                            'html': None,
+                            'title': None,
+                            'status_code': response.status,
+                            'not_modified': True,
+                            'etag': response.headers.get('ETag') or etag,
+                            'last_modified': response.headers.get('Last-Modified') or last_modified
+                        }
+                    
                     if response.status != 200:
                         return None
                     
                     html_content = await response.text()
                     
-                    # Extract title
-                    soup = BeautifulSoup(html_content, 'html.parser')
-                    title = soup.find('title')
-                    title_text = title.get_text(strip=True) if title else ''
-                    
                     return {
                         'url': url,
                         'html': html_content,
-                        'title': title_text,
-                        'status_code': response.status
+                        'title': extract_title(html_content),
+                        'status_code': response.status,
+                        'not_modified': False,
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified')
                     }
                     
         except Exception as e:
             logger.error(f"Failed to fetch {url}: {str(e)}")
             return None
     
-    def _extract_links(self, html_content: str, base_url: str) -> List[str]:
-        """Extract links from HTML content."""
-        soup = BeautifulSoup(html_content, 'html.parser')
-        links = []
-        
-        logger.info(f"🔍 Extracting links from {base_url}")
-        
-        all_links = soup.find_all('a', href=True)
-        logger.info(f"📋 Found {len(all_links)} total links in HTML")
-        
-        for i, link in enumerate(all_links):
-            href = link['href']
-            link_text = link.get_text(strip=True)[:50]  # First 50 chars of link text
-            
-            # Normalize URL
-            full_url = urljoin(base_url, href)
-            
-            logger.info(f"🔗 Link {i+1}: {href} -> {full_url} (text: '{link_text}')")
-            
-            # Check if it's a valid link
-            if self._is_valid_link(full_url, base_url):
-                links.append(full_url)
-                logger.info(f"✅ Valid link: {full_url}")
-            else:
-                logger.info(f"❌ Invalid link: {full_url}")
-                
-        logger.info(f"📊 Total valid links found: {len(links)}")
-        return list(set(links))  # Remove duplicates
+    def _filter_links(self, links: List[str], base_url: str) -> List[str]:
+        """Keep the crawlable links of a page, without duplicates."""
+        valid_links = []
+        seen = set()
+        for link in links:
+            if link in seen:
+                continue
+            seen.add(link)
+            if self._is_valid_link(link, base_url):
+                valid_links.append(link)
+        logger.debug(f"📊 {len(valid_links)} valid links out of {len(links)} on {base_url}")
+        return valid_links
     
     def _is_valid_link(self, url: str, base_url: str) -> bool:
         """Check if a link should be crawled."""
@@ -197,40 +215,27 @@ class RobustContentExtractor:
         self.chunk_overlap = config.get('chunk_overlap', 200)
         
     async def extract_content(self, url: str, html_content: str) -> Optional[Dict[str, Any]]:
-        """Extract content using multiple strategies."""
+        """Extract the main content of a page, dropping navigation and boilerplate."""
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style", "nav", "header", "footer"]):
-                script.decompose()
-            
-            # Get text and clean it
-            text = soup.get_text()
-            
-            # Clean up whitespace
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = '\n'.join(chunk for chunk in chunks if chunk)
-            
-            # Filter out very short lines
-            lines = text.split('\n')
-            filtered_lines = [line for line in lines if len(line) > 50]
-            
-            if filtered_lines:
-                content = '\n\n'.join(filtered_lines)
-                if len(content) >= self.min_content_length:
-                    return {
-                        'content': content,
-                        'metadata': {'method': 'fallback', 'lines': len(filtered_lines)},
-                        'confidence': 0.3
-                    }
-            
-            return None
+            result = await content_extraction_service.extract_content(
+                html_content, url, min_length=self.min_content_length
+            )
+            return self.from_analysis(result)
             
         except Exception as e:
             logger.error(f"Content extraction failed: {str(e)}")
             return None
+    
+    def from_analysis(self, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Convert a ``content_extraction_service`` result to the extractor format."""
+        content = result.get('content') or ''
+        if len(content) < self.min_content_length:
+            return None
+        return {
+            'content': content,
+            'metadata': {'method': result.get('method', 'unknown'), 'parser': content_extraction_service.parser},
+            'confidence': result.get('confidence', 0.3)
+        }
 
 class KnowledgeBaseService:
     """Service for managing knowledge base collections and documents."""
@@ -349,7 +354,11 @@ class KnowledgeBaseService:
             raise Exception(f"Failed to get user collections: {str(e)}")
     
     async def crawl_website_to_collection(self, collection_id: int, website_url: str, max_pages: int = 50, max_depth: int = 3) -> Dict[str, Any]:
-        """Crawl a website and add documents to a collection."""
+        """Crawl a website and add documents to a collection.
+
+        Pages that are already in the collection are updated in place, and only
+        pages whose extracted content changed are re-embedded.
+        """
         try:
             # Get collection
             result = await self.db.execute(
@@ -362,47 +371,40 @@ class KnowledgeBaseService:
             
             logger.info(f"🕷️ Starting website crawl for {website_url} into collection {collection.name}")
             
-            # Crawl website
+            # Crawl website, keeping the fetched pages so they are not downloaded twice
+            fetched_pages: Dict[str, Dict[str, Any]] = {}
             discovered_urls = await self.crawler.discover_pages(
                 website_url, 
+                page_store=fetched_pages,
                 max_pages=max_pages, 
                 max_depth=max_depth
             )
             
             logger.info(f"📄 Discovered {len(discovered_urls)} pages")
             
+            existing_documents = await self._get_website_documents(collection_id)
+            
             # Extract content from each page
             documents_added = 0
+            documents_updated = 0
+            documents_unchanged = 0
+            changed_documents: List[KnowledgeBaseDocument] = []
             for url in discovered_urls:
                 try:
-                    # Fetch page content
-                    page_data = await self.crawler.fetch_page(url)
+                    page_data = fetched_pages.get(url) or await self.crawler.fetch_page(url)
                     if not page_data:
                         continue
                     
-                    # Extract content
-                    content_result = await self.extractor.extract_content(url, page_data['html'])
-                    if not content_result or not content_result.get('content'):
-                        continue
+                    outcome, document = await self._ingest_page(collection_id, url, page_data, existing_documents.get(url))
+                    if outcome == 'added':
+                        documents_added += 1
+                    elif outcome == 'updated':
+                        documents_updated += 1
+                    elif outcome == 'unchanged':
+                        documents_unchanged += 1
                     
-                    # Create document record
-                    doc_id = hashlib.md5(url.encode()).hexdigest()
-                    document = KnowledgeBaseDocument(
-                        collection_id=collection_id,
-                        title=page_data.get('title', url),
-                        content=content_result['content'],
-                        source_url=url,
-                        document_type='website',
-                        document_metadata={
-                            'url': url,
-                            'title': page_data.get('title', ''),
-                            'content_length': len(content_result['content']),
-                            'extraction_method': content_result.get('metadata', {}).get('method', 'unknown')
-                        }
-                    )
-                    
-                    self.db.add(document)
-                    documents_added += 1
+                    if outcome in ('added', 'updated'):
+                        changed_documents.append(document)
                     
                 except Exception as e:
                     logger.warning(f"Failed to process {url}: {str(e)}")
@@ -417,15 +419,24 @@ class KnowledgeBaseService:
                 await self.db.refresh(collection)  # Refresh the object to get updated values
             
             # Add to ChromaDB
-            await self._add_documents_to_chroma(collection.chroma_collection_name, collection_id)
+            await self._add_documents_to_chroma(
+                collection.chroma_collection_name,
+                collection_id,
+                document_ids=[doc.id for doc in changed_documents]
+            )
             
-            logger.info(f"✅ Added {documents_added} documents to collection {collection.name}")
+            logger.info(
+                f"✅ Crawled {collection.name}: {documents_added} added, "
+                f"{documents_updated} updated, {documents_unchanged} unchanged"
+            )
             
             return {
                 "collection_id": collection_id,
                 "website_url": website_url,
                 "pages_discovered": len(discovered_urls),
                 "documents_added": documents_added,
+                "documents_updated": documents_updated,
+                "documents_unchanged": documents_unchanged,
                 "collection_name": collection.name
             }
             
@@ -433,6 +444,209 @@ class KnowledgeBaseService:
             logger.error(f"Failed to crawl website: {str(e)}")
             raise Exception(f"Failed to crawl website: {str(e)}")
     
+    async def refresh_collection(self, collection_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Re-validate every website page of a collection with conditional GETs.
+
+        Pages answered with ``304 Not Modified`` or whose extracted content hash
+        is unchanged are skipped; only changed pages are re-extracted and only
+        their changed chunks are re-embedded.
+        """
+        try:
+            conditions = [KnowledgeBaseCollection.id == collection_id]
+            if user_id is not None:
+                conditions.append(KnowledgeBaseCollection.user_id == user_id)
+            result = await self.db.execute(
+                select(KnowledgeBaseCollection).where(and_(*conditions))
+            )
+            collection = result.scalar_one_or_none()
+            
+            if not collection:
+                raise Exception("Collection not found or access denied")
+            
+            existing_documents = await self._get_website_documents(collection_id)
+            logger.info(f"🔄 Refreshing {len(existing_documents)} pages in collection {collection.name}")
+            
+            documents_updated = 0
+            documents_unchanged = 0
+            documents_failed = 0
+            changed_documents: List[KnowledgeBaseDocument] = []
+            for url, document in existing_documents.items():
+                try:
+                    page_data = await self.crawler.fetch_page(
+                        url,
+                        etag=document.etag,
+                        last_modified=document.last_modified
+                    )
+                    if not page_data:
+                        documents_failed += 1
+                        continue
+                    
+                    outcome, document = await self._ingest_page(collection_id, url, page_data, document)
+                    if outcome == 'updated':
+                        documents_updated += 1
+                        changed_documents.append(document)
+                    elif outcome == 'unchanged':
+                        documents_unchanged += 1
+                    
+                    if self.crawler.delay_between_requests > 0:
+                        await asyncio.sleep(self.crawler.delay_between_requests)
+                    
+                except Exception as e:
+                    documents_failed += 1
+                    logger.warning(f"Failed to refresh {url}: {str(e)}")
+                    continue
+            
+            collection.last_refreshed_at = datetime.utcnow()
+            await self.db.commit()
+            
+            await self._add_documents_to_chroma(
+                collection.chroma_collection_name,
+                collection_id,
+                document_ids=[doc.id for doc in changed_documents]
+            )
+            
+            logger.info(
+                f"✅ Refreshed {collection.name}: {documents_updated} updated, "
+                f"{documents_unchanged} unchanged, {documents_failed} failed"
+            )
+            
+            return {
+                "collection_id": collection_id,
+                "collection_name": collection.name,
+                "pages_checked": len(existing_documents),
+                "documents_updated": documents_updated,
+                "documents_unchanged": documents_unchanged,
+                "documents_failed": documents_failed,
+                "refreshed_at": collection.last_refreshed_at.isoformat()
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to refresh collection: {str(e)}")
+            raise Exception(f"Failed to refresh collection: {str(e)}")
+    
+    async def set_refresh_schedule(self, collection_id: int, user_id: int, refresh_interval_hours: Optional[int]) -> Dict[str, Any]:
+        """Enable, change or disable (``None``) scheduled refresh for a collection."""
+        try:
+            result = await self.db.execute(
+                select(KnowledgeBaseCollection).where(
+                    and_(
+                        KnowledgeBaseCollection.id == collection_id,
+                        KnowledgeBaseCollection.user_id == user_id
+                    )
+                )
+            )
+            collection = result.scalar_one_or_none()
+            
+            if not collection:
+                raise Exception("Collection not found or access denied")
+            
+            if refresh_interval_hours is not None and refresh_interval_hours < 1:
+                raise Exception("Refresh interval must be at least 1 hour")
+            
+            collection.refresh_interval_hours = refresh_interval_hours
+            await self.db.commit()
+            
+            return {
+                "collection_id": collection_id,
+                "refresh_interval_hours": collection.refresh_interval_hours,
+                "last_refreshed_at": collection.last_refreshed_at.isoformat() if collection.last_refreshed_at else None
+            }
+            
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"Failed to update refresh schedule: {str(e)}")
+            raise Exception(f"Failed to update refresh schedule: {str(e)}")
+    
+    async def _get_website_documents(self, collection_id: int) -> Dict[str, KnowledgeBaseDocument]:
+        """Return the website documents of a collection keyed by source URL."""
+        result = await self.db.execute(
+            select(KnowledgeBaseDocument).where(
+                and_(
+                    KnowledgeBaseDocument.collection_id == collection_id,
+                    KnowledgeBaseDocument.source_url.isnot(None)
+                )
+            )
+        )
+        return {doc.source_url: doc for doc in result.scalars().all()}
+    
+    async def _ingest_page(
+        self,
+        collection_id: int,
+        url: str,
+        page_data: Dict[str, Any],
+        document: Optional[KnowledgeBaseDocument] = None
+    ) -> tuple:
+        """Create or update the document for a fetched page.
+
+        Returns ``(outcome, document)`` where outcome is one of ``'added'``,
+        ``'updated'``, ``'unchanged'`` or ``'skipped'`` (no usable content).
+        """
+        now = datetime.utcnow()
+        
+        if page_data.get('not_modified'):
+            if document is not None:
+                document.last_checked_at = now
+                document.etag = page_data.get('etag') or document.etag
+                document.last_modified = page_data.get('last_modified') or document.last_modified
+            return 'unchanged', document
+        
+        html_hash = hashlib.sha256(page_data['html'].encode('utf-8', errors='ignore')).hexdigest()
+        
+        # Identical HTML means identical extraction, so skip the parse entirely
+        if document is not None and (document.document_metadata or {}).get('html_hash') == html_hash:
+            document.last_checked_at = now
+            document.etag = page_data.get('etag')
+            document.last_modified = page_data.get('last_modified')
+            return 'unchanged', document
+        
+        if page_data.get('extracted') is not None:
+            # Already parsed during discovery
+            content_result = self.extractor.from_analysis(page_data['extracted'])
+        else:
+            content_result = await self.extractor.extract_content(url, page_data['html'])
+        if not content_result or not content_result.get('content'):
+            return 'skipped', document
+        
+        content = content_result['content']
+        content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        metadata = {
+            'url': url,
+            'title': page_data.get('title', ''),
+            'content_length': len(content),
+            'extraction_method': content_result.get('metadata', {}).get('method', 'unknown'),
+            'html_hash': html_hash
+        }
+        
+        if document is None:
+            document = KnowledgeBaseDocument(
+                collection_id=collection_id,
+                title=page_data.get('title') or url,
+                content=content,
+                source_url=url,
+                document_type='website',
+                document_metadata=metadata,
+                etag=page_data.get('etag'),
+                last_modified=page_data.get('last_modified'),
+                content_hash=content_hash,
+                last_checked_at=now
+            )
+            self.db.add(document)
+            await self.db.flush()
+            return 'added', document
+        
+        document.etag = page_data.get('etag')
+        document.last_modified = page_data.get('last_modified')
+        document.last_checked_at = now
+        document.document_metadata = metadata
+        
+        if document.content_hash == content_hash:
+            return 'unchanged', document
+        
+        document.title = page_data.get('title') or document.title
+        document.content = content
+        document.content_hash = content_hash
+        return 'updated', document
+    
     async def upload_file_to_collection(self, collection_id: int, file: UploadFile) -> Dict[str, Any]:
         """Upload a file and add it to a collection."""
         try:
@@ -449,15 +663,16 @@ class KnowledgeBaseService:
             upload_dir = Path(f"uploads/knowledge_base/{collection_id}")
             upload_dir.mkdir(parents=True, exist_ok=True)
             
-            # Save file
-            file_path = upload_dir / file.filename
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
+            # Spool the upload to disk in blocks instead of reading it into memory
+            file_path = upload_dir / Path(file.filename).name
+            file_size = await document_extraction_service.spool_upload(
+                file, file_path, max_bytes=settings.KNOWLEDGE_BASE_MAX_FILE_SIZE
+            )
             
-            # For now, we'll extract text from the file
-            # In a full implementation, you'd want to handle different file types
-            file_content = content.decode('utf-8', errors='ignore')
+            # Extract text page by page / paragraph by paragraph in a worker thread
+            file_content = await document_extraction_service.extract_text_async(file_path, file.filename)
+            if not file_content.strip():
+                raise Exception("No text content could be extracted from the file")
             
             # Create document record
             document = KnowledgeBaseDocument(
@@ -465,10 +680,11 @@ class KnowledgeBaseService:
                 title=file.filename,
                 content=file_content,
                 file_path=str(file_path),
+                content_hash=hashlib.sha256(file_content.encode('utf-8')).hexdigest(),
                 document_type='file',
                 document_metadata={
                     'filename': file.filename,
-                    'file_size': len(content),
+                    'file_size': file_size,
                     'content_length': len(file_content)
                 }
             )
@@ -477,14 +693,14 @@ class KnowledgeBaseService:
             await self.db.commit()
             
             # Add to ChromaDB
-            await self._add_documents_to_chroma(collection.chroma_collection_name, collection_id)
+            await self._add_documents_to_chroma(collection.chroma_collection_name, collection_id, document_ids=[document.id])
             
             logger.info(f"✅ Uploaded file {file.filename} to collection {collection.name}")
             
             return {
                 "collection_id": collection_id,
                 "filename": file.filename,
-                "file_size": len(content),
+                "file_size": file_size,
                 "content_length": len(file_content),
                 "collection_name": collection.name
             }
@@ -493,8 +709,19 @@ class KnowledgeBaseService:
             logger.error(f"Failed to upload file: {str(e)}")
             raise Exception(f"Failed to upload file: {str(e)}")
     
-    async def query_collection(self, collection_id: int, query: str, top_k: int = 5) -> Dict[str, Any]:
-        """Query a collection for relevant documents."""
+    async def query_collection(
+        self,
+        collection_id: int,
+        query: str,
+        top_k: int = 5,
+        similarity_threshold: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Query a collection with hybrid BM25 + vector retrieval.
+
+        ``similarity_threshold`` drops weak matches and ``max_tokens`` packs the
+        ranked chunks into a context string of at most that many tokens.
+        """
         try:
             # Get collection
             result = await self.db.execute(
@@ -505,25 +732,16 @@ class KnowledgeBaseService:
             if not collection:
                 raise Exception("Collection not found")
             
-            # Query ChromaDB
             chroma_collection = self.chroma_client.get_collection(collection.chroma_collection_name)
             
-            results = chroma_collection.query(
-                query_texts=[query],
-                n_results=top_k
+            formatted_results = knowledge_retrieval_service.search(
+                chroma_collection,
+                query,
+                top_k=top_k,
+                similarity_threshold=similarity_threshold
             )
             
-            # Format results
-            formatted_results = []
-            if results['documents'] and results['documents'][0]:
-                for i, doc in enumerate(results['documents'][0]):
-                    formatted_results.append({
-                        'content': doc,
-                        'metadata': results['metadatas'][0][i] if results['metadatas'] and results['metadatas'][0] else {},
-                        'distance': results['distances'][0][i] if results['distances'] and results['distances'][0] else 0
-                    })
-            
-            return {
+            response = {
                 "collection_id": collection_id,
                 "collection_name": collection.name,
                 "query": query,
@@ -531,52 +749,126 @@ class KnowledgeBaseService:
                 "total_results": len(formatted_results)
             }
             
+            if max_tokens is not None:
+                context, packed_results = knowledge_retrieval_service.pack_context(formatted_results, max_tokens)
+                response["results"] = packed_results
+                response["total_results"] = len(packed_results)
+                response["context"] = context
+            
+            return response
+            
         except Exception as e:
             logger.error(f"Failed to query collection: {str(e)}")
             raise Exception(f"Failed to query collection: {str(e)}")
     
-    async def _add_documents_to_chroma(self, chroma_collection_name: str, collection_id: int):
-        """Add documents from database to ChromaDB."""
+    async def _add_documents_to_chroma(self, chroma_collection_name: str, collection_id: int, document_ids: Optional[List[int]] = None):
+        """Sync documents from the database into ChromaDB.
+
+        Documents are split into chunks whose ids are derived from the chunk
+        content, so re-syncing a document only embeds chunks that changed and
+        deletes the ones that disappeared. ``document_ids`` limits the sync to
+        specific documents; ``None`` syncs the whole collection.
+        """
         try:
+            if document_ids is not None and not document_ids:
+                return
+            
             # Get documents from database
+            conditions = [KnowledgeBaseDocument.collection_id == collection_id]
+            if document_ids is not None:
+                conditions.append(KnowledgeBaseDocument.id.in_(document_ids))
             result = await self.db.execute(
-                select(KnowledgeBaseDocument).where(KnowledgeBaseDocument.collection_id == collection_id)
+                select(KnowledgeBaseDocument).where(and_(*conditions))
             )
             documents = result.scalars().all()
             
             if not documents:
                 return
             
-            # Prepare documents for ChromaDB
-            ids = []
-            texts = []
-            metadatas = []
+            chroma_collection = self.chroma_client.get_collection(chroma_collection_name)
             
+            chunks_added = 0
+            chunks_removed = 0
             for doc in documents:
-                doc_id = f"doc_{doc.id}"
-                ids.append(doc_id)
-                texts.append(doc.content)
-                metadatas.append({
-                    'title': doc.title,
-                    'document_type': doc.document_type,
-                    'source_url': doc.source_url or '',
-                    'file_path': doc.file_path or '',
-                    'created_at': doc.created_at.isoformat()
-                })
+                added, removed = self._sync_document_chunks(chroma_collection, doc)
+                chunks_added += added
+                chunks_removed += removed
             
-            # Add to ChromaDB
-            chroma_collection = self.chroma_client.get_collection(chroma_collection_name)
-            chroma_collection.add(
-                ids=ids,
-                documents=texts,
-                metadatas=metadatas
-            )
+            if chunks_added or chunks_removed:
+                retrieval_cache_service.bump_collection_version(chroma_collection)
+                knowledge_retrieval_service.invalidate(chroma_collection_name)
             
-            logger.info(f"✅ Added {len(documents)} documents to ChromaDB collection {chroma_collection_name}")
+            logger.info(
+                f"✅ Synced {len(documents)} documents to ChromaDB collection {chroma_collection_name} "
+                f"({chunks_added} chunks embedded, {chunks_removed} removed)"
+            )
             
         except Exception as e:
             logger.error(f"Failed to add documents to ChromaDB: {str(e)}")
             raise Exception(f"Failed to add documents to ChromaDB: {str(e)}") 
+    
+    def _sync_document_chunks(self, chroma_collection, doc: KnowledgeBaseDocument) -> tuple:
+        """Embed new chunks of a document and drop stale ones. Returns (added, removed)."""
+        chunks: Dict[str, tuple] = {}
+        for index, chunk in enumerate(self._chunk_text(doc.content or '')):
+            chunk_id = f"doc_{doc.id}_{hashlib.sha256(chunk.encode('utf-8')).hexdigest()[:16]}"
+            chunks.setdefault(chunk_id, (index, chunk))
+        
+        existing = chroma_collection.get(where={"document_id": doc.id}, include=[])
+        existing_ids = set(existing.get('ids') or [])
+        
+        # Documents indexed before chunking was introduced were stored whole
+        stale_ids = [chunk_id for chunk_id in existing_ids if chunk_id not in chunks]
+        legacy = chroma_collection.get(ids=[f"doc_{doc.id}"], include=[])
+        stale_ids.extend(legacy.get('ids') or [])
+        if stale_ids:
+            chroma_collection.delete(ids=stale_ids)
+        
+        new_ids = [chunk_id for chunk_id in chunks if chunk_id not in existing_ids]
+        if new_ids:
+            chroma_collection.add(
+                ids=new_ids,
+                documents=[chunks[chunk_id][1] for chunk_id in new_ids],
+                metadatas=[{
+                    'document_id': doc.id,
+                    'chunk_index': chunks[chunk_id][0],
+                    'title': doc.title,
+                    'document_type': doc.document_type,
+                    'source_url': doc.source_url or '',
+                    'file_path': doc.file_path or '',
+                    'created_at': doc.created_at.isoformat()
+                } for chunk_id in new_ids]
+            )
+        
+        return len(new_ids), len(stale_ids)
+    
+    def _chunk_text(self, text: str) -> List[str]:
+        """Split text into overlapping chunks on paragraph boundaries where possible."""
+        chunk_size = self.extractor.chunk_size
+        chunk_overlap = min(self.extractor.chunk_overlap, chunk_size // 2)
+        text = text.strip()
+        if len(text) <= chunk_size:
+            return [text] if text else []
+        
+        chunks = []
+        start = 0
+        while start < len(text):
+            end = min(start + chunk_size, len(text))
+            if end < len(text):
+                # Prefer to cut at a paragraph, then a sentence, boundary
+                boundary = text.rfind('\n\n', start + chunk_overlap, end)
+                if boundary == -1:
+                    boundary = text.rfind('. ', start + chunk_overlap, end)
+                if boundary != -1:
+                    end = boundary + 1
+            chunk = text[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+            if end >= len(text):
+                break
+            start = max(end - chunk_overlap, start + 1)
+        
+        return chunks
 
     async def delete_collection(self, collection_id: int, user_id: int) -> Dict[str, Any]:
         """Delete a collection and all its documents."""
@@ -612,6 +904,8 @@ class KnowledgeBaseService:
             # Delete ChromaDB collection
             try:
                 self.chroma_client.delete_collection(collection.chroma_collection_name)
+                knowledge_retrieval_service.invalidate(collection.chroma_collection_name)
+                retrieval_cache_service.results.drop_collection(collection.chroma_collection_name)
                 logger.info(f"✅ Deleted ChromaDB collection: {collection.chroma_collection_name}")
             except Exception as e:
                 logger.warning(f"Failed to delete ChromaDB collection: {e}")
@@ -628,4 +922,69 @@ class KnowledgeBaseService:
         except Exception as e:
             await self.db.rollback()
             logger.error(f"Failed to delete collection: {str(e)}")
-            raise Exception(f"Failed to delete collection: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Failed to delete collection: {str(e)}")
+
+
+class KnowledgeBaseRefreshScheduler:
+    """Background loop that refreshes collections with a refresh schedule.
+
+    Collections opt in by setting ``refresh_interval_hours`` (24 for nightly).
+    Each refresh only re-downloads pages the server reports as changed.
+    """
+    
+    def __init__(self, check_interval_seconds: int = 300):
+        self.check_interval_seconds = check_interval_seconds
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start the scheduler loop on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info("🕒 Knowledge base refresh scheduler started")
+    
+    async def stop(self):
+        """Stop the scheduler loop."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_due_collections()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Knowledge base refresh scheduler error: {str(e)}")
+            await asyncio.sleep(self.check_interval_seconds)
+    
+    async def refresh_due_collections(self) -> int:
+        """Refresh every collection whose interval has elapsed. Returns how many ran."""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(KnowledgeBaseCollection.id, KnowledgeBaseCollection.refresh_interval_hours, KnowledgeBaseCollection.last_refreshed_at)
+                .where(KnowledgeBaseCollection.refresh_interval_hours.isnot(None))
+            )
+            now = datetime.utcnow()
+            due_ids = [
+                collection_id
+                for collection_id, interval_hours, last_refreshed_at in result.all()
+                if last_refreshed_at is None or now - last_refreshed_at >= timedelta(hours=interval_hours)
+            ]
+        
+        for collection_id in due_ids:
+            # One session per collection so a failure does not poison the rest
+            async with AsyncSessionLocal() as db:
+                try:
+                    await KnowledgeBaseService(db).refresh_collection(collection_id)
+                except Exception as e:
+                    logger.error(f"Scheduled refresh failed for collection {collection_id}: {str(e)}")
+        
+        return len(due_ids)
+
+
+knowledge_base_refresh_scheduler = KnowledgeBaseRefreshScheduler()
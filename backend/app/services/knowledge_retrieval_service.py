@@ -0,0 +1,308 @@
+"""
+Knowledge Retrieval Service
+
+Hybrid retrieval over ChromaDB collections: a local BM25 inverted index over
+the stored chunks runs next to the vector search, the two rankings are fused,
+weak and near-duplicate chunks are dropped, and the survivors are packed into
+a token budget for the agent prompt.
+"""
+
+import logging
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.retrieval_cache_service import retrieval_cache_service
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+_STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i if in into is it its of on or
+that the their there these this to was what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with common stopwords removed."""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt-token estimate, same heuristic the knowledge base tool has always used."""
+    return int(len(text.split()) * 1.3) + 1
+
+
+class BM25Index:
+    """In-memory BM25 (Okapi) inverted index over a fixed set of chunks."""
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_lengths: List[int] = []
+
+        for index, document in enumerate(documents):
+            terms = tokenize(document or '')
+            self.doc_lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                self.postings[term].append((index, frequency))
+
+        total = len(documents)
+        self.avg_doc_length = (sum(self.doc_lengths) / total) if total else 0.0
+        self.idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float, float]]:
+        """
+        Return ``(chunk_index, score, coverage)`` for the best matching chunks,
+        where coverage is the share of the query's terms the chunk contains.
+        """
+        terms = set(tokenize(query))
+        if not self.ids or not self.avg_doc_length or not terms:
+            return []
+
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, int] = defaultdict(int)
+        for term in terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, frequency in self.postings[term]:
+                norm = 1 - self.b + self.b * self.doc_lengths[index] / self.avg_doc_length
+                scores[index] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+                matched[index] += 1
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(index, score, matched[index] / len(terms)) for index, score in best]
+
+
+class KnowledgeRetrievalService:
+    """
+    Hybrid BM25 + vector retrieval for knowledge base collections.
+
+    BM25 indexes are built lazily per ChromaDB collection and rebuilt when the
+    collection's chunk count or ingestion version changes, or when
+    ``invalidate`` is called. Query embeddings and final results go through
+    ``retrieval_cache_service``.
+    """
+
+    def __init__(self, rrf_k: int = 60, candidate_multiplier: int = 4, dedupe_threshold: float = 0.85):
+        self.rrf_k = rrf_k
+        self.candidate_multiplier = candidate_multiplier
+        self.dedupe_threshold = dedupe_threshold
+        self._indexes: Dict[str, Tuple[tuple, BM25Index]] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, collection_name: str):
+        """Drop the cached BM25 index of a collection."""
+        with self._lock:
+            self._indexes.pop(collection_name, None)
+
+    def _get_index(self, collection) -> BM25Index:
+        signature = (collection.count(), retrieval_cache_service.collection_version(collection))
+        with self._lock:
+            cached = self._indexes.get(collection.name)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        data = collection.get(include=["documents", "metadatas"])
+        index = BM25Index(
+            ids=data.get('ids') or [],
+            documents=data.get('documents') or [],
+            metadatas=data.get('metadatas') or []
+        )
+        with self._lock:
+            self._indexes[collection.name] = (signature, index)
+        logger.info(f"📚 Built BM25 index for collection '{collection.name}' ({len(index)} chunks)")
+        return index
+
+    @staticmethod
+    def _distance_to_similarity(distance: float, space: str) -> float:
+        if space == 'cosine' or space == 'ip':
+            return 1 - distance
+        # Squared L2 between unit vectors: d = 2 - 2 * cos
+        return 1 - distance / 2
+
+    def search(
+        self,
+        collection,
+        query: str,
+        top_k: int = 5,
+        similarity_threshold: Optional[float] = None,
+        use_cache: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Run hybrid retrieval against a ChromaDB collection.
+
+        Args:
+            collection: ChromaDB collection object
+            query: Query text
+            top_k: Maximum number of chunks to return
+            similarity_threshold: Minimum relevance (0-1): vector similarity, or the
+                share of the query's terms a chunk contains
+            use_cache: Serve and store results and query embeddings via the retrieval cache
+
+        Returns:
+            Ranked result dicts with content, metadata, distance and scores
+        """
+        if not use_cache:
+            return self._search(collection, query, top_k, similarity_threshold)
+
+        cache_key = retrieval_cache_service.result_key(collection, query, top_k, similarity_threshold)
+        cached = retrieval_cache_service.get_results(cache_key)
+        if cached is not None:
+            return cached
+
+        query_embedding = None
+        if collection.count():
+            query_embedding = retrieval_cache_service.get_query_embedding(collection.name, query)
+        results = self._search(collection, query, top_k, similarity_threshold, query_embedding)
+        retrieval_cache_service.put_results(cache_key, results)
+        return results
+
+    def _search(
+        self,
+        collection,
+        query: str,
+        top_k: int,
+        similarity_threshold: Optional[float],
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        candidate_k = max(top_k * self.candidate_multiplier, top_k)
+        space = retrieval_cache_service.collection_distance(collection)
+        candidates: Dict[str, Dict[str, Any]] = {}
+
+        # Dense ranking
+        total = collection.count()
+        if total:
+            query_args = {"n_results": min(candidate_k, total), "include": ["documents", "metadatas", "distances"]}
+            if query_embedding is not None:
+                query_args["query_embeddings"] = [query_embedding]
+            else:
+                query_args["query_texts"] = [query]
+            results = collection.query(**query_args)
+
+            ids = (results.get('ids') or [[]])[0]
+            documents = (results.get('documents') or [[]])[0]
+            metadatas = (results.get('metadatas') or [[]])[0] or [{}] * len(ids)
+            distances = (results.get('distances') or [[]])[0] or [0] * len(ids)
+            for rank, chunk_id in enumerate(ids):
+                candidates[chunk_id] = {
+                    'id': chunk_id,
+                    'content': documents[rank],
+                    'metadata': metadatas[rank] or {},
+                    'distance': distances[rank],
+                    'similarity': self._distance_to_similarity(distances[rank], space),
+                    'bm25_score': 0.0,
+                    'lexical_score': 0.0,
+                    'vector_rank': rank,
+                    'bm25_rank': None
+                }
+
+        # Sparse ranking
+        index = self._get_index(collection)
+        bm25_hits = index.search(query, candidate_k)
+        for rank, (position, score, coverage) in enumerate(bm25_hits):
+            chunk_id = index.ids[position]
+            candidate = candidates.setdefault(chunk_id, {
+                'id': chunk_id,
+                'content': index.documents[position],
+                'metadata': index.metadatas[position] or {},
+                'distance': None,
+                'similarity': None,
+                'vector_rank': None
+            })
+            candidate['bm25_score'] = score
+            # Absolute, unlike BM25 scores: the best hit only passes a threshold on its own merits
+            candidate['lexical_score'] = coverage
+            candidate['bm25_rank'] = rank
+
+        # Reciprocal rank fusion
+        for candidate in candidates.values():
+            score = 0.0
+            if candidate.get('vector_rank') is not None:
+                score += 1 / (self.rrf_k + candidate['vector_rank'] + 1)
+            if candidate.get('bm25_rank') is not None:
+                score += 1 / (self.rrf_k + candidate['bm25_rank'] + 1)
+            candidate['score'] = score
+
+        ranked = sorted(candidates.values(), key=lambda item: item['score'], reverse=True)
+
+        if similarity_threshold is not None:
+            ranked = [
+                candidate for candidate in ranked
+                if (candidate.get('similarity') or 0.0) >= similarity_threshold
+                or candidate.get('lexical_score', 0.0) >= similarity_threshold
+            ]
+
+        return self._dedupe(ranked)[:top_k]
+
+    def _dedupe(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop chunks whose word shingles mostly overlap a higher-ranked chunk."""
+        kept: List[Dict[str, Any]] = []
+        kept_shingles: List[set] = []
+        for result in results:
+            words = tokenize(result.get('content') or '')
+            shingles = {tuple(words[i:i + 3]) for i in range(max(len(words) - 2, 1))}
+            duplicate = False
+            for other in kept_shingles:
+                union = len(shingles | other)
+                if union and len(shingles & other) / union >= self.dedupe_threshold:
+                    duplicate = True
+                    break
+            if not duplicate:
+                kept.append(result)
+                kept_shingles.append(shingles)
+        return kept
+
+    @staticmethod
+    def pack_context(results: List[Dict[str, Any]], max_tokens: int) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Pack ranked results into a token budget.
+
+        Chunks are taken in rank order; a chunk that does not fit is skipped so
+        smaller lower-ranked chunks can still use the remaining budget.
+
+        Returns:
+            The assembled context and the results that made it in
+        """
+        context_parts = []
+        packed = []
+        used_tokens = 0
+
+        for result in results:
+            content = result.get('content', '')
+            metadata = result.get('metadata') or {}
+
+            # Add source information if available
+            source_info = ""
+            if metadata.get('source_url'):
+                source_info = f" [Source: {metadata['source_url']}]"
+            elif metadata.get('title'):
+                source_info = f" [Source: {metadata['title']}]"
+
+            part = f"{content}{source_info}"
+            tokens = estimate_tokens(part)
+            if used_tokens + tokens > max_tokens:
+                continue
+
+            context_parts.append(part)
+            packed.append(result)
+            used_tokens += tokens
+
+        return "\n\n".join(context_parts), packed
+
+
+knowledge_retrieval_service = KnowledgeRetrievalService()
@@ -0,0 +1,193 @@
+"""
+Message Ingestion Service
+
+Inbound messages from messaging providers (WhatsApp, Telegram, email) are
+acknowledged as soon as they are validated and queued; the agent turn runs
+later on a bounded pool of workers. This keeps webhook responses fast, so
+providers do not time out and redeliver while the model is still thinking.
+
+Guarantees:
+- Duplicate deliveries (same provider message id) are dropped for a while
+  after the first one was accepted.
+- Messages of the same chat are processed one at a time, in arrival order.
+  Different chats are processed concurrently.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class InboundMessage:
+    """A provider message waiting for its agent turn."""
+    provider: str
+    message_id: str
+    chat_key: str
+    payload: Dict[str, Any]
+    received_at: float = field(default_factory=time.time)
+
+
+MessageHandler = Callable[[InboundMessage, AsyncSession], Awaitable[None]]
+
+
+class MessageIngestionService:
+    """Deduplicating, per-chat ordered message queue with a worker pool."""
+
+    def __init__(self, max_workers: int = 8, max_pending: int = 1000, dedupe_ttl_seconds: int = 3600, dedupe_max_entries: int = 50000):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.dedupe_ttl_seconds = dedupe_ttl_seconds
+        self.dedupe_max_entries = dedupe_max_entries
+
+        self._handlers: Dict[str, MessageHandler] = {}
+        self._seen: "OrderedDict[tuple, float]" = OrderedDict()
+        # Pending messages per chat, and chats ready for a worker
+        self._chats: Dict[str, Deque[InboundMessage]] = {}
+        self._active_chats: Set[str] = set()
+        self._ready: Optional[asyncio.Queue] = None
+        self._workers: list = []
+        self._pending = 0
+        self._stats = {"accepted": 0, "duplicates": 0, "rejected": 0, "processed": 0, "failed": 0}
+
+    def register_handler(self, provider: str, handler: MessageHandler):
+        """Set the coroutine that processes messages of a provider."""
+        self._handlers[provider] = handler
+
+    def start(self):
+        """Start the worker pool (idempotent)."""
+        if self._workers:
+            return
+        self._ready = asyncio.Queue()
+        # Messages left over from a previous stop() are picked up again
+        for chat_key, messages in self._chats.items():
+            if messages and chat_key not in self._active_chats:
+                self._ready.put_nowait(chat_key)
+        self._workers = [
+            asyncio.create_task(self._worker(index), name=f"message-ingestion-{index}")
+            for index in range(self.max_workers)
+        ]
+        logger.info(f"📨 Message ingestion started with {self.max_workers} workers")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Give in-flight messages a moment to finish, then cancel the workers."""
+        if not self._workers:
+            return
+        deadline = time.monotonic() + drain_timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._pending:
+            logger.warning(f"Stopping message ingestion with {self._pending} unprocessed messages")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._ready = None
+
+    def enqueue(self, message: InboundMessage) -> bool:
+        """
+        Queue a message for processing.
+
+        Returns:
+            True if the message is queued or was already accepted before
+            (a redelivery), False if the queue is full and the provider
+            should retry later
+        """
+        dedupe_key = (message.provider, message.message_id)
+        now = time.monotonic()
+        self._expire_seen(now)
+        if dedupe_key in self._seen:
+            self._stats["duplicates"] += 1
+            return True
+
+        if self._pending >= self.max_pending:
+            self._stats["rejected"] += 1
+            logger.warning(f"Message ingestion queue full, rejecting {message.provider} message {message.message_id}")
+            return False
+
+        if not self._workers:
+            self.start()
+
+        self._seen[dedupe_key] = now
+        self._pending += 1
+        self._stats["accepted"] += 1
+
+        chat = self._chats.setdefault(message.chat_key, deque())
+        chat.append(message)
+        # A chat already waiting or being processed picks the message up in order
+        if len(chat) == 1 and message.chat_key not in self._active_chats:
+            self._ready.put_nowait(message.chat_key)
+        return True
+
+    def _expire_seen(self, now: float):
+        while self._seen:
+            seen_at = next(iter(self._seen.values()))
+            if now - seen_at < self.dedupe_ttl_seconds and len(self._seen) <= self.dedupe_max_entries:
+                break
+            self._seen.popitem(last=False)
+
+    async def _worker(self, index: int):
+        while True:
+            chat_key = await self._ready.get()
+            chat = self._chats.get(chat_key)
+            # Another worker owns this chat; it requeues the chat when done
+            if not chat or chat_key in self._active_chats:
+                continue
+
+            self._active_chats.add(chat_key)
+            message = chat.popleft()
+            try:
+                await self._process(message)
+            finally:
+                self._pending -= 1
+                self._active_chats.discard(chat_key)
+                if chat:
+                    # Next message of this chat goes to the back of the line
+                    self._ready.put_nowait(chat_key)
+                else:
+                    self._chats.pop(chat_key, None)
+
+    async def _process(self, message: InboundMessage):
+        handler = self._handlers.get(message.provider)
+        if handler is None:
+            logger.error(f"No handler registered for {message.provider} messages")
+            self._stats["failed"] += 1
+            return
+
+        try:
+            async with AsyncSessionLocal() as db:
+                await handler(message, db)
+            self._stats["processed"] += 1
+            logger.info(
+                f"Processed {message.provider} message {message.message_id} "
+                f"({time.time() - message.received_at:.1f}s after receipt)"
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._stats["failed"] += 1
+            logger.error(f"Error processing {message.provider} message {message.message_id}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "pending": self._pending,
+            "active_chats": len(self._active_chats),
+            "workers": len(self._workers)
+        }
+
+
+message_ingestion_service = MessageIngestionService(
+    max_workers=settings.MESSAGE_INGESTION_WORKERS,
+    max_pending=settings.MESSAGE_INGESTION_MAX_PENDING
+)
@@ -0,0 +1,188 @@
+"""
+Mongo Client Service
+
+Shared MongoDB clients for the MongoDB Advanced tool. A ``MongoClient`` owns
+a connection pool and monitoring threads, so it is created once per
+connection string and reused by every tool call, instead of once per
+operation. Clients not used for ``MONGO_CLIENT_IDLE_SECONDS`` are closed by
+a background loop started with the app, and all are closed at shutdown.
+
+Also holds the helpers the tool uses to read results: cursors are consumed
+batch by batch and cut off at a row limit or a byte budget, and inferred
+collection schemas are cached for a few minutes.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import json_util
+from pymongo import MongoClient
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PooledClient:
+    client: MongoClient
+    last_used: float
+    last_ping: float = 0.0
+
+
+class MongoClientPool:
+    """MongoClients shared by connection string and closed when idle."""
+
+    def __init__(self, idle_seconds: int = 600, interval_seconds: int = 60, ping_interval_seconds: int = 30):
+        self.idle_seconds = idle_seconds
+        self.interval_seconds = interval_seconds
+        self.ping_interval_seconds = ping_interval_seconds
+        self._clients: Dict[Tuple[str, int], _PooledClient] = {}
+        # Tool calls run in worker threads
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, connection_string: str, timeout_seconds: int = 30) -> MongoClient:
+        """The shared client for a connection string, created on first use."""
+        key = (connection_string, timeout_seconds)
+        now = time.monotonic()
+        with self._lock:
+            pooled = self._clients.get(key)
+            if pooled is None:
+                timeout_ms = timeout_seconds * 1000
+                client = MongoClient(
+                    connection_string,
+                    serverSelectionTimeoutMS=timeout_ms,
+                    socketTimeoutMS=timeout_ms,
+                    # Sockets idle this long are dropped by the driver's own pool
+                    maxIdleTimeMS=self.idle_seconds * 1000
+                )
+                pooled = self._clients[key] = _PooledClient(client, now)
+            pooled.last_used = now
+            return pooled.client
+
+    def ping(self, connection_string: str, timeout_seconds: int = 30):
+        """
+        Check the server is reachable. Skipped if the client was pinged recently.
+
+        Raises:
+            ConnectionFailure: the server could not be reached
+        """
+        client = self.get(connection_string, timeout_seconds)
+        with self._lock:
+            pooled = self._clients.get((connection_string, timeout_seconds))
+        if pooled is not None and time.monotonic() - pooled.last_ping < self.ping_interval_seconds:
+            return
+        client.admin.command('ping')
+        if pooled is not None:
+            pooled.last_ping = time.monotonic()
+
+    def close_idle(self) -> int:
+        """Close clients unused for longer than ``idle_seconds``. Returns how many were closed."""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [key for key, pooled in self._clients.items() if pooled.last_used < cutoff]
+            clients = [self._clients.pop(key).client for key in idle]
+        for client in clients:
+            client.close()
+        if clients:
+            logger.info(f"🧹 Closed {len(clients)} idle MongoDB clients")
+        return len(clients)
+
+    def start(self):
+        """Start the idle-close loop on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the idle-close loop and close every client."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        with self._lock:
+            clients = [pooled.client for pooled in self._clients.values()]
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await asyncio.to_thread(self.close_idle)
+            except Exception as e:
+                logger.error(f"MongoDB client reaper error: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'clients': len(self._clients), 'idle_seconds': self.idle_seconds}
+
+
+@dataclass
+class CursorResult:
+    documents: List[Dict[str, Any]] = field(default_factory=list)
+    result_bytes: int = 0
+    # None, 'rows' (result limit) or 'bytes' (byte budget)
+    truncated_by: Optional[str] = None
+
+
+def read_cursor(cursor: Iterable[Dict[str, Any]], max_results: int, max_bytes: int) -> CursorResult:
+    """
+    Documents from a cursor as JSON-ready dicts (Extended JSON for ObjectId,
+    dates and so on), stopping at ``max_results`` documents or ``max_bytes``
+    of JSON. The cursor is closed, so the server drops the rest of the result.
+    """
+    result = CursorResult()
+    try:
+        for document in cursor:
+            if len(result.documents) >= max_results:
+                result.truncated_by = 'rows'
+                break
+            encoded = json_util.dumps(document)
+            if result.result_bytes + len(encoded) > max_bytes and result.documents:
+                result.truncated_by = 'bytes'
+                break
+            result.documents.append(json.loads(encoded))
+            result.result_bytes += len(encoded)
+    finally:
+        close = getattr(cursor, 'close', None)
+        if close is not None:
+            close()
+    return result
+
+
+class MongoSchemaCache:
+    """Inferred collection schemas, kept for ``ttl_seconds``."""
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple[str, str, str], Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                return None
+            return entry[1]
+
+    def put(self, key: Tuple[str, str, str], schema: Dict[str, Any]):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop the entry closest to expiry
+                self._entries.pop(min(self._entries, key=lambda k: self._entries[k][0]))
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, schema)
+
+
+mongo_client_pool = MongoClientPool(settings.MONGO_CLIENT_IDLE_SECONDS)
+mongo_schema_cache = MongoSchemaCache(settings.MONGO_SCHEMA_CACHE_SECONDS)
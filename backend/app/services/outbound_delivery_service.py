@@ -0,0 +1,338 @@
+"""
+Outbound Delivery Service
+
+Sends agent replies to messaging providers (Telegram, WhatsApp, email).
+
+- Messages longer than a provider accepts are split into chunks at
+  paragraph, line, sentence or word boundaries. Telegram HTML is never cut
+  inside a tag or entity, and tags open at a cut are closed at the end of
+  the chunk and reopened at the start of the next.
+- Sends wait on token buckets (``app.core.rate_limit``) sized to each
+  provider's published limits, so bursts from busy chats are smoothed out
+  before they reach the provider instead of being answered with 429s.
+- HTTP providers share one pooled client; SMTP connections are kept open per
+  account and reused.
+- 429 responses are retried after the provider's ``Retry-After``; network
+  errors and 5xx responses are retried with exponential backoff.
+"""
+
+import asyncio
+import html
+import logging
+import random
+import re
+import smtplib
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+import httpx
+
+from app.core.rate_limit import RateLimitRule, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+# Room left in each HTML chunk for the tags closed and reopened around a cut
+TELEGRAM_HTML_TAG_RESERVE = 256
+WHATSAPP_MAX_MESSAGE_LENGTH = 4096
+
+# Provider limits: Telegram allows ~30 messages/s per bot, about one per
+# second per chat and 20 per minute per group; WhatsApp Cloud API allows 80
+# messages/s per business number and short bursts to one recipient.
+TELEGRAM_BOT_RULE = RateLimitRule("outbound:telegram:bot", 30, 1)
+TELEGRAM_CHAT_RULE = RateLimitRule("outbound:telegram:chat", 3, 3)
+TELEGRAM_GROUP_RULE = RateLimitRule("outbound:telegram:group", 20, 60)
+WHATSAPP_NUMBER_RULE = RateLimitRule("outbound:whatsapp:number", 80, 1)
+WHATSAPP_RECIPIENT_RULE = RateLimitRule("outbound:whatsapp:recipient", 10, 60)
+EMAIL_ACCOUNT_RULE = RateLimitRule("outbound:email:account", 20, 60)
+
+_BOUNDARIES = [re.compile(r"\n\s*\n"), re.compile(r"\n"), re.compile(r"(?<=[.!?])\s+"), re.compile(r"\s+")]
+
+
+_HTML_TOKEN = re.compile(r"<[^<>]*>|&#?\w+;")
+_HTML_TAG = re.compile(r"<(/?)([a-zA-Z][\w-]*)[^<>]*>")
+
+
+def split_message(text: str, limit: int, atomic: Optional[Pattern] = None) -> List[str]:
+    """
+    Split text into chunks of at most ``limit`` characters at the most natural
+    boundary. Matches of ``atomic`` (e.g. markup) are never cut.
+    """
+    text = text.strip()
+    chunks = []
+    while len(text) > limit:
+        window = text[:limit + 1]
+        spans = [match.span() for match in atomic.finditer(text) if match.start() <= limit] if atomic else []
+        cut = None
+        for boundary in _BOUNDARIES:
+            matches = [
+                match for match in boundary.finditer(window)
+                if match.start() > limit // 2 and not any(start < match.start() < end for start, end in spans)
+            ]
+            if matches:
+                cut = matches[-1]
+                break
+        if cut is None:
+            position = limit
+            for start, end in spans:
+                if start < position < end and start > 0:
+                    position = start
+            chunks.append(text[:position])
+            text = text[position:].lstrip()
+        else:
+            chunks.append(text[:cut.start()].rstrip())
+            text = text[cut.end():]
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+def split_html_message(text: str, limit: int) -> List[Tuple[str, bool]]:
+    """
+    Split Telegram HTML into ``(chunk, is_html)`` pairs of at most ``limit``
+    characters. Tags open at a cut are closed at the end of the chunk and
+    reopened at the start of the next; a chunk that would still be too long
+    with them is sent as plain text instead.
+    """
+    chunks = []
+    # (tag name, opening tag) of the tags open at the current position
+    open_tags: List[Tuple[str, str]] = []
+    for piece in split_message(text, limit - TELEGRAM_HTML_TAG_RESERVE, atomic=_HTML_TOKEN):
+        reopened = "".join(tag for _, tag in open_tags)
+        for match in _HTML_TAG.finditer(piece):
+            name = match.group(2).lower()
+            if not match.group(1):
+                open_tags.append((name, match.group(0)))
+                continue
+            for index in range(len(open_tags) - 1, -1, -1):
+                if open_tags[index][0] == name:
+                    del open_tags[index]
+                    break
+        chunk = reopened + piece + "".join(f"</{name}>" for name, _ in reversed(open_tags))
+        if len(chunk) <= limit:
+            chunks.append((chunk, True))
+        else:
+            chunks.append((html.unescape(_HTML_TAG.sub("", piece)), False))
+    return chunks
+
+
+class _RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class OutboundDeliveryService:
+    """Rate-limited, chunking, retrying sender shared by the messaging integrations."""
+
+    def __init__(self, max_attempts: int = 4, max_retry_after: float = 60.0):
+        self.max_attempts = max_attempts
+        self.max_retry_after = max_retry_after
+        self._client: Optional[httpx.AsyncClient] = None
+        # (server, port, username) -> (smtp connection, lock)
+        self._smtp: Dict[Tuple[str, int, str], Tuple[Optional[smtplib.SMTP], asyncio.Lock]] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(15.0),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+            )
+        return self._client
+
+    def _stat(self, provider: str, name: str, amount: float = 1):
+        stats = self._stats.setdefault(provider, {
+            "messages": 0, "chunks": 0, "delivered": 0, "failed": 0,
+            "retries": 0, "rate_limited": 0, "throttled_seconds": 0.0
+        })
+        stats[name] += amount
+
+    async def send_telegram(self, bot_token: str, chat_id: int, text: str, parse_mode: Optional[str] = "HTML") -> bool:
+        """Send a Telegram message, split into several if needed. Returns True if every chunk was delivered."""
+        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+        bot_id = bot_token.split(":", 1)[0]
+        # Negative chat ids are groups and channels
+        checks = [(TELEGRAM_BOT_RULE, bot_id), (TELEGRAM_CHAT_RULE, f"{bot_id}:{chat_id}")]
+        if int(chat_id) < 0:
+            checks.append((TELEGRAM_GROUP_RULE, f"{bot_id}:{chat_id}"))
+
+        if parse_mode == "HTML":
+            chunks = split_html_message(text, TELEGRAM_MAX_MESSAGE_LENGTH)
+        else:
+            # Markdown entities are not tracked across chunks; only a single chunk keeps them
+            pieces = split_message(text, TELEGRAM_MAX_MESSAGE_LENGTH)
+            chunks = [(piece, len(pieces) == 1) for piece in pieces]
+
+        payloads = []
+        for chunk, formatted in chunks:
+            payload = {"chat_id": chat_id, "text": chunk}
+            if parse_mode and formatted:
+                payload["parse_mode"] = parse_mode
+            payloads.append(payload)
+        return await self._deliver("telegram", url, payloads, checks)
+
+    async def send_whatsapp(self, phone_number_id: str, to: str, text: str, access_token: str, api_url: str = "https://graph.facebook.com/v18.0") -> bool:
+        """Send a WhatsApp text message, split into several if needed. Returns True if every chunk was delivered."""
+        url = f"{api_url}/{phone_number_id}/messages"
+        checks = [(WHATSAPP_NUMBER_RULE, phone_number_id), (WHATSAPP_RECIPIENT_RULE, f"{phone_number_id}:{to}")]
+        payloads = [
+            {"messaging_product": "whatsapp", "to": to, "text": {"body": chunk}}
+            for chunk in split_message(text, WHATSAPP_MAX_MESSAGE_LENGTH)
+        ]
+        headers = {"Authorization": f"Bearer {access_token}"}
+        return await self._deliver("whatsapp", url, payloads, checks, headers)
+
+    async def _deliver(
+        self,
+        provider: str,
+        url: str,
+        payloads: List[Dict[str, Any]],
+        checks: List[Tuple[RateLimitRule, Optional[str]]],
+        headers: Optional[Dict[str, str]] = None
+    ) -> bool:
+        self._stat(provider, "messages")
+        for payload in payloads:
+            self._stat(provider, "chunks")
+            waited = await rate_limiter.acquire(checks)
+            self._stat(provider, "throttled_seconds", waited)
+            try:
+                await self._with_retries(provider, lambda: self._post(url, payload, headers))
+            except Exception as e:
+                self._stat(provider, "failed")
+                logger.error(f"{provider} delivery failed: {e}")
+                # Later chunks would read out of context without this one
+                return False
+        self._stat(provider, "delivered")
+        return True
+
+    async def _post(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]]):
+        try:
+            response = await self._get_client().post(url, json=payload, headers=headers)
+        except httpx.TransportError as e:
+            raise _RetryableError(f"network error: {e}")
+
+        if response.status_code == 429:
+            raise _RetryableError("rate limited by provider", self._retry_after(response))
+        if response.status_code >= 500:
+            raise _RetryableError(f"provider error {response.status_code}")
+        if response.status_code >= 400:
+            raise RuntimeError(f"provider rejected message ({response.status_code}): {response.text[:200]}")
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> Optional[float]:
+        header = response.headers.get("retry-after")
+        if header:
+            try:
+                return float(header)
+            except ValueError:
+                pass
+        try:
+            # Telegram reports it in the body
+            return float(response.json()["parameters"]["retry_after"])
+        except Exception:
+            return None
+
+    async def _with_retries(self, provider: str, attempt):
+        for attempt_number in range(1, self.max_attempts + 1):
+            try:
+                return await attempt()
+            except _RetryableError as e:
+                if attempt_number == self.max_attempts:
+                    raise
+                if e.retry_after is not None:
+                    self._stat(provider, "rate_limited")
+                    delay = min(e.retry_after, self.max_retry_after)
+                else:
+                    delay = min(self.max_retry_after, 2 ** attempt_number) * random.uniform(0.5, 1.0)
+                self._stat(provider, "retries")
+                logger.warning(f"{provider} delivery retry {attempt_number} in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+
+    async def send_email(
+        self,
+        smtp_server: str,
+        smtp_port: int,
+        username: str,
+        password: str,
+        from_email: str,
+        to_email: str,
+        subject: str,
+        body: str
+    ) -> bool:
+        """Send a plain-text email over a reused SMTP connection. Returns True on delivery."""
+        msg = MIMEMultipart()
+        msg['From'] = from_email
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+
+        key = (smtp_server, int(smtp_port), username)
+        self._stat("email", "messages")
+        self._stat("email", "chunks")
+        self._stat("email", "throttled_seconds", await rate_limiter.acquire([(EMAIL_ACCOUNT_RULE, f"{smtp_server}:{username}")]))
+
+        if key not in self._smtp:
+            self._smtp[key] = (None, asyncio.Lock())
+        _, lock = self._smtp[key]
+
+        # smtplib blocks and is not thread-safe: one send per account at a time, off the event loop
+        async with lock:
+            def send():
+                connection, _ = self._smtp[key]
+                for attempt in range(2):
+                    if connection is None:
+                        connection = smtplib.SMTP(smtp_server, smtp_port, timeout=30)
+                        connection.starttls()
+                        connection.login(username, password)
+                        self._smtp[key] = (connection, lock)
+                    try:
+                        connection.send_message(msg)
+                        return
+                    except (smtplib.SMTPServerDisconnected, ConnectionError):
+                        # Idle connection was closed by the server; reconnect once
+                        self._smtp[key] = (None, lock)
+                        connection = None
+                        if attempt:
+                            raise
+
+            try:
+                await self._with_retries("email", lambda: self._run_smtp(send))
+            except Exception as e:
+                self._stat("email", "failed")
+                logger.error(f"email delivery failed: {e}")
+                return False
+        self._stat("email", "delivered")
+        return True
+
+    @staticmethod
+    async def _run_smtp(send):
+        try:
+            await asyncio.to_thread(send)
+        except (smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError) as e:
+            raise _RetryableError(f"SMTP connection error: {e}")
+        except smtplib.SMTPResponseException as e:
+            # 4xx replies are temporary by definition
+            if 400 <= e.smtp_code < 500:
+                raise _RetryableError(f"SMTP temporary failure {e.smtp_code}")
+            raise
+
+    async def close(self):
+        """Close pooled HTTP and SMTP connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        for key, (connection, lock) in list(self._smtp.items()):
+            if connection is not None:
+                try:
+                    await asyncio.to_thread(connection.quit)
+                except Exception:
+                    pass
+        self._smtp.clear()
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        return {provider: dict(stats) for provider, stats in self._stats.items()}
+
+
+outbound_delivery_service = OutboundDeliveryService()
@@ -0,0 +1,334 @@
+"""
+PDF Processing Service
+
+Page-level engine behind the PDF Processor tool. Documents are split into
+ranges of consecutive pages that worker processes open and walk on their
+own (PyMuPDF documents cannot be shared between processes), and page
+results are yielded in page order as soon as their range is done, so large
+documents neither block the event loop nor sit in memory whole:
+
+- plain page text is cached in a small SQLite file keyed by the SHA-256 of
+  the file's content, so asking about the same PDF again (or a copy of it
+  under another name) reads the text from the cache instead of re-extracting
+  it; a full analysis fills the cache as a side effect;
+- merges hand PyPDF2 readers over open files to a ``PdfWriter`` that writes
+  straight to the output file, instead of first copying every input into
+  memory.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PAGE_KINDS = ('text', 'text_coordinates', 'analyze', 'images')
+PAGES_PER_TASK = 16
+# Ranges queued per worker, enough to keep every worker busy
+QUEUED_PER_WORKER = 2
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def _page_result(doc, page_num: int, kind: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    import fitz  # PyMuPDF
+
+    page = doc[page_num]
+    if kind == 'text':
+        return {'page': page_num + 1, 'content': page.get_text()}
+
+    if kind == 'text_coordinates':
+        spans = []
+        for block in page.get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                for span in line["spans"]:
+                    spans.append({'text': span['text'], 'bbox': span['bbox'], 'font': span['font'], 'size': span['size']})
+        return {'page': page_num + 1, 'content': spans}
+
+    if kind == 'analyze':
+        text = page.get_text()
+        return {
+            'page_number': page_num + 1,
+            'width': page.rect.width,
+            'height': page.rect.height,
+            'text_length': len(text),
+            'word_count': len(text.split()),
+            'image_count': len(page.get_images()),
+            'rotation': page.rotation,
+            # Not part of the analysis; lets the caller fill the text cache
+            'text': text
+        }
+
+    if kind == 'images':
+        output_dir = options.get('output_dir')
+        images = []
+        for img_index, img in enumerate(page.get_images()):
+            try:
+                pix = fitz.Pixmap(doc, img[0])
+                if pix.n - pix.alpha >= 4:
+                    # CMYK: convert to RGB first
+                    pix = fitz.Pixmap(fitz.csRGB, pix)
+                img_data = pix.tobytes("png")
+                image_filename = None
+                if output_dir:
+                    image_filename = f"page_{page_num + 1}_image_{img_index + 1}.png"
+                    with open(os.path.join(output_dir, image_filename), "wb") as img_file:
+                        img_file.write(img_data)
+                images.append({
+                    'page': page_num + 1,
+                    'image_index': img_index + 1,
+                    'width': pix.width,
+                    'height': pix.height,
+                    'colorspace': pix.colorspace.name,
+                    'size_bytes': len(img_data),
+                    'filename': image_filename
+                })
+            except Exception as e:
+                logger.warning(f"Failed to extract image {img_index} from page {page_num}: {str(e)}")
+        return {'page': page_num + 1, 'images': images}
+
+    raise ValueError(f"Unknown page operation: {kind}")
+
+
+def process_page_range(file_path: str, page_numbers: List[int], kind: str, options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Results of ``kind`` for the given (0-based) pages of a PDF.
+
+    Runs in worker processes, so it only takes and returns plain data.
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(file_path) as doc:
+        return [_page_result(doc, page_num, kind, options) for page_num in page_numbers]
+
+
+def page_count(file_path: str) -> int:
+    import fitz  # PyMuPDF
+
+    with fitz.open(file_path) as doc:
+        return len(doc)
+
+
+def merge_pdf_files(input_files: List[str], output_path: str) -> int:
+    """
+    Merge PDFs into ``output_path``, keeping their outlines. Inputs are read
+    from their open files as the writer needs them. Returns the page count.
+    """
+    from PyPDF2 import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    with ExitStack() as stack:
+        for file_path in input_files:
+            # A reader (unlike a path) is used as is, without a copy in memory
+            writer.append(PdfReader(stack.enter_context(open(file_path, 'rb'))))
+        with open(output_path, 'wb') as output_file:
+            writer.write(output_file)
+        return len(writer.pages)
+
+
+def _page_ranges(page_numbers: List[int], size: int) -> List[List[int]]:
+    """Runs of consecutive pages, at most ``size`` long."""
+    ranges: List[List[int]] = []
+    for page_num in page_numbers:
+        if ranges and page_num == ranges[-1][-1] + 1 and len(ranges[-1]) < size:
+            ranges[-1].append(page_num)
+        else:
+            ranges.append([page_num])
+    return ranges
+
+
+class PageTextCache:
+    """Plain text of PDF pages by content hash, persisted to SQLite."""
+
+    def __init__(self, db_path: str, max_documents: int = 500):
+        self.db_path = db_path
+        self.max_documents = max_documents
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pdf_documents (digest TEXT PRIMARY KEY, used_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pdf_page_text ("
+                "digest TEXT NOT NULL, page INTEGER NOT NULL, text TEXT NOT NULL, PRIMARY KEY (digest, page))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, digest: str, page_numbers: List[int]) -> Dict[int, str]:
+        """Cached text of the given pages (those not cached are left out)."""
+        with self._lock:
+            try:
+                conn = self._connection()
+                rows = conn.execute("SELECT page, text FROM pdf_page_text WHERE digest = ?", (digest,)).fetchall()
+                if rows:
+                    conn.execute("UPDATE pdf_documents SET used_at = ? WHERE digest = ?", (time.time(), digest))
+                    conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"PDF text cache read failed: {e}")
+                return {}
+        wanted = set(page_numbers)
+        return {page: text for page, text in rows if page in wanted}
+
+    def put(self, digest: str, pages: Dict[int, str]):
+        if not pages:
+            return
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.execute("INSERT OR REPLACE INTO pdf_documents (digest, used_at) VALUES (?, ?)", (digest, time.time()))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO pdf_page_text (digest, page, text) VALUES (?, ?, ?)",
+                    [(digest, page, text) for page, text in pages.items()]
+                )
+                # Keep the most recently used documents only
+                stale = [row[0] for row in conn.execute(
+                    "SELECT digest FROM pdf_documents ORDER BY used_at DESC LIMIT -1 OFFSET ?", (self.max_documents,)
+                )]
+                for stale_digest in stale:
+                    conn.execute("DELETE FROM pdf_page_text WHERE digest = ?", (stale_digest,))
+                    conn.execute("DELETE FROM pdf_documents WHERE digest = ?", (stale_digest,))
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"PDF text cache write failed: {e}")
+
+
+class PDFProcessingService:
+    """Page-range worker pool, page text cache and streaming merges for PDFs."""
+
+    def __init__(self, cache_dir: str, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.text_cache = PageTextCache(os.path.join(cache_dir, "page_text.sqlite3"))
+        self._executor: Optional[Executor] = None
+        # (path, size, mtime) -> content hash, so unchanged files are hashed once
+        self._digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._digest_lock = threading.Lock()
+        self._stats = {'cached_pages': 0, 'extracted_pages': 0}
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            try:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            except (OSError, NotImplementedError, PermissionError) as e:
+                # Some sandboxes forbid subprocesses; PyMuPDF is not thread-safe, so one thread only
+                logger.warning(f"Process pool unavailable ({e}), using a thread for PDF processing")
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            logger.info(f"📄 PDF processing pool started ({self.max_workers} workers)")
+        return self._executor
+
+    def file_digest(self, file_path: str) -> str:
+        """SHA-256 of a file's content, recomputed only when its size or mtime changes."""
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._digest_lock:
+            digest = self._digests.get(key)
+            if digest is not None:
+                self._digests.move_to_end(key)
+                return digest
+
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_BYTES), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with self._digest_lock:
+            self._digests[key] = digest
+            while len(self._digests) > 1024:
+                self._digests.popitem(last=False)
+        return digest
+
+    async def page_count(self, file_path: str) -> int:
+        return await asyncio.to_thread(page_count, file_path)
+
+    async def iter_pages(
+        self,
+        file_path: str,
+        kind: str,
+        page_numbers: List[int],
+        options: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield the result of ``kind`` for each (0-based) page, in page order.
+        Plain text comes from the cache when the file was seen before.
+        """
+        if kind not in PAGE_KINDS:
+            raise ValueError(f"Unknown page operation: {kind}")
+        options = options or {}
+
+        digest = None
+        cached: Dict[int, str] = {}
+        if kind in ('text', 'analyze'):
+            digest = await asyncio.to_thread(self.file_digest, file_path)
+        if kind == 'text':
+            cached = await asyncio.to_thread(self.text_cache.get, digest, page_numbers)
+            self._stats['cached_pages'] += len(cached)
+
+        missing = [page_num for page_num in page_numbers if page_num not in cached]
+        ranges = _page_ranges(missing, PAGES_PER_TASK)
+        self._stats['extracted_pages'] += len(missing)
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        queued: "OrderedDict[int, asyncio.Future]" = OrderedDict()
+        next_range = 0
+
+        def submit_ranges():
+            nonlocal next_range
+            while next_range < len(ranges) and len(queued) < self.max_workers * QUEUED_PER_WORKER:
+                queued[next_range] = loop.run_in_executor(
+                    executor, process_page_range, file_path, ranges[next_range], kind, options
+                )
+                next_range += 1
+
+        try:
+            submit_ranges()
+            extracted: Dict[int, Dict[str, Any]] = {}
+            for page_num in page_numbers:
+                if page_num in cached:
+                    yield {'page': page_num + 1, 'content': cached[page_num]}
+                    continue
+                while page_num not in extracted:
+                    # Ranges are submitted in page order, so the oldest one holds this page
+                    index, future = next(iter(queued.items()))
+                    results = await future
+                    del queued[index]
+                    submit_ranges()
+                    for page_range_num, result in zip(ranges[index], results):
+                        extracted[page_range_num] = result
+                    if digest is not None:
+                        texts = {num: result.get('content', result.get('text', ''))
+                                 for num, result in zip(ranges[index], results)}
+                        await asyncio.to_thread(self.text_cache.put, digest, texts)
+                yield extracted.pop(page_num)
+        finally:
+            for future in queued.values():
+                future.cancel()
+
+    async def merge(self, input_files: List[str], output_path: str) -> int:
+        """Merge PDFs off the event loop; see ``merge_pdf_files``."""
+        return await asyncio.to_thread(merge_pdf_files, input_files, output_path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self._stats, workers=self.max_workers)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pdf_processing_service = PDFProcessingService(settings.PDF_TEXT_CACHE_DIR, settings.PDF_PROCESSING_WORKERS or None)
@@ -0,0 +1,237 @@
+"""
+Query Engine Service
+
+Async SQLAlchemy engines for the Database Query tool. Tool instances are
+created per call, so engines (and their connection pools) live here, one
+per database URL, instead of being built in the tool's constructor:
+
+- connection strings are mapped to async drivers (aiosqlite, asyncpg,
+  aiomysql) and engines are cached by URL, least recently used first out;
+- SELECT results are streamed through a server-side cursor and converted
+  with ``RowMapping``, and reading stops once the row limit or the byte
+  budget of the result is reached, so large tables are never fetched whole;
+- statements are cancelled by the database after the tool's timeout
+  (PostgreSQL ``statement_timeout``, MySQL ``MAX_EXECUTION_TIME``, SQLite
+  interrupts), with a client-side timeout as a backstop.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql'
+}
+
+FETCH_BATCH_ROWS = 500
+# The database's own timeout should fire first; this only catches a stuck connection
+CLIENT_TIMEOUT_GRACE_SECONDS = 5
+
+
+def async_database_url(db_type: str, connection_string: str) -> str:
+    """The SQLAlchemy URL of a tool's database, with an async driver."""
+    if db_type == 'sqlite':
+        # Tool configs give SQLite a file path (in-memory when empty)
+        return f"{ASYNC_DRIVERS['sqlite']}:///{connection_string or ':memory:'}"
+    if db_type not in ('postgresql', 'mysql'):
+        raise ValueError(f"Unsupported database type: {db_type}")
+
+    url = make_url(connection_string)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"Unsupported database URL for {db_type}: {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def jsonable(value: Any) -> Any:
+    """A column value as something JSON can carry."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode()
+    return value
+
+
+@dataclass
+class QueryResult:
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+    columns: List[str] = field(default_factory=list)
+    result_bytes: int = 0
+    # None, 'rows' (row limit) or 'bytes' (byte budget)
+    truncated_by: Optional[str] = None
+
+    @property
+    def truncated(self) -> bool:
+        return self.truncated_by is not None
+
+
+class QueryEngineService:
+    """Cached async engines and streaming query execution."""
+
+    def __init__(self, max_engines: int = 16, pool_size: int = 5, max_overflow: int = 5, pool_recycle: int = 1800):
+        self.max_engines = max_engines
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_recycle = pool_recycle
+        self._engines: "OrderedDict[str, AsyncEngine]" = OrderedDict()
+
+    def get_engine(self, db_type: str, connection_string: str) -> AsyncEngine:
+        """The shared engine for a database, created on first use."""
+        url = async_database_url(db_type, connection_string)
+        engine = self._engines.get(url)
+        if engine is not None:
+            self._engines.move_to_end(url)
+            return engine
+
+        if db_type == 'sqlite':
+            engine = create_async_engine(url)
+        else:
+            engine = create_async_engine(
+                url,
+                pool_size=self.pool_size,
+                max_overflow=self.max_overflow,
+                pool_recycle=self.pool_recycle,
+                pool_pre_ping=True
+            )
+        self._engines[url] = engine
+        while len(self._engines) > self.max_engines:
+            _, evicted = self._engines.popitem(last=False)
+            asyncio.ensure_future(evicted.dispose())
+        return engine
+
+    async def _statement_timeout(self, connection: AsyncConnection, timeout: float) -> Optional[asyncio.TimerHandle]:
+        """
+        Make the database give up on statements after ``timeout`` seconds.
+        SQLite has no such setting, so its query is interrupted from a timer
+        instead; the returned handle must be cancelled once the statement is done.
+        """
+        milliseconds = int(timeout * 1000)
+        dialect = connection.dialect.name
+        if dialect == 'postgresql':
+            # Scoped to the current transaction, so it never leaks to the pooled connection
+            await connection.execute(text(f"SET LOCAL statement_timeout = {milliseconds}"))
+        elif dialect == 'mysql':
+            # Applies to SELECT statements only; set on every use of the connection
+            await connection.execute(text(f"SET SESSION MAX_EXECUTION_TIME = {milliseconds}"))
+        elif dialect == 'sqlite':
+            driver_connection = (await connection.get_raw_connection()).driver_connection
+            return asyncio.get_running_loop().call_later(
+                timeout, lambda: asyncio.ensure_future(driver_connection.interrupt())
+            )
+        return None
+
+    async def select(
+        self,
+        engine: AsyncEngine,
+        query: str,
+        params: Optional[Dict[str, Any]],
+        max_rows: int,
+        max_bytes: int,
+        timeout: float
+    ) -> QueryResult:
+        """
+        Run a SELECT and return up to ``max_rows`` rows whose JSON size
+        stays within ``max_bytes``. Statements running longer than
+        ``timeout`` seconds are cancelled by the database.
+
+        Raises:
+            asyncio.TimeoutError: the database did not stop the statement in time
+        """
+        return await asyncio.wait_for(
+            self._select(engine, query, params, max_rows, max_bytes, timeout),
+            timeout + CLIENT_TIMEOUT_GRACE_SECONDS
+        )
+
+    async def _select(self, engine, query, params, max_rows, max_bytes, timeout) -> QueryResult:
+        result = QueryResult()
+        async with engine.connect() as connection:
+            timer = await self._statement_timeout(connection, timeout)
+            stream = None
+            try:
+                stream = await connection.stream(text(query), params or {})
+                result.columns = list(stream.keys())
+                async for batch in stream.mappings().partitions(FETCH_BATCH_ROWS):
+                    for mapping in batch:
+                        if len(result.rows) >= max_rows:
+                            result.truncated_by = 'rows'
+                            break
+                        row = {key: jsonable(value) for key, value in mapping.items()}
+                        size = len(json.dumps(row, default=str))
+                        if result.result_bytes + size > max_bytes and result.rows:
+                            result.truncated_by = 'bytes'
+                            break
+                        result.rows.append(row)
+                        result.result_bytes += size
+                    if result.truncated:
+                        break
+            finally:
+                # Stops the cursor without reading the rest of the result
+                if stream is not None:
+                    await stream.close()
+                if timer:
+                    timer.cancel()
+            await connection.rollback()
+        return result
+
+    async def execute(self, engine: AsyncEngine, query: str, params: Optional[Dict[str, Any]], timeout: float) -> int:
+        """Run an INSERT, UPDATE or DELETE in its own transaction. Returns the affected row count."""
+        async def run() -> int:
+            async with engine.begin() as connection:
+                timer = await self._statement_timeout(connection, timeout)
+                try:
+                    result = await connection.execute(text(query), params or {})
+                finally:
+                    if timer:
+                        timer.cancel()
+                return result.rowcount
+
+        return await asyncio.wait_for(run(), timeout + CLIENT_TIMEOUT_GRACE_SECONDS)
+
+    async def table_info(self, engine: AsyncEngine, table_name: Optional[str] = None) -> Any:
+        """Columns, indexes and foreign keys of a table, or every table with its column count."""
+        def inspect_sync(sync_connection):
+            inspector = inspect(sync_connection)
+            if table_name:
+                columns = [{**column, 'type': str(column['type'])} for column in inspector.get_columns(table_name)]
+                return {
+                    'name': table_name,
+                    'columns': columns,
+                    'indexes': inspector.get_indexes(table_name),
+                    'foreign_keys': inspector.get_foreign_keys(table_name)
+                }
+            return [
+                {'name': table, 'column_count': len(inspector.get_columns(table))}
+                for table in inspector.get_table_names()
+            ]
+
+        async with engine.connect() as connection:
+            return await connection.run_sync(inspect_sync)
+
+    async def close(self):
+        engines = list(self._engines.values())
+        self._engines.clear()
+        for engine in engines:
+            await engine.dispose()
+
+
+query_engine_service = QueryEngineService()
@@ -0,0 +1,268 @@
+"""
+Response Cache Service
+
+Opt-in cache of agent answers for FAQ-style agents. An agent enables it in
+its context config:
+
+    "response_cache": {
+        "enabled": true,
+        "ttl_seconds": 86400,
+        "similarity_threshold": 0.92,
+        "cacheable_tools": ["website_knowledge_base"]
+    }
+
+Only first turns (no conversation history) are cached, and only answers that
+used no tools besides ``cacheable_tools``. Answers are kept per context, the
+framing the model saw besides the question (e.g. the widget's site). Lookups
+match the normalized question exactly, then the most similar cached question
+of the same context above the threshold,
+using the same sentence embeddings as knowledge base retrieval (or hashed
+word vectors where those are unavailable).
+
+Entries belong to an agent version (its ``updated_at``) and are dropped when
+the agent or any knowledge base of its owner changes.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import event, select
+
+from app.core.database import Agent, KnowledgeBaseCollection, KnowledgeBaseDocument
+from app.services.knowledge_retrieval_service import tokenize
+from app.services.retrieval_cache_service import retrieval_cache_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 86400
+DEFAULT_SIMILARITY_THRESHOLD = 0.92
+DEFAULT_CACHEABLE_TOOLS = ("website_knowledge_base",)
+HASHED_VECTOR_DIMENSIONS = 1024
+REPLAY_CHUNK_CHARACTERS = 24
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+
+
+def normalize_question(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a question."""
+    return " ".join(_PUNCTUATION.sub(" ", text.lower()).split())
+
+
+def _hashed_vector(text: str) -> List[float]:
+    """Unit-length bag of words and word pairs, for when embeddings are unavailable."""
+    tokens = tokenize(text)
+    features = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+    vector = np.zeros(HASHED_VECTOR_DIMENSIONS, dtype=np.float32)
+    for feature in features:
+        digest = hashlib.md5(feature.encode()).digest()
+        vector[int.from_bytes(digest[:4], "little") % HASHED_VECTOR_DIMENSIONS] += 1.0
+    return vector.tolist()
+
+
+@dataclass
+class ResponseCacheConfig:
+    ttl_seconds: int = DEFAULT_TTL_SECONDS
+    similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD
+    cacheable_tools: tuple = DEFAULT_CACHEABLE_TOOLS
+
+    @classmethod
+    def for_agent(cls, agent: Agent) -> Optional["ResponseCacheConfig"]:
+        """The agent's cache settings, or None if it has not opted in."""
+        options = (agent.context_config or {}).get("response_cache") or {}
+        if not options.get("enabled"):
+            return None
+        return cls(
+            ttl_seconds=int(options.get("ttl_seconds", DEFAULT_TTL_SECONDS)),
+            similarity_threshold=float(options.get("similarity_threshold", DEFAULT_SIMILARITY_THRESHOLD)),
+            cacheable_tools=tuple(options.get("cacheable_tools", DEFAULT_CACHEABLE_TOOLS))
+        )
+
+
+@dataclass
+class CachedResponse:
+    question: str
+    response: str
+    tools_used: List[str]
+    vector: np.ndarray
+    context: str = ""
+    stored_at: float = field(default_factory=time.monotonic)
+
+
+class _AgentResponses:
+    """Cached answers of one agent version."""
+
+    def __init__(self, version: str, owner_id: Optional[int]):
+        self.version = version
+        self.owner_id = owner_id
+        # (context, normalized question) -> answer
+        self.entries: "OrderedDict[Tuple[str, str], CachedResponse]" = OrderedDict()
+
+
+class ResponseCacheService:
+    """Per-agent exact and near-duplicate question cache."""
+
+    def __init__(self, max_entries_per_agent: int = 500, max_agents: int = 1000):
+        self.max_entries_per_agent = max_entries_per_agent
+        self.max_agents = max_agents
+        self._agents: "OrderedDict[int, _AgentResponses]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._embeddings_available = True
+        self._stats = {"hits": 0, "similar_hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    @staticmethod
+    def agent_version(agent: Agent) -> str:
+        return f"{agent.updated_at.isoformat() if agent.updated_at else ''}:{agent.model or ''}"
+
+    async def _vector(self, normalized: str) -> np.ndarray:
+        vector = None
+        if self._embeddings_available:
+            try:
+                # Shares the query embedding cache with knowledge base retrieval
+                vector = await asyncio.to_thread(
+                    retrieval_cache_service.get_query_embedding, "response_cache", normalized
+                )
+            except Exception as e:
+                logger.warning(f"Sentence embeddings unavailable for the response cache, using word vectors: {e}")
+                self._embeddings_available = False
+        if vector is None:
+            vector = _hashed_vector(normalized)
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def lookup(self, agent: Agent, question: str, config: ResponseCacheConfig, context: str = "") -> Optional[CachedResponse]:
+        """The cached answer to ``question`` or a near-duplicate of it, asked in the same ``context``."""
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        now = time.monotonic()
+        version = self.agent_version(agent)
+
+        with self._lock:
+            responses = self._agents.get(agent.id)
+            if responses is None or responses.version != version:
+                self._stats["misses"] += 1
+                return None
+            self._agents.move_to_end(agent.id)
+            exact = responses.entries.get((context, normalized))
+            if exact is not None and now - exact.stored_at <= config.ttl_seconds:
+                responses.entries.move_to_end((context, normalized))
+                self._stats["hits"] += 1
+                return exact
+            candidates = [
+                entry for entry in responses.entries.values()
+                if entry.context == context and now - entry.stored_at <= config.ttl_seconds
+            ]
+
+        if not candidates:
+            self._stats["misses"] += 1
+            return None
+
+        vector = await self._vector(normalized)
+        # Entries embedded before a fallback to word vectors cannot be compared
+        candidates = [entry for entry in candidates if entry.vector.shape == vector.shape]
+        if not candidates:
+            self._stats["misses"] += 1
+            return None
+        similarities = np.stack([entry.vector for entry in candidates]) @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] >= config.similarity_threshold:
+            self._stats["similar_hits"] += 1
+            return candidates[best]
+        self._stats["misses"] += 1
+        return None
+
+    def is_cacheable(self, tools_used: List[str], config: ResponseCacheConfig) -> bool:
+        return all(tool in config.cacheable_tools for tool in tools_used)
+
+    async def store(self, agent: Agent, question: str, response: str, tools_used: List[str], context: str = ""):
+        """Remember an answer to a first-turn question."""
+        normalized = normalize_question(question)
+        if not normalized or not response:
+            return
+        vector = await self._vector(normalized)
+        version = self.agent_version(agent)
+
+        with self._lock:
+            responses = self._agents.get(agent.id)
+            if responses is None or responses.version != version:
+                responses = _AgentResponses(version, agent.user_id)
+                self._agents[agent.id] = responses
+            self._agents.move_to_end(agent.id)
+            responses.entries[(context, normalized)] = CachedResponse(question, response, list(tools_used), vector, context)
+            responses.entries.move_to_end((context, normalized))
+            while len(responses.entries) > self.max_entries_per_agent:
+                responses.entries.popitem(last=False)
+            while len(self._agents) > self.max_agents:
+                self._agents.popitem(last=False)
+            self._stats["stores"] += 1
+
+    async def replay(self, cached: CachedResponse) -> AsyncGenerator[Dict[str, Any], None]:
+        """Stream a cached answer in the same event shape as a model turn."""
+        response = cached.response
+        for start in range(0, len(response), REPLAY_CHUNK_CHARACTERS):
+            yield {"type": "content", "content": response[start:start + REPLAY_CHUNK_CHARACTERS]}
+            # Let other requests run between chunks of long answers
+            await asyncio.sleep(0)
+        # Tools are not run again, so none are reported (or billed) for a replay
+        yield {"type": "complete", "content": response, "tools_used": [], "cached": True}
+
+    def invalidate_agent(self, agent_id: int):
+        with self._lock:
+            if self._agents.pop(agent_id, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def invalidate_owner(self, user_id: int):
+        """Drop answers of every agent whose owner's knowledge bases changed."""
+        with self._lock:
+            for agent_id in [agent_id for agent_id, responses in self._agents.items() if responses.owner_id == user_id]:
+                del self._agents[agent_id]
+                self._stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = sum(len(responses.entries) for responses in self._agents.values())
+            return {**self._stats, "agents": len(self._agents), "entries": entries}
+
+
+response_cache_service = ResponseCacheService()
+
+# knowledge base collection id -> owner, so document events need no query after the first
+_collection_owners: Dict[int, int] = {}
+
+
+@event.listens_for(Agent, "after_update")
+@event.listens_for(Agent, "after_delete")
+def _on_agent_write(mapper, connection, target):
+    response_cache_service.invalidate_agent(target.id)
+
+
+@event.listens_for(KnowledgeBaseCollection, "after_insert")
+@event.listens_for(KnowledgeBaseCollection, "after_update")
+@event.listens_for(KnowledgeBaseCollection, "after_delete")
+def _on_collection_write(mapper, connection, target):
+    _collection_owners[target.id] = target.user_id
+    response_cache_service.invalidate_owner(target.user_id)
+
+
+@event.listens_for(KnowledgeBaseDocument, "after_insert")
+@event.listens_for(KnowledgeBaseDocument, "after_update")
+@event.listens_for(KnowledgeBaseDocument, "after_delete")
+def _on_document_write(mapper, connection, target):
+    owner_id = _collection_owners.get(target.collection_id)
+    if owner_id is None:
+        owner_id = connection.execute(
+            select(KnowledgeBaseCollection.user_id).where(KnowledgeBaseCollection.id == target.collection_id)
+        ).scalar()
+        if owner_id is None:
+            return
+        _collection_owners[target.collection_id] = owner_id
+    response_cache_service.invalidate_owner(owner_id)
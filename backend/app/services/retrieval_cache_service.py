@@ -0,0 +1,247 @@
+"""
+Retrieval Cache Service
+
+Two-level cache for knowledge base retrieval:
+
+1. Query text -> embedding. An in-memory LRU backed by a small SQLite file,
+   so embeddings survive restarts and are shared between workers.
+2. (collection, collection version, query, top_k, threshold) -> results.
+   An in-memory LRU with a TTL. Every ingestion bumps the collection version
+   stored in the ChromaDB collection metadata, so stale results are never
+   served, even from another process.
+
+Hit and miss counters are kept per collection.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+VERSION_METADATA_KEY = "kb_version"
+DISTANCE_METADATA_KEY = "kb_distance"
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query used for cache keys."""
+    return " ".join(query.lower().split())
+
+
+class QueryEmbeddingCache:
+    """LRU of query embeddings persisted to SQLite."""
+
+    def __init__(self, db_path: str, max_entries: int = 5000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT NOT NULL, query TEXT NOT NULL, embedding TEXT NOT NULL, "
+                "used_at REAL NOT NULL, PRIMARY KEY (model, query))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        key = (model, query)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                return embedding
+
+            try:
+                row = self._connection().execute(
+                    "SELECT embedding FROM query_embeddings WHERE model = ? AND query = ?", key
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Query embedding cache read failed: {e}")
+                return None
+
+            if row is None:
+                return None
+            embedding = json.loads(row[0])
+            self._remember(key, embedding)
+            return embedding
+
+    def put(self, model: str, query: str, embedding: List[float]):
+        key = (model, query)
+        embedding = [float(value) for value in embedding]
+        with self._lock:
+            self._remember(key, embedding)
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (model, query, embedding, used_at) VALUES (?, ?, ?, ?)",
+                    (model, query, json.dumps(embedding), time.time())
+                )
+                # Keep the file bounded to the same size as the in-memory LRU
+                conn.execute(
+                    "DELETE FROM query_embeddings WHERE rowid NOT IN "
+                    "(SELECT rowid FROM query_embeddings ORDER BY used_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Query embedding cache write failed: {e}")
+
+    def _remember(self, key: Tuple[str, str], embedding: List[float]):
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class RetrievalResultCache:
+    """In-memory LRU of retrieval results with a TTL."""
+
+    def __init__(self, max_entries: int = 2000, ttl_seconds: int = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, results = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return list(results)
+
+    def put(self, key: tuple, results: List[Dict[str, Any]]):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def drop_collection(self, collection_name: str):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == collection_name]:
+                del self._entries[key]
+
+
+class RetrievalCacheService:
+    """Query-embedding and retrieval-result caches with per-collection metrics."""
+
+    def __init__(self, cache_dir: str):
+        self.embeddings = QueryEmbeddingCache(os.path.join(cache_dir, "query_embeddings.sqlite3"))
+        self.results = RetrievalResultCache()
+        self._embedding_function = None
+        self._embedding_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {
+            "embedding_hits": 0,
+            "embedding_misses": 0,
+            "result_hits": 0,
+            "result_misses": 0
+        })
+
+    # Collection versions
+
+    @staticmethod
+    def collection_version(collection) -> int:
+        """Current ingestion version of a ChromaDB collection."""
+        return int((collection.metadata or {}).get(VERSION_METADATA_KEY, 0))
+
+    def bump_collection_version(self, collection) -> int:
+        """Mark a collection as changed so cached results for it are ignored."""
+        # ChromaDB rejects hnsw:space in modify() since the distance function is
+        # fixed on the index segment at creation time; keep a readable copy.
+        current = collection.metadata or {}
+        metadata = {key: value for key, value in current.items() if not key.startswith("hnsw:")}
+        metadata.setdefault(DISTANCE_METADATA_KEY, current.get("hnsw:space", "l2"))
+        version = int(metadata.get(VERSION_METADATA_KEY, 0)) + 1
+        metadata[VERSION_METADATA_KEY] = version
+        collection.modify(metadata=metadata)
+        self.results.drop_collection(collection.name)
+        return version
+
+    @staticmethod
+    def collection_distance(collection) -> str:
+        """Distance function of a ChromaDB collection ('l2', 'cosine' or 'ip')."""
+        metadata = collection.metadata or {}
+        return metadata.get("hnsw:space") or metadata.get(DISTANCE_METADATA_KEY, "l2")
+
+    # Level 1: query embeddings
+
+    def _get_embedding_function(self):
+        with self._embedding_lock:
+            if self._embedding_function is None:
+                from chromadb.utils import embedding_functions
+                # Same function ChromaDB uses for collections created without one
+                self._embedding_function = embedding_functions.DefaultEmbeddingFunction()
+            return self._embedding_function
+
+    def get_query_embedding(self, collection_name: str, query: str) -> List[float]:
+        """Embedding of a query, computed at most once per distinct query text."""
+        normalized = normalize_query(query)
+        embedding = self.embeddings.get(DEFAULT_EMBEDDING_MODEL, normalized)
+        if embedding is not None:
+            self._stats[collection_name]["embedding_hits"] += 1
+            return embedding
+
+        self._stats[collection_name]["embedding_misses"] += 1
+        embedding = list(self._get_embedding_function()([normalized])[0])
+        self.embeddings.put(DEFAULT_EMBEDDING_MODEL, normalized, embedding)
+        return embedding
+
+    # Level 2: retrieval results
+
+    def result_key(self, collection, query: str, top_k: int, similarity_threshold: Optional[float]) -> tuple:
+        return (
+            collection.name,
+            self.collection_version(collection),
+            normalize_query(query),
+            top_k,
+            similarity_threshold
+        )
+
+    def get_results(self, key: tuple) -> Optional[List[Dict[str, Any]]]:
+        results = self.results.get(key)
+        if results is None:
+            self._stats[key[0]]["result_misses"] += 1
+        else:
+            self._stats[key[0]]["result_hits"] += 1
+        return results
+
+    def put_results(self, key: tuple, results: List[Dict[str, Any]]):
+        self.results.put(key, results)
+
+    # Metrics
+
+    def get_stats(self, collection_name: Optional[str] = None) -> Dict[str, Any]:
+        """Hit/miss counters and hit rates, for one collection or all of them."""
+        names = [collection_name] if collection_name else list(self._stats.keys())
+        stats = {}
+        for name in names:
+            counters = dict(self._stats.get(name) or self._stats.default_factory())
+            embedding_total = counters["embedding_hits"] + counters["embedding_misses"]
+            result_total = counters["result_hits"] + counters["result_misses"]
+            counters["embedding_hit_rate"] = counters["embedding_hits"] / embedding_total if embedding_total else 0.0
+            counters["result_hit_rate"] = counters["result_hits"] / result_total if result_total else 0.0
+            stats[name] = counters
+        return stats
+
+
+retrieval_cache_service = RetrievalCacheService(settings.RETRIEVAL_CACHE_DIR)
@@ -3,15 +3,37 @@ Telegram Integration Service for AI Agents
 Handles Telegram bot integration and message routing
 """
 
-import asyncio
+import hashlib
+import hmac
 import httpx
 from typing import Dict, Any, Optional
 from sqlalchemy import select
 from app.core.config import settings
 from app.services.agent_service import AgentService
 from app.core.database import get_db, Integration, Agent
+from app.services.conversation_memory_service import conversation_memory_service
+from app.services.outbound_delivery_service import outbound_delivery_service
+from app.services.message_ingestion_service import InboundMessage, message_ingestion_service
 from sqlalchemy.ext.asyncio import AsyncSession
 
+
+def bot_id_from_token(bot_token: Optional[str]) -> Optional[str]:
+    """Numeric bot id, the part of a bot token before the colon"""
+    if not bot_token or ':' not in bot_token:
+        return None
+    return bot_token.split(':', 1)[0]
+
+
+def webhook_secret_for(bot_token: str) -> str:
+    """
+    Secret Telegram echoes in ``X-Telegram-Bot-Api-Secret-Token`` for a bot's
+    webhook calls. It names the bot, so updates can be routed to the right
+    integration, and proves the call comes from whoever set the webhook.
+    """
+    signature = hmac.new(settings.SECRET_KEY.encode(), bot_token.encode(), hashlib.sha256).hexdigest()
+    return f"{bot_id_from_token(bot_token)}_{signature[:48]}"
+
+
 class TelegramIntegrationService:
     """
     Telegram Bot API integration service
@@ -19,10 +41,42 @@ class TelegramIntegrationService:
     """
     
     def __init__(self):
-        self.agent_service = AgentService()
         self.base_url = "https://api.telegram.org/bot"
     
-    async def process_telegram_update(self, update_data: Dict[str, Any], db: AsyncSession):
+    def enqueue_update(self, update_data: Dict[str, Any], bot_id: Optional[str] = None, secret_token: Optional[str] = None) -> bool:
+        """
+        Queue a Telegram update for processing.
+        
+        ``bot_id`` names the bot that received the update (from polling, or
+        from the webhook secret token); ``secret_token`` is verified against
+        that bot's token before the update is answered.
+        
+        Returns False when the queue is full and Telegram should redeliver.
+        """
+        message = update_data.get('message') or {}
+        chat_id = (message.get('chat') or {}).get('id')
+        if not chat_id or not message.get('text'):
+            return True
+        
+        return message_ingestion_service.enqueue(InboundMessage(
+            provider="telegram",
+            message_id=f"{bot_id}:{chat_id}:{message.get('message_id', update_data.get('update_id'))}",
+            chat_key=f"telegram:{bot_id}:{chat_id}",
+            payload={"update": update_data, "bot_id": bot_id, "secret_token": secret_token}
+        ))
+    
+    async def process_queued_message(self, inbound: InboundMessage, db: AsyncSession):
+        """Ingestion queue handler for Telegram updates"""
+        payload = inbound.payload
+        await self.process_telegram_update(payload["update"], db, payload.get("bot_id"), payload.get("secret_token"))
+    
+    async def process_telegram_update(
+        self,
+        update_data: Dict[str, Any],
+        db: AsyncSession,
+        bot_id: Optional[str] = None,
+        secret_token: Optional[str] = None
+    ):
         """Process incoming Telegram update and route to appropriate agent"""
         try:
             # Extract message data
@@ -38,11 +92,15 @@ class TelegramIntegrationService:
             if not chat_id or not text:
                 return
             
-            # Find integration by bot token (we'll need to extract this from the webhook)
-            # For now, we'll find the first active Telegram integration
-            integration = await self._get_active_telegram_integration(db)
+            # Find the integration of the bot that received the update
+            integration = await self._get_integration_for_bot(db, bot_id)
             if not integration:
-                print("No active Telegram integration found")
+                print(f"No active Telegram integration found for bot {bot_id}")
+                return
+            
+            bot_token = integration.config.get('bot_token') or ''
+            if secret_token is not None and not hmac.compare_digest(secret_token, webhook_secret_for(bot_token)):
+                print(f"Dropping Telegram update with an invalid webhook secret for bot {bot_id}")
                 return
             
             # Get the associated agent
@@ -55,14 +113,30 @@ class TelegramIntegrationService:
                 print(f"No agent found for integration: {integration.id}")
                 return
             
+            # One conversation per Telegram chat, with its recent history as context
+            conversation_id = await conversation_memory_service.get_conversation_id(
+                db, integration, agent, chat_id, title=f"Telegram @{username}"
+            )
+            conversation_history = await conversation_memory_service.load_history(
+                db, conversation_id, conversation_memory_service.max_messages_for(agent)
+            )
+            
             # Process message with agent
-            response = await self.agent_service.process_message(
-                agent_id=agent.id,
-                message=f"Telegram message from @{username}: {text}",
+            agent_service = AgentService(db)
+            response, tools_used, cost = await agent_service.execute_agent(
+                agent=agent,
+                user_message=f"Telegram message from @{username}: {text}",
+                conversation_history=conversation_history,
+                session_id=f"telegram_{chat_id}",
                 user_id=integration.user_id,
-                db=db
+                integration_id=integration.id
             )
             
+            await conversation_memory_service.append_messages(db, conversation_id, [
+                {"role": "user", "content": text, "meta_data": {"telegram_user_id": user_id, "username": username}},
+                {"role": "assistant", "content": response or "", "meta_data": {"tools_used": tools_used, "cost": cost}}
+            ])
+            
             # Send response back to Telegram
             if response:
                 await self._send_telegram_message(
@@ -74,39 +148,41 @@ class TelegramIntegrationService:
         except Exception as e:
             print(f"Error processing Telegram update: {e}")
     
-    async def _get_active_telegram_integration(self, db: AsyncSession):
-        """Get active Telegram integration"""
+    async def _get_integration_for_bot(self, db: AsyncSession, bot_id: Optional[str]):
+        """
+        Get the active Telegram integration of a bot.
+        
+        Updates without a bot id come from webhooks set up before secret
+        tokens were used; they can only be routed while a single bot is active.
+        """
         try:
             result = await db.execute(
                 select(Integration).where(
                     Integration.platform == "telegram",
                     Integration.is_active == True
-                )
+                ).order_by(Integration.id)
             )
-            return result.scalar_one_or_none()
+            integrations = result.scalars().all()
+            if bot_id is None:
+                if len(integrations) > 1:
+                    print("Cannot route Telegram update without a bot id: several bots are active")
+                    return None
+                return integrations[0] if integrations else None
+            
+            for integration in integrations:
+                if bot_id_from_token((integration.config or {}).get('bot_token')) == bot_id:
+                    return integration
+            return None
         except Exception as e:
             print(f"Error getting Telegram integration: {e}")
             return None
     
     async def _send_telegram_message(self, bot_token: str, chat_id: int, text: str):
-        """Send message to Telegram chat"""
-        try:
-            url = f"{self.base_url}{bot_token}/sendMessage"
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json={
-                    'chat_id': chat_id,
-                    'text': text,
-                    'parse_mode': 'HTML'
-                })
-                
-                if response.status_code == 200:
-                    print(f"Message sent to Telegram chat {chat_id}")
-                else:
-                    print(f"Failed to send Telegram message: {response.text}")
-                    
-        except Exception as e:
-            print(f"Error sending Telegram message: {e}")
+        """Send message to Telegram chat, split and rate limited by the outbound sender"""
+        if await outbound_delivery_service.send_telegram(bot_token, chat_id, text):
+            print(f"Message sent to Telegram chat {chat_id}")
+        else:
+            print(f"Failed to send Telegram message to chat {chat_id}")
     
     async def set_webhook(self, bot_token: str, webhook_url: str) -> bool:
         """Set Telegram webhook URL"""
@@ -115,7 +191,8 @@ class TelegramIntegrationService:
             
             async with httpx.AsyncClient() as client:
                 response = await client.post(url, json={
-                    'url': webhook_url
+                    'url': webhook_url,
+                    'secret_token': webhook_secret_for(bot_token)
                 })
                 
                 if response.status_code == 200:
@@ -181,44 +258,6 @@ class TelegramIntegrationService:
             print(f"Error getting bot info: {e}")
             return None
     
-    async def start_polling(self, bot_token: str, db: AsyncSession):
-        """Start polling for updates (alternative to webhook)"""
-        try:
-            offset = 0
-            url = f"{self.base_url}{bot_token}/getUpdates"
-            
-            print(f"Starting Telegram polling for bot token: {bot_token[:10]}...")
-            
-            while True:
-                try:
-                    async with httpx.AsyncClient() as client:
-                        response = await client.get(url, params={
-                            'offset': offset,
-                            'timeout': 30
-                        })
-                        
-                        if response.status_code == 200:
-                            result = response.json()
-                            if result.get('ok'):
-                                updates = result.get('result', [])
-                                
-                                for update in updates:
-                                    await self.process_telegram_update(update, db)
-                                    offset = max(offset, update['update_id'] + 1)
-                            else:
-                                print(f"Polling error: {result.get('description')}")
-                                break
-                        else:
-                            print(f"HTTP error during polling: {response.status_code}")
-                            break
-                            
-                except Exception as e:
-                    print(f"Error during polling: {e}")
-                    await asyncio.sleep(5)  # Wait before retrying
-                    
-        except Exception as e:
-            print(f"Error starting Telegram polling: {e}")
-    
     def validate_telegram_config(self, config: Dict[str, Any]) -> bool:
         """Validate Telegram integration configuration"""
         bot_token = config.get('bot_token', '')
@@ -274,4 +313,7 @@ class TelegramIntegrationService:
             
         except Exception as e:
             print(f"Error setting up Telegram integration: {e}")
-            return False
\ No newline at end of file
+            return False
+
+
+message_ingestion_service.register_handler("telegram", TelegramIntegrationService().process_queued_message)
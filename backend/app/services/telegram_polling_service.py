@@ -0,0 +1,189 @@
+"""
+Telegram Polling Supervisor
+
+Runs one long-poll loop per bot for Telegram integrations in polling mode
+(no ``webhook_url`` in their config). All loops share one persistent HTTP
+client (HTTP/2 when the ``h2`` package is installed), and updates are handed
+to the message ingestion queue, which answers different chats concurrently
+and the messages of one chat in order.
+
+A poll loop only confirms an update (advances its offset) once the update is
+queued, so updates refused by a full queue are delivered again. Confirming
+happens before processing, and offsets are only kept in memory: updates
+still waiting in the queue when the process stops are lost, as with any
+other message the ingestion queue holds. Failures back off exponentially;
+an invalid token stops that bot's loop until the integration changes.
+"""
+
+import asyncio
+import logging
+import random
+from typing import Any, Dict, Optional
+
+import httpx
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal, Integration
+from app.services.telegram_integration import TelegramIntegrationService, bot_id_from_token
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class TelegramPollingSupervisor:
+    """Keeps a getUpdates loop running for every active polling-mode bot."""
+
+    def __init__(self, poll_timeout: int = 30, sync_interval_seconds: int = 60, max_backoff_seconds: float = 60.0):
+        self.poll_timeout = poll_timeout
+        self.sync_interval_seconds = sync_interval_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.telegram_service = TelegramIntegrationService()
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._supervisor_task: Optional[asyncio.Task] = None
+        # bot token -> poll task
+        self._pollers: Dict[str, asyncio.Task] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def start(self):
+        """Start supervising on the running event loop (idempotent)."""
+        if self._supervisor_task is None or self._supervisor_task.done():
+            self._supervisor_task = asyncio.create_task(self._run(), name="telegram-polling-supervisor")
+            logger.info("📡 Telegram polling supervisor started")
+
+    async def stop(self):
+        """Cancel all poll loops and close the shared client."""
+        tasks = list(self._pollers.values())
+        if self._supervisor_task:
+            tasks.append(self._supervisor_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._pollers.clear()
+        self._supervisor_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                # Reads wait for the long poll to return
+                timeout=httpx.Timeout(10.0, read=self.poll_timeout + 15),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+            )
+        return self._client
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Telegram polling supervisor error: {e}")
+            await asyncio.sleep(self.sync_interval_seconds)
+
+    async def sync(self):
+        """Start loops for new polling-mode bots and stop loops for removed ones."""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Integration.config).where(
+                    Integration.platform == "telegram",
+                    Integration.is_active == True
+                )
+            )
+            bot_tokens = {
+                config.get("bot_token")
+                for config in result.scalars().all()
+                if config and config.get("bot_token") and not config.get("webhook_url")
+            }
+
+        for bot_token in list(self._pollers):
+            if bot_token not in bot_tokens:
+                self._pollers.pop(bot_token).cancel()
+                logger.info(f"Stopped Telegram polling for bot {bot_id_from_token(bot_token)}")
+
+        for bot_token in bot_tokens:
+            task = self._pollers.get(bot_token)
+            # A loop that gave up (invalid token) is only retried when the token changes
+            if task is None:
+                self._pollers[bot_token] = asyncio.create_task(
+                    self._poll(bot_token), name=f"telegram-poll-{bot_id_from_token(bot_token)}"
+                )
+
+    async def _poll(self, bot_token: str):
+        bot_id = bot_id_from_token(bot_token)
+        url = f"{self.telegram_service.base_url}{bot_token}/getUpdates"
+        stats = self._stats.setdefault(bot_id, {"updates": 0, "errors": 0, "state": "starting"})
+        offset = 0
+        failures = 0
+        logger.info(f"Starting Telegram polling for bot {bot_id}")
+
+        while True:
+            try:
+                response = await self._get_client().get(url, params={
+                    "offset": offset,
+                    "timeout": self.poll_timeout,
+                    "allowed_updates": '["message"]'
+                })
+                result = response.json()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                stats["errors"] += 1
+                stats["state"] = "reconnecting"
+                delay = self._backoff(failures)
+                logger.warning(f"Telegram polling for bot {bot_id} failed ({e}), retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code in (401, 404):
+                stats["state"] = "invalid_token"
+                logger.error(f"Telegram rejected the token of bot {bot_id}, polling stopped")
+                return
+
+            if not result.get("ok"):
+                failures += 1
+                stats["errors"] += 1
+                # 409: a webhook is set or another process polls this bot
+                stats["state"] = "conflict" if response.status_code == 409 else "error"
+                retry_after = (result.get("parameters") or {}).get("retry_after")
+                delay = float(retry_after) if retry_after else self._backoff(failures)
+                logger.warning(f"Telegram polling error for bot {bot_id}: {result.get('description')}, retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            failures = 0
+            stats["state"] = "polling"
+            for update in result.get("result", []):
+                if not self.telegram_service.enqueue_update(update, bot_id=bot_id):
+                    # Queue is full; leave the rest unconfirmed so Telegram resends them
+                    logger.warning(f"Message queue full, pausing Telegram polling for bot {bot_id}")
+                    await asyncio.sleep(1.0)
+                    break
+                offset = max(offset, update["update_id"] + 1)
+                stats["updates"] += 1
+
+    def _backoff(self, failures: int) -> float:
+        delay = min(self.max_backoff_seconds, 2 ** min(failures, 6))
+        return delay * random.uniform(0.5, 1.0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "bots": {
+                bot_id_from_token(bot_token): {**self._stats.get(bot_id_from_token(bot_token), {}), "running": not task.done()}
+                for bot_token, task in self._pollers.items()
+            }
+        }
+
+
+telegram_polling_supervisor = TelegramPollingSupervisor()
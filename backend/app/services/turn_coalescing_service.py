@@ -0,0 +1,107 @@
+"""
+Turn Coalescing Service
+
+Single-flight for streaming agent turns. When several identical turns
+without conversation history (same agent version, same input) run at the
+same time, as when many visitors of a busy page send the same opening
+question, only the first one calls the model. Later ones subscribe to the
+same upstream stream: they receive the events emitted so far, then every
+new event as it arrives. Callers decide what is shared: the agent service
+runs the shared turn without a session_id, and runs turns of agents whose
+tools keep session state on their own.
+
+Each subscriber reads from its own queue, so a slow or disconnected caller
+never holds up the others. A caller that goes away only unsubscribes; the
+upstream turn is cancelled once nobody is listening any more.
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, Hashable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class _Flight:
+    """One upstream turn and the callers waiting on it."""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+
+
+class TurnCoalescingService:
+    """Fans one upstream event stream out to every concurrent identical caller."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._stats = {"upstream_turns": 0, "coalesced_turns": 0, "cancelled_turns": 0}
+
+    async def stream(
+        self,
+        key: Hashable,
+        start_stream: Callable[[], AsyncIterator[Dict[str, Any]]]
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Events of the turn identified by ``key``. ``start_stream`` is only
+        called when no identical turn is already running.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, start_stream))
+            self._stats["upstream_turns"] += 1
+        else:
+            self._stats["coalesced_turns"] += 1
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in flight.events:
+            queue.put_nowait(event)
+        flight.subscribers.add(queue)
+
+        try:
+            while True:
+                event = await queue.get()
+                if event is _END:
+                    return
+                yield event
+        finally:
+            flight.subscribers.discard(queue)
+            if not flight.subscribers and not flight.task.done():
+                # Nobody is listening any more
+                flight.task.cancel()
+                self._stats["cancelled_turns"] += 1
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    async def _run(self, key: Hashable, flight: _Flight, start_stream):
+        try:
+            async for event in start_stream():
+                self._publish(flight, event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Coalesced agent turn failed: {e}")
+            self._publish(flight, {"type": "error", "content": f"Error: {str(e)}"})
+        finally:
+            # Later identical turns start fresh (or hit the response cache)
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            for queue in flight.subscribers:
+                queue.put_nowait(_END)
+
+    @staticmethod
+    def _publish(flight: _Flight, event: Dict[str, Any]):
+        flight.events.append(event)
+        for queue in flight.subscribers:
+            queue.put_nowait(event)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self._stats, "in_flight": len(self._flights)}
+
+
+turn_coalescing_service = TurnCoalescingService()
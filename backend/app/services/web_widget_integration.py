@@ -6,10 +6,12 @@ Handles web widget chat integration and message routing
 import asyncio
 import json
 from typing import Dict, Any, Optional, AsyncGenerator
-from sqlalchemy import select
 from app.core.config import settings
 from app.services.agent_service import AgentService
-from app.core.database import get_db, Integration, Agent
+from app.core.database import get_db
+from app.services.anonymous_session_service import anonymous_session_store
+from app.services.widget_asset_service import widget_asset_service
+from app.services.widget_integration_cache import widget_integration_cache
 from sqlalchemy.ext.asyncio import AsyncSession
 
 class WebWidgetIntegrationService:
@@ -18,42 +20,6 @@ class WebWidgetIntegrationService:
     Handles chat widget messages and routes them to agents
     """
     
-    def __init__(self):
-        # Simple in-memory rate limiting
-        self.rate_limit_data = {}  # {customer_id: {'count': 0, 'reset_time': timestamp}}
-        self.rate_limit_max = 50  # Max messages per hour per customer
-        self.rate_limit_window = 3600  # 1 hour in seconds
-    
-    def _check_rate_limit(self, customer_identifier: str) -> bool:
-        """Check if customer is within rate limits"""
-        import time
-        current_time = time.time()
-        
-        if customer_identifier not in self.rate_limit_data:
-            # First message from this customer
-            self.rate_limit_data[customer_identifier] = {
-                'count': 1,
-                'reset_time': current_time + self.rate_limit_window
-            }
-            return True
-        
-        customer_data = self.rate_limit_data[customer_identifier]
-        
-        # Check if window has expired
-        if current_time > customer_data['reset_time']:
-            # Reset counter
-            customer_data['count'] = 1
-            customer_data['reset_time'] = current_time + self.rate_limit_window
-            return True
-        
-        # Check if within limit
-        if customer_data['count'] >= self.rate_limit_max:
-            return False
-        
-        # Increment counter
-        customer_data['count'] += 1
-        return True
-    
     async def process_widget_message(self, message_data: Dict[str, Any], db: AsyncSession):
         """Process incoming web widget message and route to appropriate agent"""
         try:
@@ -68,74 +34,18 @@ class WebWidgetIntegrationService:
             if not widget_id or not message:
                 return
             
-            # Check rate limiting for anonymous users
-            if customer_identifier and user_id == 'anonymous':
-                if not self._check_rate_limit(customer_identifier):
-                    print(f"⚠️ Rate limit exceeded for customer: {customer_identifier}")
-                    return {
-                        "response": "You've sent too many messages. Please wait a bit before sending another message.",
-                        "session_id": session_id,
-                        "agent_name": "AI Assistant",
-                        "timestamp": message_data.get('timestamp'),
-                        "error": "rate_limit_exceeded"
-                    }
-            
-            # Find integration by widget ID or domain
-            integration = await self._get_integration_by_widget(widget_id, domain, db)
+            # Find integration and its agent by widget ID or domain
+            integration, agent = await self._get_integration_by_widget(widget_id, domain, db)
             if not integration:
                 print(f"No integration found for widget: {widget_id}")
                 return
             
-            # Get the associated agent
-            result = await db.execute(
-                select(Agent).where(Agent.id == integration.agent_id)
-            )
-            agent = result.scalar_one_or_none()
-            
-            if not agent:
-                print(f"No agent found for integration: {integration.id}")
-                return
-            
             # Handle conversation creation/resumption for anonymous users
             conversation_id = None
             if customer_identifier and user_id == 'anonymous':
-                print(f"🔍 Looking for existing conversation for customer: {customer_identifier}")
-                
-                # Check for existing conversation
-                from sqlalchemy import select
-                from app.core.database import Conversation
-                
-                existing_conversation = await db.execute(
-                    select(Conversation).where(
-                        Conversation.customer_identifier == customer_identifier,
-                        Conversation.agent_id == agent.id,
-                        Conversation.customer_type == "anonymous"
-                    )
+                conversation_id, session_id = await anonymous_session_store.get_or_create(
+                    db, agent, customer_identifier, session_id=session_id
                 )
-                conversation = existing_conversation.scalar_one_or_none()
-                
-                if conversation:
-                    print(f"✅ Found existing conversation: {conversation.id}")
-                    conversation_id = conversation.id
-                    session_id = conversation.session_id
-                else:
-                    print(f"📝 Creating new conversation for customer: {customer_identifier}")
-                    # Create new conversation
-                    new_conversation = Conversation(
-                        user_id=None,
-                        agent_id=agent.id,
-                        session_id=session_id or f"widget_{customer_identifier}_{agent.id}",
-                        title=f"Widget Chat - {agent.name}",
-                        customer_type="anonymous",
-                        customer_identifier=customer_identifier,
-                        expires_at=None
-                    )
-                    db.add(new_conversation)
-                    await db.commit()
-                    await db.refresh(new_conversation)
-                    conversation_id = new_conversation.id
-                    session_id = new_conversation.session_id
-                    print(f"✅ Created new conversation: {conversation_id}")
             
             # Process message with agent
             agent_service = AgentService(db)
@@ -213,68 +123,18 @@ class WebWidgetIntegrationService:
                 yield {"type": "error", "content": "Invalid message data"}
                 return
             
-            # Check rate limiting for anonymous users
-            if customer_identifier and user_id == 'anonymous':
-                if not self._check_rate_limit(customer_identifier):
-                    print(f"⚠️ Rate limit exceeded for customer: {customer_identifier}")
-                    yield {"type": "error", "content": "You've sent too many messages. Please wait a bit before sending another message."}
-                    return
-            
-            # Find integration by widget ID or domain
-            integration = await self._get_integration_by_widget(widget_id, domain, db)
+            # Find integration and its agent by widget ID or domain
+            integration, agent = await self._get_integration_by_widget(widget_id, domain, db)
             if not integration:
                 yield {"type": "error", "content": "Widget not found"}
                 return
             
-            # Get the associated agent
-            result = await db.execute(
-                select(Agent).where(Agent.id == integration.agent_id)
-            )
-            agent = result.scalar_one_or_none()
-            
-            if not agent:
-                yield {"type": "error", "content": "Agent not found"}
-                return
-            
             # Handle conversation creation/resumption for anonymous users
             conversation_id = None
             if customer_identifier and user_id == 'anonymous':
-                print(f"🔍 Looking for existing conversation for customer: {customer_identifier}")
-                
-                # Check for existing conversation
-                from app.core.database import Conversation
-                
-                existing_conversation = await db.execute(
-                    select(Conversation).where(
-                        Conversation.customer_identifier == customer_identifier,
-                        Conversation.agent_id == agent.id,
-                        Conversation.customer_type == "anonymous"
-                    )
+                conversation_id, session_id = await anonymous_session_store.get_or_create(
+                    db, agent, customer_identifier, session_id=session_id
                 )
-                conversation = existing_conversation.scalar_one_or_none()
-                
-                if conversation:
-                    print(f"✅ Found existing conversation: {conversation.id}")
-                    conversation_id = conversation.id
-                    session_id = conversation.session_id
-                else:
-                    print(f"📝 Creating new conversation for customer: {customer_identifier}")
-                    # Create new conversation
-                    new_conversation = Conversation(
-                        user_id=None,
-                        agent_id=agent.id,
-                        session_id=session_id or f"widget_{customer_identifier}_{agent.id}",
-                        title=f"Widget Chat - {agent.name}",
-                        customer_type="anonymous",
-                        customer_identifier=customer_identifier,
-                        expires_at=None
-                    )
-                    db.add(new_conversation)
-                    await db.commit()
-                    await db.refresh(new_conversation)
-                    conversation_id = new_conversation.id
-                    session_id = new_conversation.session_id
-                    print(f"✅ Created new conversation: {conversation_id}")
             
             # Process message with agent using streaming
             agent_service = AgentService(db)
@@ -288,7 +148,11 @@ class WebWidgetIntegrationService:
                 user_message=f"Web chat from {user_id} on {domain}: {message}",
                 session_id=session_id,
                 user_id=integration.user_id,  # Pass integration owner's user_id for file storage
-                integration_id=integration.id  # Pass integration_id for tools that need it
+                integration_id=integration.id,  # Pass integration_id for tools that need it
+                question=message,  # Response cache matches the visitor's own words
+                cache_context=domain,  # ...on the same site
+                # Answers to identified visitors may address them, so they are never shared
+                use_response_cache=user_id == 'anonymous'
             ):
                 chunk_type = chunk.get("type")
                 content = chunk.get("content", "")
@@ -350,804 +214,25 @@ class WebWidgetIntegrationService:
             yield {"type": "error", "content": f"Error: {str(e)}"}
     
     async def _get_integration_by_widget(self, widget_id: str, domain: str, db: AsyncSession):
-        """Get web widget integration by widget ID or domain"""
+        """Get web widget integration and its agent by widget ID or domain"""
         try:
-            # Get all active web integrations and filter in Python
-            result = await db.execute(
-                select(Integration).where(
-                    Integration.platform == "web",
-                    Integration.is_active == True
-                )
-            )
-            integrations = result.scalars().all()
-            
-            # First try to find by widget_id
-            if widget_id:
-                for integration in integrations:
-                    if integration.config and integration.config.get('widget_id') == widget_id:
-                        return integration
-            
-            # If not found by widget_id, try by domain
-            if domain:
-                for integration in integrations:
-                    if integration.config and integration.config.get('domain') == domain:
-                        return integration
-            
-            return None
+            return await widget_integration_cache.resolve(widget_id, domain, db)
         except Exception as e:
             print(f"Error getting widget integration: {e}")
-            return None
+            return None, None
     
-    def generate_widget_script(self, widget_config: Dict[str, Any]) -> str:
-        """Generate JavaScript widget script for embedding with playground-style UI"""
-        widget_id = widget_config.get('widget_id', 'default')
-        domain = widget_config.get('domain', '')
+    def generate_widget_script(self, widget_config: Dict[str, Any], integration_id: int) -> str:
+        """
+        Generate the embed snippet for a widget.
+        
+        The snippet only loads the integration's config script; the widget UI
+        itself is the shared static runtime (see ``widget_asset_service``).
+        """
         api_url = widget_config.get('api_url', '')
         if not api_url:
             raise ValueError("API URL is required for widget configuration")
         
-        # Customization options
-        theme_color = widget_config.get('theme_color', '#3B82F6')
-        position = widget_config.get('position', 'bottom-right')
-        greeting_message = widget_config.get('greeting_message', 'Hi! How can I help you today?')
-        widget_name = widget_config.get('widget_name', 'AI Assistant')
-        avatar_url = widget_config.get('avatar_url', '')
-        
-        # Color customization options for the animated button
-        button_icon_color = widget_config.get('button_icon_color', 'black')
-        button_stroke_color = widget_config.get('button_stroke_color', 'black')
-        button_fill_color = widget_config.get('button_fill_color', '#3B82F6')
-        
-        # Pre-calculate position values
-        position_parts = position.split('-')
-        position_vertical = position_parts[0] if len(position_parts) > 0 else 'bottom'
-        position_horizontal = position_parts[1] if len(position_parts) > 1 else 'right'
-        
-        # Create the script using string formatting to avoid f-string escaping issues
-        script_template = """
-<!-- AI Agent Chat Widget -->
-<div id="ai-chat-widget-{widget_id}"></div>
-<script src="https://cdn.jsdelivr.net/npm/marked@9.1.6/marked.min.js"></script>
-<script>
-(function() {{
-    // Widget configuration
-    const config = {{
-        widgetId: '{widget_id}',
-        domain: '{domain}',
-        apiUrl: '{api_url}',
-        themeColor: '{theme_color}',
-        position: '{position}',
-        greetingMessage: '{greeting_message}',
-        widgetName: '{widget_name}',
-        avatarUrl: '{avatar_url}'
-    }};
-    
-    // Markdown renderer setup
-    if (typeof marked !== 'undefined') {{
-        marked.setOptions({{
-            breaks: true,
-            gfm: true
-        }});
-    }}
-    
-    // Create widget container
-    const widgetContainer = document.createElement('div');
-    widgetContainer.id = 'ai-chat-widget-container';
-    widgetContainer.style.cssText = `
-        position: fixed;
-        {position_vertical}: 20px;
-        {position_horizontal}: 20px;
-        z-index: 9999;
-        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
-    `;
-    
-    // Widget button with animated AI assistant design
-    const widgetButton = document.createElement('div');
-    widgetButton.style.cssText = `
-        width: 100px;
-        height: 100px;
-        cursor: pointer;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-    `;
-    widgetButton.innerHTML = `
-        <svg xmlns="http://www.w3.org/2000/svg" width="80" height="80" viewBox="0 0 200 200">
-          <!-- Head circle -->
-          <circle cx="100" cy="100" r="70" fill="none" stroke="{button_stroke_color}" stroke-width="4" />
-
-          <!-- Eyes -->
-          <circle cx="90" cy="95" r="4" fill="{button_icon_color}"/>
-          <circle cx="120" cy="95" r="4" fill="{button_icon_color}"/>
-
-          <!-- Glasses frames -->
-          <!-- Left lens -->
-          <circle cx="90" cy="95" r="12" fill="none" stroke="{button_stroke_color}" stroke-width="2"/>
-          <!-- Right lens -->
-          <circle cx="120" cy="95" r="12" fill="none" stroke="{button_stroke_color}" stroke-width="2"/>
-          <!-- Bridge -->
-          <line x1="102" y1="95" x2="108" y2="95" stroke="{button_stroke_color}" stroke-width="2"/>
-          <!-- Glasses arms -->
-          <line x1="78" y1="95" x2="65" y2="90" stroke="{button_stroke_color}" stroke-width="2"/>
-          <line x1="132" y1="95" x2="145" y2="90" stroke="{button_stroke_color}" stroke-width="2"/>
-
-          <!-- Eyebrows (animated up/down) -->
-          <path d="M80 80 Q90 75 100 80" stroke="{button_stroke_color}" stroke-width="3" fill="none" stroke-linecap="round">
-            <animateTransform attributeName="transform" type="translate" values="0,0; 0,-3; 0,0" dur="2s" repeatCount="indefinite"/>
-          </path>
-          <path d="M110 80 Q120 75 130 80" stroke="{button_stroke_color}" stroke-width="3" fill="none" stroke-linecap="round">
-            <animateTransform attributeName="transform" type="translate" values="0,0; 0,-3; 0,0" dur="2s" repeatCount="indefinite"/>
-          </path>
-
-          <!-- Nose (shorter and pointing right) -->
-          <path d="M95 100 L112 115 L100 125" fill="none" stroke="{button_stroke_color}" stroke-width="3" stroke-linecap="round" stroke-linejoin="round">
-            <animateTransform attributeName="transform" type="rotate" values="0 95 115; 5 95 115; -5 95 115; 0 95 115" dur="4s" repeatCount="indefinite"/>
-          </path>
-
-          <!-- Animated Smile -->
-          <path d="M85 135 Q100 150 115 135" stroke="{button_stroke_color}" stroke-width="3" fill="none" stroke-linecap="round">
-            <animate attributeName="d" 
-              values="M85 135 Q100 150 115 135; M85 130 Q100 145 115 130; M85 140 Q100 155 115 140; M85 135 Q100 150 115 135" 
-              dur="4s" 
-              repeatCount="indefinite"/>
-          </path>
-
-          <!-- Headset band (left) -->
-          <path d="M140 35 C100 15, 40 25, 30 60" fill="none" stroke="{button_stroke_color}" stroke-width="4"/>
-
-          <!-- Connector to earcup (left side) -->
-          <path d="M40 60 C25 80, 25 110, 40 125" fill="none" stroke="{button_stroke_color}" stroke-width="4"/>
-
-          <!-- Earcup (left side) -->
-          <ellipse cx="30" cy="115" rx="18" ry="26" fill="{button_fill_color}" stroke="{button_stroke_color}" stroke-width="3">
-            <animate attributeName="rx" values="18;20;18" dur="2s" repeatCount="indefinite"/>
-            <animate attributeName="ry" values="26;28;26" dur="2s" repeatCount="indefinite"/>
-          </ellipse>
-
-          <!-- Microphone stem -->
-          <path d="M60 140 C75 150, 90 155, 100 160" fill="none" stroke="{button_stroke_color}" stroke-width="3"/>
-
-          <!-- Microphone bubble (pulsing) -->
-          <circle cx="110" cy="162" r="8" fill="{button_fill_color}" stroke="{button_stroke_color}" stroke-width="3">
-            <animate attributeName="r" values="8;10;8" dur="1.5s" repeatCount="indefinite"/>
-          </circle>
-        </svg>
-    `;
-    
-    // Hover effects for button
-    widgetButton.addEventListener('mouseenter', () => {{
-        widgetButton.style.transform = 'scale(1.1)';
-    }});
-    widgetButton.addEventListener('mouseleave', () => {{
-        widgetButton.style.transform = 'scale(1)';
-    }});
-    
-    // Modern chat window with playground styling
-    const chatWindow = document.createElement('div');
-    chatWindow.style.cssText = `
-        width: 500px;
-        height: 600px;
-        background: white;
-        border-radius: 16px;
-        box-shadow: 0 20px 60px rgba(0, 0, 0, 0.15);
-        display: none;
-        flex-direction: column;
-        position: absolute;
-        {position_vertical}: 80px;
-        {position_horizontal}: 0px;
-        border: 1px solid rgba(0, 0, 0, 0.08);
-        overflow: hidden;
-    `;
-    
-    // Modern chat header with gradient
-    const chatHeader = document.createElement('div');
-    chatHeader.style.cssText = `
-        background: linear-gradient(135deg, {theme_color} 0%, {theme_color}dd 100%);
-        color: white;
-        padding: 20px;
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        border-bottom: 1px solid rgba(255, 255, 255, 0.1);
-    `;
-    chatHeader.innerHTML = `
-        <div style="display: flex; align-items: center;">
-            ${{config.avatarUrl ? `<img src="${{config.avatarUrl}}" alt="Avatar" style="width: 32px; height: 32px; border-radius: 50%; margin-right: 12px; object-fit: cover;">` : ''}}
-            <div>
-                <div style="font-weight: 600; font-size: 18px; margin-bottom: 4px; display: flex; align-items: center;">
-                    ${{config.widgetName}}
-                    <div style="width: 8px; height: 8px; background: #10B981; border-radius: 50%; margin-left: 8px; box-shadow: 0 0 0 2px rgba(16, 185, 129, 0.2);"></div>
-                </div>
-                <div style="font-size: 12px; opacity: 0.8;">Online • Ready to help</div>
-            </div>
-        </div>
-        <button id="close-chat" style="
-            background: rgba(255, 255, 255, 0.1); 
-            border: none; 
-            color: white; 
-            cursor: pointer; 
-            width: 32px; 
-            height: 32px; 
-            border-radius: 50%; 
-            display: flex; 
-            align-items: center; 
-            justify-content: center;
-            transition: background-color 0.2s;
-            font-size: 18px;
-        " onmouseover="this.style.background='rgba(255,255,255,0.2)'" onmouseout="this.style.background='rgba(255,255,255,0.1)'">&times;</button>
-    `;
-    
-    // Chat messages area with playground styling
-    const chatMessages = document.createElement('div');
-    chatMessages.style.cssText = `
-        flex: 1;
-        padding: 24px;
-        overflow-y: auto;
-        background: #fafbfc;
-        display: flex;
-        flex-direction: column;
-        gap: 16px;
-    `;
-    
-    // Add welcome message with better styling
-    const welcomeMessage = document.createElement('div');
-    welcomeMessage.style.cssText = `
-        background: white;
-        padding: 16px 20px;
-        border-radius: 12px;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.06);
-        border: 1px solid rgba(0, 0, 0, 0.04);
-        margin-right: 40px;
-        position: relative;
-    `;
-    welcomeMessage.innerHTML = `
-        <div style="color: #374151; line-height: 1.6;">${{config.greetingMessage}}</div>
-        <div style="display: flex; align-items: center; margin-top: 8px; color: #9CA3AF; font-size: 12px;">
-            <div style="width: 6px; height: 6px; background: #10B981; border-radius: 50%; margin-right: 6px;"></div>
-            ${{config.widgetName}}
-        </div>
-    `;
-    chatMessages.appendChild(welcomeMessage);
-    
-    // Modern chat input with playground styling
-    const chatInput = document.createElement('div');
-    chatInput.style.cssText = `
-        padding: 20px;
-        border-top: 1px solid rgba(0, 0, 0, 0.06);
-        background: white;
-    `;
-    chatInput.innerHTML = `
-        <div style="position: relative; display: flex; align-items: flex-start;">
-            <textarea id="chat-message-input" placeholder="Type your message..." 
-                   style="
-                       width: 100%; 
-                       padding: 12px 50px 12px 12px; 
-                       border: 1px solid #D1D5DB; 
-                       border-radius: 8px; 
-                       outline: none;
-                       resize: none;
-                       min-height: 80px;
-                       max-height: 120px;
-                       font-family: inherit;
-                       font-size: 14px;
-                       line-height: 1.4;
-                       background: white;
-                       transition: all 0.2s;
-                   " 
-                   rows="3"
-                   oninput="this.style.height='80px'; this.style.height=Math.min(this.scrollHeight, 120)+'px';"
-                   onfocus="this.style.borderColor='{theme_color}'; this.style.boxShadow='0 0 0 2px rgba(59, 130, 246, 0.2)'"
-                   onblur="this.style.borderColor='#D1D5DB'; this.style.boxShadow='none'"
-            ></textarea>
-            <button id="send-message" style="
-                position: absolute;
-                right: 8px;
-                bottom: 8px;
-                background: {theme_color}; 
-                color: white; 
-                border: none; 
-                width: 36px;
-                height: 36px;
-                border-radius: 50%; 
-                cursor: pointer;
-                font-weight: 500;
-                transition: all 0.2s;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-            " onmouseover="this.style.transform='scale(1.1)'; this.style.boxShadow='0 4px 12px rgba(59,130,246,0.3)'" 
-               onmouseout="this.style.transform='scale(1)'; this.style.boxShadow='none'">
-                <svg width="16" height="16" viewBox="0 0 24 24" fill="currentColor">
-                    <path d="M2.01 21L23 12 2.01 3 2 10l15 2-15 2z"/>
-                </svg>
-            </button>
-        </div>
-    `;
-    
-    // Add powered by footer
-    const poweredByFooter = document.createElement('div');
-    poweredByFooter.style.cssText = `
-        padding: 8px 20px;
-        background: #f8f9fa;
-        border-top: 1px solid rgba(0, 0, 0, 0.06);
-        text-align: center;
-        font-size: 11px;
-        color: #6b7280;
-        font-weight: 500;
-    `;
-    poweredByFooter.innerHTML = `
-        <span style="display: flex; align-items: center; justify-content: center; gap: 4px;">
-            Powered by 
-            <span style="color: {theme_color}; font-weight: 600;">Drixai</span>
-        </span>
-    `;
-    
-    // Assemble widget
-    chatWindow.appendChild(chatHeader);
-    chatWindow.appendChild(chatMessages);
-    chatWindow.appendChild(chatInput);
-    chatWindow.appendChild(poweredByFooter);
-    
-    widgetContainer.appendChild(widgetButton);
-    widgetContainer.appendChild(chatWindow);
-    document.body.appendChild(widgetContainer);
-    
-    // Add event listener for Enter key after the widget is attached to DOM
-    const textarea = document.getElementById('chat-message-input');
-    if (textarea) {{
-        textarea.addEventListener('keydown', (event) => {{
-            if (event.key === 'Enter' && !event.shiftKey) {{
-                event.preventDefault();
-                document.getElementById('send-message').click();
-            }}
-        }});
-    }}
-    
-    // Widget functionality with smooth animations
-    let isOpen = false;
-    let sessionId = 'session_' + Date.now() + '_' + Math.random().toString(36).substr(2, 9);
-    
-    // Customer identification
-    let customerId = '';
-    
-    // Generate or retrieve customer ID
-    function getCustomerId() {{
-        if (customerId) return customerId;
-        
-        // Try to get from cookie first
-        const cookieValue = document.cookie
-            .split('; ')
-            .find(row => row.startsWith('ai_widget_customer='))
-            ?.split('=')[1];
-        
-        if (cookieValue) {{
-            customerId = cookieValue;
-            console.log('📂 Retrieved customer ID from cookie:', customerId);
-            return customerId;
-        }}
-        
-        // Generate new customer ID
-        customerId = 'customer_' + Date.now() + '_' + Math.random().toString(36).substr(2, 9);
-        
-        // Store in cookie for 1 year
-        const expires = new Date();
-        expires.setFullYear(expires.getFullYear() + 1);
-        document.cookie = `ai_widget_customer=${{customerId}}; expires=${{expires.toUTCString()}}; path=/; SameSite=Lax`;
-        
-        console.log('🆔 Generated new customer ID:', customerId);
-        return customerId;
-    }}
-    
-    widgetButton.addEventListener('click', () => {{
-        isOpen = !isOpen;
-        if (isOpen) {{
-            chatWindow.style.display = 'flex';
-            chatWindow.style.opacity = '0';
-            chatWindow.style.transform = 'scale(0.9)';
-            setTimeout(() => {{
-                chatWindow.style.transition = 'all 0.3s cubic-bezier(0.4, 0, 0.2, 1)';
-                chatWindow.style.opacity = '1';
-                chatWindow.style.transform = 'scale(1)';
-            }}, 10);
-        }} else {{
-            chatWindow.style.transition = 'all 0.2s cubic-bezier(0.4, 0, 0.2, 1)';
-            chatWindow.style.opacity = '0';
-            chatWindow.style.transform = 'scale(0.9)';
-            setTimeout(() => {{
-                chatWindow.style.display = 'none';
-            }}, 200);
-        }}
-        document.getElementById('chat-message-input').focus();
-    }});
-    
-    document.getElementById('close-chat').addEventListener('click', () => {{
-        isOpen = false;
-        chatWindow.style.transition = 'all 0.2s cubic-bezier(0.4, 0, 0.2, 1)';
-        chatWindow.style.opacity = '0';
-        chatWindow.style.transform = 'scale(0.9)';
-        setTimeout(() => {{
-            chatWindow.style.display = 'none';
-        }}, 200);
-    }});
-    
-    // Enhanced message creation functions
-    function createUserMessage(message) {{
-        const messageContainer = document.createElement('div');
-        messageContainer.style.cssText = `
-            display: flex;
-            justify-content: flex-end;
-            margin-bottom: 16px;
-        `;
-        
-        const userMessage = document.createElement('div');
-        userMessage.style.cssText = `
-            background: {theme_color};
-            color: white;
-            padding: 12px 16px;
-            border-radius: 16px 16px 4px 16px;
-            max-width: 280px;
-            word-wrap: break-word;
-            font-size: 14px;
-            line-height: 1.4;
-            box-shadow: 0 2px 8px rgba(59, 130, 246, 0.2);
-        `;
-        userMessage.textContent = message;
-        messageContainer.appendChild(userMessage);
-        return messageContainer;
-    }}
-    
-    function createAIMessage(message) {{
-        const messageContainer = document.createElement('div');
-        messageContainer.style.cssText = `
-            display: flex;
-            justify-content: flex-start;
-            margin-bottom: 16px;
-        `;
-        
-        const aiMessage = document.createElement('div');
-        aiMessage.style.cssText = `
-            background: white;
-            color: #374151;
-            padding: 16px 20px;
-            border-radius: 16px 16px 16px 4px;
-            max-width: 280px;
-            word-wrap: break-word;
-            font-size: 14px;
-            line-height: 1.6;
-            box-shadow: 0 2px 8px rgba(0, 0, 0, 0.06);
-            border: 1px solid rgba(0, 0, 0, 0.04);
-            position: relative;
-        `;
-        
-        // Render markdown if marked is available
-        if (typeof marked !== 'undefined') {{
-            aiMessage.innerHTML = marked.parse(message);
-            // Style markdown elements
-            const style = document.createElement('style');
-            style.textContent = `
-                #ai-chat-widget-container h1, #ai-chat-widget-container h2, #ai-chat-widget-container h3 {{
-                    margin: 8px 0 4px 0;
-                    font-weight: 600;
-                }}
-                #ai-chat-widget-container p {{
-                    margin: 4px 0;
-                }}
-                #ai-chat-widget-container code {{
-                    background: #f3f4f6;
-                    padding: 2px 6px;
-                    border-radius: 4px;
-                    font-size: 12px;
-                }}
-                #ai-chat-widget-container pre {{
-                    background: #f8f9fa;
-                    padding: 12px;
-                    border-radius: 8px;
-                    overflow-x: auto;
-                    margin: 8px 0;
-                }}
-                #ai-chat-widget-container ul, #ai-chat-widget-container ol {{
-                    margin: 8px 0;
-                    padding-left: 20px;
-                }}
-                #ai-chat-widget-container li {{
-                    margin: 4px 0;
-                }}
-                #ai-chat-widget-container blockquote {{
-                    border-left: 3px solid {theme_color};
-                    margin: 8px 0;
-                    padding-left: 12px;
-                    color: #6b7280;
-                }}
-            `;
-            document.head.appendChild(style);
-        }} else {{
-            aiMessage.textContent = message;
-        }}
-        
-        // Add AI indicator
-        const indicator = document.createElement('div');
-        indicator.style.cssText = `
-            display: flex;
-            align-items: center;
-            margin-top: 8px;
-            color: #9CA3AF;
-            font-size: 11px;
-        `;
-        indicator.innerHTML = `
-            <div style="width: 6px; height: 6px; background: #10B981; border-radius: 50%; margin-right: 6px;"></div>
-            ${{config.widgetName}}
-        `;
-        aiMessage.appendChild(indicator);
-        
-        messageContainer.appendChild(aiMessage);
-        return messageContainer;
-    }}
-    
-    function createTypingIndicator() {{
-        const messageContainer = document.createElement('div');
-        messageContainer.style.cssText = `
-            display: flex;
-            justify-content: flex-start;
-            margin-bottom: 16px;
-        `;
-        messageContainer.id = 'typing-indicator';
-        
-        const typingMessage = document.createElement('div');
-        typingMessage.style.cssText = `
-            background: white;
-            padding: 16px 20px;
-            border-radius: 16px 16px 16px 4px;
-            box-shadow: 0 2px 8px rgba(0, 0, 0, 0.06);
-            border: 1px solid rgba(0, 0, 0, 0.04);
-            display: flex;
-            align-items: center;
-            gap: 8px;
-        `;
-        
-        typingMessage.innerHTML = `
-            <div style="display: flex; gap: 4px;">
-                <div style="width: 6px; height: 6px; background: #9CA3AF; border-radius: 50%; animation: typing 1.4s infinite ease-in-out;"></div>
-                <div style="width: 6px; height: 6px; background: #9CA3AF; border-radius: 50%; animation: typing 1.4s infinite ease-in-out 0.2s;"></div>
-                <div style="width: 6px; height: 6px; background: #9CA3AF; border-radius: 50%; animation: typing 1.4s infinite ease-in-out 0.4s;"></div>
-            </div>
-            <span style="color: #6B7280; font-size: 13px;">AI is thinking...</span>
-        `;
-        
-        messageContainer.appendChild(typingMessage);
-        return messageContainer;
-    }}
-    
-    // Add typing animation styles
-    const animationStyle = document.createElement('style');
-    animationStyle.textContent = `
-        @keyframes typing {{
-            0%, 60%, 100% {{
-                transform: translateY(0);
-                opacity: 0.4;
-            }}
-            30% {{
-                transform: translateY(-10px);
-                opacity: 1;
-            }}
-        }}
-    `;
-    document.head.appendChild(animationStyle);
-    
-    // Enhanced send message functionality with streaming support
-    async function sendMessage(message) {{
-        if (!message.trim()) return;
-        
-        const input = document.getElementById('chat-message-input');
-        input.value = '';
-        input.style.height = '20px';
-        
-        // Add user message
-        const userMsg = createUserMessage(message);
-        chatMessages.appendChild(userMsg);
-        
-        // Add typing indicator
-        const typingIndicator = createTypingIndicator();
-        chatMessages.appendChild(typingIndicator);
-        chatMessages.scrollTop = chatMessages.scrollHeight;
-        
-        try {{
-            // Create AI message placeholder (but don't add it yet)
-            let aiMessageElement = null;
-            let fullResponse = '';
-            let isStreaming = false;
-            
-            // Send to streaming API with timeout
-            const controller = new AbortController();
-            const timeoutId = setTimeout(() => controller.abort(), 60000); // 60 second timeout
-            
-            const response = await fetch(config.apiUrl + '/message/stream', {{
-                method: 'POST',
-                headers: {{
-                    'Content-Type': 'application/json',
-                }},
-                body: JSON.stringify({{
-                    widget_id: config.widgetId,
-                    session_id: sessionId,
-                    user_id: 'web_user',
-                    customer_identifier: getCustomerId(),
-                    message: message,
-                    domain: window.location.hostname,
-                    timestamp: new Date().toISOString()
-                }}),
-                signal: controller.signal
-            }});
-            
-            clearTimeout(timeoutId);
-            
-            if (!response.ok) {{
-                throw new Error(`HTTP error! status: ${{response.status}}`);
-            }}
-            
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder();
-            let buffer = '';
-            
-            while (true) {{
-                const {{ done, value }} = await reader.read();
-                
-                if (done) break;
-                
-                buffer += decoder.decode(value, {{ stream: true }});
-                const lines = buffer.split('\\n');
-                buffer = lines.pop() || '';
-                
-                for (const line of lines) {{
-                    if (line.startsWith('data: ')) {{
-                        try {{
-                            const data = JSON.parse(line.slice(6));
-                            
-                            if (data.type === 'content') {{
-                                // Remove typing indicator on first content
-                                if (!isStreaming) {{
-                                    const typingEl = document.getElementById('typing-indicator');
-                                    if (typingEl) {{
-                                        chatMessages.removeChild(typingEl);
-                                    }}
-                                    
-                                    // Create AI message element
-                                    aiMessageElement = createAIMessage('');
-                                    chatMessages.appendChild(aiMessageElement);
-                                    isStreaming = true;
-                                }}
-                                
-                                // Add content to message
-                                fullResponse += data.content;
-                                if (aiMessageElement) {{
-                                    // Find the AI message div (the actual message content)
-                                    const aiMessageDiv = aiMessageElement.querySelector('div[style*="background: white"]');
-                                    if (aiMessageDiv) {{
-                                        aiMessageDiv.innerHTML = typeof marked !== 'undefined' ? marked.parse(fullResponse) : fullResponse;
-                                    }}
-                                }}
-                                
-                            }} else if (data.type === 'status') {{
-                                // Update typing indicator with status
-                                const typingEl = document.getElementById('typing-indicator');
-                                if (typingEl) {{
-                                    const statusEl = typingEl.querySelector('span');
-                                    if (statusEl) {{
-                                        statusEl.textContent = data.content;
-                                    }}
-                                }}
-                                
-                            }} else if (data.type === 'complete') {{
-                                // Finalize the message
-                                if (aiMessageElement) {{
-                                    // Find the AI message div (the actual message content)
-                                    const aiMessageDiv = aiMessageElement.querySelector('div[style*="background: white"]');
-                                    if (aiMessageDiv) {{
-                                        aiMessageDiv.innerHTML = typeof marked !== 'undefined' ? marked.parse(data.content) : data.content;
-                                    }}
-                                }}
-                                break;
-                                
-                            }} else if (data.type === 'error') {{
-                                // Remove typing indicator
-                                const typingEl = document.getElementById('typing-indicator');
-                                if (typingEl) {{
-                                    chatMessages.removeChild(typingEl);
-                                }}
-                                
-                                // Show error message
-                                const errorMsg = createAIMessage(data.content || 'Sorry, I encountered an error. Please try again.');
-                                chatMessages.appendChild(errorMsg);
-                                return;
-                            }}
-                            
-                        }} catch (e) {{
-                            console.warn('Failed to parse SSE data:', line, e);
-                        }}
-                    }}
-                }}
-                
-                // Scroll to bottom during streaming
-                chatMessages.scrollTop = chatMessages.scrollHeight;
-            }}
-            
-            // Remove typing indicator if still showing
-            const typingEl = document.getElementById('typing-indicator');
-            if (typingEl) {{
-                chatMessages.removeChild(typingEl);
-            }}
-            
-            // Ensure AI message is added if streaming didn't start
-            if (!aiMessageElement) {{
-                aiMessageElement = createAIMessage(fullResponse || 'Sorry, I could not process your request.');
-                chatMessages.appendChild(aiMessageElement);
-            }}
-            
-        }} catch (error) {{
-            console.error('Streaming error:', error);
-            
-            // Remove typing indicator
-            const typingEl = document.getElementById('typing-indicator');
-            if (typingEl) {{
-                chatMessages.removeChild(typingEl);
-            }}
-            
-            // Show appropriate error message
-            let errorMessage = 'Sorry, I encountered an error. Please try again.';
-            if (error.name === 'AbortError') {{
-                errorMessage = 'Request timed out. Please try again.';
-            }}
-            
-            // Show error message
-            const errorMsg = createAIMessage(errorMessage);
-            chatMessages.appendChild(errorMsg);
-        }}
-        
-        chatMessages.scrollTop = chatMessages.scrollHeight;
-    }}
-    
-    // Event listeners
-    document.getElementById('send-message').addEventListener('click', () => {{
-        const input = document.getElementById('chat-message-input');
-        if (input.value.trim()) {{
-            sendMessage(input.value);
-        }}
-    }});
-    
-
-}})();
-</script>
-"""
-        
-        # Helper function to escape JavaScript strings
-        def escape_js_string(text):
-            if not text:
-                return ''
-            return (text
-                .replace('\\', '\\\\')  # Escape backslashes first
-                .replace("'", "\\'")    # Escape single quotes
-                .replace('"', '\\"')   # Escape double quotes
-                .replace('\n', '\\n')   # Escape newlines
-                .replace('\r', '\\r')   # Escape carriage returns
-                .replace('\t', '\\t'))  # Escape tabs
-        
-        # Format the script with the configuration values
-        script = script_template.format(
-            widget_id=widget_id,
-            domain=domain,
-            api_url=api_url,
-            theme_color=theme_color,
-            position=position,
-            position_vertical=position_vertical,
-            position_horizontal=position_horizontal,
-            greeting_message=escape_js_string(greeting_message),
-            widget_name=escape_js_string(widget_name),
-            avatar_url=escape_js_string(avatar_url),
-            button_icon_color=button_icon_color,
-            button_stroke_color=button_stroke_color,
-            button_fill_color=button_fill_color
-        )
-        
-        return script.strip()
+        return widget_asset_service.embed_code(integration_id, api_url, widget_config.get('widget_id', 'default'))
     
     def validate_web_config(self, config: Dict[str, Any]) -> bool:
         """Validate web widget integration configuration"""
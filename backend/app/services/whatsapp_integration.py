@@ -4,12 +4,14 @@ Handles WhatsApp Business API integration and message routing
 """
 
 import asyncio
-import httpx
-from typing import Dict, Any, Optional
+from typing import Collection, Dict, Any, Optional
 from sqlalchemy import select
 from app.core.config import settings
 from app.services.agent_service import AgentService
 from app.core.database import get_db, Integration, Agent
+from app.services.conversation_memory_service import conversation_memory_service
+from app.services.outbound_delivery_service import outbound_delivery_service
+from app.services.message_ingestion_service import InboundMessage, message_ingestion_service
 from sqlalchemy.ext.asyncio import AsyncSession
 
 class WhatsAppIntegrationService:
@@ -28,21 +30,34 @@ class WhatsAppIntegrationService:
             return challenge
         return None
     
-    async def handle_webhook(self, webhook_data: Dict[str, Any], db: AsyncSession):
-        """Process incoming WhatsApp messages"""
-        try:
-            # Extract message data
-            entry = webhook_data.get("entry", [{}])[0]
-            changes = entry.get("changes", [{}])[0]
-            value = changes.get("value", {})
-            
-            messages = value.get("messages", [])
-            
-            for message in messages:
-                await self._process_message(message, value, db)
+    def handle_webhook(self, webhook_data: Dict[str, Any], skip_message_ids: Collection[str] = ()) -> bool:
+        """
+        Queue the messages of a webhook call for processing, except those in
+        ``skip_message_ids`` (e.g. from senders over their rate limit).
+        
+        Returns False when the queue is full and WhatsApp should redeliver.
+        """
+        accepted = True
+        for entry in webhook_data.get("entry") or []:
+            for change in entry.get("changes") or []:
+                value = change.get("value") or {}
+                phone_number_id = (value.get("metadata") or {}).get("phone_number_id")
                 
-        except Exception as e:
-            print(f"Error processing webhook: {e}")
+                for message in value.get("messages") or []:
+                    # Status updates and malformed messages carry nothing to answer
+                    if not message.get("id") or not message.get("from") or message["id"] in skip_message_ids:
+                        continue
+                    accepted = message_ingestion_service.enqueue(InboundMessage(
+                        provider="whatsapp",
+                        message_id=message["id"],
+                        chat_key=f"whatsapp:{phone_number_id}:{message['from']}",
+                        payload={"message": message, "value": value}
+                    )) and accepted
+        return accepted
+    
+    async def process_queued_message(self, inbound: InboundMessage, db: AsyncSession):
+        """Ingestion queue handler for WhatsApp messages"""
+        await self._process_message(inbound.payload["message"], inbound.payload["value"], db)
     
     async def _process_message(self, message: Dict[str, Any], value: Dict[str, Any], db: AsyncSession):
         """Process individual WhatsApp message"""
@@ -62,7 +77,8 @@ class WhatsAppIntegrationService:
             
             # Get the agent
             agent_service = AgentService(db)
-            agent = await agent_service.get_agent(integration.agent_id)
+            result = await db.execute(select(Agent).where(Agent.id == integration.agent_id))
+            agent = result.scalar_one_or_none()
             
             if not agent or not agent.is_active:
                 await self.send_message(
@@ -72,15 +88,28 @@ class WhatsAppIntegrationService:
                 )
                 return
             
+            # One conversation per WhatsApp number, with its recent history as context
+            conversation_id = await conversation_memory_service.get_conversation_id(
+                db, integration, agent, phone_number, title=f"WhatsApp {phone_number}"
+            )
+            conversation_history = await conversation_memory_service.load_history(
+                db, conversation_id, conversation_memory_service.max_messages_for(agent)
+            )
+            
             # Process message with AI agent
             response, tools_used, cost = await agent_service.execute_agent(
                 agent=agent,
                 user_message=message_body,
-                conversation_history=[],
+                conversation_history=conversation_history,
                 session_id=f"whatsapp_{phone_number}",
                 integration_id=integration.id
             )
             
+            await conversation_memory_service.append_messages(db, conversation_id, [
+                {"role": "user", "content": message_body, "meta_data": {"whatsapp_message_id": message_id}},
+                {"role": "assistant", "content": response, "meta_data": {"tools_used": tools_used, "cost": cost}}
+            ])
+            
             # Send response back to WhatsApp
             await self.send_message(phone_number_id, phone_number, response)
             
@@ -91,29 +120,14 @@ class WhatsAppIntegrationService:
             print(f"Error processing message: {e}")
     
     async def send_message(self, phone_number_id: str, to: str, message: str):
-        """Send message via WhatsApp Business API"""
-        try:
-            url = f"{self.api_url}/{phone_number_id}/messages"
-            
-            payload = {
-                "messaging_product": "whatsapp",
-                "to": to,
-                "text": {"body": message}
-            }
-            
-            headers = {
-                "Authorization": f"Bearer {settings.WHATSAPP_ACCESS_TOKEN}",
-                "Content-Type": "application/json"
-            }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                
+        """Send message via WhatsApp Business API, split and rate limited by the outbound sender"""
+        delivered = await outbound_delivery_service.send_whatsapp(
+            phone_number_id, to, message, settings.WHATSAPP_ACCESS_TOKEN, api_url=self.api_url
+        )
+        if delivered:
             print(f"Message sent successfully to {to}")
-            
-        except Exception as e:
-            print(f"Error sending message: {e}")
+        else:
+            print(f"Error sending message to {to}")
     
     async def _get_integration_by_phone_id(self, phone_number_id: str, db: AsyncSession):
         """Get WhatsApp integration by phone number ID"""
@@ -129,4 +143,7 @@ class WhatsAppIntegrationService:
             return result.scalar_one_or_none()
         except Exception as e:
             print(f"Error getting integration: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+message_ingestion_service.register_handler("whatsapp", WhatsAppIntegrationService().process_queued_message)
@@ -0,0 +1,253 @@
+"""
+Widget Asset Service
+
+The embeddable web widget is split into two assets:
+
+- the runtime (``app/static/web_widget/runtime.js``): the same for every
+  site, addressed by a content hash so browsers and CDNs can cache it forever;
+- a small per-integration config script that queues the widget settings and
+  loads the current runtime.
+
+Config scripts are rendered when a transaction that wrote a web integration
+through the ORM commits (never for one that rolls back) and stored under
+``WIDGET_ASSET_DIR``, so every worker process serves them from disk and
+memory without touching the database on page loads.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, Integration
+
+logger = logging.getLogger(__name__)
+
+RUNTIME_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "web_widget", "runtime.js")
+
+# Runtime URLs change with their content; config scripts are short-lived so edits show up quickly
+RUNTIME_CACHE_CONTROL = "public, max-age=31536000, immutable"
+CONFIG_CACHE_CONTROL = "public, max-age=300, stale-while-revalidate=86400"
+
+# Resolves the API base from its own URL, queues the config and loads the runtime once per page
+CONFIG_LOADER = """(function() {{
+    var base = document.currentScript.src.replace(/\\/config\\/[^\\/]*$/, '');
+    var config = {config};
+    config.apiUrl = config.apiUrl || base;
+    (window.AIChatWidgetQueue = window.AIChatWidgetQueue || []).push(config);
+    if (!window.AIChatWidgetRuntimeRequested) {{
+        window.AIChatWidgetRuntimeRequested = true;
+        var runtime = document.createElement('script');
+        runtime.src = base + '/runtime/{version}.js';
+        runtime.async = true;
+        document.head.appendChild(runtime);
+    }}
+}})();
+"""
+
+
+@dataclass(frozen=True)
+class WidgetAsset:
+    body: bytes
+    etag: str
+    cache_control: str
+
+
+def _etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def widget_runtime_config(integration_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Settings the widget runtime reads, with the defaults the widget has always used."""
+    runtime_config = {
+        "widgetId": integration_config.get('widget_id', 'default'),
+        "domain": integration_config.get('domain', ''),
+        "themeColor": integration_config.get('theme_color', '#3B82F6'),
+        "position": integration_config.get('position', 'bottom-right'),
+        "greetingMessage": integration_config.get('greeting_message', 'Hi! How can I help you today?'),
+        "widgetName": integration_config.get('widget_name', 'AI Assistant'),
+        "avatarUrl": integration_config.get('avatar_url', ''),
+        "buttonIconColor": integration_config.get('button_icon_color', 'black'),
+        "buttonStrokeColor": integration_config.get('button_stroke_color', 'black'),
+        "buttonFillColor": integration_config.get('button_fill_color', '#3B82F6')
+    }
+    if integration_config.get('api_url'):
+        runtime_config["apiUrl"] = integration_config['api_url']
+    return runtime_config
+
+
+class WidgetAssetService:
+    """Serves the widget runtime and per-integration config scripts."""
+
+    def __init__(self, asset_dir: str):
+        self.asset_dir = asset_dir
+        with open(RUNTIME_PATH, "rb") as runtime_file:
+            runtime = runtime_file.read()
+        self.runtime_version = hashlib.sha256(runtime).hexdigest()[:12]
+        self.runtime = WidgetAsset(runtime, _etag(runtime), RUNTIME_CACHE_CONTROL)
+        # integration id -> (config file mtime, rendered script)
+        self._configs: Dict[int, Tuple[int, WidgetAsset]] = {}
+        # integration id -> when it was found to have no config
+        self._missing: Dict[int, float] = {}
+        self.missing_ttl_seconds = 300
+        self._lock = threading.Lock()
+
+    def _config_path(self, integration_id: int) -> str:
+        return os.path.join(self.asset_dir, f"{int(integration_id)}.json")
+
+    def render_config(self, integration_id: int, integration_config: Dict[str, Any]):
+        """Store the widget settings of an integration for its config script."""
+        os.makedirs(self.asset_dir, exist_ok=True)
+        path = self._config_path(integration_id)
+        # Write then rename, so concurrent readers never see a partial file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as config_file:
+            json.dump(widget_runtime_config(integration_config or {}), config_file, sort_keys=True)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._configs.pop(integration_id, None)
+            self._missing.pop(integration_id, None)
+
+    def remove_config(self, integration_id: int):
+        """Stop serving the config script of a deleted or disabled integration."""
+        try:
+            os.remove(self._config_path(integration_id))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._configs.pop(integration_id, None)
+
+    def get_config_script(self, integration_id: int) -> Optional[WidgetAsset]:
+        """The config script of an integration, or None if it has none rendered."""
+        path = self._config_path(integration_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            with self._lock:
+                self._configs.pop(integration_id, None)
+            return None
+
+        with self._lock:
+            cached = self._configs.get(integration_id)
+        # Another worker may have re-rendered the file since it was cached
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with open(path) as config_file:
+            runtime_config = json.load(config_file)
+        body = CONFIG_LOADER.format(
+            config=json.dumps(runtime_config, sort_keys=True).replace("</", "<\\/"),
+            version=self.runtime_version
+        ).encode()
+        asset = WidgetAsset(body, _etag(body), CONFIG_CACHE_CONTROL)
+        with self._lock:
+            self._configs[integration_id] = (mtime, asset)
+        return asset
+
+    async def load_config_script(self, integration_id: int) -> Optional[WidgetAsset]:
+        """
+        Like ``get_config_script``, but renders from the database the first
+        time for integrations written before config scripts existed. Ids
+        without an active web integration are remembered for a while, so
+        snippets left on sites after a deletion do not query on every load.
+        """
+        asset = self.get_config_script(integration_id)
+        if asset is not None:
+            return asset
+
+        with self._lock:
+            missing_since = self._missing.get(integration_id)
+        if missing_since is not None and time.monotonic() - missing_since < self.missing_ttl_seconds:
+            return None
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Integration.config).where(
+                    Integration.id == integration_id,
+                    Integration.platform == "web",
+                    Integration.is_active == True
+                )
+            )
+            integration_config = result.scalar_one_or_none()
+        if integration_config is None:
+            with self._lock:
+                if len(self._missing) >= 10000:
+                    self._missing.clear()
+                self._missing[integration_id] = time.monotonic()
+            return None
+        self.render_config(integration_id, integration_config)
+        return self.get_config_script(integration_id)
+
+    def embed_code(self, integration_id: int, api_url: str, widget_id: str) -> str:
+        """HTML snippet site owners paste into their pages."""
+        return (
+            "<!-- AI Agent Chat Widget -->\n"
+            f'<div id="ai-chat-widget-{widget_id}"></div>\n'
+            '<script src="https://cdn.jsdelivr.net/npm/marked@9.1.6/marked.min.js"></script>\n'
+            f'<script src="{api_url}/config/{integration_id}.js"></script>'
+        )
+
+
+widget_asset_service = WidgetAssetService(settings.WIDGET_ASSET_DIR)
+
+
+# Session.info key of the config writes waiting for their transaction to commit
+_PENDING_KEY = "widget_asset_writes"
+
+
+def _queue_write(target, render: bool):
+    session = object_session(target)
+    # Captured at flush time: after the commit the instance is expired
+    write = (render, dict(target.config or {}) if render else None)
+    if session is None:
+        _apply_write(target.id, write)
+        return
+    session.info.setdefault(_PENDING_KEY, {})[target.id] = write
+
+
+def _apply_write(integration_id: int, write: Tuple[bool, Optional[Dict[str, Any]]]):
+    render, integration_config = write
+    try:
+        if render:
+            widget_asset_service.render_config(integration_id, integration_config)
+        else:
+            widget_asset_service.remove_config(integration_id)
+    except OSError as e:
+        # The config script is rendered on its next request instead
+        logger.warning(f"Could not update widget config for integration {integration_id}: {e}")
+        try:
+            widget_asset_service.remove_config(integration_id)
+        except OSError:
+            pass
+
+
+@event.listens_for(Integration, "after_insert")
+@event.listens_for(Integration, "after_update")
+def _on_integration_write(mapper, connection, target):
+    if target.platform == "web":
+        _queue_write(target, render=target.is_active is not False)
+
+
+@event.listens_for(Integration, "after_delete")
+def _on_integration_delete(mapper, connection, target):
+    if target.platform == "web":
+        _queue_write(target, render=False)
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session):
+    for integration_id, write in session.info.pop(_PENDING_KEY, {}).items():
+        _apply_write(integration_id, write)
+
+
+@event.listens_for(Session, "after_rollback")
+def _on_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,139 @@
+"""
+Widget Integration Cache
+
+Resolves a web widget (by widget id or domain) to its integration and agent.
+Lookups go through the indexed ``integrations.widget_id``/``domain`` columns,
+and the result is kept in process as detached snapshots, so a warm widget
+message costs no queries at all. Entries are dropped whenever an integration
+or agent row is written through the ORM, and expire after a short TTL to pick
+up edits made by other worker processes.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import Agent, Integration, normalize_widget_domain
+
+
+class WidgetIntegrationCache:
+    """In-process map of widget keys to (integration, agent) snapshots."""
+
+    def __init__(self, ttl_seconds: int = 60, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, Integration, Agent]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def resolve(self, widget_id: str, domain: str, db: AsyncSession) -> Tuple[Optional[Integration], Optional[Agent]]:
+        """
+        Find the active web integration for a widget and its agent.
+
+        The widget id wins over the domain, as before. Returned objects are
+        attached to ``db`` and safe to use for the rest of the request.
+        """
+        keys = []
+        if widget_id:
+            keys.append(("widget_id", widget_id))
+        normalized_domain = normalize_widget_domain(domain)
+        if normalized_domain:
+            keys.append(("domain", normalized_domain))
+
+        for column, value in keys:
+            cache_key = f"{column}:{value}"
+            entry = self._get(cache_key)
+            if entry is not None:
+                self.hits += 1
+                integration, agent = entry
+                # merge(load=False) attaches a copy without touching the database
+                return await db.merge(integration, load=False), await db.merge(agent, load=False)
+
+            self.misses += 1
+            # Load in a private session so the snapshots never belong to a request
+            async with AsyncSession(bind=db.bind, expire_on_commit=False) as lookup_session:
+                result = await lookup_session.execute(
+                    select(Integration, Agent)
+                    .join(Agent, Agent.id == Integration.agent_id)
+                    .where(
+                        getattr(Integration, column) == value,
+                        Integration.platform == "web",
+                        Integration.is_active == True
+                    )
+                    .order_by(Integration.id)
+                    .limit(1)
+                )
+                row = result.first()
+            if row is None:
+                continue
+
+            integration, agent = row
+            self._put(cache_key, integration, agent)
+            return await db.merge(integration, load=False), await db.merge(agent, load=False)
+
+        return None, None
+
+    def _get(self, cache_key: str) -> Optional[Tuple[Integration, Agent]]:
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            stored_at, integration, agent = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[cache_key]
+                return None
+            return integration, agent
+
+    def _put(self, cache_key: str, integration: Integration, agent: Agent):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Oldest insertion first; dicts keep insertion order
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[cache_key] = (time.monotonic(), integration, agent)
+
+    def invalidate_integration(self, integration_id: Optional[int] = None, widget_id: Optional[str] = None, domain: Optional[str] = None):
+        """Drop entries for an integration, and for the keys a new one may now claim."""
+        stale_keys = {f"widget_id:{widget_id}", f"domain:{normalize_widget_domain(domain)}"}
+        with self._lock:
+            for cache_key in list(self._entries):
+                _, integration, _ = self._entries[cache_key]
+                if cache_key in stale_keys or integration.id == integration_id:
+                    del self._entries[cache_key]
+
+    def invalidate_agent(self, agent_id: int):
+        """Drop entries that carry a snapshot of an agent."""
+        with self._lock:
+            for cache_key in list(self._entries):
+                _, _, agent = self._entries[cache_key]
+                if agent.id == agent_id:
+                    del self._entries[cache_key]
+
+    def clear(self):
+        """Drop everything, e.g. after bulk deletes that bypass ORM events."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            size = len(self._entries)
+        return {"entries": size, "hits": self.hits, "misses": self.misses}
+
+
+widget_integration_cache = WidgetIntegrationCache()
+
+
+@event.listens_for(Integration, "after_insert")
+@event.listens_for(Integration, "after_update")
+@event.listens_for(Integration, "after_delete")
+def _on_integration_write(mapper, connection, target):
+    widget_integration_cache.invalidate_integration(target.id, target.widget_id, target.domain)
+
+
+@event.listens_for(Agent, "after_update")
+@event.listens_for(Agent, "after_delete")
+def _on_agent_write(mapper, connection, target):
+    widget_integration_cache.invalidate_agent(target.id)
@@ -41,10 +41,48 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"Could not load marketplace tools: {e}")
     
+    # Scheduled knowledge base refresh (conditional re-crawl)
+    from app.services.knowledge_base_service import knowledge_base_refresh_scheduler
+    knowledge_base_refresh_scheduler.start()
+    
+    # Workers for queued WhatsApp/Telegram/email messages
+    from app.services.message_ingestion_service import message_ingestion_service
+    message_ingestion_service.start()
+    
+    # Deletes expired anonymous widget conversations
+    from app.services.anonymous_session_service import anonymous_session_reaper
+    anonymous_session_reaper.start()
+    
+    # Closes MongoDB clients of the MongoDB Advanced tool once idle
+    from app.services.mongo_client_service import mongo_client_pool
+    mongo_client_pool.start()
+    
+    # Long-poll loops for Telegram bots without a webhook
+    from app.services.telegram_polling_service import telegram_polling_supervisor
+    if settings.TELEGRAM_POLLING_ENABLED:
+        telegram_polling_supervisor.start()
+    
     yield
     
     # Shutdown
     logger.info("Shutting down AI Agent Platform Backend...")
+    await telegram_polling_supervisor.stop()
+    await anonymous_session_reaper.stop()
+    await message_ingestion_service.stop()
+    from app.services.outbound_delivery_service import outbound_delivery_service
+    await outbound_delivery_service.close()
+    await knowledge_base_refresh_scheduler.stop()
+    from app.services.content_extraction_service import content_extraction_service
+    content_extraction_service.shutdown()
+    from app.services.chart_rendering_service import chart_rendering_service
+    chart_rendering_service.shutdown()
+    from app.services.image_processing_service import image_processing_service
+    image_processing_service.shutdown()
+    from app.services.pdf_processing_service import pdf_processing_service
+    pdf_processing_service.shutdown()
+    from app.services.query_engine_service import query_engine_service
+    await query_engine_service.close()
+    await mongo_client_pool.stop()
     await close_db()
     logger.info("Database connection closed")
 
@@ -92,7 +130,7 @@ app.add_middleware(
 # Include API routes
 app.include_router(api_router, prefix="/api/v1")
 
-# Create temp directory for PDF files
+# Create temp directory for PDF files and rendered charts
 temp_dir = os.path.join(os.getcwd(), "temp")
 os.makedirs(temp_dir, exist_ok=True)
 
@@ -9,16 +9,19 @@ import os
 import tempfile
 import hashlib
 from typing import Dict, List, Any, Optional, Union
-import json
 from datetime import datetime
 import mimetypes
-import PyPDF2
-import docx
-import csv
+import asyncio
 import io
 import base64
 
+from app.services.document_extraction_service import document_extraction_service
+from app.services.retrieval_cache_service import retrieval_cache_service
+
 class ChromaDBTool:
+    # Chunks embedded and written per collection.add() call
+    ADD_BATCH_SIZE = 100
+
     def __init__(self):
         self.name = "chromadb_tool"
         self.description = "Upload files, extract them into ChromaDB collections, and query for agent use"
@@ -93,169 +96,91 @@ class ChromaDBTool:
 
     def _extract_text_from_file(self, file_content: bytes, file_name: str) -> str:
         """Extract text from various file types"""
-        file_extension = os.path.splitext(file_name)[1].lower()
-        
         try:
-            if file_extension == '.txt':
-                return file_content.decode('utf-8')
-            
-            elif file_extension == '.pdf':
-                return self._extract_pdf_text(file_content)
-            
-            elif file_extension == '.docx':
-                return self._extract_docx_text(file_content)
-            
-            elif file_extension == '.csv':
-                return self._extract_csv_text(file_content)
-            
-            elif file_extension == '.json':
-                return self._extract_json_text(file_content)
-            
-            else:
-                # Try to decode as text
-                try:
-                    return file_content.decode('utf-8')
-                except:
-                    return f"Binary file: {file_name} (content not extractable)"
-                    
+            return document_extraction_service.extract_text(io.BytesIO(file_content), file_name)
         except Exception as e:
             return f"Error extracting text from {file_name}: {str(e)}"
 
-    def _extract_pdf_text(self, file_content: bytes) -> str:
-        """Extract text from PDF file"""
-        text = ""
-        try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        except Exception as e:
-            text = f"Error reading PDF: {str(e)}"
-        return text
+    def _chunk_text(self, text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+        """Split text into chunks"""
+        return list(document_extraction_service.iter_chunks([text], chunk_size, chunk_overlap))
 
-    def _extract_docx_text(self, file_content: bytes) -> str:
-        """Extract text from DOCX file"""
-        text = ""
-        try:
-            doc = docx.Document(io.BytesIO(file_content))
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-        except Exception as e:
-            text = f"Error reading DOCX: {str(e)}"
-        return text
+    async def upload_file(self, config: Dict[str, Any], file_content: bytes, file_name: str, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Upload and process a file into ChromaDB"""
+        file_hash = hashlib.md5(file_content).hexdigest()
+        return await self._ingest_file(config, io.BytesIO(file_content), file_name, file_hash, len(file_content), metadata)
 
-    def _extract_csv_text(self, file_content: bytes) -> str:
-        """Extract text from CSV file"""
-        text = ""
-        try:
-            csv_content = file_content.decode('utf-8')
-            csv_reader = csv.reader(io.StringIO(csv_content))
-            for row in csv_reader:
-                text += ", ".join(row) + "\n"
-        except Exception as e:
-            text = f"Error reading CSV: {str(e)}"
-        return text
+    async def upload_file_path(self, config: Dict[str, Any], file_path: str, file_name: str = None, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Upload and process a file from disk into ChromaDB without loading it into memory"""
+        file_name = file_name or os.path.basename(file_path)
+        md5 = hashlib.md5()
+        with open(file_path, "rb") as handle:
+            for block in iter(lambda: handle.read(1024 * 1024), b""):
+                md5.update(block)
+        return await self._ingest_file(config, file_path, file_name, md5.hexdigest(), os.path.getsize(file_path), metadata)
 
-    def _extract_json_text(self, file_content: bytes) -> str:
-        """Extract text from JSON file"""
+    async def _ingest_file(self, config: Dict[str, Any], source, file_name: str, file_hash: str, file_size: int, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Stream a document's chunks into the collection in batches"""
         try:
-            json_data = json.loads(file_content.decode('utf-8'))
-            return json.dumps(json_data, indent=2)
+            return await asyncio.to_thread(self._ingest_file_sync, config, source, file_name, file_hash, file_size, metadata)
         except Exception as e:
-            return f"Error reading JSON: {str(e)}"
+            return {
+                "success": False,
+                "error": f"Error uploading file: {str(e)}"
+            }
 
-    def _chunk_text(self, text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
-        """Split text into chunks"""
-        if len(text) <= chunk_size:
-            return [text]
+    def _ingest_file_sync(self, config: Dict[str, Any], source, file_name: str, file_hash: str, file_size: int, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        # Get collection
+        collection = self._get_collection(config)
         
-        chunks = []
-        start = 0
+        chunk_size = config.get("chunk_size", 1000)
+        chunk_overlap = config.get("chunk_overlap", 200)
+        segments = document_extraction_service.iter_segments(source, file_name)
+        chunks = document_extraction_service.iter_chunks(segments, chunk_size, chunk_overlap)
         
-        while start < len(text):
-            end = start + chunk_size
-            
-            # If this isn't the last chunk, try to break at a sentence boundary
-            if end < len(text):
-                # Look for sentence endings
-                for i in range(end, max(start + chunk_size - 100, start), -1):
-                    if text[i] in '.!?':
-                        end = i + 1
-                        break
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - chunk_overlap
-            if start >= len(text):
-                break
+        timestamp = datetime.now().isoformat()
+        chunk_count = 0
+        documents, metadatas, ids = [], [], []
         
-        return chunks
-
-    async def upload_file(self, config: Dict[str, Any], file_content: bytes, file_name: str, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Upload and process a file into ChromaDB"""
-        try:
-            # Extract text from file
-            text = self._extract_text_from_file(file_content, file_name)
-            
-            if not text.strip():
-                return {
-                    "success": False,
-                    "error": "No text content extracted from file"
-                }
-            
-            # Get collection
-            collection = self._get_collection(config)
-            
-            # Chunk text
-            chunk_size = config.get("chunk_size", 1000)
-            chunk_overlap = config.get("chunk_overlap", 200)
-            chunks = self._chunk_text(text, chunk_size, chunk_overlap)
-            
-            # Prepare documents for insertion
-            documents = []
-            metadatas = []
-            ids = []
-            
-            file_hash = hashlib.md5(file_content).hexdigest()
-            timestamp = datetime.now().isoformat()
-            
-            for i, chunk in enumerate(chunks):
-                chunk_id = f"{file_hash}_{i}"
-                
-                documents.append(chunk)
-                metadatas.append({
-                    "file_name": file_name,
-                    "file_hash": file_hash,
-                    "chunk_index": i,
-                    "total_chunks": len(chunks),
-                    "upload_timestamp": timestamp,
-                    "file_size": len(file_content),
-                    **(metadata or {})
-                })
-                ids.append(chunk_id)
-            
-            # Add to collection
-            collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            
-            return {
-                "success": True,
-                "message": f"File uploaded successfully: {file_name}",
+        def flush():
+            if ids:
+                collection.add(documents=documents, metadatas=metadatas, ids=ids)
+                documents.clear()
+                metadatas.clear()
+                ids.clear()
+        
+        for i, chunk in enumerate(chunks):
+            documents.append(chunk)
+            metadatas.append({
                 "file_name": file_name,
-                "chunks_created": len(chunks),
-                "total_chunks": len(chunks),
-                "file_hash": file_hash
-            }
-            
-        except Exception as e:
+                "file_hash": file_hash,
+                "chunk_index": i,
+                "upload_timestamp": timestamp,
+                "file_size": file_size,
+                **(metadata or {})
+            })
+            ids.append(f"{file_hash}_{i}")
+            chunk_count += 1
+            if len(ids) >= self.ADD_BATCH_SIZE:
+                flush()
+        flush()
+        
+        if chunk_count == 0:
             return {
                 "success": False,
-                "error": f"Error uploading file: {str(e)}"
+                "error": "No text content extracted from file"
             }
+        
+        retrieval_cache_service.bump_collection_version(collection)
+        
+        return {
+            "success": True,
+            "message": f"File uploaded successfully: {file_name}",
+            "file_name": file_name,
+            "chunks_created": chunk_count,
+            "total_chunks": chunk_count,
+            "file_hash": file_hash
+        }
 
     async def query_documents(self, config: Dict[str, Any], query: str, n_results: int = 5, filter_metadata: Dict[str, Any] = None) -> Dict[str, Any]:
         """Query documents from ChromaDB"""
@@ -270,9 +195,9 @@ class ChromaDBTool:
                 for key, value in filter_metadata.items():
                     where_filter[key] = value
             
-            # Query collection
+            # Query collection, reusing the cached embedding for repeated questions
             results = collection.query(
-                query_texts=[query],
+                query_embeddings=[retrieval_cache_service.get_query_embedding(collection.name, query)],
                 n_results=n_results,
                 where=where_filter,
                 include=["documents", "metadatas", "distances"]
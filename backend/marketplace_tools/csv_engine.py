@@ -0,0 +1,280 @@
+"""
+CSV Engine
+
+Streaming CSV reader used by the CSV Processor tool. Files are read in
+chunks so memory stays bounded by the chunk size and the result, not by the
+file:
+
+- only the columns an operation needs are parsed (projection pushdown);
+- column types are inferred once from a sample and reused for every chunk;
+- pyarrow's multithreaded CSV reader is used when it is installed, with
+  pandas' chunked reader as the fallback;
+- filters and aggregates run chunk by chunk, so only matching rows or
+  partial aggregates are kept.
+"""
+
+import io
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+DEFAULT_CHUNK_ROWS = 100000
+DEFAULT_BLOCK_BYTES = 8 * 1024 * 1024
+DEFAULT_SAMPLE_ROWS = 10000
+
+# aggregate -> partial aggregates kept per chunk
+_PARTIALS = {
+    'count': ('count',),
+    'sum': ('sum',),
+    'min': ('min',),
+    'max': ('max',),
+    'mean': ('sum', 'count')
+}
+# partial aggregate -> how partials of several chunks combine
+_COMBINE = {'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'}
+
+ChunkTransform = Callable[[pd.DataFrame], pd.DataFrame]
+
+
+@dataclass
+class CSVSource:
+    """Where a CSV comes from and how to parse it."""
+    file_path: Optional[str] = None
+    text: Optional[str] = None
+    delimiter: str = ','
+    encoding: str = 'utf-8'
+    columns: Optional[List[str]] = None
+    chunk_rows: int = DEFAULT_CHUNK_ROWS
+    sample_rows: int = DEFAULT_SAMPLE_ROWS
+    engine: str = 'auto'  # auto, pyarrow, pandas
+
+
+@dataclass
+class ScanStats:
+    engine: str = 'pandas'
+    chunks: int = 0
+    rows_scanned: int = 0
+    truncated: bool = False
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'engine': self.engine,
+            'chunks': self.chunks,
+            'rows_scanned': self.rows_scanned,
+            'truncated': self.truncated
+        }
+
+
+class CSVEngine:
+    """Chunked, column-projected CSV scans with incremental filters and aggregates."""
+
+    def __init__(self, source: CSVSource):
+        self.source = source
+        self._dtypes: Optional[Dict[str, str]] = None
+
+    def _open(self):
+        if self.source.file_path:
+            return self.source.file_path
+        return io.StringIO(self.source.text or '')
+
+    def _use_pyarrow(self) -> bool:
+        return PYARROW_AVAILABLE and self.source.engine != 'pandas'
+
+    def infer_dtypes(self) -> Dict[str, str]:
+        """
+        Column types from the first ``sample_rows`` rows, reused for every
+        chunk so chunks parse faster and consistently. Columns that are
+        integral in the sample but have gaps are read as floats, like pandas does.
+        """
+        if self._dtypes is None:
+            sample = pd.read_csv(
+                self._open(),
+                sep=self.source.delimiter,
+                encoding=self.source.encoding if self.source.file_path else None,
+                usecols=self.source.columns,
+                nrows=self.source.sample_rows
+            )
+            dtypes = {}
+            for column, dtype in sample.dtypes.items():
+                if pd.api.types.is_bool_dtype(dtype):
+                    dtypes[column] = 'bool'
+                elif pd.api.types.is_integer_dtype(dtype):
+                    dtypes[column] = 'int64'
+                elif pd.api.types.is_float_dtype(dtype):
+                    dtypes[column] = 'float64'
+            self._dtypes = dtypes
+        return self._dtypes
+
+    def iter_chunks(self, stats: Optional[ScanStats] = None) -> Iterator[pd.DataFrame]:
+        """Parsed chunks of the projected columns."""
+        stats = stats or ScanStats()
+        if self._use_pyarrow():
+            stats.engine = 'pyarrow'
+            try:
+                for chunk in self._iter_pyarrow():
+                    stats.chunks += 1
+                    stats.rows_scanned += len(chunk)
+                    yield chunk
+                return
+            except pa.ArrowInvalid as e:
+                # pyarrow infers types from the first block; continue with pandas after a type change
+                logger.info(f"pyarrow CSV reader stopped after {stats.rows_scanned} rows ({e}), continuing with pandas")
+                stats.engine = 'pyarrow+pandas'
+
+        for chunk in self._iter_pandas(skip_rows=stats.rows_scanned):
+            stats.chunks += 1
+            stats.rows_scanned += len(chunk)
+            yield chunk
+
+    def _iter_pyarrow(self) -> Iterator[pd.DataFrame]:
+        if self.source.file_path:
+            source = self.source.file_path
+        else:
+            source = pa.BufferReader((self.source.text or '').encode('utf-8'))
+        reader = pa_csv.open_csv(
+            source,
+            read_options=pa_csv.ReadOptions(
+                block_size=DEFAULT_BLOCK_BYTES,
+                encoding=self.source.encoding if self.source.file_path else 'utf8'
+            ),
+            parse_options=pa_csv.ParseOptions(delimiter=self.source.delimiter),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=self.source.columns or [],
+                # Empty strings are missing values, as in pandas
+                strings_can_be_null=True
+            )
+        )
+        for batch in reader:
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+    def _iter_pandas(self, skip_rows: int = 0) -> Iterator[pd.DataFrame]:
+        dtypes = self.infer_dtypes()
+        skipped = skip_rows
+        while True:
+            reader = pd.read_csv(
+                self._open(),
+                sep=self.source.delimiter,
+                encoding=self.source.encoding if self.source.file_path else None,
+                usecols=self.source.columns,
+                dtype=dtypes or None,
+                chunksize=self.source.chunk_rows,
+                # Keep the header line, skip rows already returned
+                skiprows=range(1, skipped + 1) if skipped else None
+            )
+            try:
+                with reader:
+                    for chunk in reader:
+                        skipped += len(chunk)
+                        yield chunk
+                return
+            except (ValueError, TypeError, OverflowError) as e:
+                if not dtypes:
+                    raise
+                # A later chunk does not fit the sampled types; let pandas infer the rest
+                logger.info(f"CSV column types changed after row {skipped} ({e}), inferring per chunk")
+                dtypes = {}
+
+    def read(self, max_rows: int, transform: Optional[ChunkTransform] = None) -> Tuple[pd.DataFrame, ScanStats]:
+        """
+        Up to ``max_rows`` rows, after ``transform`` (such as a filter) is
+        applied to each chunk. Stops reading once enough rows are kept.
+        """
+        stats = ScanStats()
+        kept: List[pd.DataFrame] = []
+        kept_rows = 0
+        chunks = self.iter_chunks(stats)
+        for chunk in chunks:
+            if transform is not None:
+                chunk = transform(chunk)
+            room = max_rows - kept_rows
+            if len(chunk) >= room:
+                kept.append(chunk.iloc[:room])
+                # Truncated means the scan stopped before the end of the file
+                stats.truncated = len(chunk) > room or next(chunks, None) is not None
+                break
+            kept.append(chunk)
+            kept_rows += len(chunk)
+        chunks.close()
+
+        if not kept:
+            return self._empty_frame(), stats
+        return pd.concat(kept, ignore_index=True), stats
+
+    def aggregate(
+        self,
+        group_by: List[str],
+        metrics: Dict[str, List[str]],
+        transform: Optional[ChunkTransform] = None
+    ) -> Tuple[pd.DataFrame, ScanStats]:
+        """
+        Aggregates (count, sum, min, max, mean) of ``metrics`` columns per
+        ``group_by`` group, combined chunk by chunk from partial aggregates.
+        """
+        unknown = [name for names in metrics.values() for name in names if name not in _PARTIALS]
+        if unknown:
+            raise ValueError(f"Unsupported aggregates: {unknown}")
+
+        partials = sorted({(column, partial) for column, names in metrics.items() for name in names for partial in _PARTIALS[name]})
+        named = {f"{column}__{partial}": (column, partial) for column, partial in partials}
+        combine = {name: _COMBINE[partial] for name, (_, partial) in named.items()}
+
+        stats = ScanStats()
+        combined: Optional[pd.DataFrame] = None
+        for chunk in self.iter_chunks(stats):
+            if transform is not None:
+                chunk = transform(chunk)
+            if chunk.empty:
+                continue
+            if group_by:
+                part = chunk.groupby(group_by, dropna=False, sort=False).agg(**named)
+            else:
+                part = pd.DataFrame({name: [getattr(chunk[column], partial)()] for name, (column, partial) in named.items()})
+            if combined is None:
+                combined = part
+            else:
+                levels = list(range(part.index.nlevels))
+                combined = pd.concat([combined, part]).groupby(level=levels, dropna=False, sort=False).agg(combine)
+
+        if combined is None:
+            return pd.DataFrame(columns=list(group_by) + [f"{column}_{name}" for column, names in metrics.items() for name in names]), stats
+
+        result = pd.DataFrame(index=combined.index)
+        for column, names in metrics.items():
+            for name in names:
+                if name == 'mean':
+                    result[f"{column}_mean"] = combined[f"{column}__sum"] / combined[f"{column}__count"]
+                else:
+                    result[f"{column}_{name}"] = combined[f"{column}__{name}"]
+        if group_by:
+            result = result.reset_index()
+        return result, stats
+
+    def _empty_frame(self) -> pd.DataFrame:
+        return pd.read_csv(
+            self._open(),
+            sep=self.source.delimiter,
+            encoding=self.source.encoding if self.source.file_path else None,
+            usecols=self.source.columns,
+            nrows=0
+        )
+
+    def header(self) -> List[str]:
+        """Column names in the file, whatever the projection."""
+        return pd.read_csv(
+            self._open(),
+            sep=self.source.delimiter,
+            encoding=self.source.encoding if self.source.file_path else None,
+            nrows=0
+        ).columns.tolist()
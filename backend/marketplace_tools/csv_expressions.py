@@ -0,0 +1,196 @@
+"""
+CSV Expressions
+
+Compiles the ``filters`` and ``transformations`` specs of the CSV Processor
+tool into plans that run as few whole-column operations as possible:
+
+- a filter plan evaluates every condition to a boolean mask (on the NumPy
+  arrays for numeric columns), ANDs the masks and selects rows once, instead
+  of building an intermediate frame per condition;
+- a transform plan validates the steps up front and applies them to the
+  frame in place: renames and drops edit the column index rather than
+  copying the frame, and column operations replace only that column.
+
+Semantics match the original step-by-step interpretation: conditions on
+columns that are not in the frame are ignored, unknown operators compare
+for equality, and unknown transform types or functions are skipped.
+"""
+
+import operator
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+_COMPARISONS = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '!=': operator.ne,
+    '==': operator.eq
+}
+
+
+class FilterPlan:
+    """A conjunction of column conditions evaluated as one boolean mask."""
+
+    def __init__(self, conditions: List[Tuple[str, str, Any]]):
+        self.conditions = conditions
+
+    def mask(self, df: pd.DataFrame) -> Optional[np.ndarray]:
+        """Rows matching every applicable condition, or None if no condition applies."""
+        mask = None
+        for column, op, value in self.conditions:
+            if column not in df.columns:
+                continue
+            condition = _evaluate(df[column], op, value)
+            if mask is None:
+                # Own copy, so the remaining conditions can be ANDed into it in place
+                mask = np.array(condition, dtype=bool)
+            else:
+                np.logical_and(mask, condition, out=mask)
+        return mask
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        mask = self.mask(df)
+        return df if mask is None else df[mask]
+
+
+def _evaluate(series: pd.Series, op: str, value: Any) -> np.ndarray:
+    if op == 'in':
+        return series.isin(value).to_numpy()
+    if op == 'contains':
+        return series.str.contains(value, na=False).to_numpy(dtype=bool)
+
+    compare = _COMPARISONS[op]
+    # Plain NumPy comparisons skip pandas' index alignment and wrapping;
+    # NaN compares unequal to everything, as it does in pandas
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_extension_array_dtype(series.dtype) \
+            and isinstance(value, (int, float)) and not isinstance(value, bool):
+        with np.errstate(invalid='ignore'):
+            return compare(series.to_numpy(), value)
+    result = compare(series, value)
+    return result.to_numpy(dtype=bool, na_value=False) if hasattr(result, 'to_numpy') else np.asarray(result, dtype=bool)
+
+
+def compile_filters(filters: Dict[str, Any]) -> FilterPlan:
+    """
+    Compile a filters spec: ``{column: value}`` for equality or
+    ``{column: {'operator': op, 'value': value}}``.
+    """
+    conditions = []
+    for column, condition in (filters or {}).items():
+        if isinstance(condition, dict):
+            op = condition.get('operator', '==')
+            if op not in _COMPARISONS and op not in ('in', 'contains'):
+                # Unknown operators have always meant equality
+                op = '=='
+            conditions.append((column, op, condition.get('value')))
+        else:
+            conditions.append((column, '==', condition))
+    return FilterPlan(conditions)
+
+
+Step = Callable[[pd.DataFrame], None]
+
+_STRING_FUNCTIONS = {
+    'uppercase': lambda series: series.str.upper(),
+    'lowercase': lambda series: series.str.lower(),
+    'title': lambda series: series.str.title(),
+    'strip': lambda series: series.str.strip()
+}
+
+
+class TransformPlan:
+    """Validated transformation steps applied to a frame in place."""
+
+    def __init__(self, steps: List[Step]):
+        self.steps = steps
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        for step in self.steps:
+            step(df)
+        return df
+
+
+def _rename(column: str, new_name: str) -> Step:
+    def step(df: pd.DataFrame):
+        if column in df.columns:
+            df.rename(columns={column: new_name}, inplace=True)
+    return step
+
+
+def _drop(column: str) -> Step:
+    def step(df: pd.DataFrame):
+        if column in df.columns:
+            del df[column]
+    return step
+
+
+def _set_column(column: str, compute: Callable[[pd.Series], pd.Series]) -> Step:
+    def step(df: pd.DataFrame):
+        df[column] = compute(df[column])
+    return step
+
+
+def _fill_na(column: str, method: str, value: Any) -> Optional[Step]:
+    if method == 'value':
+        return _set_column(column, lambda series: series.fillna(value))
+    if method == 'forward':
+        return _set_column(column, lambda series: series.ffill())
+    if method == 'backward':
+        return _set_column(column, lambda series: series.bfill())
+    if method == 'mean':
+        return _set_column(column, lambda series: series.fillna(series.mean()))
+    if method == 'median':
+        return _set_column(column, lambda series: series.fillna(series.median()))
+    return None
+
+
+def _convert_type(column: str, target_type: str) -> Optional[Step]:
+    if target_type == 'int':
+        return _set_column(column, lambda series: pd.to_numeric(series, errors='coerce').astype('Int64'))
+    if target_type == 'float':
+        return _set_column(column, lambda series: pd.to_numeric(series, errors='coerce'))
+    if target_type == 'string':
+        return _set_column(column, lambda series: series.astype(str))
+    if target_type == 'datetime':
+        return _set_column(column, lambda series: pd.to_datetime(series, errors='coerce'))
+    return None
+
+
+def _apply_function(column: str, function_name: str, decimals: int) -> Optional[Step]:
+    if function_name in _STRING_FUNCTIONS:
+        return _set_column(column, _STRING_FUNCTIONS[function_name])
+    if function_name == 'abs':
+        return _set_column(column, lambda series: series.abs())
+    if function_name == 'round':
+        return _set_column(column, lambda series: series.round(decimals))
+    return None
+
+
+def compile_transforms(transformations: List[Dict[str, Any]]) -> TransformPlan:
+    """Compile a list of transformation specs (rename, drop, fill_na, convert_type, apply_function)."""
+    steps: List[Step] = []
+    for transform in transformations or []:
+        transform_type = transform.get('type', '')
+        column = transform.get('column', '')
+        step = None
+
+        if transform_type == 'rename':
+            new_name = transform.get('new_name', '')
+            if new_name:
+                step = _rename(column, new_name)
+        elif transform_type == 'drop':
+            step = _drop(column)
+        elif transform_type == 'fill_na':
+            step = _fill_na(column, transform.get('method', 'value'), transform.get('value', ''))
+        elif transform_type == 'convert_type':
+            step = _convert_type(column, transform.get('target_type', ''))
+        elif transform_type == 'apply_function':
+            step = _apply_function(column, transform.get('function', ''), transform.get('decimals', 2))
+
+        if step is not None:
+            steps.append(step)
+    return TransformPlan(steps)
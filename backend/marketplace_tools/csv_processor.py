@@ -7,7 +7,6 @@ It supports reading, writing, filtering, transforming, and analyzing CSV files.
 
 import asyncio
 import csv
-import io
 import json
 import logging
 import pandas as pd
@@ -15,7 +14,10 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional, Union
 import numpy as np
 
+from app.services.dataset_store_service import dataset_store
 from .base import BaseTool
+from .csv_engine import CSVEngine, CSVSource
+from .csv_expressions import compile_filters, compile_transforms
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +46,8 @@ class CSVProcessorTool(BaseTool):
         self.default_delimiter = config.get('delimiter', ',')
         self.max_file_size = config.get('max_file_size', 100 * 1024 * 1024)  # 100MB
         self.max_rows = config.get('max_rows', 100000)
+        self.chunk_rows = config.get('chunk_rows', 100000)
+        self.csv_engine = config.get('csv_engine', 'auto')  # auto, pyarrow, pandas
         
     async def execute(self, **kwargs) -> Dict[str, Any]:
         """
@@ -53,11 +57,14 @@ class CSVProcessorTool(BaseTool):
             action: Operation to perform (read, write, filter, sort, analyze, etc.)
             file_path: Path to CSV file (for file operations)
             data: CSV data as string (for in-memory operations)
+            dataset: Handle of a table returned by an earlier call, instead of data
             output_path: Output file path (for write operations)
             delimiter: CSV delimiter (default: comma)
             encoding: File encoding (default: utf-8)
             columns: List of columns to include/exclude
             filters: Dictionary of column filters
+            aggregate: Aggregates computed while reading, e.g.
+                {'group_by': ['region'], 'metrics': {'sales': ['sum', 'mean']}}
             sort_by: Column to sort by
             sort_order: Sort order (asc, desc)
             operation: Specific operation (head, tail, describe, etc.)
@@ -96,44 +103,63 @@ class CSVProcessorTool(BaseTool):
             return self._format_error(f"CSV operation failed: {str(e)}")
     
     async def _read_csv(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Read and parse CSV data."""
+        """
+        Read and parse CSV data.
+        
+        The file is scanned in chunks: only the requested columns are parsed,
+        and filters and aggregates are applied chunk by chunk, so large files
+        are not loaded whole. ``nrows`` caps the rows returned.
+        """
         file_path = params.get('file_path', '')
         data = params.get('data', '')
         delimiter = params.get('delimiter', self.default_delimiter)
         encoding = params.get('encoding', self.default_encoding)
         nrows = min(params.get('nrows', self.max_rows), self.max_rows)
+        columns = params.get('columns') or []
+        filters = params.get('filters') or {}
+        aggregate = params.get('aggregate') or {}
         
         if not file_path and not data:
             return self._format_error("Either file_path or data is required")
         
         try:
-            if file_path:
-                # Read from file
-                df = pd.read_csv(
-                    file_path,
-                    delimiter=delimiter,
-                    encoding=encoding,
-                    nrows=nrows
-                )
+            group_by = aggregate.get('group_by') or []
+            if isinstance(group_by, str):
+                group_by = [group_by]
+            metrics = aggregate.get('metrics') or {}
+            
+            engine = CSVEngine(CSVSource(
+                file_path=file_path or None,
+                text=None if file_path else data,
+                delimiter=delimiter,
+                encoding=encoding,
+                chunk_rows=self.chunk_rows,
+                engine=self.csv_engine
+            ))
+            if columns or aggregate:
+                # Parse only the columns the result, filters and aggregates need
+                in_file = set(engine.header())
+                engine.source.columns = list(dict.fromkeys(
+                    columns + group_by + list(metrics) + [column for column in filters if column in in_file]
+                ))
+            transform = compile_filters(filters).apply if filters else None
+            
+            if aggregate:
+                df, stats = await asyncio.to_thread(engine.aggregate, group_by, metrics, transform)
             else:
-                # Read from string data
-                df = pd.read_csv(
-                    io.StringIO(data),
-                    delimiter=delimiter,
-                    nrows=nrows
-                )
+                df, stats = await asyncio.to_thread(engine.read, nrows, transform)
+                if columns:
+                    df = df[columns]
             
             return self._format_success({
-                'data': df.to_dict('records'),
-                'columns': df.columns.tolist(),
-                'shape': df.shape,
-                'dtypes': df.dtypes.to_dict(),
+                **await dataset_store.describe(df, params),
                 'info': {
                     'total_rows': len(df),
                     'total_columns': len(df.columns),
-                    'memory_usage': df.memory_usage(deep=True).sum(),
-                    'null_counts': df.isnull().sum().to_dict()
-                }
+                    'memory_usage': int(df.memory_usage(index=False).sum()),
+                    'null_counts': {column: int(count) for column, count in df.isnull().sum().items()}
+                },
+                'scan': stats.to_dict()
             })
             
         except Exception as e:
@@ -141,20 +167,19 @@ class CSVProcessorTool(BaseTool):
     
     async def _write_csv(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Write data to CSV file."""
-        data = params.get('data', [])
         output_path = params.get('output_path', '')
         delimiter = params.get('delimiter', self.default_delimiter)
         encoding = params.get('encoding', self.default_encoding)
         index = params.get('index', False)
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         if not output_path:
             return self._format_error("Output path is required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             df.to_csv(
                 output_path,
                 delimiter=delimiter,
@@ -174,52 +199,24 @@ class CSVProcessorTool(BaseTool):
     
     async def _filter_csv(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Filter CSV data based on conditions."""
-        data = params.get('data', [])
         filters = params.get('filters', {})
         columns = params.get('columns', [])
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
             # Apply column selection
             if columns:
                 df = df[columns]
             
             # Apply filters
-            for column, condition in filters.items():
-                if column in df.columns:
-                    if isinstance(condition, dict):
-                        # Complex filter (e.g., {'operator': '>', 'value': 10})
-                        operator = condition.get('operator', '==')
-                        value = condition.get('value')
-                        
-                        if operator == '>':
-                            df = df[df[column] > value]
-                        elif operator == '<':
-                            df = df[df[column] < value]
-                        elif operator == '>=':
-                            df = df[df[column] >= value]
-                        elif operator == '<=':
-                            df = df[df[column] <= value]
-                        elif operator == '!=':
-                            df = df[df[column] != value]
-                        elif operator == 'in':
-                            df = df[df[column].isin(value)]
-                        elif operator == 'contains':
-                            df = df[df[column].str.contains(value, na=False)]
-                        else:
-                            df = df[df[column] == value]
-                    else:
-                        # Simple equality filter
-                        df = df[df[column] == condition]
+            df = self._apply_filters(df, filters)
             
             return self._format_success({
-                'data': df.to_dict('records'),
-                'columns': df.columns.tolist(),
-                'shape': df.shape,
+                **await dataset_store.describe(df, params),
                 'filters_applied': filters,
                 'rows_filtered': len(df)
             })
@@ -227,21 +224,24 @@ class CSVProcessorTool(BaseTool):
         except Exception as e:
             return self._format_error(f"Error filtering CSV: {str(e)}")
     
+    def _apply_filters(self, df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
+        """Rows matching every column condition; conditions on missing columns are ignored."""
+        return compile_filters(filters).apply(df)
+    
     async def _sort_csv(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Sort CSV data by specified columns."""
-        data = params.get('data', [])
         sort_by = params.get('sort_by', [])
         sort_order = params.get('sort_order', 'asc')
         ascending = sort_order.lower() != 'desc'
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         if not sort_by:
             return self._format_error("Sort columns are required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
             # Convert single column to list
             if isinstance(sort_by, str):
@@ -256,9 +256,7 @@ class CSVProcessorTool(BaseTool):
             df_sorted = df.sort_values(by=sort_by, ascending=ascending)
             
             return self._format_success({
-                'data': df_sorted.to_dict('records'),
-                'columns': df_sorted.columns.tolist(),
-                'shape': df_sorted.shape,
+                **await dataset_store.describe(df_sorted, params),
                 'sort_by': sort_by,
                 'sort_order': sort_order
             })
@@ -268,15 +266,14 @@ class CSVProcessorTool(BaseTool):
     
     async def _analyze_csv(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze CSV data and provide statistics."""
-        data = params.get('data', [])
         operation = params.get('operation', 'describe')
         columns = params.get('columns', [])
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
             # Select specific columns if provided
             if columns:
@@ -356,79 +353,22 @@ class CSVProcessorTool(BaseTool):
     
     async def _transform_csv(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Transform CSV data."""
-        data = params.get('data', [])
         transformations = params.get('transformations', [])
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         if not transformations:
             return self._format_error("Transformations are required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
-            for transform in transformations:
-                transform_type = transform.get('type', '')
-                column = transform.get('column', '')
-                
-                if transform_type == 'rename':
-                    new_name = transform.get('new_name', '')
-                    if column in df.columns and new_name:
-                        df = df.rename(columns={column: new_name})
-                        
-                elif transform_type == 'drop':
-                    if column in df.columns:
-                        df = df.drop(columns=[column])
-                        
-                elif transform_type == 'fill_na':
-                    value = transform.get('value', '')
-                    method = transform.get('method', 'value')
-                    
-                    if method == 'value':
-                        df[column] = df[column].fillna(value)
-                    elif method == 'forward':
-                        df[column] = df[column].fillna(method='ffill')
-                    elif method == 'backward':
-                        df[column] = df[column].fillna(method='bfill')
-                    elif method == 'mean':
-                        df[column] = df[column].fillna(df[column].mean())
-                    elif method == 'median':
-                        df[column] = df[column].fillna(df[column].median())
-                        
-                elif transform_type == 'convert_type':
-                    target_type = transform.get('target_type', '')
-                    
-                    if target_type == 'int':
-                        df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int64')
-                    elif target_type == 'float':
-                        df[column] = pd.to_numeric(df[column], errors='coerce')
-                    elif target_type == 'string':
-                        df[column] = df[column].astype(str)
-                    elif target_type == 'datetime':
-                        df[column] = pd.to_datetime(df[column], errors='coerce')
-                        
-                elif transform_type == 'apply_function':
-                    function_name = transform.get('function', '')
-                    
-                    if function_name == 'uppercase':
-                        df[column] = df[column].str.upper()
-                    elif function_name == 'lowercase':
-                        df[column] = df[column].str.lower()
-                    elif function_name == 'title':
-                        df[column] = df[column].str.title()
-                    elif function_name == 'strip':
-                        df[column] = df[column].str.strip()
-                    elif function_name == 'abs':
-                        df[column] = df[column].abs()
-                    elif function_name == 'round':
-                        decimals = transform.get('decimals', 2)
-                        df[column] = df[column].round(decimals)
+            # One validated plan, applied to the frame in place
+            df = compile_transforms(transformations).apply(df)
             
             return self._format_success({
-                'data': df.to_dict('records'),
-                'columns': df.columns.tolist(),
-                'shape': df.shape,
+                **await dataset_store.describe(df, params),
                 'transformations_applied': len(transformations)
             })
             
@@ -437,14 +377,13 @@ class CSVProcessorTool(BaseTool):
     
     async def _validate_csv(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Validate CSV data structure and content."""
-        data = params.get('data', [])
         schema = params.get('schema', {})
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             validation_results = {
                 'is_valid': True,
                 'errors': [],
@@ -521,7 +460,10 @@ class CSVProcessorTool(BaseTool):
         try:
             dataframes = []
             for dataset in datasets:
-                if isinstance(dataset, list):
+                if isinstance(dataset, str):
+                    # Handle of a stored table
+                    df = await dataset_store.aload({**params, 'dataset': dataset})
+                elif isinstance(dataset, list):
                     df = pd.DataFrame(dataset)
                 else:
                     df = pd.DataFrame([dataset])
@@ -541,9 +483,7 @@ class CSVProcessorTool(BaseTool):
                 result_df = pd.concat(dataframes, ignore_index=True)
             
             return self._format_success({
-                'data': result_df.to_dict('records'),
-                'columns': result_df.columns.tolist(),
-                'shape': result_df.shape,
+                **await dataset_store.describe(result_df, params),
                 'merge_type': merge_type,
                 'datasets_merged': len(datasets)
             })
@@ -553,16 +493,15 @@ class CSVProcessorTool(BaseTool):
     
     async def _sample_csv(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Sample data from CSV."""
-        data = params.get('data', [])
         sample_size = params.get('sample_size', 100)
         sample_type = params.get('sample_type', 'random')  # random, head, tail
         random_state = params.get('random_state', None)
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
             if sample_type == 'random':
                 sampled_df = df.sample(n=min(sample_size, len(df)), random_state=random_state)
@@ -574,9 +513,7 @@ class CSVProcessorTool(BaseTool):
                 return self._format_error(f"Unknown sample type: {sample_type}")
             
             return self._format_success({
-                'data': sampled_df.to_dict('records'),
-                'columns': sampled_df.columns.tolist(),
-                'shape': sampled_df.shape,
+                **await dataset_store.describe(sampled_df, params),
                 'sample_type': sample_type,
                 'sample_size': len(sampled_df)
             })
@@ -586,17 +523,16 @@ class CSVProcessorTool(BaseTool):
     
     async def _clean_csv(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Clean CSV data by removing duplicates, handling missing values, etc."""
-        data = params.get('data', [])
         remove_duplicates = params.get('remove_duplicates', True)
         handle_missing = params.get('handle_missing', True)
         missing_strategy = params.get('missing_strategy', 'drop')  # drop, fill, interpolate
         fill_value = params.get('fill_value', '')
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             original_shape = df.shape
             
             # Remove duplicates
@@ -613,9 +549,7 @@ class CSVProcessorTool(BaseTool):
                     df = df.interpolate()
             
             return self._format_success({
-                'data': df.to_dict('records'),
-                'columns': df.columns.tolist(),
-                'shape': df.shape,
+                **await dataset_store.describe(df, params),
                 'original_shape': original_shape,
                 'rows_removed': original_shape[0] - df.shape[0],
                 'cleaning_applied': {
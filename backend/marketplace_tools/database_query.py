@@ -10,13 +10,9 @@ import json
 import logging
 import re
 from typing import Any, Dict, List, Optional, Union
-from datetime import datetime
-import sqlite3
-# import psycopg2  # Removed to avoid conflicts with asyncpg
-import mysql.connector
-from sqlalchemy import create_engine, text, inspect
 from sqlalchemy.exc import SQLAlchemyError
 
+from app.services.query_engine_service import query_engine_service
 from .base import BaseTool
 
 logger = logging.getLogger(__name__)
@@ -31,6 +27,10 @@ class DatabaseQueryTool(BaseTool):
     - Query validation and sanitization
     - Result formatting and pagination
     - Connection pooling
+    
+    Queries run on async engines shared across tool instances (see
+    ``query_engine_service``); SELECT results are streamed and cut off at
+    ``max_results`` rows or ``max_result_bytes`` of JSON, whichever comes first.
     """
     
     def __init__(self, config: Dict[str, Any]):
@@ -38,45 +38,42 @@ class DatabaseQueryTool(BaseTool):
         self.db_type = config.get('db_type', 'sqlite')
         self.connection_string = config.get('connection_string', '')
         self.max_results = config.get('max_results', 1000)
+        self.max_result_bytes = config.get('max_result_bytes', 256 * 1024)
         self.timeout = config.get('timeout', 30)
         self.allowed_operations = config.get('allowed_operations', ['SELECT'])
         
-        # Initialize database connection
-        self.engine = None
-        self._init_connection()
+        # Engines are created lazily and cached by the query engine service
+        self._engine = None
+        self._engine_error = None
     
-    def _init_connection(self):
-        """Initialize database connection based on configuration."""
-        try:
-            if self.db_type == 'sqlite':
-                if not self.connection_string:
-                    self.connection_string = ':memory:'  # Default to in-memory SQLite
-                self.engine = create_engine(f"sqlite:///{self.connection_string}")
-            elif self.db_type == 'postgresql':
-                self.engine = create_engine(self.connection_string)
-            elif self.db_type == 'mysql':
-                self.engine = create_engine(self.connection_string)
-            else:
-                raise ValueError(f"Unsupported database type: {self.db_type}")
-                
-        except Exception as e:
-            logger.error(f"Failed to initialize database connection: {str(e)}")
-            self.engine = None
+    @property
+    def engine(self):
+        """The shared async engine for this tool's database, or None if it can't be created."""
+        if self._engine is None and self._engine_error is None:
+            try:
+                self._engine = query_engine_service.get_engine(self.db_type, self.connection_string)
+            except Exception as e:
+                logger.error(f"Failed to initialize database connection: {str(e)}")
+                self._engine_error = str(e)
+        return self._engine
     
-    async def execute(self, query: str, params: Optional[Dict[str, Any]] = None, 
-                     operation: str = "SELECT", limit: Optional[int] = None) -> Dict[str, Any]:
+    async def execute(self, query: str = "", params: Optional[Dict[str, Any]] = None, 
+                     operation: str = "SELECT", limit: Optional[int] = None, **kwargs) -> Dict[str, Any]:
         """
         Execute a database query.
         
         Args:
             query: SQL query to execute
-            params: Query parameters for parameterized queries
-            operation: Type of operation (SELECT, INSERT, UPDATE, DELETE)
+            params: Query parameters for parameterized queries (also accepted as ``parameters``)
+            operation: Type of operation (SELECT, INSERT, UPDATE, DELETE; also accepted as ``operation_type``)
             limit: Maximum number of results to return
             
         Returns:
             Query results with metadata
         """
+        params = params or kwargs.get('parameters')
+        operation = kwargs.get('operation_type') or operation
+        
         if not query or not query.strip():
             return self._format_error("Query is required")
         
@@ -98,17 +95,16 @@ class DatabaseQueryTool(BaseTool):
         try:
             if operation == "SELECT":
                 result = await self._execute_select(query, params, limit)
-            elif operation == "INSERT":
-                result = await self._execute_insert(query, params)
-            elif operation == "UPDATE":
-                result = await self._execute_update(query, params)
-            elif operation == "DELETE":
-                result = await self._execute_delete(query, params)
+            elif operation in ("INSERT", "UPDATE", "DELETE"):
+                result = await self._execute_write(query, params, operation)
             else:
                 return self._format_error(f"Unsupported operation: {operation}")
             
             return result
             
+        except asyncio.TimeoutError:
+            logger.error(f"Database query timed out after {self.timeout}s")
+            return self._format_error(f"Query execution failed: timed out after {self.timeout} seconds")
         except Exception as e:
             logger.error(f"Database query error: {str(e)}")
             return self._format_error(f"Query execution failed: {str(e)}")
@@ -166,98 +162,41 @@ class DatabaseQueryTool(BaseTool):
     async def _execute_select(self, query: str, params: Optional[Dict[str, Any]], limit: int) -> Dict[str, Any]:
         """Execute SELECT query."""
         try:
-            with self.engine.connect() as connection:
-                # Add LIMIT if not present
-                if 'LIMIT' not in query.upper():
-                    query = f"{query} LIMIT {limit}"
-                
-                result = connection.execute(text(query), params or {})
-                rows = result.fetchall()
-                
-                # Convert rows to dictionaries
-                columns = result.keys()
-                results = []
-                for row in rows:
-                    row_dict = {}
-                    for i, column in enumerate(columns):
-                        # Handle datetime objects
-                        if isinstance(row[i], datetime):
-                            row_dict[column] = row[i].isoformat()
-                        else:
-                            row_dict[column] = row[i]
-                    results.append(row_dict)
-                
-                metadata = {
-                    'operation': 'SELECT',
-                    'rows_returned': len(results),
-                    'limit': limit,
-                    'query': query
-                }
-                
-                return self._format_success(results, metadata)
-                
-        except SQLAlchemyError as e:
-            raise Exception(f"Database error: {str(e)}")
-    
-    async def _execute_insert(self, query: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        """Execute INSERT query."""
-        try:
-            with self.engine.connect() as connection:
-                result = connection.execute(text(query), params or {})
-                connection.commit()
-                
-                metadata = {
-                    'operation': 'INSERT',
-                    'rows_affected': result.rowcount,
-                    'query': query
-                }
-                
-                return self._format_success({
-                    'rows_affected': result.rowcount,
-                    'message': f"Successfully inserted {result.rowcount} row(s)"
-                }, metadata)
-                
-        except SQLAlchemyError as e:
-            raise Exception(f"Database error: {str(e)}")
-    
-    async def _execute_update(self, query: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        """Execute UPDATE query."""
-        try:
-            with self.engine.connect() as connection:
-                result = connection.execute(text(query), params or {})
-                connection.commit()
-                
-                metadata = {
-                    'operation': 'UPDATE',
-                    'rows_affected': result.rowcount,
-                    'query': query
-                }
-                
-                return self._format_success({
-                    'rows_affected': result.rowcount,
-                    'message': f"Successfully updated {result.rowcount} row(s)"
-                }, metadata)
+            result = await query_engine_service.select(
+                self.engine, query, params, limit, self.max_result_bytes, self.timeout
+            )
+            
+            metadata = {
+                'operation': 'SELECT',
+                'rows_returned': len(result.rows),
+                'limit': limit,
+                'truncated': result.truncated,
+                'truncated_by': result.truncated_by,
+                'result_bytes': result.result_bytes,
+                'query': query
+            }
+            
+            return self._format_success(result.rows, metadata)
                 
         except SQLAlchemyError as e:
             raise Exception(f"Database error: {str(e)}")
     
-    async def _execute_delete(self, query: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        """Execute DELETE query."""
+    async def _execute_write(self, query: str, params: Optional[Dict[str, Any]], operation: str) -> Dict[str, Any]:
+        """Execute INSERT, UPDATE or DELETE query."""
         try:
-            with self.engine.connect() as connection:
-                result = connection.execute(text(query), params or {})
-                connection.commit()
-                
-                metadata = {
-                    'operation': 'DELETE',
-                    'rows_affected': result.rowcount,
-                    'query': query
-                }
-                
-                return self._format_success({
-                    'rows_affected': result.rowcount,
-                    'message': f"Successfully deleted {result.rowcount} row(s)"
-                }, metadata)
+            rows_affected = await query_engine_service.execute(self.engine, query, params, self.timeout)
+            
+            metadata = {
+                'operation': operation,
+                'rows_affected': rows_affected,
+                'query': query
+            }
+            
+            verb = {'INSERT': 'inserted', 'UPDATE': 'updated', 'DELETE': 'deleted'}[operation]
+            return self._format_success({
+                'rows_affected': rows_affected,
+                'message': f"Successfully {verb} {rows_affected} row(s)"
+            }, metadata)
                 
         except SQLAlchemyError as e:
             raise Exception(f"Database error: {str(e)}")
@@ -276,35 +215,11 @@ class DatabaseQueryTool(BaseTool):
             return self._format_error("Database connection not available")
         
         try:
-            inspector = inspect(self.engine)
+            table_info = await query_engine_service.table_info(self.engine, table_name)
             
             if table_name:
-                # Get specific table info
-                columns = inspector.get_columns(table_name)
-                indexes = inspector.get_indexes(table_name)
-                foreign_keys = inspector.get_foreign_keys(table_name)
-                
-                table_info = {
-                    'name': table_name,
-                    'columns': columns,
-                    'indexes': indexes,
-                    'foreign_keys': foreign_keys
-                }
-                
                 return self._format_success(table_info)
-            else:
-                # Get all tables
-                tables = inspector.get_table_names()
-                table_list = []
-                
-                for table in tables:
-                    columns = inspector.get_columns(table)
-                    table_list.append({
-                        'name': table,
-                        'column_count': len(columns)
-                    })
-                
-                return self._format_success(table_list, {'total_tables': len(tables)})
+            return self._format_success(table_info, {'total_tables': len(table_info)})
                 
         except Exception as e:
             logger.error(f"Error getting table info: {str(e)}")
@@ -321,22 +236,13 @@ class DatabaseQueryTool(BaseTool):
             return self._format_error("Database connection not available")
         
         try:
-            with self.engine.connect() as connection:
-                # Try a simple query
-                if self.db_type == 'sqlite':
-                    result = connection.execute(text("SELECT 1"))
-                elif self.db_type == 'postgresql':
-                    result = connection.execute(text("SELECT 1"))
-                elif self.db_type == 'mysql':
-                    result = connection.execute(text("SELECT 1"))
-                
-                result.fetchone()
-                
-                return self._format_success({
-                    'status': 'connected',
-                    'database_type': self.db_type,
-                    'message': 'Database connection successful'
-                })
+            await query_engine_service.select(self.engine, "SELECT 1", None, 1, self.max_result_bytes, self.timeout)
+            
+            return self._format_success({
+                'status': 'connected',
+                'database_type': self.db_type,
+                'message': 'Database connection successful'
+            })
                 
         except Exception as e:
             logger.error(f"Connection test failed: {str(e)}")
@@ -11,14 +11,10 @@ import logging
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Union
 import pandas as pd
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-import gspread
 from gspread_dataframe import set_with_dataframe, get_as_dataframe
 
+from app.services.google_sheets_service import SheetsClient, google_sheets_service
 from .base import BaseTool
 
 logger = logging.getLogger(__name__)
@@ -50,32 +46,46 @@ class GoogleSheetsIntegrationTool(BaseTool):
             'https://www.googleapis.com/auth/spreadsheets',
             'https://www.googleapis.com/auth/drive'
         ])
+        # Another host for the Sheets and Drive APIs (e.g. a local stand-in)
+        self.api_endpoint = config.get('api_endpoint')
         
-        # Initialize Google Sheets client
-        self.service = None
-        self.gc = None
+        # Shared Google Sheets client, see google_sheets_service
+        self.client: Optional[SheetsClient] = None
         
-    async def execute(self, **kwargs) -> Dict[str, Any]:
+    # Operation names of the marketplace schema (tool_registry passes them positionally)
+    SCHEMA_OPERATIONS = {
+        'read_sheet': 'read',
+        'write_sheet': 'write',
+        'create_sheet': 'create',
+        'update_cells': 'update',
+        'apply_changes': 'apply_changes',
+    }
+    
+    async def execute(self, operation: Optional[str] = None, **kwargs) -> Dict[str, Any]:
         """
         Execute Google Sheets operation with given parameters.
         
         Args:
-            action: Operation to perform (read, write, create, update, etc.)
+            action: Operation to perform (read, write, create, update, apply_changes, etc.)
             spreadsheet_id: Google Sheets spreadsheet ID
             sheet_name: Name of the worksheet
             range_name: Cell range (e.g., 'A1:D10')
+            ranges: Several cell ranges to read in one request
             data: Data to write
+            changes: Ranges and values to write in one request (apply_changes)
             credentials: Google credentials
-            operation: Specific operation (append, clear, format, etc.)
+            operation: Operation name from the marketplace schema (read_sheet, apply_changes, etc.)
             
         Returns:
             Dictionary containing operation result
         """
-        action = kwargs.get('action', 'read')
+        action = kwargs.get('action') or self.SCHEMA_OPERATIONS.get(operation, operation) or 'read'
+        if 'range' in kwargs:
+            kwargs.setdefault('range_name', kwargs.pop('range'))
         
         try:
-            # Initialize Google Sheets client if not already done
-            if not self.service:
+            # Get the shared Google Sheets client if not already done
+            if not self.client:
                 await self._initialize_client(kwargs.get('credentials', {}))
             
             if action == 'read':
@@ -88,6 +98,8 @@ class GoogleSheetsIntegrationTool(BaseTool):
                 return await self._update_sheet(kwargs)
             elif action == 'append':
                 return await self._append_data(kwargs)
+            elif action == 'apply_changes':
+                return await self._apply_changes(kwargs)
             elif action == 'clear':
                 return await self._clear_sheet(kwargs)
             elif action == 'list_sheets':
@@ -102,41 +114,66 @@ class GoogleSheetsIntegrationTool(BaseTool):
             return self._format_error(f"Google Sheets operation failed: {str(e)}")
     
     async def _initialize_client(self, credentials: Dict[str, Any]) -> None:
-        """Initialize Google Sheets client."""
+        """Get the Google Sheets client for the credentials, authorized once and shared."""
         try:
-            if credentials:
-                # Use provided credentials
-                creds = Credentials.from_authorized_user_info(credentials, self.scopes)
-            elif self.credentials_file:
-                # Use service account credentials
-                creds = Credentials.from_service_account_file(self.credentials_file, scopes=self.scopes)
-            else:
-                return self._format_error("No credentials provided")
-            
-            # Refresh credentials if needed
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            
-            # Initialize Google Sheets API service
-            self.service = build('sheets', 'v4', credentials=creds)
-            
-            # Initialize gspread client
-            self.gc = gspread.authorize(creds)
-            
+            self.client = await asyncio.to_thread(
+                google_sheets_service.get_client,
+                credentials, self.credentials_file, self.scopes, self.api_endpoint
+            )
         except Exception as e:
             raise Exception(f"Failed to initialize Google Sheets client: {str(e)}")
     
+    def _to_values(self, data: List[Any], include_headers: bool = True) -> List[List[Any]]:
+        """Rows as lists; a list of dictionaries becomes a header row plus one row per record."""
+        if data and isinstance(data[0], dict):
+            headers = list(data[0].keys())
+            values = [headers] if include_headers else []
+            for row in data:
+                values.append([row.get(header, '') for header in headers])
+            return values
+        return data
+    
+    def _records(self, values: List[List[Any]], include_headers: bool) -> List[Any]:
+        """Rows as dictionaries keyed by the first row, when it holds the headers."""
+        if not include_headers or not values:
+            return values
+        headers = values[0]
+        data = []
+        for row in values[1:]:
+            # Pad row with empty values if shorter than headers
+            padded_row = row + [''] * (len(headers) - len(row))
+            data.append(dict(zip(headers, padded_row)))
+        return data
+    
     async def _read_sheet(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Read data from Google Sheets."""
         spreadsheet_id = params.get('spreadsheet_id', '')
         sheet_name = params.get('sheet_name', '')
         range_name = params.get('range_name', '')
+        ranges = params.get('ranges', [])
         include_headers = params.get('include_headers', True)
+        use_cache = params.get('use_cache', True)
         
         if not spreadsheet_id:
             return self._format_error("Spreadsheet ID is required")
         
         try:
+            if ranges:
+                # Several ranges, read in one request
+                all_values = await asyncio.to_thread(self.client.batch_get, spreadsheet_id, ranges, use_cache)
+                return self._format_success({
+                    'ranges': {
+                        range_spec: {
+                            'data': self._records(values, include_headers),
+                            'rows': len(values),
+                            'columns': len(values[0]) if values else 0
+                        }
+                        for range_spec, values in zip(ranges, all_values)
+                    },
+                    'spreadsheet_id': spreadsheet_id,
+                    'has_headers': include_headers
+                })
+            
             # Determine the range to read
             if range_name:
                 range_spec = range_name
@@ -145,13 +182,8 @@ class GoogleSheetsIntegrationTool(BaseTool):
             else:
                 range_spec = "A:Z"
             
-            # Read data from Google Sheets
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=spreadsheet_id,
-                range=range_spec
-            ).execute()
-            
-            values = result.get('values', [])
+            # Read data from Google Sheets (or the range cache)
+            values = (await asyncio.to_thread(self.client.batch_get, spreadsheet_id, [range_spec], use_cache))[0]
             
             if not values:
                 return self._format_success({
@@ -162,19 +194,8 @@ class GoogleSheetsIntegrationTool(BaseTool):
                     'range': range_spec
                 })
             
-            # Convert to list of dictionaries if headers are included
-            if include_headers and values:
-                headers = values[0]
-                data = []
-                for row in values[1:]:
-                    # Pad row with empty values if shorter than headers
-                    padded_row = row + [''] * (len(headers) - len(row))
-                    data.append(dict(zip(headers, padded_row)))
-            else:
-                data = values
-            
             return self._format_success({
-                'data': data,
+                'data': self._records(values, include_headers),
                 'rows': len(values),
                 'columns': len(values[0]) if values else 0,
                 'spreadsheet_id': spreadsheet_id,
@@ -210,34 +231,18 @@ class GoogleSheetsIntegrationTool(BaseTool):
             else:
                 range_spec = "A1"
             
-            # Convert data to list format if it's a list of dictionaries
-            if data and isinstance(data[0], dict):
-                headers = list(data[0].keys())
-                values = [headers]  # Add headers as first row
-                for row in data:
-                    values.append([row.get(header, '') for header in headers])
-            else:
-                values = data
+            values = self._to_values(data)
             
             # Clear sheet if requested
             if clear_sheet:
                 clear_range = f"{sheet_name}!A:Z" if sheet_name else "A:Z"
-                self.service.spreadsheets().values().clear(
-                    spreadsheetId=spreadsheet_id,
-                    range=clear_range
-                ).execute()
+                await asyncio.to_thread(self.client.batch_clear, spreadsheet_id, [clear_range])
             
             # Write data
-            body = {
-                'values': values
-            }
-            
-            result = self.service.spreadsheets().values().update(
-                spreadsheetId=spreadsheet_id,
-                range=range_spec,
-                valueInputOption='RAW',
-                body=body
-            ).execute()
+            result = await asyncio.to_thread(
+                self.client.batch_update, spreadsheet_id, [{'range': range_spec, 'values': values}]
+            )
+            responses = result.get('responses', [])
             
             return self._format_success({
                 'data_written': True,
@@ -245,8 +250,8 @@ class GoogleSheetsIntegrationTool(BaseTool):
                 'range': range_spec,
                 'rows_written': len(values),
                 'columns_written': len(values[0]) if values else 0,
-                'updated_cells': result.get('updatedCells', 0),
-                'updated_range': result.get('updatedRange', '')
+                'updated_cells': result.get('totalUpdatedCells', 0),
+                'updated_range': responses[0].get('updatedRange', '') if responses else ''
             })
             
         except HttpError as e:
@@ -254,15 +259,76 @@ class GoogleSheetsIntegrationTool(BaseTool):
         except Exception as e:
             return self._format_error(f"Error writing sheet: {str(e)}")
     
+    async def _apply_changes(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Write any number of ranges in one request, after clearing
+        ``clear_ranges`` in one more. Each change is ``{'range': ..., 'data': ...}``
+        (or ``'values'``), with rows as lists or as dictionaries; ranges
+        without a sheet are taken from ``sheet_name``.
+        """
+        spreadsheet_id = params.get('spreadsheet_id', '')
+        sheet_name = params.get('sheet_name', '')
+        changes = params.get('changes', [])
+        clear_ranges = params.get('clear_ranges', [])
+        value_input_option = params.get('value_input_option', 'RAW')
+        
+        if not spreadsheet_id:
+            return self._format_error("Spreadsheet ID is required")
+        
+        if not changes and not clear_ranges:
+            return self._format_error("Changes or clear ranges are required")
+        
+        def qualified(range_spec: str) -> str:
+            return f"{sheet_name}!{range_spec}" if sheet_name and '!' not in range_spec else range_spec
+        
+        data = []
+        for index, change in enumerate(changes):
+            range_spec = change.get('range', '')
+            rows = change.get('values', change.get('data', []))
+            if not range_spec or not rows:
+                return self._format_error(f"Change {index} needs a range and data")
+            data.append({
+                'range': qualified(range_spec),
+                'values': self._to_values(rows, change.get('include_headers', True))
+            })
+        
+        try:
+            cleared = []
+            if clear_ranges:
+                result = await asyncio.to_thread(
+                    self.client.batch_clear, spreadsheet_id, [qualified(r) for r in clear_ranges]
+                )
+                cleared = result.get('clearedRanges', [])
+            
+            result = {}
+            if data:
+                result = await asyncio.to_thread(self.client.batch_update, spreadsheet_id, data, value_input_option)
+            
+            return self._format_success({
+                'changes_applied': True,
+                'spreadsheet_id': spreadsheet_id,
+                'ranges_updated': len(result.get('responses', [])),
+                'updated_ranges': [response.get('updatedRange', '') for response in result.get('responses', [])],
+                'updated_rows': result.get('totalUpdatedRows', 0),
+                'updated_cells': result.get('totalUpdatedCells', 0),
+                'cleared_ranges': cleared,
+                'api_requests': int(bool(clear_ranges)) + int(bool(data))
+            })
+            
+        except HttpError as e:
+            return self._format_error(f"Google Sheets API error: {str(e)}")
+        except Exception as e:
+            return self._format_error(f"Error applying changes: {str(e)}")
+    
     async def _create_sheet(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new Google Sheets spreadsheet."""
         title = params.get('title', f'Sheet_{datetime.now().strftime("%Y%m%d_%H%M%S")}')
         data = params.get('data', [])
         share_with = params.get('share_with', [])
         
-        try:
+        def create():
             # Create new spreadsheet
-            spreadsheet = self.gc.create(title)
+            spreadsheet = self.client.gspread.create(title)
             
             # Get the first worksheet
             worksheet = spreadsheet.get_worksheet(0)
@@ -280,6 +346,10 @@ class GoogleSheetsIntegrationTool(BaseTool):
             if share_with:
                 for email in share_with:
                     spreadsheet.share(email, perm_type='user', role='writer')
+            return spreadsheet
+        
+        try:
+            spreadsheet = await asyncio.to_thread(create)
             
             return self._format_success({
                 'spreadsheet_created': True,
@@ -316,35 +386,23 @@ class GoogleSheetsIntegrationTool(BaseTool):
             else:
                 range_spec = "A1"
             
-            # Convert data to list format if it's a list of dictionaries
-            if data and isinstance(data[0], dict):
-                headers = list(data[0].keys())
-                values = [headers]  # Add headers as first row
-                for row in data:
-                    values.append([row.get(header, '') for header in headers])
-            else:
-                values = data
+            values = self._to_values(data)
             
             if update_type == 'overwrite':
                 # Overwrite existing data
-                body = {'values': values}
-                result = self.service.spreadsheets().values().update(
-                    spreadsheetId=spreadsheet_id,
-                    range=range_spec,
-                    valueInputOption='RAW',
-                    body=body
-                ).execute()
+                result = await asyncio.to_thread(
+                    self.client.batch_update, spreadsheet_id, [{'range': range_spec, 'values': values}]
+                )
+                responses = result.get('responses', [])
+                updated_cells = result.get('totalUpdatedCells', 0)
+                updated_range = responses[0].get('updatedRange', '') if responses else ''
                 
             elif update_type == 'append':
                 # Append data to the end
-                body = {'values': values}
-                result = self.service.spreadsheets().values().append(
-                    spreadsheetId=spreadsheet_id,
-                    range=range_spec,
-                    valueInputOption='RAW',
-                    insertDataOption='INSERT_ROWS',
-                    body=body
-                ).execute()
+                result = await asyncio.to_thread(self.client.append, spreadsheet_id, range_spec, values)
+                updates = result.get('updates', {})
+                updated_cells = updates.get('updatedCells', 0)
+                updated_range = updates.get('updatedRange', '')
                 
             else:
                 return self._format_error(f"Unknown update type: {update_type}")
@@ -355,8 +413,8 @@ class GoogleSheetsIntegrationTool(BaseTool):
                 'range': range_spec,
                 'update_type': update_type,
                 'rows_updated': len(values),
-                'updated_cells': result.get('updatedCells', 0),
-                'updated_range': result.get('updatedRange', '')
+                'updated_cells': updated_cells,
+                'updated_range': updated_range
             })
             
         except HttpError as e:
@@ -380,32 +438,20 @@ class GoogleSheetsIntegrationTool(BaseTool):
             # Determine the range
             range_spec = f"{sheet_name}!A:Z" if sheet_name else "A:Z"
             
-            # Convert data to list format if it's a list of dictionaries
-            if data and isinstance(data[0], dict):
-                headers = list(data[0].keys())
-                values = []
-                for row in data:
-                    values.append([row.get(header, '') for header in headers])
-            else:
-                values = data
+            # Rows only; the sheet already has its headers
+            values = self._to_values(data, include_headers=False)
             
             # Append data
-            body = {'values': values}
-            result = self.service.spreadsheets().values().append(
-                spreadsheetId=spreadsheet_id,
-                range=range_spec,
-                valueInputOption='RAW',
-                insertDataOption='INSERT_ROWS',
-                body=body
-            ).execute()
+            result = await asyncio.to_thread(self.client.append, spreadsheet_id, range_spec, values)
+            updates = result.get('updates', {})
             
             return self._format_success({
                 'data_appended': True,
                 'spreadsheet_id': spreadsheet_id,
                 'range': range_spec,
                 'rows_appended': len(values),
-                'updated_cells': result.get('updatedCells', 0),
-                'updated_range': result.get('updatedRange', '')
+                'updated_cells': updates.get('updatedCells', 0),
+                'updated_range': updates.get('updatedRange', '')
             })
             
         except HttpError as e:
@@ -432,16 +478,14 @@ class GoogleSheetsIntegrationTool(BaseTool):
                 range_spec = "A:Z"
             
             # Clear the range
-            result = self.service.spreadsheets().values().clear(
-                spreadsheetId=spreadsheet_id,
-                range=range_spec
-            ).execute()
+            result = await asyncio.to_thread(self.client.batch_clear, spreadsheet_id, [range_spec])
+            cleared = result.get('clearedRanges', [])
             
             return self._format_success({
                 'sheet_cleared': True,
                 'spreadsheet_id': spreadsheet_id,
                 'range': range_spec,
-                'cleared_range': result.get('clearedRange', '')
+                'cleared_range': cleared[0] if cleared else ''
             })
             
         except HttpError as e:
@@ -458,9 +502,7 @@ class GoogleSheetsIntegrationTool(BaseTool):
         
         try:
             # Get spreadsheet metadata
-            spreadsheet = self.service.spreadsheets().get(
-                spreadsheetId=spreadsheet_id
-            ).execute()
+            spreadsheet = await asyncio.to_thread(self.client.metadata, spreadsheet_id)
             
             sheets = []
             for sheet in spreadsheet.get('sheets', []):
@@ -497,9 +539,7 @@ class GoogleSheetsIntegrationTool(BaseTool):
         
         try:
             # Get spreadsheet metadata
-            spreadsheet = self.service.spreadsheets().get(
-                spreadsheetId=spreadsheet_id
-            ).execute()
+            spreadsheet = await asyncio.to_thread(self.client.metadata, spreadsheet_id)
             
             # Find the specific sheet
             target_sheet = None
@@ -521,11 +561,7 @@ class GoogleSheetsIntegrationTool(BaseTool):
             # Get data range
             try:
                 data_range = f"{sheet_props.get('title')}!A:Z"
-                data_result = self.service.spreadsheets().values().get(
-                    spreadsheetId=spreadsheet_id,
-                    range=data_range
-                ).execute()
-                values = data_result.get('values', [])
+                values = (await asyncio.to_thread(self.client.batch_get, spreadsheet_id, [data_range]))[0]
             except:
                 values = []
             
@@ -597,11 +633,7 @@ class GoogleSheetsIntegrationTool(BaseTool):
                     })
             
             if requests:
-                body = {'requests': requests}
-                self.service.spreadsheets().batchUpdate(
-                    spreadsheetId=spreadsheet_id,
-                    body=body
-                ).execute()
+                await asyncio.to_thread(self.client.update_spreadsheet, spreadsheet_id, requests)
             
             return self._format_success({
                 'sheet_formatted': True,
@@ -9,7 +9,8 @@ import asyncio
 import json
 import logging
 import os
-from typing import Any, Dict, List, Optional, Union
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
 from datetime import datetime
 from pathlib import Path
 from PIL import Image, ImageFilter, ImageEnhance, ImageOps
@@ -25,10 +26,17 @@ except ImportError:
     np = None
 from io import BytesIO
 
+from app.services.image_processing_service import BATCH_OPERATIONS, image_processing_service, scan_images
 from .base import BaseTool
 
 logger = logging.getLogger(__name__)
 
+# Parameters passed on to the batch workers
+BATCH_OPTIONS = (
+    'width', 'height', 'maintain_aspect_ratio', 'fast_downscale', 'target_format',
+    'brightness', 'contrast', 'saturation', 'sharpness'
+)
+
 class ImageProcessorTool(BaseTool):
     """
     Image Processor Tool for handling image operations.
@@ -79,7 +87,12 @@ class ImageProcessorTool(BaseTool):
             elif operation == "enhance":
                 return await self._enhance_image(input_path, output_path, **kwargs)
             elif operation == "batch_process":
-                return await self._batch_process_images(input_path, **kwargs)
+                return await self._batch_process_images(
+                    input_path,
+                    kwargs.pop('batch_operation', ''),
+                    kwargs.pop('output_directory', None) or output_path,
+                    **kwargs
+                )
             else:
                 return self._format_error(f"Unsupported operation: {operation}")
                 
@@ -469,69 +482,89 @@ class ImageProcessorTool(BaseTool):
         except Exception as e:
             raise Exception(f"Image enhancement error: {str(e)}")
     
+    def _plan_batch(self, input_directory: str, operation: str,
+                    output_directory: Optional[str] = None, **kwargs) -> Tuple[List[Tuple[str, str]], Path, Dict[str, Any]]:
+        """Input/output file pairs, output directory and worker options of a batch."""
+        input_path = Path(input_directory)
+        if not input_path.exists() or not input_path.is_dir():
+            raise ValueError(f"Input directory not found: {input_directory}")
+        
+        if operation not in BATCH_OPERATIONS:
+            raise ValueError(f"Unsupported batch operation: {operation}")
+        
+        options = {key: kwargs[key] for key in BATCH_OPTIONS if kwargs.get(key) is not None}
+        options['quality'] = self.quality
+        if operation == "resize" and not (options.get('width') or options.get('height')):
+            raise ValueError("Either width or height must be specified")
+        target_format = str(options.get('target_format', '')).lower()
+        if operation == "convert" and target_format not in self.supported_formats:
+            raise ValueError(f"Unsupported target format: {options.get('target_format')}")
+        
+        # Find all image files in one pass over the directory
+        image_files = scan_images(input_directory, self.supported_formats)
+        if not image_files:
+            raise ValueError("No image files found in directory")
+        
+        # Create output directory if specified
+        if output_directory:
+            output_path = Path(output_directory)
+            output_path.mkdir(parents=True, exist_ok=True)
+        else:
+            output_path = input_path / "processed"
+            output_path.mkdir(exist_ok=True)
+        
+        files = []
+        for image_file in image_files:
+            # Converted files take the extension of their new format
+            name = f"{image_file.stem}.{target_format}" if operation == "convert" else image_file.name
+            files.append((str(image_file), str(output_path / name)))
+        return files, output_path, options
+    
+    async def iter_batch_process(self, input_directory: str, operation: str,
+                                 output_directory: Optional[str] = None, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process every image of a directory in the worker pool, yielding
+        ``{'completed', 'total', 'result'}`` as each image finishes.
+        
+        Raises:
+            ValueError: the directory, operation or its parameters are invalid
+        """
+        files, _, options = self._plan_batch(input_directory, operation, output_directory, **kwargs)
+        async for progress in self._run_batch(operation, files, options):
+            yield progress
+    
+    async def _run_batch(self, operation: str, files: List[Tuple[str, str]],
+                         options: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        completed = 0
+        async for result in image_processing_service.process_batch(operation, files, options):
+            completed += 1
+            yield {'completed': completed, 'total': len(files), 'result': result}
+    
     async def _batch_process_images(self, input_directory: str, operation: str,
-                                  output_directory: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+                                  output_directory: Optional[str] = None,
+                                  progress_callback: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                                  **kwargs) -> Dict[str, Any]:
         """Process multiple images in batch."""
         try:
-            input_path = Path(input_directory)
-            if not input_path.exists() or not input_path.is_dir():
-                return self._format_error(f"Input directory not found: {input_directory}")
-            
-            # Find all image files
-            image_extensions = [f'.{ext}' for ext in self.supported_formats]
-            image_files = []
-            
-            for ext in image_extensions:
-                image_files.extend(input_path.glob(f'*{ext}'))
-                image_files.extend(input_path.glob(f'*{ext.upper()}'))
+            try:
+                files, output_path, options = self._plan_batch(input_directory, operation, output_directory, **kwargs)
+            except ValueError as e:
+                return self._format_error(str(e))
             
-            if not image_files:
-                return self._format_error("No image files found in directory")
-            
-            # Create output directory if specified
-            if output_directory:
-                output_path = Path(output_directory)
-                output_path.mkdir(parents=True, exist_ok=True)
-            else:
-                output_path = input_path / "processed"
-                output_path.mkdir(exist_ok=True)
-            
-            # Process each image
+            # Process images in the worker pool, reporting each one as it finishes
+            started = time.perf_counter()
             results = []
-            for image_file in image_files:
-                try:
-                    # Determine output path
-                    if output_directory:
-                        output_file = output_path / image_file.name
-                    else:
-                        output_file = output_path / image_file.name
-                    
-                    # Process image based on operation
-                    if operation == "resize":
-                        result = await self._resize_image(str(image_file), str(output_file), **kwargs)
-                    elif operation == "convert":
-                        result = await self._convert_format(str(image_file), str(output_file), **kwargs)
-                    elif operation == "enhance":
-                        result = await self._enhance_image(str(image_file), str(output_file), **kwargs)
-                    else:
-                        result = self._format_error(f"Unsupported batch operation: {operation}")
-                    
-                    results.append({
-                        'input_file': str(image_file),
-                        'output_file': str(output_file),
-                        'success': result['success'],
-                        'data': result.get('result', {}),
-                        'error': result.get('error', '')
-                    })
-                    
-                except Exception as e:
-                    results.append({
-                        'input_file': str(image_file),
-                        'output_file': '',
-                        'success': False,
-                        'data': {},
-                        'error': str(e)
-                    })
+            async for progress in self._run_batch(operation, files, options):
+                results.append(progress['result'])
+                if progress_callback is not None:
+                    outcome = progress_callback(progress)
+                    if asyncio.iscoroutine(outcome):
+                        await outcome
+            elapsed = time.perf_counter() - started
+            
+            # Keep the directory order in the report
+            order = {input_file: index for index, (input_file, _) in enumerate(files)}
+            results.sort(key=lambda r: order[r['input_file']])
             
             # Calculate statistics
             successful = sum(1 for r in results if r['success'])
@@ -541,17 +574,19 @@ class ImageProcessorTool(BaseTool):
                 'input_directory': input_directory,
                 'output_directory': str(output_path),
                 'operation': operation,
-                'total_files': len(image_files),
+                'total_files': len(files),
                 'successful': successful,
                 'failed': failed,
-                'success_rate': round(successful / len(image_files) * 100, 2) if image_files else 0,
+                'success_rate': round(successful / len(files) * 100, 2) if files else 0,
+                'elapsed_seconds': round(elapsed, 3),
                 'results': results
             }
             
             metadata = {
                 'operation': 'batch_process',
                 'batch_operation': operation,
-                'total_files': len(image_files)
+                'total_files': len(files),
+                'workers': image_processing_service.max_workers
             }
             
             return self._format_success(batch_data, metadata)
@@ -606,6 +641,8 @@ class ImageProcessorTool(BaseTool):
                 'width': 'Target width for resize operations',
                 'height': 'Target height for resize operations',
                 'filter_type': 'Type of filter to apply',
-                'target_format': 'Target format for conversion'
+                'target_format': 'Target format for conversion',
+                'batch_operation': 'Operation applied to every image of the input directory (resize, convert, enhance)',
+                'output_directory': 'Output directory for batch processing'
             }
         } 
\ No newline at end of file
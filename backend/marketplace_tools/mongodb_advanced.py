@@ -1,19 +1,31 @@
 """
 MongoDB Advanced Tool
 Allows connecting to MongoDB with credentials and querying data for agent use.
+
+Clients are shared per connection string through ``mongo_client_pool``, and
+results are read from the cursor in batches until ``max_results`` documents
+or ``max_result_bytes`` of JSON, so large collections are never fetched whole.
 """
 
 import pymongo
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError, OperationFailure
 import json
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Tuple, Union
 from datetime import datetime
 import re
 from bson import ObjectId, json_util
 import asyncio
 from urllib.parse import quote_plus
 
+from app.services.mongo_client_service import mongo_client_pool, mongo_schema_cache, read_cursor
+
+DEFAULT_MAX_RESULT_BYTES = 256 * 1024
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_SCHEMA_SAMPLE_SIZE = 100
+# Stages that write their output and must stay last in a pipeline
+WRITE_STAGES = ('$out', '$merge')
+
 class MongoDBAdvancedTool:
     def __init__(self):
         self.name = "mongodb_advanced"
@@ -46,6 +58,21 @@ class MongoDBAdvancedTool:
                     "description": "Maximum number of results to return",
                     "default": 100
                 },
+                "max_result_bytes": {
+                    "type": "integer",
+                    "description": "Maximum size of the returned results in bytes of JSON",
+                    "default": DEFAULT_MAX_RESULT_BYTES
+                },
+                "batch_size": {
+                    "type": "integer",
+                    "description": "Number of documents fetched from the server per batch",
+                    "default": DEFAULT_BATCH_SIZE
+                },
+                "schema_sample_size": {
+                    "type": "integer",
+                    "description": "Number of random documents sampled to infer a collection schema",
+                    "default": DEFAULT_SCHEMA_SAMPLE_SIZE
+                },
                 "enable_logging": {
                     "type": "boolean",
                     "description": "Enable query logging",
@@ -56,17 +83,8 @@ class MongoDBAdvancedTool:
         }
 
     def _get_client(self, config: Dict[str, Any]) -> MongoClient:
-        """Get MongoDB client"""
-        connection_string = config.get("connection_string")
-        max_query_time = config.get("max_query_time", 30)
-        
-        # Parse connection string and add timeout options
-        if "?" in connection_string:
-            connection_string += f"&serverSelectionTimeoutMS={max_query_time * 1000}&socketTimeoutMS={max_query_time * 1000}"
-        else:
-            connection_string += f"?serverSelectionTimeoutMS={max_query_time * 1000}&socketTimeoutMS={max_query_time * 1000}"
-        
-        return MongoClient(connection_string)
+        """Get the shared MongoDB client for the connection string"""
+        return mongo_client_pool.get(config.get("connection_string"), config.get("max_query_time", 30))
 
     def _get_database(self, config: Dict[str, Any]):
         """Get MongoDB database"""
@@ -77,31 +95,24 @@ class MongoDBAdvancedTool:
     def _test_connection(self, config: Dict[str, Any]) -> Dict[str, Any]:
         """Test MongoDB connection"""
         try:
-            client = self._get_client(config)
-            # Test connection by listing databases
-            client.admin.command('ping')
-            
-            # Get database info
-            db = self._get_database(config)
-            collections = db.list_collection_names()
+            # The ping is cached by the pool, so this is cheap before every operation
+            mongo_client_pool.ping(config.get("connection_string"), config.get("max_query_time", 30))
             
             return {
                 "success": True,
                 "message": "Connection successful",
-                "database": config.get("database_name"),
-                "collections": collections,
-                "total_collections": len(collections)
+                "database": config.get("database_name")
             }
             
-        except ConnectionFailure as e:
+        except ServerSelectionTimeoutError as e:
             return {
                 "success": False,
-                "error": f"Connection failed: {str(e)}"
+                "error": f"Server selection timeout: {str(e)}"
             }
-        except ServerSelectionTimeoutError as e:
+        except ConnectionFailure as e:
             return {
                 "success": False,
-                "error": f"Server selection timeout: {str(e)}"
+                "error": f"Connection failed: {str(e)}"
             }
         except Exception as e:
             return {
@@ -109,6 +120,49 @@ class MongoDBAdvancedTool:
                 "error": f"Connection error: {str(e)}"
             }
 
+    def _result_limit(self, config: Dict[str, Any], requested: Optional[int]) -> Tuple[int, int]:
+        """
+        Number of documents to return (the requested limit, capped by
+        max_results) and to fetch: one more when max_results applies, so
+        the response can tell the result was truncated.
+        """
+        max_results = config.get("max_results", 100)
+        if requested and requested <= max_results:
+            return requested, requested
+        return max_results, max_results + 1
+
+    def _find(self, config: Dict[str, Any], collection, filter_conditions: Dict[str, Any], sort: Optional[Dict[str, int]], fetch: int):
+        """Find cursor returning at most ``fetch`` documents in batches"""
+        cursor = collection.find(
+            filter_conditions,
+            batch_size=min(config.get("batch_size", DEFAULT_BATCH_SIZE), fetch),
+            max_time_ms=config.get("max_query_time", 30) * 1000
+        )
+        if sort:
+            cursor = cursor.sort(list(sort.items()))
+        return cursor.limit(fetch)
+
+    def _aggregate(self, config: Dict[str, Any], collection, pipeline: List[Dict[str, Any]], fetch: int):
+        """Aggregation cursor; a $limit stage is added so the server stops after ``fetch`` documents"""
+        if not pipeline or not any(stage in pipeline[-1] for stage in WRITE_STAGES):
+            pipeline = pipeline + [{"$limit": fetch}]
+        return collection.aggregate(
+            pipeline,
+            batchSize=min(config.get("batch_size", DEFAULT_BATCH_SIZE), fetch),
+            maxTimeMS=config.get("max_query_time", 30) * 1000
+        )
+
+    def _read_results(self, config: Dict[str, Any], cursor, limit: int) -> Dict[str, Any]:
+        """Results of a cursor, stopped at the limit or the byte budget"""
+        read = read_cursor(cursor, limit, config.get("max_result_bytes", DEFAULT_MAX_RESULT_BYTES))
+        return {
+            "results": read.documents,
+            "total_results": len(read.documents),
+            "truncated": read.truncated_by is not None,
+            "truncated_by": read.truncated_by,
+            "result_bytes": read.result_bytes
+        }
+
     def _parse_query(self, query: str) -> Dict[str, Any]:
         """Parse natural language query into MongoDB query"""
         query_lower = query.lower()
@@ -126,6 +180,8 @@ class MongoDBAdvancedTool:
 
     def _parse_find_query(self, query: str) -> Dict[str, Any]:
         """Parse find query from natural language"""
+        query_lower = query.lower()
+        
         # Extract collection name
         collection_match = re.search(r'(?:from|in|collection)\s+(\w+)', query, re.IGNORECASE)
         collection = collection_match.group(1) if collection_match else None
@@ -229,6 +285,10 @@ class MongoDBAdvancedTool:
 
     async def execute_query(self, config: Dict[str, Any], query: str) -> Dict[str, Any]:
         """Execute a natural language query on MongoDB"""
+        # pymongo blocks, so the query runs off the event loop
+        return await asyncio.to_thread(self._execute_query, config, query)
+
+    def _execute_query(self, config: Dict[str, Any], query: str) -> Dict[str, Any]:
         try:
             # Test connection first
             connection_test = self._test_connection(config)
@@ -250,43 +310,24 @@ class MongoDBAdvancedTool:
             
             # Execute query based on operation
             operation = parsed_query["operation"]
-            max_results = config.get("max_results", 100)
+            limit, fetch = self._result_limit(config, parsed_query.get("limit"))
             
             if operation == "find":
-                # Build find query
                 filter_conditions = parsed_query.get("filter", {})
-                limit = min(parsed_query.get("limit", max_results), max_results)
-                sort = parsed_query.get("sort")
-                
-                # Execute find
-                cursor = collection.find(filter_conditions)
-                
-                if sort:
-                    cursor = cursor.sort(list(sort.items()))
-                
-                if limit:
-                    cursor = cursor.limit(limit)
-                
-                # Convert cursor to list and handle ObjectId serialization
-                results = []
-                for doc in cursor:
-                    # Convert ObjectId to string for JSON serialization
-                    doc = json.loads(json_util.dumps(doc))
-                    results.append(doc)
+                cursor = self._find(config, collection, filter_conditions, parsed_query.get("sort"), fetch)
                 
                 return {
                     "success": True,
                     "operation": "find",
                     "collection": parsed_query["collection"],
                     "filter": filter_conditions,
-                    "results": results,
-                    "total_results": len(results),
+                    **self._read_results(config, cursor, limit),
                     "query": query
                 }
             
             elif operation == "count":
                 filter_conditions = parsed_query.get("filter", {})
-                count = collection.count_documents(filter_conditions)
+                count = collection.count_documents(filter_conditions, maxTimeMS=config.get("max_query_time", 30) * 1000)
                 
                 return {
                     "success": True,
@@ -299,27 +340,14 @@ class MongoDBAdvancedTool:
             
             elif operation == "aggregate":
                 pipeline = parsed_query.get("pipeline", [])
-                
-                # Add limit to pipeline if specified
-                limit = min(parsed_query.get("limit", max_results), max_results)
-                if limit:
-                    pipeline.append({"$limit": limit})
-                
-                cursor = collection.aggregate(pipeline)
-                
-                # Convert cursor to list
-                results = []
-                for doc in cursor:
-                    doc = json.loads(json_util.dumps(doc))
-                    results.append(doc)
+                cursor = self._aggregate(config, collection, pipeline, fetch)
                 
                 return {
                     "success": True,
                     "operation": "aggregate",
                     "collection": parsed_query["collection"],
                     "pipeline": pipeline,
-                    "results": results,
-                    "total_results": len(results),
+                    **self._read_results(config, cursor, limit),
                     "query": query
                 }
             
@@ -342,6 +370,9 @@ class MongoDBAdvancedTool:
 
     async def list_collections(self, config: Dict[str, Any]) -> Dict[str, Any]:
         """List all collections in the database"""
+        return await asyncio.to_thread(self._list_collections, config)
+
+    def _list_collections(self, config: Dict[str, Any]) -> Dict[str, Any]:
         try:
             connection_test = self._test_connection(config)
             if not connection_test["success"]:
@@ -355,7 +386,8 @@ class MongoDBAdvancedTool:
             for collection_name in collections:
                 collection = db[collection_name]
                 try:
-                    count = collection.count_documents({})
+                    # Read from collection metadata instead of scanning every document
+                    count = collection.estimated_document_count()
                     collection_stats.append({
                         "name": collection_name,
                         "document_count": count
@@ -381,7 +413,15 @@ class MongoDBAdvancedTool:
 
     async def get_collection_schema(self, config: Dict[str, Any], collection_name: str) -> Dict[str, Any]:
         """Get schema information for a collection"""
+        return await asyncio.to_thread(self._get_collection_schema, config, collection_name)
+
+    def _get_collection_schema(self, config: Dict[str, Any], collection_name: str) -> Dict[str, Any]:
         try:
+            cache_key = (config.get("connection_string"), config.get("database_name"), collection_name)
+            cached = mongo_schema_cache.get(cache_key)
+            if cached is not None:
+                return {**cached, "cached": True}
+            
             connection_test = self._test_connection(config)
             if not connection_test["success"]:
                 return connection_test
@@ -389,10 +429,23 @@ class MongoDBAdvancedTool:
             db = self._get_database(config)
             collection = db[collection_name]
             
-            # Get a sample document to understand schema
-            sample_doc = collection.find_one()
+            # Infer the schema from a random sample rather than the first document
+            sample_size = config.get("schema_sample_size", DEFAULT_SCHEMA_SAMPLE_SIZE)
+            cursor = collection.aggregate(
+                [{"$sample": {"size": sample_size}}],
+                maxTimeMS=config.get("max_query_time", 30) * 1000
+            )
+            merged: Dict[str, Any] = {}
+            sample_doc = None
+            sampled = 0
+            with cursor:
+                for doc in cursor:
+                    if sample_doc is None:
+                        sample_doc = doc
+                    self._merge_schema(merged, self._analyze_document_schema(doc))
+                    sampled += 1
             
-            if not sample_doc:
+            if not sampled:
                 return {
                     "success": True,
                     "collection": collection_name,
@@ -400,15 +453,15 @@ class MongoDBAdvancedTool:
                     "message": "Collection is empty"
                 }
             
-            # Analyze schema
-            schema = self._analyze_document_schema(sample_doc)
-            
-            return {
+            result = {
                 "success": True,
                 "collection": collection_name,
-                "schema": schema,
+                "schema": self._finalize_schema(merged, sampled),
+                "sampled_documents": sampled,
                 "sample_document": json.loads(json_util.dumps(sample_doc))
             }
+            mongo_schema_cache.put(cache_key, result)
+            return {**result, "cached": False}
             
         except Exception as e:
             return {
@@ -447,8 +500,37 @@ class MongoDBAdvancedTool:
         
         return schema
 
+    def _merge_schema(self, merged: Dict[str, Any], schema: Dict[str, Any]):
+        """Add one document's schema to the per-field type counts of a sample"""
+        for field_name, info in schema.items():
+            entry = merged.setdefault(field_name, {"count": 0, "types": {}, "item_types": {}})
+            entry["count"] += 1
+            entry["types"][info["type"]] = entry["types"].get(info["type"], 0) + 1
+            if "item_type" in info:
+                entry["item_types"][info["item_type"]] = entry["item_types"].get(info["item_type"], 0) + 1
+            if "fields" in info:
+                self._merge_schema(entry.setdefault("fields", {}), info["fields"])
+
+    def _finalize_schema(self, merged: Dict[str, Any], total: int) -> Dict[str, Any]:
+        """Schema of a sample: the most common type of each field and how often it is present"""
+        schema = {}
+        for field_name, entry in merged.items():
+            types = sorted(entry["types"], key=entry["types"].get, reverse=True)
+            info = {"type": types[0], "presence": round(entry["count"] / total, 4)}
+            if len(types) > 1:
+                info["types"] = types
+            if entry["item_types"]:
+                info["item_type"] = max(entry["item_types"], key=entry["item_types"].get)
+            if "fields" in entry:
+                info["fields"] = self._finalize_schema(entry["fields"], entry["count"])
+            schema[field_name] = info
+        return schema
+
     async def execute_raw_query(self, config: Dict[str, Any], operation: str, collection_name: str, query_data: Dict[str, Any]) -> Dict[str, Any]:
         """Execute a raw MongoDB query"""
+        return await asyncio.to_thread(self._execute_raw_query, config, operation, collection_name, query_data)
+
+    def _execute_raw_query(self, config: Dict[str, Any], operation: str, collection_name: str, query_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
             connection_test = self._test_connection(config)
             if not connection_test["success"]:
@@ -456,53 +538,26 @@ class MongoDBAdvancedTool:
             
             db = self._get_database(config)
             collection = db[collection_name]
-            max_results = config.get("max_results", 100)
+            limit, fetch = self._result_limit(config, query_data.get("limit"))
             
             if operation == "find":
-                filter_conditions = query_data.get("filter", {})
-                limit = min(query_data.get("limit", max_results), max_results)
-                sort = query_data.get("sort")
-                
-                cursor = collection.find(filter_conditions)
-                
-                if sort:
-                    cursor = cursor.sort(list(sort.items()))
-                
-                if limit:
-                    cursor = cursor.limit(limit)
-                
-                results = []
-                for doc in cursor:
-                    doc = json.loads(json_util.dumps(doc))
-                    results.append(doc)
+                cursor = self._find(config, collection, query_data.get("filter", {}), query_data.get("sort"), fetch)
                 
                 return {
                     "success": True,
                     "operation": "find",
                     "collection": collection_name,
-                    "results": results,
-                    "total_results": len(results)
+                    **self._read_results(config, cursor, limit)
                 }
             
             elif operation == "aggregate":
-                pipeline = query_data.get("pipeline", [])
-                
-                if len(pipeline) > max_results:
-                    pipeline.append({"$limit": max_results})
-                
-                cursor = collection.aggregate(pipeline)
-                
-                results = []
-                for doc in cursor:
-                    doc = json.loads(json_util.dumps(doc))
-                    results.append(doc)
+                cursor = self._aggregate(config, collection, query_data.get("pipeline", []), fetch)
                 
                 return {
                     "success": True,
                     "operation": "aggregate",
                     "collection": collection_name,
-                    "results": results,
-                    "total_results": len(results)
+                    **self._read_results(config, cursor, limit)
                 }
             
             else:
@@ -5,7 +5,6 @@ Allows storing multiple website links and intelligently scraping relevant conten
 
 import asyncio
 import aiohttp
-from bs4 import BeautifulSoup
 import re
 from typing import Dict, List, Any, Optional
 from urllib.parse import urljoin, urlparse
@@ -15,6 +14,7 @@ from datetime import datetime
 import hashlib
 
 from .base import BaseTool
+from app.services.content_extraction_service import content_extraction_service
 
 @dataclass
 class ScrapedContent:
@@ -468,19 +468,13 @@ class MultiLinkScraperTool(BaseTool):
                 html = await response.text()
                 print(f"Scraped {url} - HTML length: {len(html)}")
                 
-                # Parse HTML
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                # Extract title
-                title = ""
-                title_tag = soup.find('title')
-                if title_tag:
-                    title = title_tag.get_text().strip()
+                # Parse HTML off the event loop and score the main content block
+                page = await content_extraction_service.analyze(html, final_url, min_length=50)
+                title = page['title']
                 
                 print(f"Title: {title}")
                 
-                # Extract main content using adaptive selectors
-                content = self._extract_main_content_adaptive(soup)
+                content = self._clean_content(page['content'])
                 
                 print(f"Content length: {len(content) if content else 0}")
                 
@@ -587,19 +581,13 @@ class MultiLinkScraperTool(BaseTool):
                 html = await response.text()
                 print(f"Scraped {url} - HTML length: {len(html)}")
                 
-                # Parse HTML
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                # Extract title
-                title = ""
-                title_tag = soup.find('title')
-                if title_tag:
-                    title = title_tag.get_text().strip()
+                # Parse HTML off the event loop and score the main content block
+                page = await content_extraction_service.analyze(html, final_url, min_length=50)
+                title = page['title']
                 
                 print(f"Title: {title}")
                 
-                # Extract main content using adaptive selectors
-                content = self._extract_main_content_adaptive(soup)
+                content = self._clean_content(page['content'])
                 
                 print(f"Content length: {len(content) if content else 0}")
                 
@@ -630,138 +618,14 @@ class MultiLinkScraperTool(BaseTool):
             print(f"Error scraping {url}: {str(e)}")
             return None
 
-    def _extract_main_content_adaptive(self, soup: BeautifulSoup) -> str:
-        """Extract main content using adaptive selectors with fallback strategies"""
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "header", "footer", "aside"]):
-            script.decompose()
-        
-        # Primary content selectors (specific)
-        primary_selectors = [
-            'main',
-            'article',
-            '.content',
-            '.main-content',
-            '#content',
-            '#main',
-            '.post-content',
-            '.entry-content',
-            '.privacy-policy',
-            '.policy-content',
-            '.legal-content',
-            '.terms-content',
-            '.privacy',
-            '.terms',
-            '.about-content',
-            '.contact-content'
-        ]
-        
-        # Fallback selectors (more general)
-        fallback_selectors = [
-            'section',
-            '.container',
-            '.wrapper',
-            '.page-content',
-            '.site-content',
-            '.main',
-            '.content-wrapper',
-            '.text-content',
-            '.body-content'
-        ]
-        
-        # Try primary selectors first
-        content = self._try_selectors(soup, primary_selectors, min_length=50)
-        
-        # If no content found, try fallback selectors
-        if not content:
-            content = self._try_selectors(soup, fallback_selectors, min_length=30)
-        
-        # If still no content, try flexible selectors (contains pattern matching)
-        if not content:
-            content = self._try_flexible_selectors(soup)
-        
-        # If no content found, try paragraphs
-        if not content:
-            content = self._extract_from_paragraphs(soup)
-        
-        # If still no content, use body
-        if not content:
-            body = soup.find('body')
-            if body:
-                content = body.get_text(separator=' ', strip=True)
-        
-        # Clean up content
+    def _clean_content(self, content: str) -> str:
+        """Collapse whitespace and strip unusual characters"""
         content = re.sub(r'\s+', ' ', content)  # Remove extra whitespace
         # Less aggressive character filtering to preserve more content
         content = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)\[\]\{\}\"\']', '', content)
         
         return content.strip()
 
-    def _try_selectors(self, soup: BeautifulSoup, selectors: List[str], min_length: int = 50) -> str:
-        """Try multiple selectors and return the first one with sufficient content"""
-        for selector in selectors:
-            try:
-                element = soup.select_one(selector)
-                if element:
-                    content = element.get_text(separator=' ', strip=True)
-                    if len(content) > min_length:
-                        return content
-            except Exception as e:
-                print(f"Error with selector {selector}: {str(e)}")
-                continue
-        return ""
-
-    def _try_flexible_selectors(self, soup: BeautifulSoup) -> str:
-        """Use flexible selectors that match partial class names"""
-        import re
-        
-        # Common content-related patterns
-        patterns = [
-            r'content',
-            r'main',
-            r'article',
-            r'text',
-            r'body',
-            r'page',
-            r'post',
-            r'entry'
-        ]
-        
-        for pattern in patterns:
-            try:
-                # Find elements with class names containing the pattern
-                elements = soup.find_all(class_=re.compile(pattern, re.IGNORECASE))
-                for element in elements:
-                    content = element.get_text(separator=' ', strip=True)
-                    if len(content) > 100:  # Higher threshold for flexible selectors
-                        return content
-            except Exception as e:
-                print(f"Error with flexible selector pattern {pattern}: {str(e)}")
-                continue
-        
-        return ""
-
-    def _extract_from_paragraphs(self, soup: BeautifulSoup) -> str:
-        """Extract content from paragraphs as a fallback"""
-        try:
-            paragraphs = soup.find_all('p')
-            if paragraphs:
-                # Filter out very short paragraphs (likely navigation/menu items)
-                meaningful_paragraphs = [
-                    p.get_text(strip=True) for p in paragraphs 
-                    if len(p.get_text(strip=True)) > 20
-                ]
-                if meaningful_paragraphs:
-                    return ' '.join(meaningful_paragraphs)
-        except Exception as e:
-            print(f"Error extracting from paragraphs: {str(e)}")
-        
-        return ""
-
-    def _extract_main_content(self, soup: BeautifulSoup) -> str:
-        """Legacy method - now calls the adaptive version"""
-        return self._extract_main_content_adaptive(soup)
-
     def _calculate_content_relevance(self, content: str, query: str) -> float:
         """Calculate relevance score between content and query"""
         content_lower = content.lower()
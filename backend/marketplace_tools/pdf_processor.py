@@ -9,7 +9,7 @@ import asyncio
 import json
 import logging
 import os
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
 from datetime import datetime
 from pathlib import Path
 import PyPDF2
@@ -18,9 +18,9 @@ from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.units import inch
-import fitz  # PyMuPDF
 import io
 
+from app.services.pdf_processing_service import pdf_processing_service
 from .base import BaseTool
 
 logger = logging.getLogger(__name__)
@@ -81,6 +81,25 @@ class PDFProcessorTool(BaseTool):
             logger.error(f"PDF processing error: {str(e)}")
             return self._format_error(f"PDF processing failed: {str(e)}")
     
+    def _pages_to_process(self, total_pages: int, pages: Optional[List[int]]) -> List[int]:
+        """Requested (0-based) pages that exist, or every page."""
+        if pages is None:
+            return list(range(total_pages))
+        return [p for p in pages if 0 <= p < total_pages]
+    
+    async def iter_pages(self, file_path: str, kind: str = 'text', pages: Optional[List[int]] = None,
+                         **options) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield per-page results as they are ready, in page order. ``kind`` is
+        ``text``, ``text_coordinates``, ``analyze`` or ``images`` (with
+        ``output_dir``); pages are processed in ranges by the worker pool.
+        """
+        total_pages = await pdf_processing_service.page_count(file_path)
+        async for result in pdf_processing_service.iter_pages(
+            file_path, kind, self._pages_to_process(total_pages, pages), options
+        ):
+            yield result
+    
     async def _extract_text(self, file_path: str, pages: Optional[List[int]] = None,
                            include_coordinates: bool = False) -> Dict[str, Any]:
         """Extract text from PDF file."""
@@ -92,46 +111,14 @@ class PDFProcessorTool(BaseTool):
             if path.stat().st_size > self.max_file_size:
                 return self._format_error(f"PDF file too large: {path.stat().st_size} bytes")
             
-            # Open PDF with PyMuPDF for better text extraction
-            doc = fitz.open(file_path)
-            
-            extracted_text = []
-            total_pages = len(doc)
+            total_pages = await pdf_processing_service.page_count(file_path)
+            pages_to_extract = self._pages_to_process(total_pages, pages)
             
-            # Determine pages to extract
-            if pages is None:
-                pages_to_extract = range(total_pages)
-            else:
-                pages_to_extract = [p for p in pages if 0 <= p < total_pages]
-            
-            for page_num in pages_to_extract:
-                page = doc[page_num]
-                
-                if include_coordinates:
-                    # Extract text with coordinates
-                    text_blocks = page.get_text("dict")
-                    page_text = []
-                    
-                    for block in text_blocks["blocks"]:
-                        if "lines" in block:
-                            for line in block["lines"]:
-                                for span in line["spans"]:
-                                    page_text.append({
-                                        'text': span['text'],
-                                        'bbox': span['bbox'],
-                                        'font': span['font'],
-                                        'size': span['size']
-                                    })
-                else:
-                    # Extract plain text
-                    page_text = page.get_text()
-                
-                extracted_text.append({
-                    'page': page_num + 1,
-                    'content': page_text
-                })
-            
-            doc.close()
+            # Pages are extracted in parallel ranges; plain text may come from the cache
+            kind = 'text_coordinates' if include_coordinates else 'text'
+            extracted_text = [
+                page async for page in pdf_processing_service.iter_pages(file_path, kind, pages_to_extract)
+            ]
             
             # Calculate statistics
             total_text_length = sum(len(str(page['content'])) for page in extracted_text)
@@ -165,68 +152,18 @@ class PDFProcessorTool(BaseTool):
             if not path.exists():
                 return self._format_error(f"PDF file not found: {file_path}")
             
-            # Open PDF with PyMuPDF
-            doc = fitz.open(file_path)
-            
-            extracted_images = []
-            total_pages = len(doc)
-            
-            # Determine pages to extract
-            if pages is None:
-                pages_to_extract = range(total_pages)
-            else:
-                pages_to_extract = [p for p in pages if 0 <= p < total_pages]
+            total_pages = await pdf_processing_service.page_count(file_path)
+            pages_to_extract = self._pages_to_process(total_pages, pages)
             
             # Create output directory if specified
             if output_dir:
-                output_path = Path(output_dir)
-                output_path.mkdir(parents=True, exist_ok=True)
-            
-            for page_num in pages_to_extract:
-                page = doc[page_num]
-                
-                # Get image list for this page
-                image_list = page.get_images()
-                
-                for img_index, img in enumerate(image_list):
-                    try:
-                        # Get image data
-                        xref = img[0]
-                        pix = fitz.Pixmap(doc, xref)
-                        
-                        if pix.n - pix.alpha < 4:  # GRAY or RGB
-                            img_data = pix.tobytes("png")
-                        else:  # CMYK: convert to RGB first
-                            pix1 = fitz.Pixmap(fitz.csRGB, pix)
-                            img_data = pix1.tobytes("png")
-                            pix1 = None
-                        
-                        # Save image if output directory is specified
-                        image_filename = None
-                        if output_dir:
-                            image_filename = f"page_{page_num + 1}_image_{img_index + 1}.png"
-                            image_path = output_path / image_filename
-                            
-                            with open(image_path, "wb") as img_file:
-                                img_file.write(img_data)
-                        
-                        extracted_images.append({
-                            'page': page_num + 1,
-                            'image_index': img_index + 1,
-                            'width': pix.width,
-                            'height': pix.height,
-                            'colorspace': pix.colorspace.name,
-                            'size_bytes': len(img_data),
-                            'filename': image_filename
-                        })
-                        
-                        pix = None
-                        
-                    except Exception as e:
-                        logger.warning(f"Failed to extract image {img_index} from page {page_num}: {str(e)}")
-                        continue
+                Path(output_dir).mkdir(parents=True, exist_ok=True)
             
-            doc.close()
+            extracted_images = []
+            async for page in pdf_processing_service.iter_pages(
+                file_path, 'images', pages_to_extract, {'output_dir': output_dir}
+            ):
+                extracted_images.extend(page['images'])
             
             extraction_data = {
                 'file_path': file_path,
@@ -382,52 +319,25 @@ class PDFProcessorTool(BaseTool):
             if not path.exists():
                 return self._format_error(f"PDF file not found: {file_path}")
             
-            # Open PDF with PyMuPDF for analysis
-            doc = fitz.open(file_path)
+            total_pages = await pdf_processing_service.page_count(file_path)
             
             analysis_data = {
                 'file_path': file_path,
                 'file_size': path.stat().st_size,
                 'file_size_mb': round(path.stat().st_size / (1024 * 1024), 2),
-                'page_count': len(doc),
+                'page_count': total_pages,
                 'pages': []
             }
             
             total_text_length = 0
             total_images = 0
             
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                # Get page dimensions
-                rect = page.rect
-                page_width = rect.width
-                page_height = rect.height
-                
-                # Get text statistics
-                text = page.get_text()
-                text_length = len(text)
-                word_count = len(text.split())
-                
-                # Get image count
-                image_list = page.get_images()
-                image_count = len(image_list)
-                
-                page_data = {
-                    'page_number': page_num + 1,
-                    'width': page_width,
-                    'height': page_height,
-                    'text_length': text_length,
-                    'word_count': word_count,
-                    'image_count': image_count,
-                    'rotation': page.rotation
-                }
-                
+            # Pages are analyzed in parallel ranges, which also caches their text
+            async for page_data in pdf_processing_service.iter_pages(file_path, 'analyze', list(range(total_pages))):
+                page_data.pop('text', None)
                 analysis_data['pages'].append(page_data)
-                total_text_length += text_length
-                total_images += image_count
-            
-            doc.close()
+                total_text_length += page_data['text_length']
+                total_images += page_data['image_count']
             
             # Add summary statistics
             analysis_data.update({
@@ -463,19 +373,11 @@ class PDFProcessorTool(BaseTool):
                 if not path.exists():
                     return self._format_error(f"Input file not found: {file_path}")
             
-            # Create PDF merger
-            merger = PyPDF2.PdfMerger()
-            
-            # Add each PDF to the merger
-            for file_path in input_files:
-                with open(file_path, 'rb') as file:
-                    merger.append(file)
-            
-            # Write merged PDF
-            with open(output_path, 'wb') as output_file:
-                merger.write(output_file)
+            if not output_path:
+                return self._format_error("Output path is required")
             
-            merger.close()
+            # Inputs are read from their files as the writer needs them
+            page_count = await pdf_processing_service.merge(input_files, output_path)
             
             # Get output file info
             output_path_obj = Path(output_path)
@@ -485,6 +387,7 @@ class PDFProcessorTool(BaseTool):
                 'input_files': input_files,
                 'output_path': output_path,
                 'input_count': len(input_files),
+                'page_count': page_count,
                 'output_size': file_size,
                 'output_size_mb': round(file_size / (1024 * 1024), 2)
             }
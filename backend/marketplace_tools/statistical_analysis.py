@@ -13,14 +13,25 @@ from typing import Any, Dict, List, Optional, Union
 import pandas as pd
 import numpy as np
 from scipy import stats
-from scipy.stats import ttest_ind, chi2_contingency, pearsonr, spearmanr
+from scipy.stats import ttest_ind, chi2_contingency
 from sklearn.linear_model import LinearRegression, LogisticRegression
 from sklearn.metrics import mean_squared_error, r2_score, accuracy_score, classification_report
 from sklearn.preprocessing import StandardScaler
 import warnings
 warnings.filterwarnings('ignore')
 
+from app.services.dataset_store_service import dataset_store
 from .base import BaseTool
+from .statistics_core import (
+    CORRELATION_METHODS,
+    ZSCORE_THRESHOLD,
+    correlation_matrix,
+    correlation_p_values,
+    detect_outliers,
+    numeric_matrix,
+    outlier_records,
+    significant_pairs
+)
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +60,7 @@ class StatisticalAnalysisTool(BaseTool):
         self.confidence_level = config.get('confidence_level', 0.95)
         self.significance_level = config.get('significance_level', 0.05)
         self.max_sample_size = config.get('max_sample_size', 10000)
+        self.max_outliers = config.get('max_outliers', 100)
         
     async def execute(self, **kwargs) -> Dict[str, Any]:
         """
@@ -57,11 +69,14 @@ class StatisticalAnalysisTool(BaseTool):
         Args:
             action: Operation to perform (descriptive, hypothesis_test, correlation, etc.)
             data: Data to analyze
+            dataset: Handle of a table stored by the data tools, instead of data
             columns: Columns to analyze
             test_type: Type of statistical test
             group_column: Column for grouping data
             target_column: Target variable for regression
             feature_columns: Feature variables for regression
+            method: Correlation or outlier detection method
+            max_outliers: Most extreme outliers listed per column
             
         Returns:
             Dictionary containing analysis result
@@ -96,14 +111,13 @@ class StatisticalAnalysisTool(BaseTool):
     
     async def _descriptive_statistics(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate descriptive statistics for data."""
-        data = params.get('data', [])
         columns = params.get('columns', [])
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
             # Select columns to analyze
             if columns:
@@ -166,7 +180,6 @@ class StatisticalAnalysisTool(BaseTool):
     
     async def _hypothesis_test(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Perform hypothesis testing."""
-        data = params.get('data', [])
         test_type = params.get('test_type', 't_test')
         column1 = params.get('column1', '')
         column2 = params.get('column2', '')
@@ -174,11 +187,11 @@ class StatisticalAnalysisTool(BaseTool):
         value_column = params.get('value_column', '')
         alpha = params.get('alpha', self.significance_level)
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
             if test_type == 't_test_independent':
                 # Independent t-test
@@ -275,15 +288,14 @@ class StatisticalAnalysisTool(BaseTool):
     
     async def _correlation_analysis(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Perform correlation analysis."""
-        data = params.get('data', [])
         columns = params.get('columns', [])
         method = params.get('method', 'pearson')  # pearson, spearman, kendall
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
             # Select columns to analyze
             if columns:
@@ -295,45 +307,27 @@ class StatisticalAnalysisTool(BaseTool):
             if len(numerical_cols) < 2:
                 return self._format_error("Need at least 2 numerical columns for correlation analysis")
             
-            # Calculate correlation matrix
-            corr_matrix = df[numerical_cols].corr(method=method)
-            
-            # Calculate p-values for correlations
-            p_values = pd.DataFrame(index=numerical_cols, columns=numerical_cols)
-            
-            for i in numerical_cols:
-                for j in numerical_cols:
-                    if i == j:
-                        p_values.loc[i, j] = 1.0
-                    else:
-                        if method == 'pearson':
-                            _, p_val = pearsonr(df[i].dropna(), df[j].dropna())
-                        elif method == 'spearman':
-                            _, p_val = spearmanr(df[i].dropna(), df[j].dropna())
-                        else:
-                            p_val = 1.0  # Default for kendall
-                        p_values.loc[i, j] = p_val
-            
-            # Find significant correlations
-            significant_correlations = []
-            for i in range(len(numerical_cols)):
-                for j in range(i+1, len(numerical_cols)):
-                    col1 = numerical_cols[i]
-                    col2 = numerical_cols[j]
-                    corr_val = corr_matrix.loc[col1, col2]
-                    p_val = p_values.loc[col1, col2]
-                    
-                    if p_val < self.significance_level:
-                        significant_correlations.append({
-                            'variable1': col1,
-                            'variable2': col2,
-                            'correlation': float(corr_val),
-                            'p_value': float(p_val),
-                            'strength': self._get_correlation_strength(abs(corr_val))
-                        })
-            
-            # Sort by absolute correlation value
-            significant_correlations.sort(key=lambda x: abs(x['correlation']), reverse=True)
+            if method not in CORRELATION_METHODS:
+                return self._format_error(f"Unknown correlation method: {method}")
+            
+            # Coefficients and p-values of every pair in one matrix pass
+            column_names = list(numerical_cols)
+            corr, counts = correlation_matrix(numeric_matrix(df[numerical_cols]), method)
+            p_value_matrix = correlation_p_values(corr, counts, method)
+            corr_matrix = pd.DataFrame(corr, index=numerical_cols, columns=numerical_cols)
+            p_values = pd.DataFrame(p_value_matrix, index=numerical_cols, columns=numerical_cols)
+            
+            # Find significant correlations, strongest first
+            significant_correlations = [
+                {
+                    'variable1': col1,
+                    'variable2': col2,
+                    'correlation': corr_val,
+                    'p_value': p_val,
+                    'strength': self._get_correlation_strength(abs(corr_val))
+                }
+                for col1, col2, corr_val, p_val in significant_pairs(column_names, corr, p_value_matrix, self.significance_level)
+            ]
             
             return self._format_success({
                 'correlation_matrix': corr_matrix.to_dict(),
@@ -341,7 +335,7 @@ class StatisticalAnalysisTool(BaseTool):
                 'method': method,
                 'significant_correlations': significant_correlations,
                 'total_correlations': len(significant_correlations),
-                'columns_analyzed': list(numerical_cols)
+                'columns_analyzed': column_names
             })
             
         except Exception as e:
@@ -349,12 +343,11 @@ class StatisticalAnalysisTool(BaseTool):
     
     async def _regression_analysis(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Perform regression analysis."""
-        data = params.get('data', [])
         target_column = params.get('target_column', '')
         feature_columns = params.get('feature_columns', [])
         regression_type = params.get('regression_type', 'linear')  # linear, logistic
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         if not target_column:
@@ -364,7 +357,7 @@ class StatisticalAnalysisTool(BaseTool):
             return self._format_error("Feature columns are required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
             # Check if columns exist
             if target_column not in df.columns:
@@ -462,18 +455,17 @@ class StatisticalAnalysisTool(BaseTool):
     
     async def _distribution_test(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Test if data follows a specific distribution."""
-        data = params.get('data', [])
         column = params.get('column', '')
         distribution = params.get('distribution', 'normal')  # normal, uniform, exponential
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         if not column:
             return self._format_error("Column is required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
             if column not in df.columns:
                 return self._format_error("Specified column not found")
@@ -548,15 +540,14 @@ class StatisticalAnalysisTool(BaseTool):
     
     async def _outlier_detection(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Detect outliers in data."""
-        data = params.get('data', [])
         columns = params.get('columns', [])
         method = params.get('method', 'iqr')  # iqr, zscore, isolation_forest
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
             # Select columns to analyze
             if columns:
@@ -568,56 +559,30 @@ class StatisticalAnalysisTool(BaseTool):
             if len(numerical_cols) == 0:
                 return self._format_error("No numerical columns found")
             
-            results = {}
+            if method not in ('iqr', 'zscore'):
+                return self._format_error(f"Unknown outlier detection method: {method}")
             
-            for col in numerical_cols:
-                series = df[col].dropna()
-                
-                if len(series) == 0:
+            # One mask per column; only the most extreme outliers become records
+            max_outliers = int(params.get('max_outliers', self.max_outliers))
+            detected = detect_outliers(numeric_matrix(df[numerical_cols]), method, max_outliers)
+            
+            results = {}
+            for col, column_outliers in zip(numerical_cols, detected):
+                if column_outliers.valid == 0:
                     results[col] = {'error': 'No valid data'}
                     continue
                 
-                outliers = []
-                
+                outliers = outlier_records(df.index, column_outliers, include_scores=(method == 'zscore'))
                 if method == 'iqr':
-                    # IQR method
-                    Q1 = series.quantile(0.25)
-                    Q3 = series.quantile(0.75)
-                    IQR = Q3 - Q1
-                    lower_bound = Q1 - 1.5 * IQR
-                    upper_bound = Q3 + 1.5 * IQR
-                    
-                    outlier_indices = series[(series < lower_bound) | (series > upper_bound)].index
-                    outliers = [{'index': int(idx), 'value': float(series[idx])} for idx in outlier_indices]
-                    
-                    results[col] = {
-                        'method': 'IQR',
-                        'q1': float(Q1),
-                        'q3': float(Q3),
-                        'iqr': float(IQR),
-                        'lower_bound': float(lower_bound),
-                        'upper_bound': float(upper_bound),
-                        'outliers': outliers,
-                        'outlier_count': len(outliers),
-                        'outlier_percentage': float(len(outliers) / len(series) * 100)
-                    }
-                    
-                elif method == 'zscore':
-                    # Z-score method
-                    z_scores = np.abs(stats.zscore(series))
-                    outlier_indices = series[z_scores > 3].index
-                    outliers = [{'index': int(idx), 'value': float(series[idx]), 'z_score': float(z_scores[series.index.get_loc(idx)])} for idx in outlier_indices]
-                    
-                    results[col] = {
-                        'method': 'Z-Score',
-                        'threshold': 3,
-                        'outliers': outliers,
-                        'outlier_count': len(outliers),
-                        'outlier_percentage': float(len(outliers) / len(series) * 100)
-                    }
-                    
+                    results[col] = {'method': 'IQR', **column_outliers.bounds}
                 else:
-                    return self._format_error(f"Unknown outlier detection method: {method}")
+                    results[col] = {'method': 'Z-Score', 'threshold': ZSCORE_THRESHOLD}
+                results[col].update({
+                    'outliers': outliers,
+                    'outlier_count': column_outliers.count,
+                    'outlier_percentage': float(column_outliers.count / column_outliers.valid * 100),
+                    'outliers_truncated': column_outliers.count > len(outliers)
+                })
             
             return self._format_success({
                 'outlier_analysis': results,
@@ -630,18 +595,17 @@ class StatisticalAnalysisTool(BaseTool):
     
     async def _anova_analysis(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Perform ANOVA analysis."""
-        data = params.get('data', [])
         group_column = params.get('group_column', '')
         value_column = params.get('value_column', '')
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         if not group_column or not value_column:
             return self._format_error("Group column and value column are required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
             if group_column not in df.columns or value_column not in df.columns:
                 return self._format_error("Specified columns not found")
@@ -688,18 +652,17 @@ class StatisticalAnalysisTool(BaseTool):
     
     async def _chi_square_test(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Perform chi-square test of independence."""
-        data = params.get('data', [])
         column1 = params.get('column1', '')
         column2 = params.get('column2', '')
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         if not column1 or not column2:
             return self._format_error("Two columns are required for chi-square test")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
             if column1 not in df.columns or column2 not in df.columns:
                 return self._format_error("Specified columns not found")
@@ -732,14 +695,13 @@ class StatisticalAnalysisTool(BaseTool):
     
     async def _normality_test(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Test for normality of data."""
-        data = params.get('data', [])
         columns = params.get('columns', [])
         
-        if not data:
+        if not params.get('data') and not params.get('dataset'):
             return self._format_error("Data is required")
         
         try:
-            df = pd.DataFrame(data)
+            df = await dataset_store.aload(params)
             
             # Select columns to analyze
             if columns:
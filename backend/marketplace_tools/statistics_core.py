@@ -0,0 +1,195 @@
+"""
+Statistics Core
+
+Vectorized kernels behind the Statistical Analysis tool's correlation and
+outlier operations. Columns are handled as one float matrix:
+
+- correlations are computed in a single matrix pass (with pairwise-complete
+  observations when values are missing, like pandas), and the p-values of
+  every pair come from the same matrix of coefficients and pair counts;
+- outliers are found with one boolean mask per column, and only the most
+  extreme ones are turned into records.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+CORRELATION_METHODS = ('pearson', 'spearman', 'kendall')
+ZSCORE_THRESHOLD = 3
+IQR_FACTOR = 1.5
+
+
+def numeric_matrix(df: pd.DataFrame) -> np.ndarray:
+    """The frame as a float64 matrix, missing values as NaN."""
+    return df.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _pairwise_pearson(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Pearson coefficients and pair counts over pairwise-complete rows."""
+    present = ~np.isnan(values)
+    counts = present.T.astype(np.float64) @ present
+    if present.all():
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.corrcoef(values, rowvar=False), counts
+
+    # Centre first so the sums below do not lose precision
+    centred = values - np.nanmean(values, axis=0)
+    x = np.where(present, centred, 0.0)
+    weights = present.astype(np.float64)
+    sums = x.T @ weights            # [i, j]: sum of column i over rows where j is present
+    squares = (x * x).T @ weights   # [i, j]: sum of squares of column i over the same rows
+    products = x.T @ x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = counts * products - sums * sums.T
+        variance_i = counts * squares - sums * sums
+        corr = covariance / np.sqrt(variance_i * variance_i.T)
+    corr[counts < 2] = np.nan
+    return corr, counts
+
+
+def correlation_matrix(values: np.ndarray, method: str = 'pearson') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Correlation coefficients of the columns of ``values`` and the number of
+    rows each pair was computed from.
+    """
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"Unknown correlation method: {method}")
+
+    if method == 'pearson':
+        corr, counts = _pairwise_pearson(values)
+    else:
+        present = ~np.isnan(values)
+        counts = present.T.astype(np.float64) @ present
+        if method == 'spearman' and present.all():
+            # Spearman is Pearson on ranks; without gaps each column is ranked once
+            corr, _ = _pairwise_pearson(stats.rankdata(values, axis=0))
+        else:
+            # Ranks depend on which rows a pair shares, so let pandas rank per pair
+            corr = pd.DataFrame(values).corr(method=method).to_numpy()
+
+    corr = np.clip(corr, -1.0, 1.0)
+    # Exactly 1 on the diagonal, except for constant or empty columns
+    np.fill_diagonal(corr, np.where(np.isnan(np.diag(corr)), np.nan, 1.0))
+    return corr, counts
+
+
+def correlation_p_values(corr: np.ndarray, counts: np.ndarray, method: str = 'pearson') -> np.ndarray:
+    """
+    Two-sided p-values for a matrix of coefficients. Pearson and Spearman use
+    the t distribution with n - 2 degrees of freedom (as scipy's pearsonr and
+    spearmanr do); Kendall uses the normal approximation of tau.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if method == 'kendall':
+            z = 3 * corr * np.sqrt(counts * (counts - 1)) / np.sqrt(2 * (2 * counts + 5))
+            p_values = 2 * stats.norm.sf(np.abs(z))
+        else:
+            dof = counts - 2
+            t = corr * np.sqrt(dof / ((1.0 - corr) * (1.0 + corr)))
+            p_values = 2 * stats.t.sf(np.abs(t), np.maximum(dof, 1))
+            p_values[np.abs(corr) == 1.0] = 0.0
+    p_values[counts < 3] = np.nan
+    np.fill_diagonal(p_values, 1.0)
+    return p_values
+
+
+def significant_pairs(
+    columns: List[str],
+    corr: np.ndarray,
+    p_values: np.ndarray,
+    significance_level: float
+) -> List[Tuple[str, str, float, float]]:
+    """Column pairs with p below the significance level, strongest first."""
+    rows, cols = np.triu_indices(len(columns), k=1)
+    pair_corr = corr[rows, cols]
+    pair_p = p_values[rows, cols]
+    with np.errstate(invalid='ignore'):
+        selected = np.flatnonzero(pair_p < significance_level)
+    selected = selected[np.argsort(-np.abs(pair_corr[selected]), kind='stable')]
+    return [
+        (columns[rows[k]], columns[cols[k]], float(pair_corr[k]), float(pair_p[k]))
+        for k in selected
+    ]
+
+
+@dataclass
+class ColumnOutliers:
+    """Outliers of one column; ``indices`` and ``values`` hold the most extreme ones first."""
+    valid: int
+    count: int
+    indices: np.ndarray
+    values: np.ndarray
+    scores: np.ndarray
+    bounds: Dict[str, float] = field(default_factory=dict)
+
+
+def _top_k(mask: np.ndarray, severity: np.ndarray, max_outliers: int) -> np.ndarray:
+    positions = np.flatnonzero(mask)
+    if len(positions) > max_outliers:
+        # Partial selection of the most extreme, then order just those
+        keep = np.argpartition(-severity[positions], max_outliers - 1)[:max_outliers]
+        positions = positions[keep]
+    return positions[np.argsort(-severity[positions], kind='stable')]
+
+
+def detect_outliers(values: np.ndarray, method: str = 'iqr', max_outliers: int = 100) -> List[ColumnOutliers]:
+    """
+    Outliers of every column of ``values``: beyond 1.5 IQR of the quartiles
+    (``iqr``) or more than 3 standard deviations from the mean (``zscore``).
+    Missing values are ignored. Only the ``max_outliers`` most extreme rows
+    of a column are returned; ``count`` is the full number.
+    """
+    valid = (~np.isnan(values)).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if method == 'iqr':
+            q1, q3 = np.nanquantile(values, [0.25, 0.75], axis=0)
+            iqr = q3 - q1
+            lower = q1 - IQR_FACTOR * iqr
+            upper = q3 + IQR_FACTOR * iqr
+            # Distance beyond the nearest bound; NaN compares False
+            severity = np.maximum(lower - values, values - upper)
+            mask = severity > 0
+        elif method == 'zscore':
+            mean = np.nanmean(values, axis=0)
+            std = np.nanstd(values, axis=0)
+            severity = np.abs((values - mean) / std)
+            mask = severity > ZSCORE_THRESHOLD
+        else:
+            raise ValueError(f"Unknown outlier detection method: {method}")
+
+    results = []
+    for j in range(values.shape[1]):
+        if not valid[j]:
+            results.append(ColumnOutliers(valid=0, count=0, indices=np.empty(0, dtype=np.int64),
+                                          values=np.empty(0), scores=np.empty(0)))
+            continue
+        column_mask = mask[:, j]
+        positions = _top_k(column_mask, severity[:, j], max_outliers)
+        if method == 'iqr':
+            bounds = {'q1': float(q1[j]), 'q3': float(q3[j]), 'iqr': float(iqr[j]),
+                      'lower_bound': float(lower[j]), 'upper_bound': float(upper[j])}
+        else:
+            bounds = {}
+        results.append(ColumnOutliers(
+            valid=int(valid[j]),
+            count=int(np.count_nonzero(column_mask)),
+            indices=positions,
+            values=values[positions, j],
+            scores=severity[positions, j],
+            bounds=bounds
+        ))
+    return results
+
+
+def outlier_records(index: pd.Index, outliers: ColumnOutliers, include_scores: bool) -> List[Dict[str, Any]]:
+    """Outlier rows as records keyed by the frame's index labels."""
+    labels = index.to_numpy()[outliers.indices].tolist()
+    values = outliers.values.tolist()
+    if include_scores:
+        return [{'index': label, 'value': value, 'z_score': score}
+                for label, value, score in zip(labels, values, outliers.scores.tolist())]
+    return [{'index': label, 'value': value} for label, value in zip(labels, values)]
@@ -9,7 +9,7 @@ import json
 import logging
 import hashlib
 import os
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 from datetime import datetime
 from pathlib import Path
 from urllib.parse import urlparse, urljoin
@@ -19,6 +19,8 @@ import chromadb
 from chromadb.config import Settings
 
 from .base import BaseTool
+from app.services.knowledge_retrieval_service import knowledge_retrieval_service
+from app.services.retrieval_cache_service import retrieval_cache_service
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +49,8 @@ class WebsiteKnowledgeBaseTool(BaseTool):
                 return await self._list_collections(**kwargs)
             elif operation == "get_collection_stats":
                 return await self._get_collection_stats(**kwargs)
+            elif operation == "get_cache_stats":
+                return await self._get_cache_stats(**kwargs)
             else:
                 return {
                     "success": False,
@@ -92,43 +96,26 @@ class WebsiteKnowledgeBaseTool(BaseTool):
                     "error": f"Collection '{collection_name}' not found: {str(e)}"
                 }
             
-            # Query the collection
-            results = collection.query(
-                query_texts=[query],
-                n_results=top_k
+            # Hybrid BM25 + vector retrieval with threshold and near-duplicate removal
+            formatted_results = knowledge_retrieval_service.search(
+                collection,
+                query,
+                top_k=top_k,
+                similarity_threshold=self.retrieval_config.get('similarity_threshold', 0.7)
             )
             
-            logger.info(f"🔍 Raw query results: {results}")
-            logger.info(f"📊 Results structure - documents: {type(results.get('documents'))}, length: {len(results.get('documents', []))}")
-            if results.get('documents'):
-                logger.info(f"📄 First document array: {type(results['documents'][0])}, length: {len(results['documents'][0]) if results['documents'][0] else 0}")
+            for i, result in enumerate(formatted_results):
+                metadata = result.get('metadata', {})
+                similarity = result.get('similarity')
+                logger.info(f"📄 Document {i+1}:")
+                logger.info(f"   Title: {metadata.get('title', 'No title')}")
+                logger.info(f"   Source: {metadata.get('source_url', 'Unknown source')}")
+                logger.info(f"   Similarity Score: {similarity:.3f}" if similarity is not None else "   Similarity Score: n/a (keyword match)")
+                logger.info(f"   BM25 Score: {result.get('bm25_score', 0.0):.3f}")
+                logger.info(f"   Content Length: {len(result.get('content', ''))} characters")
             
-            # Format results
-            formatted_results = []
-            if results['documents'] and results['documents'][0]:
-                for i, doc in enumerate(results['documents'][0]):
-                    formatted_results.append({
-                        'content': doc,
-                        'metadata': results['metadatas'][0][i] if results['metadatas'] and results['metadatas'][0] else {},
-                        'distance': results['distances'][0][i] if results['distances'] and results['distances'][0] else 0
-                    })
-                    
-                    # Log each retrieved document
-                    metadata = results['metadatas'][0][i] if results['metadatas'] and results['metadatas'][0] else {}
-                    distance = results['distances'][0][i] if results['distances'] and results['distances'][0] else 0
-                    source_url = metadata.get('source_url', 'Unknown source')
-                    title = metadata.get('title', 'No title')
-                    
-                    logger.info(f"📄 Document {i+1}:")
-                    logger.info(f"   Title: {title}")
-                    logger.info(f"   Source: {source_url}")
-                    logger.info(f"   Similarity Score: {1 - distance:.3f}")
-                    logger.info(f"   Content Preview: {doc[:200]}...")
-                    logger.info(f"   Content Length: {len(doc)} characters")
-                    logger.info("   " + "-" * 50)
-            
-            # Assemble context
-            context = self._assemble_context(formatted_results)
+            # Assemble context; only chunks that fit the token budget are returned
+            context, formatted_results = self._assemble_context(formatted_results)
             
             logger.info(f"✅ Found {len(formatted_results)} relevant documents")
             logger.info(f"📝 Total context length: {len(context)} characters")
@@ -218,36 +205,27 @@ class WebsiteKnowledgeBaseTool(BaseTool):
             logger.error(f"Error getting collection stats: {str(e)}")
             return self._format_error(f"Failed to get collection stats: {str(e)}")
     
-    def _assemble_context(self, results: List[Dict[str, Any]]) -> str:
-        """Assemble context from query results."""
+    async def _get_cache_stats(self, collection_name: str = None, **kwargs) -> Dict[str, Any]:
+        """Get query-embedding and result cache hit rates."""
+        try:
+            collection_name = collection_name or self.config.get('collection_name')
+            return self._format_success({
+                "collections": retrieval_cache_service.get_stats(collection_name)
+            })
+        except Exception as e:
+            logger.error(f"Error getting cache stats: {str(e)}")
+            return self._format_error(f"Failed to get cache stats: {str(e)}")
+    
+    def _assemble_context(self, results: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+        """Pack ranked results into the configured token budget.
+
+        Returns the context string and the results that were included in it.
+        """
         if not results:
-            return ""
+            return "", []
         
-        context_parts = []
         max_tokens = self.retrieval_config.get('max_tokens', 2000)
-        current_tokens = 0
-        
-        for result in results:
-            content = result.get('content', '')
-            metadata = result.get('metadata', {})
-            
-            # Estimate tokens (rough approximation)
-            estimated_tokens = len(content.split()) * 1.3
-            
-            if current_tokens + estimated_tokens > max_tokens:
-                break
-            
-            # Add source information if available
-            source_info = ""
-            if metadata.get('source_url'):
-                source_info = f" [Source: {metadata['source_url']}]"
-            elif metadata.get('title'):
-                source_info = f" [Source: {metadata['title']}]"
-            
-            context_parts.append(f"{content}{source_info}")
-            current_tokens += estimated_tokens
-        
-        return "\n\n".join(context_parts)
+        return knowledge_retrieval_service.pack_context(results, max_tokens)
     
     def get_tool_info(self) -> Dict[str, Any]:
         """Get tool information."""
@@ -257,7 +235,8 @@ class WebsiteKnowledgeBaseTool(BaseTool):
             "operations": [
                 "query_knowledge_base",
                 "list_collections", 
-                "get_collection_stats"
+                "get_collection_stats",
+                "get_cache_stats"
             ],
             "parameters": {
                 "type": "object",
@@ -269,7 +248,7 @@ class WebsiteKnowledgeBaseTool(BaseTool):
                     "operation": {
                         "type": "string",
                         "description": "Type of operation to perform",
-                        "enum": ["query_knowledge_base", "list_collections", "get_collection_stats"],
+                        "enum": ["query_knowledge_base", "list_collections", "get_collection_stats", "get_cache_stats"],
                         "default": "query_knowledge_base"
                     },
                     "collection_name": {
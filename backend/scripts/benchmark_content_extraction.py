@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark HTML content extraction throughput.
+
+Compares the old extraction path (html.parser, one page at a time on the
+event loop) with the shared content extraction service (lxml when available,
+parsed in a worker pool) over a local corpus of .html files.
+
+Usage:
+    python scripts/benchmark_content_extraction.py [corpus_dir] [--pages N] [--workers N]
+
+Without a corpus directory a synthetic corpus of N pages is generated.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import os
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from app.services.content_extraction_service import ContentExtractionService
+
+WORDS = (
+    "policy data service account customer privacy information terms usage "
+    "platform agent knowledge support access request response team product"
+).split()
+
+
+def synthetic_page(index: int) -> str:
+    """A page with navigation, sidebar and footer around an article."""
+    rng = random.Random(index)
+
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + ", and more."
+
+    nav = "".join(f'<li><a href="/section-{i}">Section {i}</a></li>' for i in range(40))
+    paragraphs = "".join(f"<p>{' '.join(sentence() for _ in range(4))}</p>" for _ in range(rng.randint(15, 40)))
+    sidebar = "".join(f'<div class="widget"><a href="/related-{i}">Related {i}</a></div>' for i in range(20))
+    return (
+        f"<html><head><title>Page {index}</title><style>body {{ margin: 0 }}</style>"
+        f"<script>var tracking = {index};</script></head><body>"
+        f'<header><nav><ul>{nav}</ul></nav></header>'
+        f'<div class="layout"><div class="article-content"><h1>Page {index}</h1>{paragraphs}</div>'
+        f'<aside class="sidebar">{sidebar}</aside></div>'
+        f'<footer class="footer"><p>Copyright {index}</p></footer></body></html>'
+    )
+
+
+def load_corpus(corpus_dir, pages: int):
+    if corpus_dir:
+        files = sorted(Path(corpus_dir).rglob("*.html"))
+        if not files:
+            raise SystemExit(f"No .html files found in {corpus_dir}")
+        return [path.read_text(encoding="utf-8", errors="replace") for path in files]
+    return [synthetic_page(i) for i in range(pages)]
+
+
+def baseline_extract(html: str) -> str:
+    """The previous crawler path: three html.parser passes per page (title, links, content)."""
+    title_soup = BeautifulSoup(html, "html.parser")
+    title_soup.find("title")
+
+    link_soup = BeautifulSoup(html, "html.parser")
+    [anchor["href"] for anchor in link_soup.find_all("a", href=True)]
+
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup(["script", "style", "nav", "header", "footer"]):
+        element.decompose()
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return "\n\n".join(chunk for chunk in chunks if len(chunk) > 50)
+
+
+async def run_baseline(corpus):
+    started = time.perf_counter()
+    for html in corpus:
+        baseline_extract(html)
+        # The crawler awaited between pages, but the parse itself blocked the loop
+        await asyncio.sleep(0)
+    return time.perf_counter() - started
+
+
+async def run_engine(corpus, workers: int):
+    service = ContentExtractionService(workers)
+    # Start the pool outside the timed section
+    await service.analyze("<html><body><p>warm up</p></body></html>")
+    started = time.perf_counter()
+    results = await asyncio.gather(*(service.analyze(html, include_links=True) for html in corpus))
+    elapsed = time.perf_counter() - started
+    service.shutdown()
+    return elapsed, results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus_dir", nargs="?", help="Directory with .html files")
+    parser.add_argument("--pages", type=int, default=300, help="Synthetic corpus size")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (0 = default)")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus_dir, args.pages)
+    total_mb = sum(len(html) for html in corpus) / (1024 * 1024)
+    print(f"Corpus: {len(corpus)} pages, {total_mb:.1f} MB, {os.cpu_count()} CPUs")
+
+    baseline_time = await run_baseline(corpus)
+    engine_time, results = await run_engine(corpus, args.workers or None)
+
+    methods = {}
+    for result in results:
+        methods[result["method"]] = methods.get(result["method"], 0) + 1
+
+    engine_label = f"Engine ({ContentExtractionService().parser}, worker pool):"
+    print(f"{'Baseline (html.parser, sequential):':40} {len(corpus) / baseline_time:8.1f} pages/sec")
+    print(f"{engine_label:40} {len(corpus) / engine_time:8.1f} pages/sec")
+    print(f"Speedup: {baseline_time / engine_time:.2f}x")
+    print(f"Extraction methods: {methods}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
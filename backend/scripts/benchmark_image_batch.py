@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Image Processor batch engine.
+
+Writes a folder of synthetic product photos (JPEG), then resizes it twice:
+
+- previous: one image after another, decoded at full size, LANCZOS resize,
+  saved with the tool's quality (what ``_batch_process_images`` did);
+- engine: ``image_processing_service.process_batch`` with a process pool,
+  draft decoding, ``reduce`` and optimized encoders.
+
+Output sizes are checked to match, and the two outputs are compared by
+mean absolute pixel difference.
+
+Usage:
+    python scripts/benchmark_image_batch.py [--images N] [--width PX] [--height PX] [--target-width PX]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageChops, ImageStat
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.image_processing_service import image_processing_service, scan_images, target_size
+
+QUALITY = 85
+
+
+def write_photos(directory: Path, count: int, width: int, height: int):
+    """Smooth gradients with a bright subject and sensor-like noise, like studio product shots."""
+    rng = np.random.default_rng(7)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    for i in range(count):
+        base = np.stack([
+            200 - 60 * y / height + 10 * np.sin(x / (40 + i % 7)),
+            190 - 40 * x / width,
+            180 + 30 * np.cos(y / (55 + i % 5))
+        ], axis=-1)
+        cx, cy = width * (0.3 + 0.4 * rng.random()), height * (0.3 + 0.4 * rng.random())
+        subject = ((x - cx) ** 2 + (y - cy) ** 2) < (min(width, height) / 4) ** 2
+        base[subject] = rng.integers(20, 235, size=3)
+        base += rng.normal(0, 6, size=base.shape)
+        Image.fromarray(np.clip(base, 0, 255).astype(np.uint8)).save(directory / f"product_{i:04d}.jpg", quality=92)
+
+
+def previous_batch(files, output_directory: Path, width: int):
+    for image_file in files:
+        with Image.open(image_file) as img:
+            new_size = target_size(img.size, width, None)
+            img.resize(new_size, Image.Resampling.LANCZOS).save(output_directory / image_file.name, quality=QUALITY)
+
+
+async def engine_batch(files, output_directory: Path, width: int):
+    pairs = [(str(image_file), str(output_directory / image_file.name)) for image_file in files]
+    results = [result async for result in image_processing_service.process_batch(
+        'resize', pairs, {'width': width, 'quality': QUALITY}
+    )]
+    failed = [result for result in results if not result['success']]
+    assert not failed, failed[0]['error']
+
+
+def compare(previous_dir: Path, engine_dir: Path) -> float:
+    differences = []
+    for previous in sorted(previous_dir.iterdir()):
+        with Image.open(previous) as a, Image.open(engine_dir / previous.name) as b:
+            assert a.size == b.size, previous.name
+            differences.append(sum(ImageStat.Stat(ImageChops.difference(a.convert('RGB'), b.convert('RGB'))).mean) / 3)
+    return max(differences)
+
+
+def folder_bytes(directory: Path) -> int:
+    return sum(path.stat().st_size for path in directory.iterdir())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=500, help="Number of photos")
+    parser.add_argument("--width", type=int, default=2400, help="Photo width")
+    parser.add_argument("--height", type=int, default=1800, help="Photo height")
+    parser.add_argument("--target-width", type=int, default=600, help="Width to resize to")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        source, previous_dir, engine_dir = Path(root, "source"), Path(root, "previous"), Path(root, "engine")
+        for directory in (source, previous_dir, engine_dir):
+            directory.mkdir()
+        print(f"Writing {args.images} photos of {args.width}x{args.height}...")
+        write_photos(source, args.images, args.width, args.height)
+        files = scan_images(str(source))
+
+        started = time.perf_counter()
+        previous_batch(files, previous_dir, args.target_width)
+        previous_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        asyncio.run(engine_batch(files, engine_dir, args.target_width))
+        engine_seconds = time.perf_counter() - started
+        image_processing_service.shutdown()
+
+        difference = compare(previous_dir, engine_dir)
+        print(f"{'':10}{'time':>10}{'output':>12}")
+        print(f"{'previous':10}{previous_seconds:9.2f}s{folder_bytes(previous_dir) / 1e6:10.1f}MB")
+        print(f"{'engine':10}{engine_seconds:9.2f}s{folder_bytes(engine_dir) / 1e6:10.1f}MB")
+        print(f"speedup {previous_seconds / engine_seconds:.1f}x with {image_processing_service.max_workers} workers; "
+              f"largest mean pixel difference {difference:.2f}/255")
+
+
+if __name__ == "__main__":
+    main()
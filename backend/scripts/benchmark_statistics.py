@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Statistical Analysis correlation and outlier kernels.
+
+Compares the previous implementations (a scipy test per column pair, one
+record per outlier looked up by index label) with the vectorized kernels in
+``marketplace_tools.statistics_core`` on two synthetic tables:
+
+- wide: many columns, few rows (correlation is dominated by column pairs);
+- tall: few columns, many rows (outliers are dominated by row count).
+
+Both implementations are checked to agree before they are timed.
+
+Usage:
+    python scripts/benchmark_statistics.py [--wide-columns N] [--wide-rows N] [--tall-rows N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.stats import pearsonr, spearmanr
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from marketplace_tools.statistics_core import (
+    correlation_matrix,
+    correlation_p_values,
+    detect_outliers,
+    numeric_matrix,
+    outlier_records,
+    significant_pairs
+)
+
+SIGNIFICANCE_LEVEL = 0.05
+
+
+def synthetic_table(rows: int, columns: int, seed: int) -> pd.DataFrame:
+    """Columns driven by a few shared factors, with heavy-tailed noise."""
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(size=(rows, 4))
+    loadings = rng.normal(size=(4, columns))
+    noise = rng.standard_t(df=3, size=(rows, columns))
+    return pd.DataFrame(factors @ loadings + noise, columns=[f"c{i}" for i in range(columns)])
+
+
+def baseline_correlation(df: pd.DataFrame, method: str):
+    """The previous _correlation_analysis: pandas matrix plus a scipy test per ordered pair."""
+    columns = df.columns
+    corr_matrix = df.corr(method=method)
+    p_values = pd.DataFrame(index=columns, columns=columns)
+    for i in columns:
+        for j in columns:
+            if i == j:
+                p_values.loc[i, j] = 1.0
+            elif method == 'pearson':
+                p_values.loc[i, j] = pearsonr(df[i].dropna(), df[j].dropna())[1]
+            else:
+                p_values.loc[i, j] = spearmanr(df[i].dropna(), df[j].dropna())[1]
+
+    significant = []
+    for a in range(len(columns)):
+        for b in range(a + 1, len(columns)):
+            p_val = p_values.loc[columns[a], columns[b]]
+            if p_val < SIGNIFICANCE_LEVEL:
+                significant.append((columns[a], columns[b], float(corr_matrix.loc[columns[a], columns[b]]), float(p_val)))
+    significant.sort(key=lambda x: abs(x[2]), reverse=True)
+    return corr_matrix, p_values.astype(float), significant
+
+
+def vectorized_correlation(df: pd.DataFrame, method: str):
+    corr, counts = correlation_matrix(numeric_matrix(df), method)
+    p_values = correlation_p_values(corr, counts, method)
+    return corr, p_values, significant_pairs(list(df.columns), corr, p_values, SIGNIFICANCE_LEVEL)
+
+
+def baseline_outliers(df: pd.DataFrame, method: str):
+    """The previous _outlier_detection loop."""
+    results = {}
+    for col in df.columns:
+        series = df[col].dropna()
+        if method == 'iqr':
+            q1 = series.quantile(0.25)
+            q3 = series.quantile(0.75)
+            iqr = q3 - q1
+            outlier_indices = series[(series < q1 - 1.5 * iqr) | (series > q3 + 1.5 * iqr)].index
+            results[col] = [{'index': int(idx), 'value': float(series[idx])} for idx in outlier_indices]
+        else:
+            z_scores = np.abs(stats.zscore(series))
+            outlier_indices = series[z_scores > 3].index
+            results[col] = [{'index': int(idx), 'value': float(series[idx]),
+                             'z_score': float(z_scores[series.index.get_loc(idx)])} for idx in outlier_indices]
+    return results
+
+
+def vectorized_outliers(df: pd.DataFrame, method: str, max_outliers: int):
+    detected = detect_outliers(numeric_matrix(df), method, max_outliers)
+    return {col: (found.count, outlier_records(df.index, found, include_scores=(method == 'zscore')))
+            for col, found in zip(df.columns, detected)}
+
+
+def check_correlation(df: pd.DataFrame, method: str):
+    expected_corr, expected_p, expected_significant = baseline_correlation(df, method)
+    corr, p_values, significant = vectorized_correlation(df, method)
+    np.testing.assert_allclose(corr, expected_corr.to_numpy(), atol=1e-9)
+    np.testing.assert_allclose(p_values, expected_p.to_numpy(), rtol=1e-6, atol=1e-12)
+    assert {pair[:2] for pair in significant} == {pair[:2] for pair in expected_significant}
+
+
+def check_outliers(df: pd.DataFrame, method: str):
+    expected = baseline_outliers(df, method)
+    # Without truncation both list the same outliers (ordered differently)
+    actual = vectorized_outliers(df, method, max_outliers=len(df))
+    for col, records in expected.items():
+        count, found = actual[col]
+        assert count == len(records), col
+        key = lambda record: record['index']
+        for want, got in zip(sorted(records, key=key), sorted(found, key=key)):
+            assert want['index'] == got['index'] and np.isclose(want['value'], got['value']), col
+            if 'z_score' in want:
+                assert np.isclose(want['z_score'], got['z_score']), col
+
+
+def timed(run) -> float:
+    started = time.perf_counter()
+    run()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wide-columns", type=int, default=200, help="Columns of the wide table")
+    parser.add_argument("--wide-rows", type=int, default=2000, help="Rows of the wide table")
+    parser.add_argument("--tall-rows", type=int, default=1_000_000, help="Rows of the tall table")
+    parser.add_argument("--tall-columns", type=int, default=8, help="Columns of the tall table")
+    parser.add_argument("--max-outliers", type=int, default=100, help="Outliers listed per column")
+    args = parser.parse_args()
+
+    wide = synthetic_table(args.wide_rows, args.wide_columns, seed=1)
+    tall = synthetic_table(args.tall_rows, args.tall_columns, seed=2)
+
+    # Agreement is checked on a slice so the slow path stays quick
+    for method in ('pearson', 'spearman'):
+        check_correlation(wide.iloc[:, :20], method)
+    for method in ('iqr', 'zscore'):
+        check_outliers(tall.iloc[:100_000], method)
+    print("Vectorized kernels match the previous implementations")
+
+    cases = [
+        (f"correlation pearson, wide {args.wide_rows:,}x{args.wide_columns}",
+         lambda: baseline_correlation(wide, 'pearson'), lambda: vectorized_correlation(wide, 'pearson')),
+        (f"correlation spearman, wide {args.wide_rows:,}x{args.wide_columns}",
+         lambda: baseline_correlation(wide, 'spearman'), lambda: vectorized_correlation(wide, 'spearman')),
+        (f"correlation pearson, tall {args.tall_rows:,}x{args.tall_columns}",
+         lambda: baseline_correlation(tall, 'pearson'), lambda: vectorized_correlation(tall, 'pearson')),
+        (f"outliers iqr, tall {args.tall_rows:,}x{args.tall_columns}",
+         lambda: baseline_outliers(tall, 'iqr'), lambda: vectorized_outliers(tall, 'iqr', args.max_outliers)),
+        (f"outliers zscore, tall {args.tall_rows:,}x{args.tall_columns}",
+         lambda: baseline_outliers(tall, 'zscore'), lambda: vectorized_outliers(tall, 'zscore', args.max_outliers)),
+        (f"outliers zscore, wide {args.wide_rows:,}x{args.wide_columns}",
+         lambda: baseline_outliers(wide, 'zscore'), lambda: vectorized_outliers(wide, 'zscore', args.max_outliers))
+    ]
+
+    print(f"{'':44}{'previous':>12}{'vectorized':>12}{'speedup':>10}")
+    for name, baseline, vectorized in cases:
+        before = timed(baseline)
+        after = timed(vectorized)
+        print(f"{name:44}{before * 1000:9.0f} ms{after * 1000:9.1f} ms{before / after:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -31,7 +31,7 @@ export default function UploadFileModal({ isOpen, onClose, collection, onUpload
   const [dragActive, setDragActive] = useState(false)
   const fileInputRef = useRef<HTMLInputElement>(null)
 
-  const allowedExtensions = ['.txt', '.md', '.pdf', '.doc', '.docx']
+  const allowedExtensions = ['.txt', '.md', '.pdf', '.docx']
   const maxFileSize = 10 * 1024 * 1024 // 10MB
 
   const truncateName = (name: string, maxLength: number = 25) => {